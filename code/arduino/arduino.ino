@@ -5,10 +5,50 @@
   The code can request a setup and a cleanup wich means a reset of fssPressed and enoughWeight.
   The setup also activate the solenoide and the cleanup deactivate it
   It can also request the status of those two variables and deactivation of the solenoide.
+  "activate solenoide" locks the desk again without resetting the variables (game lost).
+
+  Push mode:
+  After the "push mode on" request the arduino sends a frame each time fsrPressed or
+  enoughLCWeight changes and a heartbeat frame every second, so the Raspberry Pi
+  does not have to request the status anymore. "push mode off" goes back to the
+  request/reply behaviour, it is acknowledged by the "push mode off" line.
+  The other requests work the same way in both modes.
+  Frames are one line: #<payload>*<checksum>
+  with the checksum being the XOR of the payload characters written in hexadecimal.
+    Event:     #E,<sensor id>,<state>,<millis>,<sequence number>*<checksum>
+               sensor id is F (FSR) or L (load cell), state is 1 or 0
+    Heartbeat: #H,<millis>,<sequence number>*<checksum>
+
+  Status frame:
+  "status all" is answered in both modes by one frame with the state of every sensor,
+  "status all raw" adds the readings: FSR analog value and load cell average in grams.
+    Status:    #S,<millis>,F<state>,L<state>[,f<fsr reading>,l<load cell grams>]*<checksum>
+  A new sensor adds its own uppercase (state) and lowercase (reading) letter.
+
+  Stream mode:
+  After the "stream on" request every raw sample is sent to the Raspberry Pi, which filters them and
+  decides when a sensor is activated (signal_processing.py), the states above are still kept.
+  The samples are sent in batches, once a batch is full: FSR analog values on 2 bytes (24 per batch,
+  one every 240 ms) and HX711 counts before tare and scale on 3 bytes (8 per batch, 10 samples per second),
+  in little endian and base64. The frames take about half of the serial link at 115200 bauds.
+    Batch:     #R,<sensor id>,<batch number>,<millis of the last sample>,<samples in base64>*<checksum>
+  "stream off" stops the batches, it is acknowledged by the "stream off" line.
+
+  Scheduling:
+  loop() never waits for a sensor. It runs small tasks, each one when its interval has elapsed:
+  the serial requests are read and answered at every loop, the FSR is sampled every 10 ms,
+  the load cell is only read once the HX711 has a conversion ready (is_ready()) and its
+  samples go through a rolling average, the heartbeat is sent every second in push mode.
+  A request is therefore answered within a few milliseconds.
+
+  Ready banner:
+  Opening the serial port resets the arduino, "ready" is sent once setup() is done
+  so the Raspberry Pi knows when requests can be sent. The "ping" request is also
+  answered by "ready", for when the arduino was not reset.
    
   Based on Serial Event example
 
-  When new serial data arrives, this sketch adds it to a String.
+  When new serial data arrives, this sketch adds it to a fixed buffer (see command_parser.h).
   When a newline is received, the loop prints the string and clears it.
   
   created 9 May 2011
@@ -42,7 +82,8 @@
 */
 
 #include "HX711.h" //This library can be obtained here http://librarymanager/All#Avia_HX711
-#include <assert.h>
+#include "command_parser.h"
+#include "sample_batch.h"
 
 #define calibration_factor -7050.0 //This value is obtained using the SparkFun_HX711_Calibration sketc
 //Load cell pins :
@@ -53,128 +94,387 @@ HX711 scale;
 
 int fsrAnalogPin = 0; // FSR is connected to analog 0
 int fsrReading;      // the analog reading from the FSR resistor divider
-int loadCellReading;
+float loadCellReading;  // rolling average of the last load cell samples (kg)
+
+#define FSR_SAMPLE_INTERVAL 10  // time between two FSR samples (ms)
+#define LC_FILTER_SIZE 4        // number of load cell samples averaged (10 samples per second)
+float lcSamples[LC_FILTER_SIZE];  // last load cell samples, used as a ring
+byte lcSampleIndex = 0;           // position of the next sample in lcSamples
+byte lcSampleCount = 0;           // number of samples in lcSamples
+float lcSampleSum = 0;            // sum of the samples in lcSamples
 
 int solenoidPin = 9;// Solenoid Pin
 
-int inputValue = 0;
-String inputString = "";         // a String to hold incoming data
-bool stringComplete = false;  // whether the string is complet
-String fsrPressed = "false";
-String enoughLCWeight = "false";
+LineReader request;            // request being received, see command_parser.h
+bool fsrPressed = false;       // whether the FSR was pressed hard enough since the last setup
+bool enoughLCWeight = false;   // whether the load cell had enough weight since the last setup
+
+bool pushMode = false;             // whether the changes are pushed to the Raspberry Pi
+unsigned long frameSequence = 0;   // sequence number of the last frame sent
+unsigned long lastHeartbeat = 0;   // time of the last heartbeat frame
+#define HEARTBEAT_INTERVAL 1000    // time between two heartbeat frames (ms)
+
+bool streamMode = false;           // whether the raw samples are sent to the Raspberry Pi
+unsigned long batchSequence = 0;   // number of the last batch frame sent
+#define FSR_BATCH_SIZE 24          // FSR samples of a batch frame
+#define LC_BATCH_SIZE 8            // load cell samples of a batch frame
+SampleBatch fsrBatch;              // FSR samples not sent yet
+SampleBatch lcBatch;               // load cell samples not sent yet
+
+/*
+  Task of the cooperative scheduler: run is called by loop() every interval milliseconds
+  (at every loop for an interval of 0). A task must return without waiting.
+*/
+struct Task {
+  void (*run)();
+  unsigned long interval;
+  unsigned long lastRun;
+};
+
+void handleSerial();
+void updateFsr();
+void updateLoadCell();
+void updateHeartbeat();
+void replyFsrStatus();
+void replyLoadCellStatus();
+void replyInvalidStatus();
+void replyAllStatus();
+void replyAllStatusRaw();
+void setupRequest();
+void cleanupRequest();
+void pushModeOnRequest();
+void pushModeOffRequest();
+void pingRequest();
+void deactivateSolenoideRequest();
+void activateSolenoideRequest();
+void streamOnRequest();
+void streamOffRequest();
+void replyInvalidCommand();
+
+Task tasks[] = {
+  {handleSerial, 0, 0},
+  {updateFsr, FSR_SAMPLE_INTERVAL, 0},
+  {updateLoadCell, 0, 0},
+  {updateHeartbeat, 0, 0},
+};
+#define TASK_COUNT (sizeof(tasks) / sizeof(tasks[0]))
+
+/*
+  Function handling each request identified by parseCommand.
+*/
+struct CommandHandler {
+  CommandId command;
+  void (*handle)();
+};
+
+const CommandHandler commandHandlers[] = {
+  {CMD_STATUS_FSR, replyFsrStatus},
+  {CMD_STATUS_LOAD_CELL, replyLoadCellStatus},
+  {CMD_STATUS_INVALID, replyInvalidStatus},
+  {CMD_STATUS_ALL, replyAllStatus},
+  {CMD_STATUS_ALL_RAW, replyAllStatusRaw},
+  {CMD_SETUP, setupRequest},
+  {CMD_CLEANUP, cleanupRequest},
+  {CMD_PUSH_MODE_ON, pushModeOnRequest},
+  {CMD_PUSH_MODE_OFF, pushModeOffRequest},
+  {CMD_PING, pingRequest},
+  {CMD_DEACTIVATE_SOLENOIDE, deactivateSolenoideRequest},
+  {CMD_ACTIVATE_SOLENOIDE, activateSolenoideRequest},
+  {CMD_STREAM_ON, streamOnRequest},
+  {CMD_STREAM_OFF, streamOffRequest},
+};
+#define HANDLER_COUNT (sizeof(commandHandlers) / sizeof(commandHandlers[0]))
 
 /*
   Program setup.
 */
 void setup() {
   // initialize serial:
-  Serial.begin(9600);
+  Serial.begin(115200);
   // Scale configuration
   scale.begin(LOADCELL_DOUT_PIN, LOADCELL_SCK_PIN);
   scale.set_scale(calibration_factor); //This value is obtained by using the SparkFun_HX711_Calibration sketch
   scale.tare();  //Assuming there is no weight on the scale at start up, reset the scale to 0
   
   pinMode(solenoidPin, OUTPUT); //Sets solenoid pin as an output
-  // reserve 200 bytes for the inputString:
-  inputString.reserve(200);
+  clearLine(&request);
+  // Tell the Raspberry Pi the requests can be sent
+  Serial.println(F("ready"));
 }
 
 /*
-  Program loop.
+  Program loop: run the tasks which are due, none of them waits.
 */
 void loop() {
-  // print the string when a newline arrives:
-  if (stringComplete) {
-    // Status request:
-    if (inputString.startsWith("status update")){
-      // FSR status request:
-      if (inputString.indexOf("fsr") > -1){
-        // Send reply regarding the FSR:
-        Serial.println("fsr activated: " + fsrPressed);
-        }
-      // Load cell status request:
-      else if (inputString.indexOf("load cell") > -1){
-        // Send reply regarding the load cell:
-        Serial.println("load cell activated: " + enoughLCWeight);
-        }
-      else{
-        // In case of an invalid request:
-        Serial.println("invalid set Command");
-        }
-      }
-    // Setup request:
-    else if (inputString.startsWith("setup")){
-      fsrPressed = "false"; // Reset fsrPressed
-      enoughLCWeight = "false"; // Reset enoughLCWeight
-      digitalWrite(solenoidPin, LOW); // Switch Solenoid ON
-      }
-    // Cleanup request:
-    else if (inputString.startsWith("cleanup")){
-      fsrPressed = "false"; // Reset fsrPressed
-      enoughLCWeight = "false"; // Reset enoughLCWeight
-      digitalWrite(solenoidPin, HIGH); // Switch Solenoid OFF
-      }
-    // Deactivate the solenoide:
-    else if (inputString.startsWith("deactivate solenoide")){
-      digitalWrite(solenoidPin, HIGH); // Switch Solenoid OFF
-      }
-    // In case of an invalid request
-    else{
-      Serial.println("invalid Command");
+  unsigned long now = millis();
+  for (unsigned int i = 0; i < TASK_COUNT; i++){
+    if (now - tasks[i].lastRun >= tasks[i].interval){
+      tasks[i].lastRun = now;
+      tasks[i].run();
       }
-    // clear the string:
-    inputString = "";
-    stringComplete = false;
-  }
-  // Check FSR status:
-  updateFsr();
-  // Check load cell status:
-  updateLoadCell();
+    }
 }
 
 /*
-  SerialEvent occurs whenever a new data comes in the hardware serial RX. This
-  routine is run between each time loop() runs, so using delay inside loop can
-  delay response. Multiple bytes of data may be available.
+  handleSerial reads the bytes received so far and handles each request once
+  its newline arrives. Nothing waits for more bytes, the rest of the request
+  is read at the next loop.
 */
-void serialEvent() {
+void handleSerial(){
   while (Serial.available()) {
-    // get the new byte:
-    char inChar = (char)Serial.read();
-    // add it to the inputString:
-    inputString += inChar;
-    // if the incoming character is a newline, set a flag so the main loop can
-    // do something about it:
-    if (inChar == '\n') {
-      stringComplete = true;
+    if (readLine(&request, (char)Serial.read())) {
+      handleRequest(parseCommand(request.line));
     }
   }
 }
+
+/*
+  handleRequest calls the handler of the request, an unknown request gets "invalid Command".
+*/
+void handleRequest(CommandId command){
+  for (unsigned int i = 0; i < HANDLER_COUNT; i++){
+    if (commandHandlers[i].command == command){
+      commandHandlers[i].handle();
+      return;
+      }
+    }
+  replyInvalidCommand();
+  }
+
+/*
+  Handlers of the requests. The replies are stored in flash (F macro).
+*/
+// Status request of the FSR:
+void replyFsrStatus(){
+  Serial.print(F("fsr activated: "));
+  Serial.println(fsrPressed ? F("true") : F("false"));
+  }
+
+// Status request of the load cell:
+void replyLoadCellStatus(){
+  Serial.print(F("load cell activated: "));
+  Serial.println(enoughLCWeight ? F("true") : F("false"));
+  }
+
+// Status request of an unknown sensor:
+void replyInvalidStatus(){
+  Serial.println(F("invalid set Command"));
+  }
+
+// Status request of every sensor, with or without the readings:
+void replyAllStatus(){
+  sendStatusFrame(false);
+  }
+
+void replyAllStatusRaw(){
+  sendStatusFrame(true);
+  }
+
+// Setup request:
+void setupRequest(){
+  setFsrPressed(false); // Reset fsrPressed
+  setEnoughLCWeight(false); // Reset enoughLCWeight
+  digitalWrite(solenoidPin, LOW); // Switch Solenoid ON
+  }
+
+// Cleanup request:
+void cleanupRequest(){
+  setFsrPressed(false); // Reset fsrPressed
+  setEnoughLCWeight(false); // Reset enoughLCWeight
+  digitalWrite(solenoidPin, HIGH); // Switch Solenoid OFF
+  }
+
+// Push mode requests:
+void pushModeOnRequest(){
+  pushMode = true;
+  // Send the current state so the Raspberry Pi starts from a known snapshot
+  sendEventFrame('F', fsrPressed);
+  sendEventFrame('L', enoughLCWeight);
+  sendHeartbeatFrame();
+  }
+
+void pushModeOffRequest(){
+  pushMode = false;
+  // Acknowledge so the Raspberry Pi stops reading frames
+  Serial.println(F("push mode off"));
+  }
+
+// Is the arduino ready:
+void pingRequest(){
+  Serial.println(F("ready"));
+  }
+
+// Deactivate the solenoide:
+void deactivateSolenoideRequest(){
+  digitalWrite(solenoidPin, HIGH); // Switch Solenoid OFF
+  }
+
+// Activate the solenoide:
+void activateSolenoideRequest(){
+  digitalWrite(solenoidPin, LOW); // Switch Solenoid ON
+  }
+
+// Stream mode requests:
+void streamOnRequest(){
+  // The batches start empty, the first one is complete
+  initBatch(&fsrBatch, 2, FSR_BATCH_SIZE);
+  initBatch(&lcBatch, 3, LC_BATCH_SIZE);
+  streamMode = true;
+  }
+
+void streamOffRequest(){
+  streamMode = false;
+  // Acknowledge so the Raspberry Pi stops reading batches
+  Serial.println(F("stream off"));
+  }
+
+// In case of an invalid request
+void replyInvalidCommand(){
+  Serial.println(F("invalid Command"));
+  }
+
 /*
   updateFsr update the fsrPressed variable when the weight pressed on the FSR is
-  sufficient.
-  The update consist of assigning the string "true" to it when conditions are met.
+  sufficient. Called every FSR_SAMPLE_INTERVAL milliseconds.
+  The update consist of setting it to true when conditions are met.
 */
 void updateFsr(){
-  assert(fsrPressed == "false" or fsrPressed == "true");
   // Analog read of the FSR:
   fsrReading = analogRead(fsrAnalogPin);
+  if (streamMode && addSample(&fsrBatch, fsrReading)){
+    sendBatchFrame('F', &fsrBatch);
+    }
   // If the strenght apply is over 800 units.
   if (fsrReading > 800){
-    fsrPressed = "true";
+    setFsrPressed(true);
     } 
   }
 
 /*
   updateLoadCell update the enoughLCWeight variable when the weight on the load cell is
   sufficient.
-  The update consist of assigning the string "true" to it when conditions are met.
+  The HX711 is only read once it has a new conversion (10 per second), the read does not wait.
+  The decision is taken on the average of the last LC_FILTER_SIZE samples.
+  The update consist of setting it to true when conditions are met.
 */
 void updateLoadCell(){
-  assert(enoughLCWeight == "false" or enoughLCWeight == "true");
-  loadCellReading = scale.get_units(); //scale.get_units() returns a float;
+  if (!scale.is_ready()){
+    return;
+    }
+  long reading = scale.read();
+  if (streamMode && addSample(&lcBatch, reading)){
+    sendBatchFrame('L', &lcBatch);
+    }
+  // Same value as scale.get_units(), without waiting for the conversion
+  float sample = (reading - scale.get_offset()) / scale.get_scale();
+  // Replace the oldest sample of the rolling average
+  if (lcSampleCount == LC_FILTER_SIZE){
+    lcSampleSum -= lcSamples[lcSampleIndex];
+    }
+  else{
+    lcSampleCount++;
+    }
+  lcSamples[lcSampleIndex] = sample;
+  lcSampleSum += sample;
+  lcSampleIndex = (lcSampleIndex + 1) % LC_FILTER_SIZE;
+  loadCellReading = lcSampleSum / lcSampleCount;
   // If the load cell reading value is over 3 kgs:
   if (abs(loadCellReading) > 3){
-    enoughLCWeight = "true";
+    setEnoughLCWeight(true);
     } 
   }
+
+/*
+  updateHeartbeat sends the heartbeat frame every HEARTBEAT_INTERVAL milliseconds in push mode.
+*/
+void updateHeartbeat(){
+  if (pushMode && millis() - lastHeartbeat >= HEARTBEAT_INTERVAL){
+    sendHeartbeatFrame();
+    }
+  }
+
+/*
+  setFsrPressed and setEnoughLCWeight change the state of a sensor.
+  In push mode a frame is sent when the state really changes.
+*/
+void setFsrPressed(bool state){
+  if (fsrPressed != state){
+    fsrPressed = state;
+    if (pushMode){
+      sendEventFrame('F', fsrPressed);
+      }
+    }
+  }
+
+void setEnoughLCWeight(bool state){
+  if (enoughLCWeight != state){
+    enoughLCWeight = state;
+    if (pushMode){
+      sendEventFrame('L', enoughLCWeight);
+      }
+    }
+  }
+
+/*
+  sendFrame sends the payload between the frame start and its checksum.
+*/
+void sendFrame(const char *payload){
+  byte checksum = 0;
+  for (const char *c = payload; *c != '\0'; c++){
+    checksum ^= *c;
+    }
+  Serial.print('#');
+  Serial.print(payload);
+  Serial.print('*');
+  if (checksum < 0x10){
+    Serial.print('0');
+    }
+  Serial.println(checksum, HEX);
+  }
+
+/*
+  sendEventFrame sends the new state of a sensor (F or L).
+*/
+void sendEventFrame(char sensorId, bool state){
+  char payload[40];
+  frameSequence++;
+  snprintf(payload, sizeof(payload), "E,%c,%d,%lu,%lu", sensorId, state ? 1 : 0, millis(), frameSequence);
+  sendFrame(payload);
+  }
+
+/*
+  sendStatusFrame sends the state of every sensor, and their readings if raw is true.
+  The load cell average is sent in grams, printf of floats is not available on the arduino.
+*/
+void sendStatusFrame(bool raw){
+  char payload[48];
+  int length = snprintf(payload, sizeof(payload), "S,%lu,F%d,L%d", millis(), fsrPressed ? 1 : 0,
+                        enoughLCWeight ? 1 : 0);
+  if (raw){
+    snprintf(payload + length, sizeof(payload) - length, ",f%d,l%ld", fsrReading, (long)(loadCellReading * 1000));
+    }
+  sendFrame(payload);
+  }
+
+/*
+  sendBatchFrame sends the samples of a full batch of a sensor (F or L) and empties it.
+*/
+void sendBatchFrame(char sensorId, SampleBatch *batch){
+  char payload[32 + 4 * BATCH_DATA_SIZE / 3];
+  batchSequence++;
+  int length = snprintf(payload, sizeof(payload), "R,%c,%lu,%lu,", sensorId, batchSequence, millis());
+  encodeBase64(batch->data, batch->count * batch->width, payload + length);
+  batch->count = 0;
+  sendFrame(payload);
+  }
+
+/*
+  sendHeartbeatFrame tells the Raspberry Pi the link is still up.
+*/
+void sendHeartbeatFrame(){
+  char payload[32];
+  frameSequence++;
+  lastHeartbeat = millis();
+  snprintf(payload, sizeof(payload), "H,%lu,%lu", lastHeartbeat, frameSequence);
+  sendFrame(payload);
+  }
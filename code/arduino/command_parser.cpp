@@ -0,0 +1,93 @@
+/*
+  See command_parser.h
+*/
+
+#include <string.h>
+#include "command_parser.h"
+
+/*
+  Prefix of each request, checked in order like the startsWith calls they replace.
+*/
+struct CommandPrefix {
+  char prefix[24];
+  uint8_t command;
+};
+
+const CommandPrefix COMMAND_PREFIXES[] PROGMEM = {
+  {"status update", CMD_STATUS_INVALID},  // refined with the sensor found in the rest of the line
+  {"status all raw", CMD_STATUS_ALL_RAW},
+  {"status all", CMD_STATUS_ALL},
+  {"setup", CMD_SETUP},
+  {"cleanup", CMD_CLEANUP},
+  {"push mode on", CMD_PUSH_MODE_ON},
+  {"push mode off", CMD_PUSH_MODE_OFF},
+  {"ping", CMD_PING},
+  {"deactivate solenoide", CMD_DEACTIVATE_SOLENOIDE},
+  {"activate solenoide", CMD_ACTIVATE_SOLENOIDE},
+  {"stream on", CMD_STREAM_ON},
+  {"stream off", CMD_STREAM_OFF},
+};
+#define COMMAND_PREFIX_COUNT (sizeof(COMMAND_PREFIXES) / sizeof(COMMAND_PREFIXES[0]))
+
+/*
+  clearLine forgets the line being received.
+*/
+void clearLine(LineReader *reader){
+  reader->line[0] = '\0';
+  reader->length = 0;
+  reader->overflow = false;
+  }
+
+/*
+  readLine adds a received character to the line.
+  Return true when the character ends the line, the line is then in reader->line
+  without its end and the next character starts a new line.
+  A line longer than the buffer is returned empty, so it is answered as an invalid request.
+*/
+bool readLine(LineReader *reader, char c){
+  if (c == '\n'){
+    if (reader->overflow){
+      reader->length = 0;
+      }
+    reader->line[reader->length] = '\0';
+    reader->length = 0;
+    reader->overflow = false;
+    return true;
+    }
+  // The carriage return of a "\r\n" line end is not part of the request
+  if (c == '\r'){
+    return false;
+    }
+  if (reader->length < LINE_BUFFER_SIZE - 1){
+    reader->line[reader->length++] = c;
+    }
+  else{
+    reader->overflow = true;
+    }
+  return false;
+  }
+
+/*
+  parseCommand identifies the request of a complete line.
+*/
+CommandId parseCommand(const char *line){
+  for (unsigned int i = 0; i < COMMAND_PREFIX_COUNT; i++){
+    const char *prefix = COMMAND_PREFIXES[i].prefix;
+    if (strncmp_P(line, prefix, strlen_P(prefix)) != 0){
+      continue;
+      }
+    CommandId command = (CommandId) pgm_read_byte(&COMMAND_PREFIXES[i].command);
+    if (command == CMD_STATUS_INVALID){
+      // Status request, the sensor can be anywhere in the line
+      if (strstr(line, "fsr") != NULL){
+        return CMD_STATUS_FSR;
+        }
+      if (strstr(line, "load cell") != NULL){
+        return CMD_STATUS_LOAD_CELL;
+        }
+      return CMD_STATUS_INVALID;
+      }
+    return command;
+    }
+  return CMD_INVALID;
+  }
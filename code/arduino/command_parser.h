@@ -0,0 +1,57 @@
+/*
+  Parsing of the requests sent by raspberry.py, without any dynamic allocation.
+
+  The bytes received are put in a fixed buffer by readLine until a newline arrives,
+  the complete line is then identified by parseCommand with a table of request prefixes
+  stored in flash. The same code is compiled on the host by host/parser_test.cpp.
+*/
+
+#ifndef COMMAND_PARSER_H
+#define COMMAND_PARSER_H
+
+#include <stdint.h>
+
+#ifdef ARDUINO
+#include <avr/pgmspace.h>
+#else
+// On the host the tables are in RAM
+#include <string.h>
+#define PROGMEM
+#define strncmp_P strncmp
+#define strlen_P strlen
+#define pgm_read_byte(address) (*(const uint8_t *)(address))
+#endif
+
+// Longest request is "status update load cell", lines longer than the buffer are invalid
+#define LINE_BUFFER_SIZE 32
+
+enum CommandId {
+  CMD_INVALID,               // unknown request
+  CMD_STATUS_FSR,            // status update fsr
+  CMD_STATUS_LOAD_CELL,      // status update load cell
+  CMD_STATUS_INVALID,        // status update of an unknown sensor
+  CMD_SETUP,                 // setup
+  CMD_CLEANUP,               // cleanup
+  CMD_PUSH_MODE_ON,          // push mode on
+  CMD_PUSH_MODE_OFF,         // push mode off
+  CMD_PING,                  // ping
+  CMD_DEACTIVATE_SOLENOIDE,  // deactivate solenoide
+  CMD_ACTIVATE_SOLENOIDE,    // activate solenoide
+  CMD_STATUS_ALL,            // status all
+  CMD_STATUS_ALL_RAW,        // status all raw
+  CMD_STREAM_ON,             // stream on
+  CMD_STREAM_OFF,            // stream off
+  COMMAND_COUNT
+};
+
+struct LineReader {
+  char line[LINE_BUFFER_SIZE];  // line being received, then the complete line without its end
+  uint8_t length;               // number of characters received in line
+  bool overflow;                // whether the line being received is longer than the buffer
+};
+
+void clearLine(LineReader *reader);
+bool readLine(LineReader *reader, char c);
+CommandId parseCommand(const char *line);
+
+#endif
@@ -0,0 +1,172 @@
+/*
+  Host test harness of command_parser.cpp, compiled for Linux by test.py:
+    g++ -I.. -fsanitize=address,undefined parser_test.cpp ../command_parser.cpp ../sample_batch.cpp -o parser_test
+
+  parser_test parse
+    Read the requests on the standard input and print the name of each request parsed.
+  parser_test fuzz <iterations> <seed>
+    Read example requests on the standard input (one per line) and feed the parser with
+    mutations of them: changed, inserted and removed bytes, missing or repeated newlines
+    and lines longer than the buffer. The exit code is 1 if an invariant is broken.
+  parser_test batch <width> <capacity>
+    Read samples on the standard input (one number per line) and print the base64 text of each
+    full batch, as sent in stream mode (see sample_batch.h).
+*/
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <string>
+#include <vector>
+#include "command_parser.h"
+#include "sample_batch.h"
+
+const char *COMMAND_NAMES[COMMAND_COUNT] = {
+  "invalid", "status fsr", "status load cell", "status invalid", "setup", "cleanup",
+  "push mode on", "push mode off", "ping", "deactivate solenoide", "activate solenoide",
+  "status all", "status all raw", "stream on", "stream off",
+};
+
+/*
+  check stops the program if a condition does not hold.
+*/
+void check(bool condition, const char *message, const std::string &input){
+  if (!condition){
+    fprintf(stderr, "%s, input: \"", message);
+    for (size_t i = 0; i < input.size(); i++){
+      fprintf(stderr, (input[i] >= 32 && input[i] < 127) ? "%c" : "\\x%02x", (unsigned char) input[i]);
+      }
+    fprintf(stderr, "\"\n");
+    exit(1);
+    }
+  }
+
+/*
+  feed gives the input to the reader and checks the state of the reader after each byte.
+  Return the number of complete lines.
+*/
+int feed(LineReader *reader, const std::string &input){
+  int lines = 0;
+  for (size_t i = 0; i < input.size(); i++){
+    bool complete = readLine(reader, input[i]);
+    check(reader->length < LINE_BUFFER_SIZE, "Line length out of the buffer", input);
+    if (complete){
+      lines++;
+      check(memchr(reader->line, '\0', LINE_BUFFER_SIZE) != NULL, "Line not terminated", input);
+      CommandId command = parseCommand(reader->line);
+      check(command >= CMD_INVALID && command < COMMAND_COUNT, "Unknown command id", input);
+      }
+    }
+  return lines;
+  }
+
+/*
+  mutate returns a random variation of the request.
+*/
+std::string mutate(std::string request){
+  int mutations = 1 + rand() % 4;
+  for (int i = 0; i < mutations; i++){
+    size_t position = request.empty() ? 0 : rand() % request.size();
+    switch (rand() % 7){
+      case 0:  // changed byte
+        if (!request.empty()) request[position] = (char) (rand() % 256);
+        break;
+      case 1:  // inserted byte
+        request.insert(position, 1, (char) (rand() % 256));
+        break;
+      case 2:  // removed byte
+        if (!request.empty()) request.erase(position, 1);
+        break;
+      case 3:  // line longer than the buffer
+        request.insert(position, LINE_BUFFER_SIZE + rand() % 200, 'a' + rand() % 26);
+        break;
+      case 4:  // repeated newline
+        request.insert(position, "\n");
+        break;
+      case 5:  // carriage returns
+        request.insert(position, "\r\r");
+        break;
+      default:  // missing end of line
+        if (!request.empty() && request[request.size() - 1] == '\n') request.erase(request.size() - 1);
+        break;
+      }
+    }
+  return request;
+  }
+
+int parse(){
+  LineReader reader;
+  clearLine(&reader);
+  int c;
+  while ((c = getchar()) != EOF){
+    if (readLine(&reader, (char) c)){
+      printf("%s\n", COMMAND_NAMES[parseCommand(reader.line)]);
+      }
+    }
+  return 0;
+  }
+
+int fuzz(long iterations, unsigned int seed){
+  std::vector<std::string> requests;
+  char line[256];
+  while (fgets(line, sizeof(line), stdin) != NULL){
+    std::string request = line;
+    // Every example is a complete line
+    if (request.empty() || request[request.size() - 1] != '\n') request += '\n';
+    requests.push_back(request);
+    }
+  check(!requests.empty(), "No example request", "");
+  srand(seed);
+
+  LineReader reader;
+  clearLine(&reader);
+  for (long i = 0; i < iterations; i++){
+    std::string input;
+    int pieces = 1 + rand() % 3;
+    for (int j = 0; j < pieces; j++){
+      input += mutate(requests[rand() % requests.size()]);
+      }
+    feed(&reader, input);
+
+    // Whatever was received before, the line after the next newline is parsed like on a fresh reader
+    const std::string &request = requests[rand() % requests.size()];
+    LineReader fresh;
+    clearLine(&fresh);
+    feed(&fresh, request);
+    CommandId expected = parseCommand(fresh.line);
+    check(feed(&reader, "\n" + request) == 2, "Request not complete", input + "\n" + request);
+    check(parseCommand(reader.line) == expected, "Request parsed differently after other input", input + "\n" + request);
+    }
+  printf("%ld inputs\n", iterations);
+  return 0;
+  }
+
+int batch(uint8_t width, uint8_t capacity){
+  SampleBatch samples;
+  initBatch(&samples, width, capacity);
+  char text[4 * BATCH_DATA_SIZE / 3 + 1];
+  long sample;
+  while (scanf("%ld", &sample) == 1){
+    if (addSample(&samples, sample)){
+      check(encodeBase64(samples.data, samples.count * samples.width, text) < sizeof(text),
+            "Text longer than its buffer", "");
+      printf("%s\n", text);
+      samples.count = 0;
+      }
+    }
+  return 0;
+  }
+
+int main(int argc, char **argv){
+  if (argc == 2 && strcmp(argv[1], "parse") == 0){
+    return parse();
+    }
+  if (argc == 4 && strcmp(argv[1], "fuzz") == 0){
+    return fuzz(atol(argv[2]), (unsigned int) atoi(argv[3]));
+    }
+  if (argc == 4 && strcmp(argv[1], "batch") == 0){
+    return batch((uint8_t) atoi(argv[2]), (uint8_t) atoi(argv[3]));
+    }
+  fprintf(stderr, "Usage: %s parse | fuzz <iterations> <seed> | batch <width> <capacity>\n", argv[0]);
+  return 2;
+  }
@@ -0,0 +1,68 @@
+/*
+  See sample_batch.h
+*/
+
+#include "sample_batch.h"
+
+#ifdef ARDUINO
+#include <avr/pgmspace.h>
+#else
+// On the host the table is in RAM
+#define PROGMEM
+#define pgm_read_byte(address) (*(const uint8_t *)(address))
+#endif
+
+const char BASE64_ALPHABET[] PROGMEM = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/";
+
+/*
+  initBatch empties the batch and sets the size of its samples.
+  The capacity is cut so the batch fits in BATCH_DATA_SIZE.
+*/
+void initBatch(SampleBatch *batch, uint8_t width, uint8_t capacity){
+  batch->width = width;
+  batch->capacity = (capacity * width > BATCH_DATA_SIZE) ? BATCH_DATA_SIZE / width : capacity;
+  batch->count = 0;
+  }
+
+/*
+  addSample packs a sample at the end of the batch, the upper bytes are dropped:
+  the two's complement of a 24 bit HX711 reading fits in 3 bytes.
+  Return true when the batch is full, it must be sent and emptied (count = 0) before the next sample.
+*/
+bool addSample(SampleBatch *batch, long sample){
+  if (batch->count >= batch->capacity){
+    return true;
+    }
+  uint8_t *position = batch->data + batch->count * batch->width;
+  for (uint8_t i = 0; i < batch->width; i++){
+    position[i] = (uint8_t) (sample >> (8 * i));
+    }
+  batch->count++;
+  return batch->count >= batch->capacity;
+  }
+
+/*
+  base64Char returns the character of the lowest 6 bits of the value.
+*/
+static char base64Char(uint32_t value){
+  return (char) pgm_read_byte(&BASE64_ALPHABET[value & 0x3F]);
+  }
+
+/*
+  encodeBase64 writes the base64 text of the data, with its padding and ending null character.
+  The text must hold 4 * ((length + 2) / 3) + 1 characters. Return the length of the text.
+*/
+uint16_t encodeBase64(const uint8_t *data, uint16_t length, char *text){
+  uint16_t size = 0;
+  for (uint16_t i = 0; i < length; i += 3){
+    uint32_t group = (uint32_t) data[i] << 16;
+    if (i + 1 < length) group |= (uint32_t) data[i + 1] << 8;
+    if (i + 2 < length) group |= data[i + 2];
+    text[size++] = base64Char(group >> 18);
+    text[size++] = base64Char(group >> 12);
+    text[size++] = (i + 1 < length) ? base64Char(group >> 6) : '=';
+    text[size++] = (i + 2 < length) ? base64Char(group) : '=';
+    }
+  text[size] = '\0';
+  return size;
+  }
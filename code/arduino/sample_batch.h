@@ -0,0 +1,28 @@
+/*
+  Batches of raw samples sent in stream mode, without any dynamic allocation.
+
+  The samples of a sensor are packed in little endian, on 2 bytes (FSR) or 3 bytes (HX711),
+  and the batch is sent once full in base64, so it fits in a frame line like the other frames.
+  The same code is compiled on the host by host/parser_test.cpp.
+*/
+
+#ifndef SAMPLE_BATCH_H
+#define SAMPLE_BATCH_H
+
+#include <stdint.h>
+
+// Largest batch in bytes, its base64 text is 4 characters for each 3 bytes
+#define BATCH_DATA_SIZE 48
+
+struct SampleBatch {
+  uint8_t data[BATCH_DATA_SIZE];  // samples packed in little endian
+  uint8_t width;                  // bytes of a sample, 2 or 3
+  uint8_t capacity;               // samples of a full batch
+  uint8_t count;                  // samples in data
+};
+
+void initBatch(SampleBatch *batch, uint8_t width, uint8_t capacity);
+bool addSample(SampleBatch *batch, long sample);
+uint16_t encodeBase64(const uint8_t *data, uint16_t length, char *text);
+
+#endif
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 22, 2022
+# Last Modified: March 24, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Play full game sessions on the simulated hardware (simulator package) and report
+# the latency of each step, the CPU time used and the bytes exchanged with the arduino.
+# Tk needs a display, on a machine without screen use a virtual one:
+#     xvfb-run python3 benchmark.py --sessions 20
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import types
+from simulator import Simulator
+from telemetry import percentile, recorder
+
+# Longest time a step can take before the session is considered stuck (seconds)
+STEP_TIMEOUT = 10
+
+
+def wait_until(window, condition, timeout: float = STEP_TIMEOUT) -> float:
+    """
+    Run the Tk loop of the window until the condition is true.
+    Return the time it took in seconds.
+    :param window: MainWindow
+    :param condition: function returning a bool
+    :param timeout: float, seconds
+    :return: float
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    start = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError("Step not completed after %s seconds" % timeout)
+        window.update()
+        time.sleep(0.001)
+    return time.perf_counter() - start
+
+
+def click(window, x: int, y: int):
+    """
+    Left click on the window at the given coordinates.
+    :param window: MainWindow
+    :param x: int
+    :param y: int
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    window.mouse_left_click(types.SimpleNamespace(x=x, y=y))
+    window.update()
+
+
+def run_session(game, sim: Simulator) -> dict:
+    """
+    Play one game: FSR, load cell, floppy disk, the five RFID tasks and the end screen.
+    Return the latency of each step in seconds, and the longest update of the game clock.
+    :param game: main module
+    :param sim: Simulator
+    :return: dict
+    :author: AUGUSTIN NOGUE
+    :version: 1.1
+    """
+    latencies = {}
+    recorder.records.clear()
+    game.setup_arduino()
+    # Wait for the arduino to reset the sensors
+    start = time.perf_counter()
+    while game.get_arduino_sensor_status("fsr") or game.get_arduino_sensor_status("load cell"):
+        if time.perf_counter() - start > STEP_TIMEOUT:
+            raise TimeoutError("Arduino not reset")
+        time.sleep(0.001)
+
+    start = time.perf_counter()
+    window = game.MainWindow()
+    window.update()
+    latencies["window"] = time.perf_counter() - start
+    try:
+        # The window sets the arduino up from the sensor watcher thread
+        latencies["arduino"] = wait_until(window, window.arduino_ready.is_set)
+        sim.arduino.press_fsr()
+        latencies["fsr"] = wait_until(window, lambda: window.puzzle.state == "desk error")
+        sim.arduino.put_weight()
+        latencies["load cell"] = wait_until(window, lambda: window.puzzle.state == "selection")
+
+        # Floppy disk
+        click(window, 400, 500)
+        sim.floppy.insert("Session clue")
+        latencies["floppy"] = wait_until(window, lambda: window.floppy_text == "Session clue")
+        click(window, 50, 50)
+        sim.floppy.eject()
+
+        # RFID tasks in order
+        tasks = window.puzzle.tasks
+        for i, task in enumerate(tasks):
+            click(window, 1400, 500)
+            sim.present_card(list(task.uid))
+            latencies["rfid task %s" % task.name] = wait_until(window, lambda: window.puzzle.completed[i])
+            sim.remove_card()
+            if i < len(tasks) - 1:
+                click(window, 50, 50)
+
+        # End screen, until the arduino opened the desk
+        click(window, 960, 1000)
+        latencies["end screen"] = wait_until(window, lambda: not sim.arduino.solenoid_on)
+    finally:
+        window.stop_services()
+        window.journal.close()
+        window.destroy()
+    # Cost of one tick of the countdown, measured by the telemetry
+    ticks = [record[3] for record in list(recorder.records) if record[1:3] == ("span", "update_clock")]
+    if ticks:
+        latencies["clock tick"] = max(ticks)
+    return latencies
+
+
+def run_benchmark(sessions: int) -> dict:
+    """
+    Play the sessions and gather the results.
+    :param sessions: int
+    :return: dict
+    :author: AUGUSTIN NOGUE
+    :version: 1.2
+    """
+    sim = Simulator()
+    sim.install()
+    # Imported once the hardware is simulated
+    import main as game
+    sim.configure(game)
+    # The games of the benchmark have their own journal
+    journal_folder = tempfile.mkdtemp()
+    game.journal_file = os.path.join(journal_folder, "journal.jsonl")
+    # No game master watches the games of the benchmark
+    game.mirror_socket = None
+
+    steps = {}
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        for _ in range(sessions):
+            for step, latency in run_session(game, sim).items():
+                steps.setdefault(step, []).append(latency)
+    finally:
+        # The serial link is closed before the emulated arduino goes away
+        game.cleanup_arduino()
+        sim.stop()
+        shutil.rmtree(journal_folder)
+
+    return {
+        "sessions": sessions,
+        "wall time": time.perf_counter() - wall_start,
+        # CPU time of the whole process, the simulated hardware included
+        "cpu time": time.process_time() - cpu_start,
+        "serial bytes sent": sim.arduino.bytes_received,
+        "serial bytes received": sim.arduino.bytes_sent,
+        "steps": {step: {"p50": percentile(values, 50), "p90": percentile(values, 90),
+                         "p99": percentile(values, 99), "max": max(values)}
+                  for step, values in steps.items()},
+    }
+
+
+def print_report(results: dict):
+    """
+    Print the results of the benchmark as a table, latencies in milliseconds.
+    :param results: dict
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    print("%d sessions in %.1f s, CPU time %.2f s" % (results["sessions"], results["wall time"],
+                                                       results["cpu time"]))
+    print("Serial bytes: %d sent, %d received" % (results["serial bytes sent"], results["serial bytes received"]))
+    print("%-14s %9s %9s %9s %9s" % ("step", "p50 ms", "p90 ms", "p99 ms", "max ms"))
+    for step, values in results["steps"].items():
+        print("%-14s %9.1f %9.1f %9.1f %9.1f" % (step, values["p50"] * 1000, values["p90"] * 1000,
+                                                values["p99"] * 1000, values["max"] * 1000))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of game sessions on simulated hardware")
+    parser.add_argument("--sessions", type=int, default=10, help="number of sessions to play")
+    parser.add_argument("--json", help="also write the results in this file")
+    arguments = parser.parse_args()
+
+    benchmark_results = run_benchmark(arguments.sessions)
+    print_report(benchmark_results)
+    if arguments.json:
+        with open(arguments.json, "w") as results_file:
+            json.dump(benchmark_results, results_file, indent=2)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: April 2, 2022
+# Last Modified: April 2, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Bundle of the assets: the images and texts of Assets/ and PictureFrame/ packed in a single file,
+# read at runtime through a memory mapping instead of one file opened per asset.
+#   magic "ENIGMESC" | format version (4 bytes) | length of the index (4 bytes) | index (JSON) | data
+# The index gives for each asset, by its path relative to the folder of the bundle:
+#   {"offset": offset from the start of the data, "size": bytes, "sha256": hash of the data,
+#    "mtime": modification time of the asset in nanoseconds}
+# The images are packed as Tk decodes them, their pre-scaled version when it is up to date.
+# Build it once the images are pre-scaled:
+#     python3 images.py
+#     python3 bundle.py
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+
+# Start of every bundle and version of its format
+BUNDLE_MAGIC = b"ENIGMESC"
+BUNDLE_VERSION = 1
+# Header: magic, format version and length of the index
+HEADER = struct.Struct(">8sII")
+
+
+def build_bundle(path: str, sources: list) -> int:
+    """
+    Offline step: pack the assets in a bundle. Each asset is given with the file its data comes from,
+    the pre-scaled version of an image for instance. The bundle is written aside and then renamed,
+    a running program keeps reading the previous one. Return the number of assets packed.
+    :param path: string
+    :param sources: list of (asset path, source path)
+    :return: int
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    assert type(path) == str, "Path should be a string"
+
+    root = os.path.dirname(os.path.abspath(path))
+    index = {}
+    blobs = []
+    offset = 0
+    for asset_path, source_path in sources:
+        with open(source_path, "rb") as file:
+            data = file.read()
+        index[bundle_name(root, asset_path)] = {"offset": offset, "size": len(data),
+                                                "sha256": hashlib.sha256(data).hexdigest(),
+                                                "mtime": os.stat(asset_path).st_mtime_ns}
+        blobs.append(data)
+        offset += len(data)
+    index_data = json.dumps(index, sort_keys=True).encode("utf-8")
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(index_data)))
+        file.write(index_data)
+        for data in blobs:
+            file.write(data)
+    os.replace(temporary_path, path)
+    return len(index)
+
+
+def bundle_name(root: str, asset_path: str) -> str:
+    """
+    Return the name of an asset in the bundle: its path relative to the folder of the bundle.
+    :param root: string
+    :param asset_path: string
+    :return: string
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    return os.path.relpath(os.path.abspath(asset_path), root).replace(os.sep, "/")
+
+
+class AssetBundle:
+    def __init__(self, path: str, verify: bool = False):
+        """
+        Bundle of assets mapped in memory, see build_bundle. The data of an asset is read from the mapping,
+        the pages are only read from the disk when they are used. With verify, the hash of an asset is
+        checked the first time it is asked for if verify() did not check it already.
+        Raise ValueError if the file is not a bundle.
+        :param path: string
+        :param verify: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        assert type(path) == str, "Path should be a string"
+        assert type(verify) == bool, "Verify should be a boolean"
+
+        self.path = os.path.abspath(path)
+        self.root = os.path.dirname(self.path)
+        with open(self.path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError("%s is not an asset bundle" % path)
+            # The mapping keeps its own reference to the file
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_size = HEADER.unpack_from(self._map)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION or HEADER.size + index_size > size:
+            self._map.close()
+            raise ValueError("%s is not an asset bundle of version %d" % (path, BUNDLE_VERSION))
+        self.entries = json.loads(self._map[HEADER.size:HEADER.size + index_size].decode("utf-8"))
+        self.data_start = HEADER.size + index_size
+        self.verify_hashes = verify
+        # Names of the assets whose hash was checked, and of the damaged ones among them
+        self.checked = set()
+        self.damaged = set()
+        # The images are also read ahead by the prefetch thread of the picture frame
+        self._check_lock = threading.Lock()
+
+    def contains(self, asset_path: str) -> bool:
+        """
+        Return True if the asset is in the bundle and not damaged, its hash is checked on the first call
+        when the bundle verifies the assets. The loose file of a damaged asset is used instead.
+        :param asset_path: string
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        name = bundle_name(self.root, asset_path)
+        if name not in self.entries:
+            return False
+        if self.verify_hashes and name not in self.checked:
+            self._check(name)
+        return name not in self.damaged
+
+    def view(self, asset_path: str) -> memoryview:
+        """
+        Return the data of an asset as a view of the mapping, nothing is copied.
+        :param asset_path: string
+        :return: memoryview
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        start, end = self._span(asset_path)
+        return memoryview(self._map)[start:end]
+
+    def data(self, asset_path: str) -> bytes:
+        """
+        Return the data of an asset, as given to Tk which only accepts bytes.
+        :param asset_path: string
+        :return: bytes
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        start, end = self._span(asset_path)
+        return self._map[start:end]
+
+    def text(self, asset_path: str) -> str:
+        """
+        Return the content of a text asset.
+        :param asset_path: string
+        :return: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self.data(asset_path).decode("utf-8")
+
+    def version(self, asset_path: str) -> str:
+        """
+        Return the hash of an asset, it changes with its content.
+        :param asset_path: string
+        :return: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self.entries[bundle_name(self.root, asset_path)]["sha256"]
+
+    def files(self, folder: str, file_type: str) -> list:
+        """
+        Return the paths of the assets of the type given in the folder, as get_files_in_directory does.
+        :param folder: string
+        :param file_type: string
+        :return: list of strings
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        prefix = bundle_name(self.root, folder) + "/"
+        return [os.path.join(self.root, *name.split("/")) for name in sorted(self.entries)
+                if name.startswith(prefix) and "/" not in name[len(prefix):] and name.endswith(file_type)]
+
+    def verify(self) -> list:
+        """
+        Check now the hash of every asset not checked yet, the damaged ones are left to their loose files.
+        Return the names of the damaged assets.
+        :return: list of strings
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        for name in sorted(self.entries):
+            if name not in self.checked:
+                self._check(name)
+        return sorted(self.damaged)
+
+    def _check(self, name: str):
+        """
+        Check the hash of an asset once, a damaged asset is reported and left to its loose file.
+        :param name: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with self._check_lock:
+            if name in self.checked:
+                return
+            entry = self.entries[name]
+            start = self.data_start + entry["offset"]
+            end = start + entry["size"]
+            if end > len(self._map) or \
+                    hashlib.sha256(memoryview(self._map)[start:end]).hexdigest() != entry["sha256"]:
+                print("Asset %s damaged in the bundle, the loose file is used" % name)
+                self.damaged.add(name)
+            self.checked.add(name)
+
+    def remove_outdated(self) -> list:
+        """
+        Remove from the bundle the assets whose loose file changed since the bundle was built,
+        the loose files are used instead. Return their names.
+        :return: list of strings
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        outdated = []
+        for name, entry in sorted(self.entries.items()):
+            try:
+                if os.stat(os.path.join(self.root, *name.split("/"))).st_mtime_ns != entry["mtime"]:
+                    outdated.append(name)
+            except FileNotFoundError:
+                # Only the bundle was copied to the desk
+                continue
+        for name in outdated:
+            del self.entries[name]
+        return outdated
+
+    def read_ahead(self, asset_path: str) -> int:
+        """
+        Read the pages of an asset from the disk, so the decoding does not wait for the SD card.
+        Return the number of bytes of the asset.
+        :param asset_path: string
+        :return: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        view = self.view(asset_path)
+        # One byte of each page is enough to have the page read
+        for i in range(0, len(view), mmap.PAGESIZE):
+            view[i]
+        return len(view)
+
+    def _span(self, asset_path: str) -> tuple:
+        """
+        Return the start and the end of the data of an asset in the mapping.
+        :param asset_path: string
+        :return: tuple
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        entry = self.entries[bundle_name(self.root, asset_path)]
+        start = self.data_start + entry["offset"]
+        return start, start + entry["size"]
+
+    def close(self):
+        """
+        Unmap the bundle.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._map.close()
+
+
+if __name__ == "__main__":
+    from configuration import asset_bundle_file, assets_folder, picture_frame_folder
+    from images import image_source
+
+    asset_sources = []
+    for asset_folder in (assets_folder, picture_frame_folder):
+        for file_name in sorted(os.listdir(asset_folder)):
+            asset = os.path.join(asset_folder, file_name)
+            if file_name.endswith(".png"):
+                asset_sources.append((asset, image_source(asset)))
+            elif file_name.endswith(".txt"):
+                asset_sources.append((asset, asset))
+    print("%d assets packed in %s" % (build_bundle(asset_bundle_file, asset_sources), asset_bundle_file))
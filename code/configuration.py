@@ -11,26 +11,175 @@
 import os
 from raspberry import *
 
-# UIDS of the RFID cards composing the solution of the escape game
-rfid_uids = [[25, 201, 83, 179, 48], [105, 26, 84, 179, 148], [249, 138, 83, 179, 147], [137, 225, 73, 178, 147],
-             [217, 194, 99, 178, 202]]
+# States, tasks and UIDs of the RFID cards composing the solution of the escape game (see puzzle.py)
+puzzle_file = os.path.abspath(os.path.join(os.path.dirname(__file__), 'puzzle.json'))
 # Folder locations of assets necessary to run the program
 assets_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Assets/'))
 # Folder with picture to display in the picture frame
 picture_frame_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), 'PictureFrame/'))
+# Folder with the pre-scaled images (python3 images.py)
+prescaled_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Prescaled/'))
+# Images and folders of images without transparency, they are pre-scaled without alpha channel
+opaque_images = [picture_frame_folder, os.path.join(assets_folder, 'clean_desk_clue.png')]
+# Size of the screen, the pre-scaled images fit in it
+screen_size = (1920, 1080)
+# Maximum memory used by the decoded images (bytes)
+image_cache_max_bytes = 64 * 1024 * 1024
+# Bundle of the images and texts of the assets (python3 bundle.py), the loose files are used without it
+asset_bundle_file = os.path.abspath(os.path.join(os.path.dirname(__file__), 'assets.bundle'))
+# Check the hash of every asset of the bundle at startup
+asset_bundle_verify = True
 
 # Path of the floppy mount
 floppy_path = os.path.abspath("/media/pi")
 # Time between pictures in picture frame
 time_between_images = 20
-# Time before clue leading to load cell
-time_before_lc_clue = 30
+# Time in seconds of the fade between two pictures in picture frame, 0 for none
+picture_fade_time = 0.8
+# Time in seconds between two sensor status requests made in the background
+sensor_poll_interval = 0.05
+# Time in milliseconds between two checks of the sensor events by the window
+sensor_event_check_interval = 20
+# Time in seconds a status of every sensor is reused before it is asked again to the arduino
+sensor_snapshot_ttl = 0.02
+# Time in seconds during which a card read again is ignored
+rfid_debounce_time = 2
+# Time in milliseconds between two checks of the RFID scan result by the window
+rfid_check_interval = 20
 # Mount command
 mount_command = "sudo mount -t msdos /dev/sda /media/pi"
 # Unmount command
 unmount_command = "sudo umount -t msdos /dev/sda"
+# Block device of the floppy drive
+floppy_device = "/dev/sda"
+# Command writing the first sectors of the floppy disk, to identify it. The device is only readable by root
+# and the disk group, like the mount it goes through sudo. None to read floppy_device directly.
+identity_command = "sudo dd if=/dev/sda bs=512 count=33 status=none"
+# Name of the file holding the clue on the floppy disk
+floppy_file_name = "clue.txt"
+# Time in seconds between two checks of the floppy drive for a new disk
+floppy_poll_interval = 1
+# Time in seconds before the mount and unmount commands are given up
+floppy_command_timeout = 10
+# Time in milliseconds between two checks of the floppy text by the window
+floppy_check_interval = 100
 
 # Arduino
-# Characteristic of the serial communication
-# First the port then the data rate and then the timout option
-ser = serial.Serial("/dev/ttyUSB0", 9600, timeout=10)
+# Ask the arduino to push the sensor changes instead of requesting their status
+push_mode = True
+# Time in seconds without any frame from the arduino before the push link is considered down
+push_heartbeat_timeout = 3
+# Serial port of the arduino, the simulator (simulator package) replaces it through the environment
+serial_port = os.environ.get("ENIGM_ESC_SERIAL_PORT", "/dev/ttyUSB0")
+# Characteristic of the serial communication, the port is only opened on first use (see get_serial_link)
+# Data rate, the batches of the stream mode take about half of it
+serial_baudrate = 115200
+# Time in seconds for a command to be sent to the arduino and answered, else it fails
+serial_command_timeout = 2
+# Commands waiting to be sent to the arduino, the next ones fail at once
+serial_queue_size = 32
+# Time in seconds before opening the port again once the link is lost, doubled after each failure
+serial_reconnect_min = 0.5
+# Longest time in seconds between two tries to open the port
+serial_reconnect_max = 30
+# Time in seconds to wait for the "ready" banner of the arduino once the port is opened
+arduino_ready_timeout = 5
+# Time in seconds between two pings while the arduino does not answer
+arduino_ping_interval = 0.5
+
+# Control server (server.py)
+# Address and port of the HTTP/WebSocket API, only reachable from the host itself by default
+server_host = "127.0.0.1"
+server_port = 8318
+# File listing the desks run by the control server
+rooms_file = os.path.abspath(os.path.join(os.path.dirname(__file__), 'rooms.json'))
+# Time in seconds between two reads of the RFID reader of a desk
+server_rfid_poll_interval = 0.2
+# Time in seconds before trying again to connect the arduino of a desk
+server_reconnect_interval = 5
+# Bytes waiting to be sent to a WebSocket client before it is disconnected for being too slow
+server_client_buffer = 256 * 1024
+
+# Startup
+# File in which the duration of the startup phases is appended, one JSON line per start
+startup_log_file = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Logs/startup.jsonl'))
+
+# Telemetry (telemetry.py)
+# Folder of the session logs, one file per start of the program (python3 telemetry_report.py to read them)
+telemetry_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Logs/telemetry/'))
+# Time in seconds between two writes of the records to the session log
+telemetry_flush_interval = 2
+
+# Game clock (game_clock.py)
+# Time in seconds given to the players, counted from the activation of the fsr
+game_duration = 30 * 60
+# Time in seconds removed for each wrong card or card in the wrong order
+wrong_card_penalty = 60
+# Wrong cards allowed before the game is lost, 0 for no limit
+game_chances = 3
+
+# Journal of the game (journal.py), replayed at startup to resume a game interrupted by a crash
+journal_file = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Logs/journal.jsonl'))
+# Time in seconds between two writes of the journal to the disk, the changes of the game lost in a crash at most
+journal_sync_interval = 0.2
+# Records in the journal before it is compacted to the progress of the game
+journal_compact_records = 200
+
+# Hints (hints.py), the hints of each state and their delays are given in puzzle.json
+# Named pipe in which the operator writes the hints to give at once, one line each
+hint_pipe_file = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Logs/hints.fifo'))
+
+# Hardware daemon (hardware_daemon.py), owning the hardware in its own process
+# Use the hardware through the daemon, started before the window, instead of from the window
+use_hardware_daemon = False
+# File of shared memory in which the daemon publishes the state of the hardware
+hardware_state_file = "/dev/shm/enigm-esc-hardware"
+# Socket on which the daemon takes the commands of the window
+hardware_command_socket = "/tmp/enigm-esc-hardware.sock"
+# Bytes kept in the shared memory for the text of the floppy disk
+hardware_text_size = 64 * 1024
+# Time in seconds before a command not answered by the daemon fails
+hardware_command_timeout = 5
+# Time in seconds between two heartbeats of the daemon, and without heartbeat before it is considered gone
+hardware_heartbeat_interval = 0.1
+hardware_heartbeat_timeout = 2
+
+# Stream mode (signal_processing.py), the arduino sends the raw samples and the Raspberry Pi decides
+# when a sensor is activated. NumPy is needed.
+sensor_stream = False
+# File in which the batch frames received are appended, for the benchmark of signal_processing.py, None for none
+sensor_stream_record_file = None
+# Samples of the moving median removing the outliers, odd
+fsr_median_window = 5
+load_cell_median_window = 5
+# Weight of a new sample in the exponential moving average, 1 for no average
+fsr_ema_alpha = 0.5
+load_cell_ema_alpha = 0.3
+# The FSR is pressed above the on threshold and released below the off threshold (analog reading)
+fsr_on_threshold = 800
+fsr_off_threshold = 700
+# HX711 counts per kilogram (calibration_factor of arduino.ino)
+load_cell_scale = -7050.0
+# The load cell has enough weight above the on threshold and not anymore below the off threshold (kilograms)
+load_cell_on_threshold = 3.0
+load_cell_off_threshold = 2.0
+# The tare follows the drift of the empty load cell: share of the gap caught up at each sample,
+# for the samples within the band (kilograms) of the tare
+load_cell_tare_rate = 0.01
+load_cell_tare_band = 0.5
+
+# Recording of the hardware sessions (session_record.py), replayed by session_replay.py
+# Folder of the recordings, one file per start of the program, None to record nothing
+session_record_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Logs/sessions/'))
+
+# Badge stations (rfid_readers.py), one RC522 reader each on the SPI bus of the Raspberry Pi
+# Options of pirc522.RFID of each reader by name: chip select (device), or a GPIO as chip select (pin_ce).
+# The readers are polled, no IRQ pin is set up unless pin_irq is given, a distinct GPIO for each reader.
+# The game itself still uses the reader of rfid_service.py, the stations are not part of the puzzle yet.
+rfid_readers = {"desk": {"device": 0}}
+# Time in seconds of one round of polls of every reader, a card is seen within about two rounds
+rfid_round_time = 0.05
+
+# Mirror of the window for the game master (mirror.py, python3 mirror.py to watch it)
+# Socket of the mirror, None for no mirror
+mirror_socket = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Logs/mirror.sock'))
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 16, 2022
+# Last Modified: March 16, 2022
+#
+# Developed and tested using Python 3.7.3
+
+import collections
+import hashlib
+import os
+import shlex
+import stat
+import subprocess
+import threading
+from raspberry import *
+from configuration import *
+from telemetry import timed
+
+# Bytes read to identify a floppy disk: boot sector, both FATs and root directory of a 1.44 MB FAT12 disk.
+# They change when the disk is formatted or when a file of the disk is modified.
+IDENTITY_SIZE = 33 * 512
+# Number of floppy disks whose text is kept
+CACHE_SIZE = 16
+
+
+def medium_signature(device: str):
+    """
+    Cheap check of the medium in the drive, done without reading the disk.
+    For a block device the size given by the kernel is used (0 without disk),
+    for a disk image file its size and modification time.
+    Return None if there is no medium.
+    :param device: string
+    :return: tuple or None
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    assert type(device) == str, "Device should be a string"
+
+    try:
+        device_stat = os.stat(device)
+    except OSError:
+        return None
+    if stat.S_ISBLK(device_stat.st_mode):
+        try:
+            with open("/sys/class/block/%s/size" % os.path.basename(os.path.realpath(device))) as file:
+                size = int(file.read())
+        except (OSError, ValueError):
+            return None
+        return (size,) if size > 0 else None
+    if device_stat.st_size == 0:
+        return None
+    return device_stat.st_size, device_stat.st_mtime_ns
+
+
+def medium_identity(device: str, command: str = None, timeout: float = None):
+    """
+    Identify the floppy disk in the drive with a hash of its first sectors.
+    The block device can only be read by root and the disk group, so the sectors are read by the command
+    given (through sudo, like the mount), writing them on its standard output. Without command the device
+    is read directly, a disk image file for instance.
+    Return None if the disk cannot be read.
+    :param device: string
+    :param command: string or None
+    :param timeout: float or None, seconds before the command is given up
+    :return: string or None
+    :author: AUGUSTIN NOGUE
+    :version: 1.1
+    """
+    if command is not None:
+        try:
+            result = subprocess.run(shlex.split(command), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                    timeout=timeout)
+        except (subprocess.TimeoutExpired, OSError):
+            return None
+        if result.returncode != 0 or not result.stdout:
+            return None
+        return hashlib.sha1(result.stdout[:IDENTITY_SIZE]).hexdigest()
+    try:
+        with open(device, "rb") as file:
+            return hashlib.sha1(file.read(IDENTITY_SIZE)).hexdigest()
+    except OSError:
+        return None
+
+
+class FloppyReader:
+    def __init__(self, device: str, mount_cmd: str, unmount_cmd: str, text_path: str, poll_interval: float,
+                 command_timeout: float, identity_cmd: str = None):
+        """
+        Watch the floppy drive from a background thread.
+        When a disk is inserted its text file is read once (mount, read, unmount)
+        and kept with the identity of the disk, so the same disk is never read twice.
+        :param device: string, block device of the drive or disk image file
+        :param mount_cmd: string
+        :param unmount_cmd: string
+        :param text_path: string, path of the text file once the disk is mounted
+        :param poll_interval: float, seconds between two checks of the drive
+        :param command_timeout: float, seconds before the mount and unmount commands are given up
+        :param identity_cmd: string or None, command writing the first sectors of the disk, see medium_identity
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        self.device = device
+        self.mount_command = mount_cmd
+        self.unmount_command = unmount_cmd
+        self.identity_command = identity_cmd
+        self.text_path = text_path
+        self.poll_interval = poll_interval
+        self.command_timeout = command_timeout
+        # Text of the disks already read, by identity
+        self.texts = collections.OrderedDict()
+        # Status of the drive: "no disk", "reading", "ready" or "error"
+        self.status = "no disk"
+        # Identity of the disk in the drive
+        self.identity = None
+        # Number of times the text file was read
+        self.reads = 0
+        self._signature = None
+        self._refresh_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="FloppyReader", daemon=True)
+
+    def start(self):
+        """
+        Start the background thread.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._stop_event.set()
+        self._refresh_event.set()
+        if self._thread.is_alive():
+            self._thread.join(self.poll_interval + 1)
+
+    def get_text(self):
+        """
+        Return the text of the disk in the drive or None if there is no disk or it is being read.
+        :return: string or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self.status != "ready":
+            return None
+        return self.texts.get(self.identity)
+
+    def refresh(self):
+        """
+        Ask the background thread to identify the disk at once, even if the drive seems unchanged.
+        Some drives do not report a disk swapped for another one of the same size.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._refresh_event.set()
+
+    def check_drive(self, force: bool = False):
+        """
+        Check the drive once and read the disk if a new one was inserted.
+        Called by the background thread.
+        :param force: bool, identify the disk even if the drive seems unchanged
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        signature = medium_signature(self.device)
+        if signature == self._signature and not (force and signature is not None):
+            return
+        self._signature = signature
+        if signature is None:
+            self.status = "no disk"
+            self.identity = None
+            return
+
+        identity = medium_identity(self.device, self.identity_command, self.command_timeout)
+        if identity is None:
+            # Not readable yet or not allowed, try again at the next check
+            self.status = "error"
+            self._signature = None
+            return
+        if identity not in self.texts:
+            self.status = "reading"
+            text = self.read_text()
+            if text is None:
+                # Read again at the next check, the disk may not be fully inserted
+                self.status = "error"
+                self._signature = None
+                return
+            self.texts[identity] = text
+            # Forget the oldest disks
+            while len(self.texts) > CACHE_SIZE:
+                self.texts.popitem(last=False)
+        self.identity = identity
+        self.status = "ready"
+
+    @timed
+    def read_text(self) -> str:
+        """
+        Mount the disk, read the text file and unmount the disk.
+        Return None if the disk cannot be mounted or the file cannot be read. A file left in the mount point
+        is not the one of the disk, it is not read without the mount.
+        :return: string or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.2
+        """
+        self.reads += 1
+        if not run_command(self.mount_command, self.command_timeout):
+            return None
+        try:
+            text = read_txt(self.text_path)
+        except OSError:
+            text = None
+        run_command(self.unmount_command, self.command_timeout)
+        return text
+
+    def _run(self):
+        """
+        Background loop checking the drive every poll_interval seconds or when a refresh is asked.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        force = False
+        while not self._stop_event.is_set():
+            self.check_drive(force)
+            force = self._refresh_event.wait(self.poll_interval)
+            self._refresh_event.clear()
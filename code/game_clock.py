@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: April 1, 2022
+# Last Modified: April 1, 2022
+#
+# Developed and tested using Python 3.7.3
+
+import math
+import time
+
+
+class GameClock:
+    def __init__(self, duration: float, penalty_time: float, chances: int):
+        """
+        Countdown of the game on the monotonic clock. Each wrong card (or card in the wrong order)
+        costs a chance and penalty_time seconds, the game is lost once the time or the chances run out.
+        :param duration: float, seconds given to the players
+        :param penalty_time: float, seconds removed for each wrong card
+        :param chances: int, wrong cards allowed before the game is lost, 0 for no limit
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(chances) == int and chances >= 0, "Chances should be a positive integer"
+
+        self.duration = duration
+        self.penalty_time = penalty_time
+        self.chances = chances
+        self.penalties = 0
+        # Monotonic time of the start, None before the start
+        self.started = None
+        # Remaining time once the clock is stopped
+        self.stopped_remaining = None
+
+    def start(self, elapsed: float = 0):
+        """
+        Start the countdown, elapsed seconds ago for a resumed game.
+        :param elapsed: float
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.started = time.monotonic() - elapsed
+        self.stopped_remaining = None
+
+    def stop(self, remaining: float = None):
+        """
+        Stop the countdown, the remaining time does not change anymore.
+        :param remaining: float or None, seconds left when the clock of a resumed game was stopped
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        self.stopped_remaining = self.remaining() if remaining is None else remaining
+
+    def is_running(self) -> bool:
+        """
+        Return True once started and until stopped.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self.started is not None and self.stopped_remaining is None
+
+    def penalize(self):
+        """
+        Take a chance and the penalty time away.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.penalties += 1
+
+    def chances_left(self):
+        """
+        Return the number of wrong cards still allowed, None if there is no limit.
+        :return: int or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if not self.chances:
+            return None
+        return max(0, self.chances - self.penalties)
+
+    def remaining(self) -> float:
+        """
+        Return the time left in seconds, penalties included.
+        :return: float
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self.stopped_remaining is not None:
+            return self.stopped_remaining
+        elapsed = time.monotonic() - self.started if self.started is not None else 0
+        return max(0.0, self.duration - self.penalties * self.penalty_time - elapsed)
+
+    def is_lost(self) -> bool:
+        """
+        Return True once the time or the chances run out.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self.started is None:
+            return False
+        return self.remaining() <= 0 or self.chances_left() == 0
+
+    def text(self) -> str:
+        """
+        Return the remaining time as minutes:seconds, the seconds rounded up
+        so 00:00 is only displayed once the time is up.
+        :return: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return "%02d:%02d" % divmod(math.ceil(self.remaining()), 60)
+
+    def next_change(self) -> int:
+        """
+        Return the time in milliseconds until the displayed text changes.
+        :return: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        fraction = self.remaining() % 1
+        return int(fraction * 1000) + 1 if fraction else 1000
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: April 5, 2022
+# Last Modified: April 5, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Window side of the hardware daemon (hardware_daemon.py). The client has the functions of raspberry.py
+# used by the window, and the sensor watcher, RFID service and floppy reader below have the methods of
+# the ones of the window, so the window uses the daemon or its own hardware the same way.
+# The state is read from the shared memory without system call, the commands are datagrams.
+
+import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from raspberry import report_command_failure
+from session_record import recorded
+from shared_state import SENSOR_FIELDS, SharedState
+
+# Exceptions raised by the futures of the commands, by name of the exception raised in the daemon
+COMMAND_ERRORS = {"TimeoutError": TimeoutError, "ValueError": ValueError}
+
+
+class HardwareClient:
+    def __init__(self, state_path: str, socket_path: str, text_size: int, command_timeout: float,
+                 heartbeat_timeout: float):
+        """
+        Connection of the window to the hardware daemon.
+        :param state_path: string, file of the shared state
+        :param socket_path: string, socket of the commands of the daemon
+        :param text_size: int, bytes kept for the text of the floppy disk
+        :param command_timeout: float, seconds before a command not answered fails with TimeoutError
+        :param heartbeat_timeout: float, seconds without heartbeat before the daemon is considered gone
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.state = SharedState(state_path, text_size)
+        self.socket_path = socket_path
+        self.command_timeout = command_timeout
+        self.heartbeat_timeout = heartbeat_timeout
+        # Commands waiting for their answer: number -> (Future, deadline)
+        self._futures = {}
+        self._numbers = itertools.count(1)
+        self._lock = threading.Lock()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        # Abstract address, nothing is left in the file system by a crashed window
+        self._socket.bind("\0enigm-esc-window-%d" % os.getpid())
+        self._closed = False
+        self._thread = threading.Thread(target=self._receive, name="HardwareClient", daemon=True)
+        self._thread.start()
+
+    def read_state(self):
+        """
+        Return the state of the hardware, see shared_state.py.
+        :return: HardwareState
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self.state.read()
+
+    def is_alive(self) -> bool:
+        """
+        Return True while the daemon publishes its heartbeat.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return time.monotonic() - self.state.read().heartbeat < self.heartbeat_timeout
+
+    def send(self, command: str) -> concurrent.futures.Future:
+        """
+        Send a command to the daemon. The future fails with ConnectionError if the daemon is not running,
+        with TimeoutError if it does not answer in time.
+        :param command: string
+        :return: Future
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(command) == str, "Command should be a string"
+
+        future = concurrent.futures.Future()
+        number = next(self._numbers)
+        with self._lock:
+            self._futures[number] = (future, time.monotonic() + self.command_timeout)
+        try:
+            self._socket.sendto(json.dumps({"id": number, "command": command}).encode("utf-8"), self.socket_path)
+        except OSError as error:
+            with self._lock:
+                self._futures.pop(number, None)
+            future.set_exception(ConnectionError("Hardware daemon not running: %s" % error))
+        return future
+
+    def wait_arduino_connected(self, timeout: float) -> bool:
+        """
+        Wait until the daemon is connected to the arduino. Return False after timeout seconds.
+        :param timeout: float
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        deadline = time.monotonic() + timeout
+        while not (self.is_alive() and self.read_state().connected):
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    @recorded
+    def setup_arduino(self) -> concurrent.futures.Future:
+        """
+        Ask the daemon to set the arduino up, see raspberry.setup_arduino.
+        :return: Future
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self.send("setup")
+
+    def enable_push_mode(self, callback=None):
+        """
+        The daemon starts the push mode itself (push_mode of configuration.py), nothing is sent.
+        :param callback: ignored
+        :return: None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return None
+
+    def enable_sensor_stream(self):
+        """
+        The daemon starts the stream mode itself (sensor_stream of configuration.py), nothing is sent.
+        :return: None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return None
+
+    @recorded
+    def activate_solenoide(self) -> concurrent.futures.Future:
+        """
+        Ask the daemon to lock the desk.
+        :return: Future
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self.send("activate solenoide")
+
+    @recorded
+    def deactivate_solenoide(self) -> concurrent.futures.Future:
+        """
+        Ask the daemon to unlock the desk.
+        :return: Future
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self.send("deactivate solenoide")
+
+    @recorded
+    def cleanup_arduino(self):
+        """
+        Ask the daemon to release the hardware and stop, then close the client.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        try:
+            self.send("cleanup").result()
+        except (TimeoutError, ConnectionError) as error:
+            print("Hardware daemon not cleaned up: %s" % error)
+        self.close()
+
+    def close(self):
+        """
+        Close the socket, the commands waiting fail with ConnectionError.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._closed = True
+        # An empty datagram wakes the background thread up
+        try:
+            self._socket.sendto(b"", self._socket.getsockname())
+        except OSError:
+            pass
+        self._thread.join(1)
+        self._socket.close()
+        self.state.close()
+
+    def _receive(self):
+        """
+        Background loop completing the futures with the answers of the daemon,
+        the commands not answered in time fail with TimeoutError.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        while not self._closed:
+            with self._lock:
+                deadlines = [deadline for _, deadline in self._futures.values()]
+            # A command sent while waiting expires at most one command timeout late
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else self.command_timeout
+            try:
+                self._socket.settimeout(timeout)
+                reply = json.loads(self._socket.recv(4096).decode("utf-8"))
+            except socket.timeout:
+                reply = None
+            except ValueError:
+                continue
+            except OSError:
+                # Closed
+                break
+            now = time.monotonic()
+            with self._lock:
+                done = []
+                if reply is not None and reply.get("id") in self._futures:
+                    future, _ = self._futures.pop(reply["id"])
+                    done.append((future, reply))
+                for number, (future, deadline) in list(self._futures.items()):
+                    if deadline <= now:
+                        del self._futures[number]
+                        done.append((future, None))
+            for future, reply in done:
+                if reply is None:
+                    future.set_exception(TimeoutError("No answer from the hardware daemon"))
+                elif reply["error"] is not None:
+                    future.set_exception(COMMAND_ERRORS.get(reply.get("type"), ConnectionError)(reply["error"]))
+                else:
+                    future.set_result(None)
+        with self._lock:
+            futures, self._futures = self._futures, {}
+        for future, _ in futures.values():
+            future.set_exception(ConnectionError("Hardware client closed"))
+
+
+class DaemonSensorWatcher:
+    def __init__(self, client: HardwareClient, sensors: list, prepare=None):
+        """
+        Sensor watcher reading the activations published by the daemon, see sensors.SensorWatcher.
+        The sensors are reported in the order of the list. The state is only read once prepare
+        returned, an activation of the previous game is cleared by the setup first.
+        :param client: HardwareClient
+        :param sensors: list of strings
+        :param prepare: function or None, called by a background thread before watching
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert all(sensor in SENSOR_FIELDS for sensor in sensors), "Unknown sensor"
+
+        self.client = client
+        self.pending = list(sensors)
+        self.prepare = prepare
+        self.events = queue.Queue()
+        self.latencies = {}
+        self._prepared = threading.Event()
+        self._stopped = False
+
+    def start(self):
+        """
+        Call prepare in the background.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        threading.Thread(target=self._prepare, name="DaemonSensorWatcher", daemon=True).start()
+
+    def stop(self):
+        """
+        Stop watching. Events already in the queue are kept.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._stopped = True
+
+    def _prepare(self):
+        """
+        Background thread of prepare.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self.prepare is not None:
+            self.prepare()
+        self._prepared.set()
+
+    def dispatch(self, callback):
+        """
+        Read the activations published by the daemon, then call the callback for each event.
+        Must be called from the thread of the window (for instance with after()).
+        :param callback: function taking the sensor name as parameter
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self._prepared.is_set() and not self._stopped:
+            state = self.client.read_state()
+            while self.pending and getattr(state, SENSOR_FIELDS[self.pending[0]]):
+                sensor = self.pending.pop(0)
+                self.events.put((sensor, getattr(state, SENSOR_FIELDS[sensor])))
+        while True:
+            try:
+                sensor, detected_at = self.events.get_nowait()
+            except queue.Empty:
+                return
+            self.latencies[sensor] = time.monotonic() - detected_at
+            callback(sensor)
+
+    def is_running(self) -> bool:
+        """
+        Return True while a sensor is still watched.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return bool(self.pending) and not self._stopped
+
+
+class DaemonRfidService:
+    def __init__(self, client: HardwareClient):
+        """
+        RFID service of the daemon, see rfid_service.RfidService. The cards are read and debounced
+        by the daemon, the results are read from the shared state.
+        :param client: HardwareClient
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.client = client
+        self.latencies = collections.deque(maxlen=100)
+        self._scanning = False
+        # Number of the last result seen, a result is new once the number changes
+        self._seen = None
+
+    def start_scan(self):
+        """
+        Ask for the next card to be scanned.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._seen = self.client.read_state().scans
+        self._scanning = True
+        report_command_failure(self.client.send("scan"), "RFID scan")
+
+    def cancel_scan(self):
+        """
+        Cancel the scan in progress.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._scanning = False
+        report_command_failure(self.client.send("cancel scan"), "Cancel of the RFID scan")
+
+    def stop(self):
+        """
+        The reader belongs to the daemon, only the scan in progress is cancelled.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self._scanning:
+            self.cancel_scan()
+
+    def is_scanning(self) -> bool:
+        """
+        Return True while a scan is asked and no card was read yet.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self._scanning
+
+    def get_result(self):
+        """
+        Return the scan result (UID, time of the read) or None if no card was read yet.
+        :return: tuple or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if not self._scanning:
+            return None
+        state = self.client.read_state()
+        if state.scans == self._seen:
+            return None
+        self._seen = state.scans
+        self._scanning = False
+        return state.uid, state.scan_time
+
+    def record_feedback(self, read_time: float):
+        """
+        Record the time between the read of a card and the display of its result.
+        :param read_time: float, time.monotonic of the read
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.latencies.append(time.monotonic() - read_time)
+
+
+class DaemonFloppyReader:
+    def __init__(self, client: HardwareClient):
+        """
+        Floppy reader of the daemon, see floppy.FloppyReader. The text is copied from the shared memory
+        once for each disk read by the daemon.
+        :param client: HardwareClient
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.client = client
+        self._texts = None
+        self._text = None
+
+    @property
+    def status(self) -> str:
+        """
+        Status of the drive: "no disk", "reading", "ready" or "error".
+        :return: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self.client.read_state().floppy_status
+
+    def start(self):
+        """
+        The drive is watched by the daemon.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+
+    def stop(self):
+        """
+        The drive is watched by the daemon.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+
+    def refresh(self):
+        """
+        Ask the daemon to identify the disk at once.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        report_command_failure(self.client.send("refresh floppy"), "Refresh of the floppy drive")
+
+    def get_text(self):
+        """
+        Return the text of the disk in the drive or None if there is no disk or it is being read.
+        :return: string or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        state = self.client.read_state()
+        if state.floppy_status != "ready":
+            return None
+        if state.texts != self._texts:
+            state, text = self.client.state.read_text()
+            if text is not None:
+                self._texts, self._text = state.texts, text
+        return self._text
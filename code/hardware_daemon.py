@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: April 5, 2022
+# Last Modified: April 5, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Hardware daemon: a process owning the arduino, the RFID reader and the floppy drive, so a slow or
+# crashing device never blocks or stops the window. It publishes the state of the hardware in shared
+# memory (shared_state.py) and takes the commands of the window on a Unix datagram socket,
+# one JSON datagram each:
+#   {"id": number, "command": command}   answered with {"id": number, "error": message or null, "type": name}
+# Commands: "setup", "cleanup", "activate solenoide", "deactivate solenoide", "scan", "cancel scan",
+# "refresh floppy". The cleanup releases the hardware and stops the daemon, the game is over.
+# Start it before the window, with use_hardware_daemon set in configuration.py:
+#     python3 hardware_daemon.py &
+#     python3 main.py
+
+import json
+import queue
+import select
+import signal
+import socket
+from raspberry import *
+from configuration import *
+from rfid_service import RfidService
+from floppy import FloppyReader
+from shared_state import SENSOR_FIELDS, SharedState
+
+
+class HardwareDaemon:
+    def __init__(self, state_path: str, socket_path: str, text_size: int, heartbeat_interval: float):
+        """
+        Daemon owning the hardware, see the top of the file. The state left by a previous daemon is kept:
+        the lock of the desk and a scan in progress are restored at start.
+        :param state_path: string, file of the shared state
+        :param socket_path: string, socket of the commands
+        :param text_size: int, bytes kept for the text of the floppy disk
+        :param heartbeat_interval: float, seconds between two publishes of the heartbeat
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        assert type(socket_path) == str, "Socket path should be a string"
+
+        self.state = SharedState(state_path, text_size, writable=True)
+        self.socket_path = socket_path
+        self.heartbeat_interval = heartbeat_interval
+        self.rfid_service = RfidService(rfid_debounce_time)
+        self.floppy_reader = FloppyReader(floppy_device, mount_command, unmount_command,
+                                          os.path.join(floppy_path, floppy_file_name), floppy_poll_interval,
+                                          floppy_command_timeout, identity_command)
+        # Number of setups done, a sensor status read before the last setup is dropped
+        self.setups = 0
+        # Address and number of the cleanup command, answered once the hardware is released
+        self.cleanup_request = None
+        self._floppy_identity = None
+        self._publish_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._socket = None
+
+    def publish(self, text: str = None, **changes):
+        """
+        Change the shared state, from any thread of the daemon.
+        :param text: string or None, text of the floppy disk
+        :param changes: fields of HardwareState
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with self._publish_lock:
+            self.state.publish(text, heartbeat=time.monotonic(), **changes)
+
+    def run(self):
+        """
+        Restore the state of the previous daemon, then handle the commands until stop or cleanup.
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            try:
+                probe.connect(self.socket_path)
+                print("A hardware daemon already runs on %s" % self.socket_path)
+                return
+            except ConnectionRefusedError:
+                # Left by a daemon that crashed
+                os.remove(self.socket_path)
+            finally:
+                probe.close()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.socket_path)
+
+        previous = self.state.read()
+        self.publish(pid=os.getpid(), starts=previous.starts + 1)
+        if previous.solenoide == 1:
+            report_command_failure(activate_solenoide(), "Desk lock")
+        elif previous.solenoide == 0:
+            report_command_failure(deactivate_solenoide(), "Desk unlock")
+        if previous.scan_requested:
+            self.rfid_service.start_scan()
+        if push_mode:
+            enable_push_mode()
+        if sensor_stream:
+            enable_sensor_stream()
+        self.floppy_reader.start()
+        threading.Thread(target=self._watch_sensors, name="DaemonSensors", daemon=True).start()
+        threading.Thread(target=self._forward_scans, name="DaemonScans", daemon=True).start()
+
+        try:
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([self._socket], [], [], self.heartbeat_interval)
+                if readable:
+                    self._handle(*self._socket.recvfrom(4096))
+                self._publish_status()
+        finally:
+            self._stop_event.set()
+            self.floppy_reader.stop()
+            self.rfid_service.stop()
+            if self.cleanup_request is not None:
+                cleanup_arduino()
+                self.publish(solenoide=0, fsr=0.0, load_cell=0.0, scan_requested=False, connected=False)
+                self._reply(*self.cleanup_request, None)
+            self._socket.close()
+            os.remove(self.socket_path)
+
+    def stop(self):
+        """
+        Stop the daemon without releasing the hardware, a new daemon takes over where it stopped.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._stop_event.set()
+
+    def _handle(self, data: bytes, address):
+        """
+        Run a command of the window, the answer is sent once the command is done.
+        :param data: bytes
+        :param address: address of the window
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        try:
+            message = json.loads(data.decode("utf-8"))
+            number, command = message["id"], message["command"]
+        except (ValueError, KeyError, TypeError):
+            print("Invalid hardware command %r" % data)
+            return
+
+        future = None
+        if command == "setup":
+            self.publish(fsr=0.0, load_cell=0.0)
+            future = setup_arduino()
+            future.add_done_callback(self._setup_done)
+        elif command == "activate solenoide":
+            self.publish(solenoide=1)
+            future = activate_solenoide()
+        elif command == "deactivate solenoide":
+            self.publish(solenoide=0)
+            future = deactivate_solenoide()
+        elif command == "cleanup":
+            self.cleanup_request = (address, number)
+            self._stop_event.set()
+            return
+        elif command == "scan":
+            self.publish(scan_requested=True)
+            self.rfid_service.start_scan()
+        elif command == "cancel scan":
+            self.publish(scan_requested=False)
+            self.rfid_service.cancel_scan()
+        elif command == "refresh floppy":
+            self.floppy_reader.refresh()
+        else:
+            self._reply(address, number, ValueError("Unknown command %s" % command))
+            return
+
+        if future is None:
+            self._reply(address, number, None)
+        else:
+            future.add_done_callback(lambda done: self._reply(address, number, done.exception()))
+
+    def _setup_done(self, future):
+        """
+        The sensors were reset by the setup, the activations read before are dropped.
+        :param future: Future of the setup
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with self._publish_lock:
+            self.setups += 1
+            self.state.publish(heartbeat=time.monotonic(), fsr=0.0, load_cell=0.0)
+
+    def _reply(self, address, number: int, error):
+        """
+        Answer a command. A window that is gone gets no answer, it sends its commands again once restarted.
+        :param address: address of the window
+        :param number: int
+        :param error: exception or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        reply = {"id": number, "error": None if error is None else str(error),
+                 "type": None if error is None else type(error).__name__}
+        try:
+            self._socket.sendto(json.dumps(reply).encode("utf-8"), address)
+        except OSError:
+            pass
+
+    def _publish_status(self):
+        """
+        Publish the heartbeat, the connection of the arduino and the floppy drive.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        state = self.state.read()
+        changes = {"connected": get_serial_link().is_connected(), "floppy_status": self.floppy_reader.status}
+        text = None
+        identity = self.floppy_reader.identity
+        if changes["floppy_status"] == "ready" and identity != self._floppy_identity:
+            text = self.floppy_reader.get_text()
+        if text is not None:
+            if len(text.encode("utf-8")) > self.state.text_size:
+                print("Text of the floppy disk cut to %d bytes" % self.state.text_size)
+            changes["texts"] = (state.texts + 1) & 0xFFFFFFFF
+            self._floppy_identity = identity
+        self.publish(text, **changes)
+
+    def _watch_sensors(self):
+        """
+        Background loop publishing the time each sensor is activated, like the sensor watcher of the window.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        while not self._stop_event.is_set():
+            setups = self.setups
+            try:
+                states = get_sensor_snapshot().states
+            except (TimeoutError, ConnectionError):
+                states = {}
+            with self._publish_lock:
+                state = self.state.read()
+                activated = {field: time.monotonic() for sensor, field in SENSOR_FIELDS.items()
+                             if states.get(sensor) and not getattr(state, field)}
+                if activated and setups == self.setups:
+                    self.state.publish(heartbeat=time.monotonic(), **activated)
+            if not wait_for_sensor_change(sensor_poll_interval):
+                self._stop_event.wait(sensor_poll_interval)
+
+    def _forward_scans(self):
+        """
+        Background loop publishing the result of each scan.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        while not self._stop_event.is_set():
+            try:
+                scan, read_time = self.rfid_service.results.get(timeout=self.heartbeat_interval)
+            except queue.Empty:
+                continue
+            self.publish(scans=(self.state.read().scans + 1) & 0xFFFFFFFF, uid=scan, scan_time=read_time,
+                         scan_requested=False)
+
+
+if __name__ == "__main__":
+    daemon = HardwareDaemon(hardware_state_file, hardware_command_socket, hardware_text_size,
+                            hardware_heartbeat_interval)
+    # Stopped by the system (restart of the service): the desk keeps its state for the next daemon
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        daemon.stop()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: April 4, 2022
+# Last Modified: April 4, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Hints of the game: the hints of a state (puzzle.json) are given after their delay in the state,
+# and the operator can give a hint at any time by writing it in the hint pipe of the desk:
+#     python3 hints.py "Look under the keyboard"
+#     echo "Look under the keyboard" > Logs/hints.fifo
+
+import heapq
+import itertools
+import math
+import os
+import sys
+import time
+import tkinter as tk
+
+
+class HintScheduler:
+    def __init__(self, widget: tk.Misc, show):
+        """
+        Timers of the hints kept in a heap ordered by due time. Only the earliest timer is scheduled
+        with after(), so adding or cancelling a timer costs O(log n) and nothing runs until a hint is due.
+        :param widget: Tk widget used to schedule the timers
+        :param show: function called with each hint once it is due
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.widget = widget
+        self.show = show
+        # Entries (due monotonic time, number, hint), the cancelled ones are dropped once at the top
+        self._heap = []
+        # Hints waiting by number of their entry
+        self._pending = {}
+        self._numbers = itertools.count()
+        # Scheduled after() job and the due time it was scheduled for
+        self._job = None
+        self._job_due = None
+
+    def schedule(self, hint, delay: float) -> int:
+        """
+        Show the hint in delay seconds. Return the number of the timer, used to cancel it.
+        :param hint: Hint or any value given to show
+        :param delay: float
+        :return: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        number = next(self._numbers)
+        heapq.heappush(self._heap, (time.monotonic() + delay, number, hint))
+        self._pending[number] = hint
+        self._arm()
+        return number
+
+    def schedule_state(self, hints: list):
+        """
+        Cancel the waiting hints and schedule the hints of a state, each after its delay.
+        :param hints: list of Hint
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.cancel_all()
+        for hint in hints:
+            self.schedule(hint, hint.delay)
+
+    def cancel(self, number: int):
+        """
+        Cancel a timer, nothing happens if it already fired.
+        :param number: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._pending.pop(number, None)
+        self._arm()
+
+    def cancel_all(self):
+        """
+        Cancel every timer.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._heap = []
+        self._pending.clear()
+        self._arm()
+
+    def pending(self) -> int:
+        """
+        Return the number of hints waiting.
+        :return: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return len(self._pending)
+
+    def _arm(self):
+        """
+        Schedule the after() job for the earliest timer, the job is kept if it is already the right one.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        while self._heap and self._heap[0][1] not in self._pending:
+            heapq.heappop(self._heap)
+        due = self._heap[0][0] if self._heap else None
+        if due == self._job_due:
+            return
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+        self._job_due = due
+        if due is not None:
+            delay = max(0, math.ceil((due - time.monotonic()) * 1000))
+            self._job = self.widget.after(delay, self._fire)
+
+    def _fire(self):
+        """
+        Show the hints that are due, then schedule the next one.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._job = None
+        self._job_due = None
+        now = time.monotonic()
+        while self._heap and self._heap[0][0] <= now:
+            _, number, hint = heapq.heappop(self._heap)
+            if number in self._pending:
+                del self._pending[number]
+                self.show(hint)
+        self._arm()
+
+
+class OperatorHints:
+    def __init__(self, widget: tk.Misc, path: str, show):
+        """
+        Hints written by the operator in a named pipe, one line each. The pipe is watched by the
+        event loop of Tk, the lines are read when they arrive without checking the pipe regularly.
+        :param widget: Tk widget whose event loop watches the pipe
+        :param path: string, path of the pipe, created if needed
+        :param show: function called with the text of each hint
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(path) == str, "Path should be a string"
+
+        self.widget = widget
+        self.path = path
+        self.show = show
+        self._reader = None
+        self._writer = None
+        self._buffer = b""
+
+    def open(self):
+        """
+        Create the pipe and start watching it. Raise OSError if the pipe cannot be opened.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if not os.path.exists(self.path):
+            os.mkfifo(self.path)
+        self._reader = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        # Kept open so the pipe never reaches the end of file once a writer closes it,
+        # else it would be readable, and watched, all the time
+        self._writer = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+        self.widget.tk.createfilehandler(self._reader, tk.READABLE, self._readable)
+
+    def close(self):
+        """
+        Stop watching the pipe.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self._reader is None:
+            return
+        self.widget.tk.deletefilehandler(self._reader)
+        os.close(self._reader)
+        os.close(self._writer)
+        self._reader = self._writer = None
+
+    def _readable(self, file_descriptor: int, mask: int):
+        """
+        Read what was written in the pipe and show each complete line.
+        :param file_descriptor: int
+        :param mask: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        try:
+            self._buffer += os.read(file_descriptor, 4096)
+        except BlockingIOError:
+            return
+        *lines, self._buffer = self._buffer.split(b"\n")
+        for line in lines:
+            text = line.decode("utf-8", "replace").strip()
+            if text:
+                self.show(text)
+
+
+def send_hint(path: str, text: str):
+    """
+    Write a hint in the pipe of a running game. Raise OSError if no game reads the pipe.
+    :param path: string
+    :param text: string
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    assert type(text) == str, "Text should be a string"
+
+    # Without a reader the opening fails at once instead of waiting for the game
+    file_descriptor = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+    try:
+        os.write(file_descriptor, (" ".join(text.split()) + "\n").encode("utf-8"))
+    finally:
+        os.close(file_descriptor)
+
+
+if __name__ == "__main__":
+    from configuration import hint_pipe_file
+
+    try:
+        send_hint(hint_pipe_file, " ".join(sys.argv[1:]))
+    except OSError as error:
+        print("Hint not sent, is the game running? %s" % error)
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 14, 2022
+# Last Modified: March 14, 2022
+#
+# Developed and tested using Python 3.7.3
+
+import collections
+import math
+import os
+import struct
+import tkinter as tk
+from bundle import AssetBundle
+from configuration import *
+from raspberry import get_files_in_directory
+
+# Bundle the assets are read from, None if the loose files are used (see open_asset_bundle)
+asset_bundle = None
+
+
+def open_asset_bundle(path: str, verify: bool):
+    """
+    Read the assets from the bundle from now on. With verify, the hash of every asset is checked before
+    the game starts: a damaged asset is reported at once and its loose file is used instead.
+    The assets changed since the bundle was built are also read from their loose files.
+    Return the bundle, None if there is no bundle or it cannot be read.
+    Raise FileNotFoundError if a damaged asset has no loose file to be read from.
+    :param path: string
+    :param verify: bool
+    :return: AssetBundle or None
+    :author: AUGUSTIN NOGUE
+    :version: 1.2
+    """
+    global asset_bundle
+
+    if not os.path.exists(path):
+        return None
+    try:
+        bundle = AssetBundle(path, verify)
+    except (OSError, ValueError) as error:
+        print("Asset bundle not used: %s" % error)
+        return None
+    if verify:
+        # Only the bundle may have been copied to the desk, a damaged asset must not be found in the middle of a game
+        missing = [name for name in bundle.verify() if not os.path.exists(os.path.join(bundle.root, *name.split("/")))]
+        if missing:
+            bundle.close()
+            raise FileNotFoundError("Assets damaged in the bundle and without loose file: %s" % ", ".join(missing))
+    for name in bundle.remove_outdated():
+        print("Asset %s changed since the bundle was built, the loose file is used" % name)
+    asset_bundle = bundle
+    return bundle
+
+
+def asset_files(folder: str, file_type: str) -> list:
+    """
+    Return the assets of the type given in the folder, from the index of the bundle when it holds them
+    so the folder is not listed again.
+    :param folder: string
+    :param file_type: string
+    :return: list of strings
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    if asset_bundle is not None:
+        files = asset_bundle.files(folder, file_type)
+        if files:
+            return files
+    return get_files_in_directory(folder, file_type)
+
+
+def asset_version(image_path: str):
+    """
+    Return what changes with the content of an image: its hash in the bundle, else the modification time of its file.
+    :param image_path: string
+    :return: string or int
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    if asset_bundle is not None and asset_bundle.contains(image_path):
+        return asset_bundle.version(image_path)
+    return os.stat(image_path).st_mtime_ns
+
+
+def asset_read_ahead(image_path: str):
+    """
+    Read the pages of a bundled image from the disk. Return the number of bytes, None if the image is not bundled.
+    :param image_path: string
+    :return: int or None
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    if asset_bundle is not None and asset_bundle.contains(image_path):
+        return asset_bundle.read_ahead(image_path)
+    return None
+
+
+def prescaled_path(image_path: str) -> str:
+    """
+    Return the path of the pre-scaled version of an image, see prescale_image.
+    The pre-scaled image is a .ppm file if the image can be flattened, else a .png file.
+    :param image_path: string
+    :return: string
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    assert type(image_path) == str, "Image path should be a string"
+
+    folder = os.path.basename(os.path.dirname(os.path.abspath(image_path)))
+    name, extension = os.path.splitext(os.path.basename(image_path))
+    if is_opaque(image_path):
+        extension = ".ppm"
+    return os.path.join(prescaled_folder, folder, name + extension)
+
+
+def is_opaque(image_path: str) -> bool:
+    """
+    Return True if the image has no transparency and can be stored without alpha channel.
+    Either the png file has no alpha channel, or the image (or its folder) is listed in opaque_images.
+    Only the chunk headers before the image data are read.
+    :param image_path: string
+    :return: bool
+    :author: AUGUSTIN NOGUE
+    :version: 1.1
+    """
+    image_path = os.path.abspath(image_path)
+    if image_path in opaque_images or os.path.dirname(image_path) in opaque_images:
+        return True
+    with open(image_path, "rb") as file:
+        header = file.read(33)
+        # Color type of the IHDR chunk: 0 (grey) and 2 (RGB) have no alpha channel
+        color_type = struct.unpack(">B", header[25:26])[0] if len(header) == 33 else None
+        if color_type not in (0, 2):
+            return False
+        # A tRNS chunk adds transparency to grey and RGB images, it comes before the image data (IDAT)
+        while True:
+            chunk = file.read(8)
+            if len(chunk) < 8:
+                return True
+            length, kind = struct.unpack(">I4s", chunk)
+            if kind == b"tRNS":
+                return False
+            if kind in (b"IDAT", b"IEND"):
+                return True
+            # Data and CRC of the chunk
+            file.seek(length + 4, os.SEEK_CUR)
+
+
+def fit_factor(width: int, height: int, size: tuple) -> int:
+    """
+    Return the smallest integer subsample factor for an image to fit in size (width, height).
+    :param width: int
+    :param height: int
+    :param size: tuple
+    :return: int
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    return max(1, math.ceil(width / size[0]), math.ceil(height / size[1]))
+
+
+def image_source(image_path: str) -> str:
+    """
+    Return the file an image is decoded from: its pre-scaled version when it is up to date, else the image itself.
+    :param image_path: string
+    :return: string
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    prescaled = prescaled_path(image_path)
+    if os.path.exists(prescaled) and os.path.getmtime(prescaled) >= os.path.getmtime(image_path):
+        return prescaled
+    return image_path
+
+
+def load_image(image_path: str, size=None) -> tk.PhotoImage:
+    """
+    Load an image in a PhotoImage. The image is decoded from the bundle when it holds it,
+    else from its pre-scaled version when it is up to date.
+    If size (width, height) is given the image is reduced to fit in it.
+    :param image_path: string
+    :param size: tuple or None
+    :return: PhotoImage
+    :author: AUGUSTIN NOGUE
+    :version: 1.2
+    """
+    if asset_bundle is not None and asset_bundle.contains(image_path):
+        image = tk.PhotoImage(data=asset_bundle.data(image_path))
+    else:
+        image = tk.PhotoImage(file=image_source(image_path))
+    if size is not None:
+        factor = fit_factor(image.width(), image.height(), size)
+        if factor > 1:
+            image = image.subsample(factor, factor)
+    return image
+
+
+def prescale_image(image_path: str, size: tuple) -> bool:
+    """
+    Offline step: write the pre-scaled version of an image, reduced to fit in size (width, height).
+    Opaque images are stored as .ppm files, Tk reads them without decompression.
+    Images with transparency are only written again if they have to be reduced.
+    Return True if a pre-scaled file was written.
+    :param image_path: string
+    :param size: tuple
+    :return: bool
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    image = tk.PhotoImage(file=image_path)
+    factor = fit_factor(image.width(), image.height(), size)
+    opaque = is_opaque(image_path)
+    if factor == 1 and not opaque:
+        return False
+    if factor > 1:
+        image = image.subsample(factor, factor)
+
+    destination = prescaled_path(image_path)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    image.write(destination, format="ppm" if opaque else "png")
+    return True
+
+
+class ImageCache:
+    def __init__(self, max_bytes: int, loader=load_image):
+        """
+        Least recently used cache of decoded images.
+        The images are identified by their path, their version (see asset_version) and the size they must fit in,
+        so a modified file is decoded again.
+        When the decoded images take more than max_bytes the least recently used ones are dropped.
+        :param max_bytes: int
+        :param loader: function(path, size) returning a PhotoImage
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(max_bytes) == int, "Maximum size should be an integer"
+
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.images = collections.OrderedDict()
+        # Memory used by the decoded images (Tk keeps 4 bytes per pixel)
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, image_path: str, size=None):
+        """
+        Return the decoded image, decoding it if it is not in the cache.
+        :param image_path: string
+        :param size: tuple or None
+        :return: PhotoImage
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        assert type(image_path) == str, "Image path should be a string"
+
+        image_path = os.path.abspath(image_path)
+        key = (image_path, asset_version(image_path), size)
+        if key in self.images:
+            self.hits += 1
+            self.images.move_to_end(key)
+            return self.images[key][0]
+
+        self.misses += 1
+        image = self.loader(image_path, size)
+        cost = image.width() * image.height() * 4
+        self.images[key] = (image, cost)
+        self.used_bytes += cost
+        # Drop the least recently used images, always keeping the new one
+        while self.used_bytes > self.max_bytes and len(self.images) > 1:
+            _, (_, dropped_cost) = self.images.popitem(last=False)
+            self.used_bytes -= dropped_cost
+        return image
+
+    def path_of(self, image):
+        """
+        Return the path of a decoded image of the cache, None if it is not in the cache anymore.
+        :param image: PhotoImage
+        :return: string or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        for (image_path, _, _), (cached, _) in self.images.items():
+            if cached is image:
+                return image_path
+        return None
+
+    def warm(self, widget: tk.Misc, image_paths: list, size=None):
+        """
+        Decode the images in the background of the window: one image is decoded
+        each time Tk is idle, so the window stays responsive while the cache fills.
+        :param widget: Tk widget used to schedule the decoding
+        :param image_paths: list of strings
+        :param size: tuple or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if not image_paths:
+            return
+        self.get(image_paths[0], size)
+        widget.after_idle(self.warm, widget, image_paths[1:], size)
+
+    def clear(self):
+        """
+        Drop every decoded image.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.images.clear()
+        self.used_bytes = 0
+
+
+if __name__ == "__main__":
+    # Pre-scale every image to the size of the screen
+    # Tk is needed to decode and write the images
+    root = tk.Tk()
+    root.withdraw()
+    for folder in (assets_folder, picture_frame_folder):
+        for file in sorted(os.listdir(folder)):
+            if file.endswith(".png") and prescale_image(os.path.join(folder, file), screen_size):
+                print("Pre-scaled %s" % os.path.join(folder, file))
+    root.destroy()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 31, 2022
+# Last Modified: March 31, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Journal of the game, so a game interrupted by a crash or a reboot is resumed where it stopped.
+# Every change of the game is appended to the journal before it matters, one JSON line each:
+#   {"event": "new game"}                                   start of a game
+#   {"event": "sensor", "sensor": name, "state": state}     sensor activation moving the game
+#   {"event": "task", "task": name, "state": state}         task completed with its card
+#   {"event": "penalty", "outcome": outcome}                wrong card or wrong order
+#   {"event": "view", "view": name}                         view chosen by the players
+#   {"event": "clock", "started": wall clock time}          start of the countdown (game_clock.py)
+#   {"event": "clock stop", "remaining": seconds}           countdown stopped, the game is solved
+#   {"event": "snapshot", "state", "completed", "view", "penalties", "clock started", "clock remaining"}
+#                                                           progress, written by the compaction
+#   {"event": "game over"}                                  desk opened or game lost, the next start is a new game
+# The lines are written and synced to the disk by batches, at most one fsync every sync interval.
+
+import json
+import os
+import threading
+
+
+class Journal:
+    def __init__(self, path: str, sync_interval: float, compact_records: int):
+        """
+        Append-only journal of the game kept in a file.
+        :param path: string
+        :param sync_interval: float, seconds between two writes of the waiting records
+        :param compact_records: int, records in the file before it is compacted
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(path) == str, "Path should be a string"
+        assert type(compact_records) == int, "Number of records should be an integer"
+
+        self.path = path
+        self.sync_interval = sync_interval
+        self.compact_records = compact_records
+        # Records in the file and records waiting to be written
+        self.records = 0
+        self.pending = []
+        # Number of fsync done
+        self.syncs = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def load(self) -> list:
+        """
+        Read the records of the file. A record cut by a crash at the end of the file is removed.
+        :return: list of dicts
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        records = []
+        valid_size = 0
+        try:
+            with open(self.path, "rb") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line.decode("utf-8"))
+                    except ValueError:
+                        break
+                    if not line.endswith(b"\n") or not isinstance(record, dict):
+                        break
+                    records.append(record)
+                    valid_size += len(line)
+        except FileNotFoundError:
+            return []
+        # The next records are appended after the last complete one
+        if os.path.getsize(self.path) != valid_size:
+            os.truncate(self.path, valid_size)
+        self.records = len(records)
+        return records
+
+    def append(self, record: dict):
+        """
+        Add a record, written with the next batch.
+        :param record: dict
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(record) == dict, "Record should be a dictionary"
+        with self._lock:
+            self.pending.append(record)
+
+    def flush(self):
+        """
+        Write the waiting records in one write and sync them to the disk.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with self._write_lock:
+            with self._lock:
+                records, self.pending = self.pending, []
+            if not records:
+                return
+            with open(self.path, "ab") as file:
+                file.write("".join(json.dumps(record) + "\n" for record in records).encode("utf-8"))
+                file.flush()
+                os.fsync(file.fileno())
+            self.syncs += 1
+            self.records += len(records)
+
+    def compact(self, records: list):
+        """
+        Replace the content of the journal with the records given, the waiting records are written after them.
+        The new file is written aside and then renamed, the journal is complete even if the power is cut.
+        :param records: list of dicts
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with self._write_lock:
+            self._compact(records)
+
+    def compact_game(self):
+        """
+        Replace the content of the journal with the progress of its game, see compact_game.
+        The file is read and replaced while no batch is written, a record written meanwhile would be lost.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with self._write_lock:
+            self._compact(compact_game(self.load()))
+
+    def _compact(self, records: list):
+        """
+        Replace the content of the journal with the records given, the write lock must be held.
+        :param records: list of dicts
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        folder = os.path.dirname(self.path)
+        os.makedirs(folder, exist_ok=True)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "wb") as file:
+            file.write("".join(json.dumps(record) + "\n" for record in records).encode("utf-8"))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self.path)
+        # Sync the folder, so the rename itself is on the disk
+        folder_descriptor = os.open(folder, os.O_RDONLY)
+        try:
+            os.fsync(folder_descriptor)
+        finally:
+            os.close(folder_descriptor)
+        self.syncs += 1
+        self.records = len(records)
+
+    def start(self):
+        """
+        Start writing the records by batches in the background.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._thread = threading.Thread(target=self._run, name="Journal", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """
+        Stop the background thread and write the last records.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        """
+        Background loop writing the records, the journal is compacted once it holds too many records.
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        while not self._stop_event.wait(self.sync_interval):
+            try:
+                self.flush()
+                if self.records > self.compact_records:
+                    self.compact_game()
+            except OSError as error:
+                print("Journal not written: %s" % error)
+
+
+def game_records(records: list) -> list:
+    """
+    Return the records of the last game, or an empty list if it is over.
+    :param records: list of dicts
+    :return: list of dicts
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    start = 0
+    for i, record in enumerate(records):
+        if record.get("event") == "new game":
+            start = i
+    game = records[start:]
+    if not game or any(record.get("event") == "game over" for record in game):
+        return []
+    return game
+
+
+def replay(records: list) -> dict:
+    """
+    Replay the records of a game and return its progress:
+    {"state": state or None, "completed": names of the completed tasks, "view": view or None, "penalties": int,
+    "clock started": wall clock time or None, "clock remaining": seconds left once stopped or None}
+    :param records: list of dicts
+    :return: dict
+    :author: AUGUSTIN NOGUE
+    :version: 1.2
+    """
+    progress = {"state": None, "completed": [], "view": None, "penalties": 0, "clock started": None,
+                "clock remaining": None}
+    for record in records:
+        event = record.get("event")
+        if event == "snapshot":
+            progress = {key: record.get(key, value) for key, value in progress.items()}
+            progress["completed"] = list(progress["completed"])
+        elif event in ("sensor", "task"):
+            progress["state"] = record["state"]
+            if event == "task" and record["task"] not in progress["completed"]:
+                progress["completed"].append(record["task"])
+        elif event == "penalty":
+            progress["penalties"] += 1
+        elif event == "view":
+            progress["view"] = record["view"]
+        elif event == "clock":
+            progress["clock started"] = record["started"]
+        elif event == "clock stop":
+            progress["clock remaining"] = record["remaining"]
+    return progress
+
+
+def compact_game(records: list) -> list:
+    """
+    Return the records replacing the journal: the progress of the game in progress in one snapshot.
+    :param records: list of dicts
+    :return: list of dicts
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    game = game_records(records)
+    if not game:
+        return [{"event": "new game"}]
+    return [{"event": "new game"}, dict(replay(game), event="snapshot")]
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 29, 2022
+# Last Modified: March 29, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Load test of the control server (server.py) on simulated hardware: every desk has an
+# emulated arduino and a fake RFID reader and plays a full game, all desks at the same time,
+# while a WebSocket client receives the changes. Reports the memory used by each desk
+# and the time between an action on the hardware and the WebSocket message announcing it.
+#     python3 load_test.py --desks 200
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+import tracemalloc
+from simulator import rfid
+from simulator.arduino import ArduinoEmulator
+from telemetry import percentile
+from websocket import read_frame
+
+# Longest time a step can take before the test is considered stuck (seconds)
+STEP_TIMEOUT = 30
+
+
+async def connect_events(port: int) -> tuple:
+    """
+    Open a WebSocket on /events of the control server and return (reader, writer).
+    :param port: int
+    :return: tuple
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    key = base64.b64encode(os.urandom(16))
+    writer.write(b"GET /events HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                 b"Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\n\r\n" % key)
+    # Head of the answer
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+    return reader, writer
+
+
+async def dispatch_events(reader: asyncio.StreamReader, queues: dict):
+    """
+    Put each message of the WebSocket in the queue of its desk.
+    :param reader: StreamReader
+    :param queues: dict of asyncio.Queue by desk name
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    while True:
+        _, payload = await read_frame(reader)
+        message = json.loads(payload.decode("utf-8"))
+        if "session" in message:
+            queues[message["session"]].put_nowait((time.perf_counter(), message))
+
+
+async def wait_event(queue: asyncio.Queue, condition) -> float:
+    """
+    Wait for a message of the desk matching the condition, return its arrival time.
+    :param queue: asyncio.Queue
+    :param condition: function(message) returning a bool
+    :return: float
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    while True:
+        arrival, message = await asyncio.wait_for(queue.get(), STEP_TIMEOUT)
+        if condition(message):
+            return arrival
+
+
+async def play(arduino: ArduinoEmulator, device: int, uids: list, queue: asyncio.Queue) -> dict:
+    """
+    Play a full game on one desk, return the latency of each step in seconds.
+    :param arduino: ArduinoEmulator
+    :param device: int, chip select of the fake RFID reader
+    :param uids: list of the card UIDs, in the order of the tasks
+    :param queue: asyncio.Queue of the messages of the desk
+    :return: dict
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    latencies = {}
+    start = time.perf_counter()
+    arduino.press_fsr()
+    latencies["fsr"] = await wait_event(queue, lambda message: message.get("state") == "desk error") - start
+    start = time.perf_counter()
+    arduino.put_weight()
+    latencies["load cell"] = await wait_event(queue, lambda message: message.get("state") == "selection") - start
+    for i, uid in enumerate(uids):
+        start = time.perf_counter()
+        rfid.field(device).present(uid)
+        arrival = await wait_event(queue, lambda message: message.get("outcome") == "completed")
+        latencies["rfid task %d" % (i + 1)] = arrival - start
+        rfid.field(device).remove()
+    return latencies
+
+
+async def run_load_test(desks: int) -> dict:
+    """
+    Start the emulated desks and the control server, play one game on every desk and gather the results.
+    :param desks: int
+    :return: dict
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    # The RFID readers of the server are the fake ones
+    sys.modules["pirc522"] = rfid
+    import server
+    from puzzle import load_puzzle
+
+    arduinos = [ArduinoEmulator() for _ in range(desks)]
+    for arduino in arduinos:
+        arduino.start()
+    rooms = [{"name": "desk %d" % i, "serial_port": arduino.port, "rfid_device": i}
+             for i, arduino in enumerate(arduinos)]
+    puzzle = load_puzzle(server.puzzle_file)
+    uids = [list(task.uid) for task in puzzle.tasks]
+
+    tracemalloc.start()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    control_server = server.ControlServer(rooms, puzzle)
+    start = time.perf_counter()
+    await control_server.start("127.0.0.1", 0)
+    while any(session.link_status != "ready" for session in control_server.sessions.values()):
+        if time.perf_counter() - start > STEP_TIMEOUT:
+            raise TimeoutError("Desks not connected after %s seconds" % STEP_TIMEOUT)
+        await asyncio.sleep(0.01)
+    connect_time = time.perf_counter() - start
+    memory_per_desk = (tracemalloc.get_traced_memory()[0] - memory_before) / desks
+    tracemalloc.stop()
+
+    queues = {room["name"]: asyncio.Queue() for room in rooms}
+    reader, writer = await connect_events(control_server.port)
+    dispatcher = asyncio.ensure_future(dispatch_events(reader, queues))
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        games = await asyncio.gather(*(play(arduino, i, uids, queues["desk %d" % i])
+                                       for i, arduino in enumerate(arduinos)))
+    finally:
+        dispatcher.cancel()
+        writer.close()
+        await control_server.stop()
+        for arduino in arduinos:
+            arduino.stop()
+
+    steps = {}
+    for game in games:
+        for step, latency in game.items():
+            steps.setdefault(step, []).append(latency)
+    return {
+        "desks": desks,
+        "connect time": connect_time,
+        "memory per desk": memory_per_desk,
+        "wall time": time.perf_counter() - wall_start,
+        # CPU time of the whole process, the emulated arduinos included
+        "cpu time": time.process_time() - cpu_start,
+        "events sent": control_server.events_sent,
+        "steps": {step: {"p50": percentile(values, 50), "p99": percentile(values, 99), "max": max(values)}
+                  for step, values in steps.items()},
+    }
+
+
+def print_report(results: dict):
+    """
+    Print the results of the load test, latencies in milliseconds.
+    :param results: dict
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    print("%d desks connected in %.1f s, %.1f KiB per desk" % (results["desks"], results["connect time"],
+                                                               results["memory per desk"] / 1024))
+    print("Games played in %.1f s, CPU time %.2f s, %d events sent" % (results["wall time"], results["cpu time"],
+                                                                      results["events sent"]))
+    print("%-14s %9s %9s %9s" % ("step", "p50 ms", "p99 ms", "max ms"))
+    for step, values in results["steps"].items():
+        print("%-14s %9.1f %9.1f %9.1f" % (step, values["p50"] * 1000, values["p99"] * 1000, values["max"] * 1000))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the control server on simulated hardware")
+    parser.add_argument("--desks", type=int, default=100, help="number of desks playing at the same time")
+    parser.add_argument("--json", help="also write the results in this file")
+    arguments = parser.parse_args()
+
+    load_test_results = asyncio.run(run_load_test(arguments.desks))
+    print_report(load_test_results)
+    if arguments.json:
+        with open(arguments.json, "w") as results_file:
+            json.dump(load_test_results, results_file, indent=2)
@@ -9,18 +9,43 @@
 # Developed and tested using Python 3.7.3
 
 import tkinter as tk
+import raspberry
 from raspberry import *
 from configuration import *
+from sensors import SensorWatcher
+from images import ImageCache, asset_files, open_asset_bundle
+from rfid_service import RfidService
+from floppy import FloppyReader
+from scene import Scene
+from startup import StartupTimer
+from puzzle import Hint, load_puzzle
+from slideshow import Slideshow
+from telemetry import recorder, timed
+from journal import Journal, game_records, replay
+from game_clock import GameClock
+from hints import HintScheduler, OperatorHints
+from hardware_client import DaemonFloppyReader, DaemonRfidService, DaemonSensorWatcher, HardwareClient
+from session_record import session
+from mirror import SceneMirror
 
 
 class MainWindow(tk.Tk):
-    def __init__(self):
+    def __init__(self, startup_timer: StartupTimer = None, replay=None):
         """
         Initialisation of the main window
+        The first picture is displayed before the hardware is used,
+        the arduino is connected from the thread of the sensor watcher.
+        A game interrupted by a crash is resumed from the journal.
+        The hardware is used from this process, or through the hardware daemon (use_hardware_daemon),
+        or a recorded session is replayed instead (see session_replay.py).
+        The scene is mirrored for the game master (see mirror.py).
+        :param startup_timer: StartupTimer or None, measures the startup phases
+        :param replay: SessionReplay or None
         :author: AUGUSTIN NOGUE
-        :version: 1.0
+        :version: 1.8
         """
         super().__init__()
+        self.startup_timer = startup_timer
         # Name of the window
         self.title("ENIGM-ESC")
         # Size of the window
@@ -38,8 +63,15 @@ class MainWindow(tk.Tk):
         self.RIGHT_COORD = ((self.x_size / 2) / 2, 250)
         self.LEFT_COORD = (self.x_size - (self.x_size / 2) / 2, 250)
 
-        # Task status
-        self.tasks_status = [False, False, False, False, False]
+        # States, tasks and progress of the game (puzzle.json)
+        self.puzzle = load_puzzle(puzzle_file)
+        # Countdown of the game, started by the first sensor activation
+        self.clock = GameClock(game_duration, wrong_card_penalty, game_chances)
+        self.clock_job = None
+        # Journal of the game, replayed to resume the game in progress if any
+        self.journal = Journal(journal_file, journal_sync_interval, journal_compact_records)
+        resumed_view = self.resume_game()
+        self.mark_startup("journal")
         # Boolean to know if we are in selection screen
         self.in_selection_screen = False
 
@@ -48,30 +80,190 @@ class MainWindow(tk.Tk):
         self.main_window.pack(side=tk.LEFT, anchor=tk.N)
         # Bind escape to the exit function
         self.bind("<Escape>", exit)
+        self.mark_startup("window")
+
+        # Slideshow of the picture frame
+        self.slideshow = None
+        # View chosen by the players once the load cell is passed: "selection", "floppy" or "rfid"
+        self.view = None
+
+        # Hardware of the desk: the functions of raspberry.py, or the client of the hardware daemon
+        # which has the same functions (hardware_daemon.py), or the replay of a session
+        if replay is not None:
+            self.hardware = replay.hardware
+        elif use_hardware_daemon:
+            self.hardware = HardwareClient(hardware_state_file, hardware_command_socket, hardware_text_size,
+                                           hardware_command_timeout, hardware_heartbeat_timeout)
+        else:
+            self.hardware = raspberry
 
-        # Display last image of the list while the arduino establish connection.
-        self.display_image(pictures_for_frame[len(pictures_for_frame)-1], self.CENTER_COORD, True)
-        # First phase of the game display pictures (fake picture frame) while fsr isn't pressed
-        self.picture_frame(pictures_for_frame, time_between_images)
+        # RFID cards are scanned in the background
+        if replay is not None:
+            self.rfid_service = replay.rfid_service
+        elif use_hardware_daemon:
+            self.rfid_service = DaemonRfidService(self.hardware)
+        else:
+            self.rfid_service = RfidService(rfid_debounce_time)
+        self.rfid_scan_job = None
+
+        # The floppy drive is watched in the background, each disk is read once
+        if replay is not None:
+            self.floppy_reader = replay.floppy_reader
+        elif use_hardware_daemon:
+            self.floppy_reader = DaemonFloppyReader(self.hardware)
+        else:
+            self.floppy_reader = FloppyReader(floppy_device, mount_command, unmount_command,
+                                              os.path.join(floppy_path, floppy_file_name), floppy_poll_interval,
+                                              floppy_command_timeout, identity_command)
+        self.floppy_job = None
+        self.floppy_text = None
+
+        # Decoded images, shared by every view, read from the bundle of the assets if there is one
+        open_asset_bundle(asset_bundle_file, asset_bundle_verify)
+        self.mark_startup("assets")
+        self.images = ImageCache(image_cache_max_bytes)
+        # Hints of the state of the game and hints written by the operator
+        self.hint_scheduler = HintScheduler(self, self.show_hint)
+        self.operator_hints = OperatorHints(self, hint_pipe_file, self.show_operator_hint)
+
+        # Items of the window, created once and updated by the views
+        self.scene = Scene(self.main_window)
+        self.build_scene()
+        # Mirror of the scene for the game master, each change is sent once the window is idle
+        self.mirror = None
+        if mirror_socket is not None:
+            self.mirror = SceneMirror(self.scene, mirror_socket, self.mirror_status, self.images.path_of,
+                                      self.after_idle)
+
+        # Automatically list of pictures to display in picture frame
+        self.pictures_for_frame = asset_files(picture_frame_folder, ".png")
+        if self.puzzle.state == self.puzzle.initial:
+            # First phase of the game display pictures (fake picture frame) while fsr isn't pressed
+            # It starts with the last image of the list while the arduino establish connection.
+            self.picture_frame(self.pictures_for_frame, time_between_images)
+        else:
+            # Resumed game, back to the view of the players, the delays of the hints start again
+            self.show_state_view(resumed_view)
+            self.schedule_hints()
+        if self.clock.is_running():
+            self.show_clock()
+        self.update_idletasks()
+        self.mark_startup("first frame")
+
+        # The hardware is only used once the first frame is displayed
+        self.floppy_reader.start()
+        try:
+            self.operator_hints.open()
+        except OSError as error:
+            # The game is still playable with the hints of puzzle.json
+            print("Operator hints not available: %s" % error)
+        if self.mirror is not None:
+            try:
+                self.mirror.open()
+            except OSError as error:
+                print("Mirror not available: %s" % error)
+        # Set once the arduino is set up, see connect_arduino
+        self.arduino_ready = threading.Event()
+        # The sensors are read in the background, their activations are handled as events.
+        # The setup clears the latches of the arduino, a resumed game only waits for the sensors it still needs.
+        sensors = self.puzzle.pending_sensors()
+        if replay is not None:
+            self.sensor_watcher = replay.sensor_watcher(sensors, self.connect_arduino)
+        elif use_hardware_daemon:
+            self.sensor_watcher = DaemonSensorWatcher(self.hardware, sensors, self.connect_arduino)
+        else:
+            self.sensor_watcher = SensorWatcher(sensors, sensor_poll_interval, self.connect_arduino)
+        self.sensor_watcher.start()
+        self.after(sensor_event_check_interval, self.check_sensor_events)
 
-        self.once_fsr_passed()
+        # Decode the other images while the window is idle
+        # The pictures of the frame are decoded one at a time by the slideshow
+        self.images.warm(self, asset_files(assets_folder, ".png"))
 
-        # Once the fsr is pressed, wait for the load cell weight to be heavy enough
-        while not get_arduino_sensor_status("load cell"):
-            pass
+    def mark_startup(self, phase: str):
+        """
+        End a startup phase, if the startup is measured.
+        :param phase: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self.startup_timer is not None:
+            self.startup_timer.mark(phase)
 
-        # Once the load cell weight is enough
-        self.once_load_cell_passed()
-        # Bind mouse left click to the mouse_left_click function
-        self.bind("<Button-1>", self.mouse_left_click)
+    def resume_game(self):
+        """
+        Replay the journal: the game in progress is resumed if the program stopped during a game,
+        else a new game is started in the journal. Start writing the journal.
+        Return the view the players were on, None if there was none.
+        The arduino is set up again at startup, the progress of the sensors comes from the journal.
+        The countdown goes on from its start, the time the program was stopped is counted,
+        unless the game was already solved.
+        :return: string or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.2
+        """
+        try:
+            progress = replay(game_records(self.journal.load()))
+            if progress["state"] is not None:
+                self.puzzle.restore(progress["state"], progress["completed"])
+                self.clock.penalties = progress["penalties"]
+                if progress["clock started"] is not None:
+                    self.clock.start(max(0, time.time() - progress["clock started"]))
+                # A solved game keeps the time it was solved in
+                if progress["clock remaining"] is not None:
+                    self.clock.stop(progress["clock remaining"])
+                print("Game resumed in state %s, %d tasks completed" % (self.puzzle.state,
+                                                                        self.puzzle.completed_count))
+            else:
+                self.journal.compact([{"event": "new game"}])
+        except (OSError, ValueError) as error:
+            # The game is still playable without journal
+            print("Journal not replayed: %s" % error)
+            progress = {"view": None}
+        self.journal.start()
+        return progress["view"]
+
+    def connect_arduino(self):
+        """
+        Wait for the arduino, set it up and start the push and stream modes.
+        Called from the thread of the sensor watcher, must not use the window.
+        If the arduino is not there yet, the setup and the modes are sent once it is connected.
+        :author: AUGUSTIN NOGUE
+        :version: 1.3
+        """
+        # The port is opened and the arduino waited for by the serial link, see serial_link.py
+        if not self.hardware.wait_arduino_connected(2 * arduino_ready_timeout):
+            print("Arduino not connected yet, it is set up once connected")
+        self.mark_startup("arduino ready")
+        # Setup arduino
+        commands = [self.hardware.setup_arduino()]
+        if push_mode:
+            commands.append(self.hardware.enable_push_mode())
+        if sensor_stream:
+            commands.append(self.hardware.enable_sensor_stream())
+        for command in commands:
+            try:
+                # None if the mode was already on
+                if command is not None:
+                    command.result()
+            except (TimeoutError, ConnectionError) as error:
+                print("Arduino not set up yet: %s" % error)
+        self.mark_startup("arduino setup")
+        self.arduino_ready.set()
+        if self.startup_timer is not None:
+            self.startup_timer.save(startup_log_file)
 
     def mouse_left_click(self, event):
         """
         Record the different left mouse click even and react base on their coordinates
         :param event: event
         :author: AUGUSTIN NOGUE
-        :version: 1.0
+        :version: 1.5
         """
+        session.record("click", (event.x, event.y))
+        # Once the game is lost only the exit of the top right corner works
+        if self.puzzle.state == self.puzzle.lost and not (event.x > 1800 and event.y < 100):
+            return
         # Center Left of the screen
         if event.x < 960 and 100 < event.y < 880 and self.in_selection_screen and not self.win_conditions():
             # Load the floppy view
@@ -84,11 +276,15 @@ class MainWindow(tk.Tk):
             self.in_selection_screen = False
         # Top left of the screen
         if event.x < 960 and event.y < 100 and not self.win_conditions():
+            # Stop scanning if the player leaves the RFID view during the scan
+            self.cancel_rfid_scan()
+            self.cancel_floppy_check()
             # Back to the wait screen for player actions
             self.once_load_cell_passed()
         # Top right of the screen
         if event.x > 1800 and event.y < 100:
-            deactivate_solenoide()
+            report_command_failure(self.hardware.deactivate_solenoide(), "Desk unlock")
+            self.game_over()
             # Leave the program
             exit()
         # Bottom of the screen
@@ -96,6 +292,42 @@ class MainWindow(tk.Tk):
             # End screen
             self.end_screen()
 
+    def stop_services(self):
+        """
+        Stop the background threads watching the hardware, the watching of the hint pipe and the mirror.
+        :author: AUGUSTIN NOGUE
+        :version: 1.2
+        """
+        self.sensor_watcher.stop()
+        self.rfid_service.stop()
+        self.floppy_reader.stop()
+        self.operator_hints.close()
+        if self.mirror is not None:
+            self.mirror.close()
+
+    def mirror_status(self) -> dict:
+        """
+        Return the state of the game shown by the mirror, next to the scene.
+        :return: dict
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return {"state": self.puzzle.state, "view": self.view, "completed": list(self.puzzle.completed)}
+
+    def game_over(self):
+        """
+        Write the end of the game in the journal at once, the next start is a new game.
+        The end is recorded in the session too.
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        session.record("end", {"state": self.puzzle.state, "completed": list(self.puzzle.completed)})
+        self.journal.append({"event": "game over"})
+        try:
+            self.journal.flush()
+        except OSError as error:
+            print("Journal not written: %s" % error)
+
     def exit(self):
         """
         Exit function link to the escape key
@@ -111,15 +343,12 @@ class MainWindow(tk.Tk):
         Return true if they are and false if they aren't.
         :return: bool
         :author: AUGUSTIN NOGUE
-        :version: 1.0
+        :version: 1.1
         """
-        # Check if there is task not completed
-        for task in self.tasks_status:
-            if not task:
-                return False
-
-        return True
+        # The puzzle counts the completed tasks
+        return self.puzzle.is_solved()
 
+    @timed
     def display_image(self, image: str, coord: tuple, clear: bool):
         """
         Display image based on the coordinates (coord) and the path of the file.
@@ -130,272 +359,499 @@ class MainWindow(tk.Tk):
         :param coord: tuple
         :param clear: boolean
         :author: AUGUSTIN NOGUE
-        :version: 1.0
+        :version: 1.2
         """
         assert type(image) == str, 'Wrong file name type, should be string'
         assert image.endswith('.png'), 'Image should be of type .png'
         assert type(coord) == tuple, 'Coordinates should be a tuple'
         assert (all(isinstance(c, int) for c in coord) or all(isinstance(c, float) for c in coord)), \
             'Coordinates should be int or float'
+
+        # Display of the image, decoded once and then taken from the cache
+        self.picture = self.images.get(image)
+        self.scene.configure("picture", image=self.picture)
+        self.scene.move("picture", coord)
         # Clear window
         if clear:
-            self.main_window.delete("all")
+            self.scene.show(["picture"])
+        else:
+            self.scene.show(self.scene.visible | {"picture"})
 
-        # Display of the image
-        self.picture = tk.PhotoImage(file=image)
-        self.main_window.create_image(coord, image=self.picture)
-        self.update()
+    def build_scene(self):
+        """
+        Create every item of the window once. They are hidden, each view shows the items it needs.
+        The items are drawn in their creation order: the content first, then the informative layout.
+        :author: AUGUSTIN NOGUE
+        :version: 1.2
+        """
+        # Content of the views
+        self.scene.add("picture", "image", self.CENTER_COORD)
+        # Cover of the picture during the fade of the picture frame
+        self.scene.add("fade", "rectangle", (0, 0, self.x_size, self.y_size), fill="black", outline="")
+        self.scene.add("clue_title", "text", self.TOP_CENTER_COORD, text="Here is a clue!", fill="white",
+                       font=(None, 50))
+        self.scene.add("message", "text", self.CENTER_COORD, fill="orange", font=(None, 100))
+        # Text hint, shown on every view until the state changes
+        self.scene.add("hint", "text", (self.x_size / 2, self.y_size - 250), fill="white", font=(None, 35))
+        # Selection screen
+        self.scene.add("floppy_logo", "image", self.RIGHT_COORD, image=self.images.get(assets_folder + '/save.png'))
+        self.scene.add("floppy_label", "text", ((self.x_size / 2) / 2, 550), text="Insert Floppy Disk",
+                       fill="orange", font=(None, 70))
+        self.scene.add("rfid_logo", "image", self.LEFT_COORD, image=self.images.get(assets_folder + '/rfid_logo.png'))
+        self.scene.add("rfid_label", "text", (self.x_size - (self.x_size / 2) / 2, 550), text="Scan RFID card",
+                       fill="orange", font=(None, 70))
+        # RFID scan result
+        self.scene.add("scan_status", "text", (self.x_size / 2, (self.y_size / 2) - 100), fill=self.unamur_green,
+                       font=(None, 70))
+        self.scene.add("scan_result", "text", (self.x_size / 2, (self.y_size / 2) + 70), fill="orange",
+                       font=(None, 100))
+        self.scene.add("scan_warning", "text", (self.x_size / 2, (self.y_size / 2) + 200),
+                       text="One less chance available, careful now !", fill="orange", font=(None, 70))
+        # Countdown of the game, shown on every view once started
+        self.scene.add("clock", "text", (self.x_size - 130, 150), fill="white", font=(None, 40))
+
+        # Informative layout
+        # Header
+        self.scene.add("header", "rectangle", (0, 0, self.x_size, 100), fill=self.unamur_green)
+        self.scene.add("header_text", "text", self.TOP_CENTER_COORD, fill="black", font=(None, 65))
+        # Footer
+        self.scene.add("footer", "rectangle", (0, self.y_size - 200, self.x_size, self.y_size),
+                       fill=self.unamur_green)
+        # Separator
+        self.scene.add("separator", "rectangle", ((self.x_size / 2) - 5, 100, (self.x_size / 2) + 5,
+                                                  self.y_size - 200), fill=self.unamur_green)
+        # Back button
+        self.scene.add("back_button", "image", (50, 50), image=self.images.get(assets_folder + '/back_button.png'))
+        # Access to the end screen
+        self.scene.add("win_link", "text", (950, self.y_size - 100), text="Click here to access win screen",
+                       fill="orange", font=(None, 70))
+        # Information of the solving steps of the game
+        self.scene.add("steps_title", "text", (200, self.y_size - 170), text="Steps completed: ", fill="black",
+                       font=(None, 30))
+        # One status per task, spread over the width of the screen
+        for i in range(len(self.puzzle.tasks)):
+            self.scene.add("task_%d" % i, "text", (self.x_size * (2 * i + 1) / (2 * len(self.puzzle.tasks)),
+                                                   self.y_size - 100), fill="black", font=(None, 30))
 
     def picture_frame(self, pictures_list: list, time_between_pictures: int):
         """
-        Cycle through the picture list displaying them.
+        Cycle through the picture list displaying them, starting with the last one.
         Time in between images are given by the integer time_between_pictures
         :param pictures_list: list
         :param time_between_pictures: int
         :author: AUGUSTIN NOGUE
-        :version: 1.0
+        :version: 1.1
         """
         assert all(isinstance(picture, str) for picture in pictures_list), 'Picture name should be a string'
         assert all(picture.endswith('.png') for picture in pictures_list), 'Picture should be a .png file'
         assert type(time_between_images) == int, 'time between pictures should be an integer'
-        i = 0
-        modulo = len(pictures_list)
-        # Picture Frame loop waiting for fsr activation
-        while not get_arduino_sensor_status("fsr"):
-            # Display last image waiting for the serial communication to be established
-            self.display_image(pictures_list[(i % modulo)], self.CENTER_COORD, True)
-            i += 1
-            time_before = time.time()
-            # Wait for the specified amount of time between pictures while checking for fsr status.
-            while time.time() - time_before < time_between_pictures and not get_arduino_sensor_status("fsr"):
-                pass
+        # The next picture is prepared in the background while one is displayed
+        self.slideshow = Slideshow(self, self.scene, pictures_list, time_between_pictures * 1000,
+                                   lambda picture: self.display_image(picture, self.CENTER_COORD, True),
+                                   self.images, "fade", int(picture_fade_time * 1000))
+        self.slideshow.start(len(pictures_list) - 1)
+
+    def check_sensor_events(self):
+        """
+        Handle the sensor activations detected by the sensor watcher since the last call.
+        Reschedule itself as long as the watcher is running or events are waiting.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.sensor_watcher.dispatch(self.sensor_activated)
+        if self.sensor_watcher.is_running() or not self.sensor_watcher.events.empty():
+            self.after(sensor_event_check_interval, self.check_sensor_events)
+
+    def sensor_activated(self, sensor: str):
+        """
+        React to the activation of a sensor.
+        The transitions are given by the puzzle, the window displays the view of the new state:
+        with the default puzzle the fsr ends the picture frame, the load cell ends the desk error screen.
+        :param sensor: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.6
+        """
+        session.record("sensor", sensor)
+        if not self.puzzle.handle_sensor(sensor):
+            return
+        recorder.event(sensor, self.puzzle.state)
+        self.journal.append({"event": "sensor", "sensor": sensor, "state": self.puzzle.state})
+        # The first activation starts the countdown
+        if self.clock.started is None:
+            self.start_clock()
+        # Stop the picture frame
+        if self.slideshow is not None:
+            self.slideshow.stop()
+            self.slideshow = None
+        # The hints of the previous state are no longer needed
+        self.schedule_hints()
+        self.show_state_view()
+
+    def start_clock(self):
+        """
+        Start the countdown, its start is written in the journal so a resumed game keeps its time.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.clock.start()
+        self.journal.append({"event": "clock", "started": time.time()})
+        self.show_clock()
+
+    def show_clock(self):
+        """
+        Display the countdown on top of every view.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.scene.pin("clock")
+        self.update_clock()
+
+    @timed
+    def update_clock(self):
+        """
+        Display the remaining time, then wait until the displayed text changes: one item update
+        per second, scheduled with after() so the sensors and cards are handled in between.
+        The game is lost once the time or the chances run out.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self.clock_job is not None:
+            self.after_cancel(self.clock_job)
+            self.clock_job = None
+        if self.clock.is_running() and self.clock.is_lost():
+            self.lose_game()
+            return
+        remaining = self.clock.remaining()
+        self.scene.configure("clock", text=self.clock.text(), fill="red" if remaining < 60 else "white")
+        if self.clock.is_running():
+            self.clock_job = self.after(self.clock.next_change(), self.update_clock)
+
+    def lose_game(self):
+        """
+        The time or the chances ran out: the desk is locked again and the game is over.
+        :author: AUGUSTIN NOGUE
+        :version: 1.3
+        """
+        if not self.puzzle.lose():
+            return
+        self.clock.stop()
+        self.cancel_rfid_scan()
+        self.cancel_floppy_check()
+        self.hint_scheduler.cancel_all()
+        self.scene.unpin("hint")
+        self.in_selection_screen = False
+        report_command_failure(self.hardware.activate_solenoide(), "Desk lock")
+        recorder.event("lost")
+        self.game_over()
+        self.scene.configure("clock", text=self.clock.text(), fill="red")
+        self.scene.configure("message", text="Game Over", fill="red", font=(None, 100))
+        self.scene.show(["message"])
+
+    def show_state_view(self, view: str = None):
+        """
+        Display the view of the state of the puzzle.
+        Once the load cell is passed the players can be back on the floppy or RFID view they chose.
+        :param view: string or None, "floppy", "rfid" or None for the selection screen
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self.puzzle.state == "desk error":
+            self.once_fsr_passed()
+        elif self.puzzle.state in ("selection", "solved"):
+            # Bind mouse left click to the mouse_left_click function
+            self.bind("<Button-1>", self.mouse_left_click)
+            if view == "floppy":
+                self.floppy_view()
+            elif view == "rfid":
+                self.rfid_view()
+            else:
+                # Once the load cell weight is enough
+                self.once_load_cell_passed()
 
     def once_fsr_passed(self):
         """
         Display the after fsr is passed window
+        The clue for the load cell is a hint of the desk error state, see schedule_hints.
+        :author: AUGUSTIN NOGUE
+        :version: 1.2
+        """
+        # Desk error text
+        self.scene.configure("message", text="Desk Error Detected!", fill="white", font=(None, 100))
+        self.scene.show(["message"])
+
+    def schedule_hints(self):
+        """
+        Schedule the hints of the state of the puzzle, the hints of the previous state are cancelled.
+        Their images are decoded now, the hint is displayed at once when it is due.
         :author: AUGUSTIN NOGUE
         :version: 1.0
         """
-        # Delete all elements of main window
-        self.main_window.delete("all")
-        # Create desk error text
-        self.main_window.create_text(self.CENTER_COORD, text="Desk Error Detected!", fill="white", font=(None, 100))
-        # Update main window
-        self.update()
-        if not get_arduino_sensor_status("load cell"):
-            time_before = time.time()
-            # Wait for the specified amount of time between pictures while checking for fsr status.
-            while time.time() - time_before < time_before_lc_clue and not get_arduino_sensor_status("load cell"):
-                pass
-            # Call the function to display clue for the load cell if the load cell wasn't activated in time.
-            if not get_arduino_sensor_status("load cell"):
-                self.load_cell_clue()
-
-    def load_cell_clue(self):
-        """
-        Function to display the clue for the load cell.
+        hints = self.puzzle.hints.get(self.puzzle.state, [])
+        self.hint_scheduler.schedule_state(hints)
+        self.scene.unpin("hint")
+        self.images.warm(self, [assets_folder + '/' + hint.image for hint in hints if hint.image is not None])
+
+    def show_hint(self, hint: Hint):
+        """
+        Give a hint to the players. An image hint replaces the view, like the clue of the load cell,
+        a text hint stays at the bottom of every view until the state changes.
+        :param hint: Hint
         :author: AUGUSTIN NOGUE
         :version: 1.0
         """
-        self.main_window.delete("all")
-        self.display_image(assets_folder + '/clean_desk_clue.png', self.CENTER_COORD, True)
-        self.main_window.create_text(self.TOP_CENTER_COORD, text="Here is a clue!", fill="white", font=(None, 50))
-        self.update()
+        recorder.count("hint " + hint.name)
+        if hint.image is not None:
+            self.display_image(assets_folder + '/' + hint.image, self.CENTER_COORD, True)
+            self.scene.configure("clue_title", text=hint.text or "Here is a clue!")
+            self.scene.show(["picture", "clue_title"])
+        else:
+            self.scene.configure("hint", text=hint.text)
+            self.scene.pin("hint")
+
+    def show_operator_hint(self, text: str):
+        """
+        Give at once the hint written by the operator in the hint pipe.
+        :param text: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        session.record("hint", text)
+        self.show_hint(Hint("operator", self.puzzle.state, 0, text, None))
 
-    def informative_layout(self, top_page_text: str, separator: bool, back_button: bool):
+    @timed
+    def informative_layout(self, top_page_text: str, separator: bool, back_button: bool) -> list:
         """
-        Function to display the informative layout.
+        Function to update the informative layout and return the name of its items to show.
         It consist of a header, a text in the header, a footer and a middle of a screen.
         If the boolean separator is true then the middle of the screen is divided in two equal parts by a separator.
         If the back button boolean is true then a back button is displayed on the top left corner.
         :param top_page_text: str
         :param separator: boolean
         :param back_button: boolean
+        :return: list of strings
         :author: AUGUSTIN NOGUE
-        :version: 1.0
+        :version: 1.2
         """
 
         assert type(top_page_text) == str, 'Top page text should be of type string'
         assert type(separator) == bool, 'Separator should be of type bool'
         assert type(back_button) == bool, 'Back button should be of type bool'
 
-        # Header
-        self.main_window.create_rectangle(0, 0, self.x_size, 100, fill=self.unamur_green)
-        self.main_window.create_text(self.TOP_CENTER_COORD, text=top_page_text, fill="black", font=(None, 65))
-        # Footer
-        self.main_window.create_rectangle(0, self.y_size - 200, self.x_size, self.y_size, fill=self.unamur_green)
+        # Header and footer
+        self.scene.configure("header_text", text=top_page_text)
+        layout = ["header", "header_text", "footer"]
         # Separator
         if separator:
-            self.main_window.create_rectangle((self.x_size / 2) - 5, 100, (self.x_size / 2) + 5, self.y_size - 200,
-                                              fill=self.unamur_green)
+            layout.append("separator")
         # Back button
         if back_button and not self.win_conditions():
-            self.display_image(assets_folder + '/back_button.png', (50, 50), False)
+            layout.append("back_button")
 
         # if winning conditions are met display and back button is true the access to end screen
         if back_button and self.win_conditions():
-            self.main_window.create_text((950, self.y_size - 100), text="Click here to access win screen",
-                                         fill="orange", font=(None, 70))
+            layout.append("win_link")
         else:
             # information of the solving steps of the game
-            self.main_window.create_text((200, self.y_size - 170), text="Steps completed: ", fill="black",
-                                         font=(None, 30))
-            self.main_window.create_text((150, self.y_size - 100), text="1: %s" % str(self.tasks_status[0]),
-                                         fill="black", font=(None, 30))
-            self.main_window.create_text((550, self.y_size - 100), text="2: %s" % str(self.tasks_status[1]),
-                                         fill="black", font=(None, 30))
-            self.main_window.create_text((950, self.y_size - 100), text="3: %s" % str(self.tasks_status[2]),
-                                         fill="black", font=(None, 30))
-            self.main_window.create_text((1350, self.y_size - 100), text="4: %s" % str(self.tasks_status[3]),
-                                         fill="black", font=(None, 30))
-            self.main_window.create_text((1750, self.y_size - 100), text="5: %s" % str(self.tasks_status[4]),
-                                         fill="black", font=(None, 30))
-
-        self.update()
+            layout.append("steps_title")
+            for i, task in enumerate(self.puzzle.tasks):
+                self.scene.configure("task_%d" % i, text="%s: %s" % (task.name, str(self.puzzle.completed[i])))
+                layout.append("task_%d" % i)
+
+        return layout
 
     def once_load_cell_passed(self):
         """
         Display the after load cell is passed window
         :author: AUGUSTIN NOGUE
-        :version: 1.0
+        :version: 1.3
         """
-        # Delete all elements of main window
-        self.main_window.delete("all")
-        # Floppy Logo
-        self.picture1 = tk.PhotoImage(file=assets_folder + '/save.png')
-        self.main_window.create_image(self.RIGHT_COORD, image=self.picture1)
-        self.main_window.create_text(((self.x_size / 2) / 2, 550), text="Insert Floppy Disk", fill="orange",
-                                     font=(None, 70))
-        # Rfid Logo
-        self.picture2 = tk.PhotoImage(file=assets_folder + '/rfid_logo.png')
-        self.main_window.create_image(self.LEFT_COORD, image=self.picture2)
-        self.main_window.create_text((self.x_size - (self.x_size / 2) / 2, 550), text="Scan RFID card",
-                                     fill="orange", font=(None, 70))
-
-        # Load the layout
-        self.informative_layout("Tap your choice: ", True, False)
+        self.view = "selection"
+        self.journal.append({"event": "view", "view": "selection"})
+        # Floppy and RFID logos and the layout
+        self.scene.show(["floppy_logo", "floppy_label", "rfid_logo", "rfid_label"] +
+                        self.informative_layout("Tap your choice: ", True, False))
         self.in_selection_screen = True
 
     def floppy_view(self):
         """
         Display the floppy view after the floppy read was chosen by the player
         :author: AUGUSTIN NOGUE
+        :version: 1.3
+        """
+        self.view = "floppy"
+        self.journal.append({"event": "view", "view": "floppy"})
+        # Waiting text to display and informative layout
+        self.scene.configure("message", text="Wait a minute will you \nIt's old tech !", fill="orange",
+                             font=(None, 100))
+        self.scene.show(["message"] + self.informative_layout("Reading data from Floppy Disk: ", False, True))
+        # The disk is read in the background, make sure it is still the same disk
+        self.floppy_text = None
+        self.floppy_reader.refresh()
+        self.check_floppy()
+
+    def check_floppy(self):
+        """
+        Display the text of the floppy disk once it is read, else check again later.
+        A text already displayed is replaced if another disk is inserted.
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        self.floppy_job = None
+        if self.floppy_reader.status == "error":
+            text = "An error occurred"
+        else:
+            text = self.floppy_reader.get_text()
+        if text is not None and text != self.floppy_text:
+            session.record("floppy", (self.floppy_reader.status, self.floppy_reader.get_text()))
+            self.floppy_text = text
+            self.floppy_text_view(text)
+        self.floppy_job = self.after(floppy_check_interval, self.check_floppy)
+
+    def cancel_floppy_check(self):
+        """
+        Stop checking the floppy disk once the player leaves the floppy view.
+        :author: AUGUSTIN NOGUE
         :version: 1.0
         """
-        # Delete all elements of main window
-        self.main_window.delete("all")
-        # Waiting text to display
-        self.main_window.create_text(self.CENTER_COORD, text="Wait a minute will you \nIt's old tech !", fill="orange",
-                                     font=(None, 100))
-        # Load informative layout
-        self.informative_layout("Reading data from Floppy Disk: ", False, True)
-        # Load text from floppy disk
-        text = text_from_floppy(floppy_path + "/clue.txt")
-        
+        if self.floppy_job is not None:
+            self.after_cancel(self.floppy_job)
+            self.floppy_job = None
+
+    def floppy_text_view(self, text: str):
+        """
+        Display the text read from the floppy disk.
+        :param text: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
         # Smaller font for bigger clues
         if len(text) > 300:
             font_size = 20
         else:
             font_size = 30
 
-        # Delete all elements of main window
-        self.main_window.delete("all")
-        # Text from floppy disk
-        self.main_window.create_text(self.CENTER_COORD, text=text, fill="orange",
-                                     font=(None, font_size))
-        # Load informative layout
-        self.informative_layout("Reading data from Floppy Disk: ", False, True)
+        # Text from floppy disk and informative layout
+        self.scene.configure("message", text=text, fill="orange", font=(None, font_size))
+        self.scene.show(["message"] + self.informative_layout("Reading data from Floppy Disk: ", False, True))
 
     def rfid_view(self):
         """
         Display the RFID view after the RFID scan was chosen by the player.
         The information will change base on the card scanned.
         :author: AUGUSTIN NOGUE
+        :version: 1.3
+        """
+        self.view = "rfid"
+        self.journal.append({"event": "view", "view": "rfid"})
+        # Scanning badge text and informative layout
+        self.scene.configure("message", text="Scanning Badge...", fill="orange", font=(None, 100))
+        self.scene.show(["message"] + self.informative_layout("RFID SCAN: ", False, True))
+        # Scan RFID card in the background, the window keeps reacting to clicks
+        self.rfid_service.start_scan()
+        self.rfid_scan_job = self.after(rfid_check_interval, self.check_rfid_scan)
+
+    def check_rfid_scan(self):
+        """
+        Display the scan result once a card was read, else check again later.
+        :author: AUGUSTIN NOGUE
+        :version: 1.2
+        """
+        result = self.rfid_service.get_result()
+        if result is None:
+            self.rfid_scan_job = self.after(rfid_check_interval, self.check_rfid_scan)
+            return
+        self.rfid_scan_job = None
+        scan, read_time = result
+        session.record("scan", scan)
+        self.rfid_scan_result(scan)
+        self.rfid_service.record_feedback(read_time)
+
+    def cancel_rfid_scan(self):
+        """
+        Cancel the RFID scan in progress, if any.
+        :author: AUGUSTIN NOGUE
         :version: 1.0
         """
-        # Delete all elements of main window
-        self.main_window.delete("all")
-        # Scanning badge text
-        self.main_window.create_text(self.CENTER_COORD, text="Scanning Badge...", fill="orange",
-                                     font=(None, 100))
-        # Load informative layout
-        self.informative_layout("RFID SCAN: ", False, True)
-        # Scan RFID card
-        scan = rfid_scan()
-        # Delete all elements of main window
-        self.main_window.delete("all")
+        if self.rfid_scan_job is not None:
+            self.after_cancel(self.rfid_scan_job)
+            self.rfid_scan_job = None
+            self.rfid_service.cancel_scan()
+
+    def rfid_scan_result(self, scan: list):
+        """
+        Display the result of the RFID scan.
+        The information will change base on the card scanned.
+        :param scan: list of integers, empty if the scan failed
+        :author: AUGUSTIN NOGUE
+        :version: 1.6
+        """
+        items = ["scan_status"]
         # if scan was done
         if scan:
-            self.main_window.create_text((self.x_size / 2, (self.y_size / 2) - 100), text="Badge Scanned successfully",
-                                         fill=self.unamur_green, font=(None, 70))
-            i = 0
-            # Run through the task and UIDS list to check if the card link to them is in it
-            while i < 5:
-                # If the card is the right one and the task linked to it is not completed
-                if scan == rfid_uids[i] and self.tasks_status[i] is False:
-                    # If the task number is strictly bigger than 0 and the task before it is false
-                    if i > 0 and not self.tasks_status[i-1]:
-                        self.main_window.create_text((self.x_size / 2, (self.y_size / 2) + 70),
-                                                     text="Wrong order", fill="orange", font=(None, 100))
-                        self.main_window.create_text((self.x_size / 2, (self.y_size / 2) + 200),
-                                                     text="One less chance available, careful now !", fill="orange",
-                                                     font=(None, 70))
-                    # If the task is the first one or the task before it is completed
-                    else:
-                        self.tasks_status[i] = True
-                        self.main_window.create_text((self.x_size / 2, (self.y_size / 2) + 70),
-                                                     text="Task %s has been completed" % str(i + 1), fill="orange",
-                                                     font=(None, 100))
-                    break
-
-                # If the card is the right one and the task linked to it is completed
-                elif scan == rfid_uids[i] and self.tasks_status[i] is True:
-                    self.main_window.create_text((self.x_size / 2, (self.y_size / 2) + 70),
-                                                 text="Task %s has already been completed" % str(i + 1),
-                                                 fill="orange",
-                                                 font=(None, 70))
-                    break
-                # If the card is a wrong card
-                else:
-                    i += 1
-                    if i == 5:
-                        self.main_window.create_text((self.x_size / 2, (self.y_size / 2) + 70),
-                                                     text="Wrong Card", fill="orange", font=(None, 100))
-                        self.main_window.create_text((self.x_size / 2, (self.y_size / 2) + 200),
-                                                     text="One less chance available, careful now !", fill="orange",
-                                                     font=(None, 70))
+            self.scene.configure("scan_status", text="Badge Scanned successfully")
+            items.append("scan_result")
+            # The puzzle finds the task of the card and checks the order of the tasks
+            state = self.puzzle.state
+            result = self.puzzle.scan(scan)
+            if self.puzzle.is_solved():
+                self.clock.stop()
+                self.journal.append({"event": "clock stop", "remaining": self.clock.remaining()})
+            if self.puzzle.state != state:
+                self.schedule_hints()
+            recorder.count("scan " + result.outcome)
+            if result.outcome == "completed":
+                recorder.event("task", result.task.name)
+                self.journal.append({"event": "task", "task": result.task.name, "state": self.puzzle.state})
+            self.scene.configure("scan_result", text=result.message,
+                                 font=(None, 70 if result.outcome == "already completed" else 100))
+            # Wrong card or wrong order
+            if result.outcome in ("wrong card", "wrong order"):
+                items.append("scan_warning")
+                self.journal.append({"event": "penalty", "outcome": result.outcome})
+                self.clock.penalize()
+                if self.clock.chances_left() is not None:
+                    self.scene.configure("scan_warning", text="One less chance available, %d left, careful now !"
+                                         % self.clock.chances_left())
         # If there is a scan error
         else:
-            self.main_window.create_text((self.x_size / 2, (self.y_size / 2) - 100), text="Error scan badge",
-                                         fill=self.unamur_green, font=(None, 70))
+            self.scene.configure("scan_status", text="Error scan badge")
+            recorder.count("scan error")
         # Load informative layout
-        self.informative_layout("RFID SCAN: ", False, True)
+        self.scene.show(items + self.informative_layout("RFID SCAN: ", False, True))
+        # The penalty shows at once, the game can be lost
+        self.update_clock()
 
     def end_screen(self):
         """
         Display the end screen view after the player has completed all the tasks and tapes the go to end screen area.
         :author: AUGUSTIN NOGUE
-        :version: 1.0
+        :version: 1.5
         """
-        # Delete all elements of main window
-        # deactivate_solenoide()
-        self.main_window.delete("all")
+        recorder.event("end screen")
         # Load the victory image
-        self.win_image = tk.PhotoImage(file=assets_folder + '/congrats.png')
-        self.main_window.create_image(self.CENTER_COORD, image=self.win_image)
+        self.win_image = self.images.get(assets_folder + '/congrats.png')
+        self.scene.configure("picture", image=self.win_image)
+        self.scene.move("picture", self.CENTER_COORD)
+        report_command_failure(self.hardware.deactivate_solenoide(), "Desk unlock")
+        self.game_over()
         # Load informative layout
-        deactivate_solenoide()
-        self.informative_layout("Well Done: Desk is now open", False, False)
+        self.scene.show(["picture"] + self.informative_layout("Well Done: Desk is now open", False, False))
 
 
 if __name__ == "__main__":
-    # Setup arduino
-    setup_arduino()
-    # Automatically list of pictures to display in picture frame
-    pictures_for_frame = get_files_in_directory(picture_frame_folder, ".png")
-    w = MainWindow()
+    # The startup is measured from the start of the process, the imports included
+    timer = StartupTimer()
+    timer.mark("imports")
+    # Duration of the hot paths and game events, written by batches to the session log
+    recorder.open(telemetry_folder, telemetry_flush_interval)
+    # What the hardware and the players did, to replay the session (session_replay.py)
+    if session_record_folder is not None:
+        session.open(session_record_folder)
+    w = MainWindow(timer)
     w.mainloop()
+    w.stop_services()
+    w.journal.close()
+    recorder.close()
     # Cleanup arduino
-    cleanup_arduino()
-
-
+    w.hardware.cleanup_arduino()
+    session.close()
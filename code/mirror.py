@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: April 7, 2022
+# Last Modified: April 7, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Mirror of the window for the game master: the items of the scene (scene.py) and the state of the game
+# are sent on a Unix socket (mirror_socket) as a stream of frames, one JSON line each:
+#   {"seq": n, "key": true, "order": [names], "items": {name: options}, "game": {...}}   whole scene
+#   {"seq": n, "items": {name: options changed}, "game": {...} if changed}            changes only
+# A viewer gets the whole scene when it connects, then only the changes. The images are given by
+# their path. Each frame is encoded once by the window, whatever the number of viewers, and sent to
+# the viewers by a background thread; a viewer too slow to follow gets the whole scene again.
+#     python3 mirror.py                      viewer, at half the size of the screen
+#     python3 mirror.py --benchmark 1 10 100 cost of the frames for 1, 10 and 100 viewers
+
+import argparse
+import json
+import os
+import select
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import tkinter as tk
+from configuration import *
+from scene import Scene
+
+
+def apply_frame(model: dict, frame: dict) -> bool:
+    """
+    Apply a frame to the model of the scene {"seq", "order", "items", "game"} kept by a viewer.
+    A frame of changes that does not follow the last frame applied is ignored, the viewer waits
+    for the whole scene. Return True if the frame was applied.
+    :param model: dict
+    :param frame: dict
+    :return: bool
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    if frame.get("key"):
+        model.clear()
+        model.update(seq=frame["seq"], order=list(frame["order"]), items={}, game=frame.get("game"))
+    elif model.get("seq") is None or frame["seq"] != model["seq"] + 1:
+        return False
+    else:
+        model["seq"] = frame["seq"]
+    for name, changes in frame["items"].items():
+        if name not in model["items"]:
+            model["items"][name] = {}
+            if name not in model["order"]:
+                model["order"].append(name)
+        model["items"][name].update(changes)
+    if frame.get("game") is not None:
+        model["game"] = frame["game"]
+    return True
+
+
+class MirrorConnection:
+    def __init__(self, connection: socket.socket):
+        """
+        Viewer connected to the mirror: its socket and the bytes not sent yet.
+        :param connection: socket
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        self.socket = connection
+        self.pending = b""
+        # False while a line is partly sent, its end must be sent before any other line
+        self.line_start = True
+        # The whole scene is sent first, and again once the viewer could not follow
+        self.needs_key = True
+
+
+class SceneMirror:
+    def __init__(self, scene: Scene, path: str, status=None, image_path=None, schedule=None,
+                 max_buffer: int = 256 * 1024):
+        """
+        Mirror of the scene, see the top of the file. The changes of the scene are gathered and sent
+        as one frame by flush, called by the schedule function once the window is idle.
+        :param scene: Scene
+        :param path: string, path of the socket
+        :param status: function or None, returning the state of the game (JSON value)
+        :param image_path: function or None, returning the path of an image of the scene
+        :param schedule: function or None, calling the function given once the window is idle (after_idle)
+        :param max_buffer: int, bytes waiting for a viewer before it gets the whole scene again instead
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(path) == str, "Path should be a string"
+
+        self.path = path
+        self.status = status
+        self.image_path = image_path
+        self.schedule = schedule
+        self.max_buffer = max_buffer
+        # Frames sent, whole scenes sent, viewers that could not follow and bytes sent to the viewers
+        self.seq = 0
+        self.keyframes = 0
+        self.resyncs = 0
+        self.bytes_sent = 0
+        # Seconds spent encoding the frames in the window, and CPU seconds of the thread sending them
+        self.encode_time = 0.0
+        self.send_cpu = 0.0
+        # Options of every item as sent, in the drawing order, and the last state of the game sent
+        self._order = list(scene.items)
+        self._snapshot = {}
+        for name in scene.items:
+            visible = tk.NORMAL if name in scene.visible else tk.HIDDEN
+            self._snapshot[name] = self._encode(dict(scene.options[name], kind=scene.kinds[name], state=visible))
+        self._game = None
+        self._pending = {}
+        self._flush_scheduled = False
+        self._frames = []
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._listener = None
+        self._wake_reader = self._wake_writer = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        scene.watch(self.changed)
+
+    def open(self):
+        """
+        Listen on the socket and start sending the frames. Raise OSError if the socket cannot be created.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Left by a window that crashed
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        self._listener.listen(16)
+        self._listener.setblocking(False)
+        self._wake_reader, self._wake_writer = os.pipe()
+        os.set_blocking(self._wake_writer, False)
+        self._thread = threading.Thread(target=self._run, name="SceneMirror", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """
+        Stop sending the frames and disconnect the viewers.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._wake()
+        self._thread.join(1)
+        self._thread = None
+        for connection in list(self._clients):
+            connection.close()
+        self._clients.clear()
+        self._listener.close()
+        os.close(self._wake_reader)
+        os.close(self._wake_writer)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def viewers(self) -> int:
+        """
+        Return the number of viewers connected.
+        :return: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return len(self._clients)
+
+    def changed(self, name: str, changes: dict):
+        """
+        Keep a change of the scene until the next frame (Scene watcher).
+        :param name: string
+        :param changes: dict
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._pending.setdefault(name, {}).update(changes)
+        if not self._flush_scheduled and self.schedule is not None:
+            self._flush_scheduled = True
+            self.schedule(self.flush)
+
+    def flush(self):
+        """
+        Send the changes kept and the state of the game if it changed, as one frame.
+        Nothing is encoded while no viewer is connected, only the scene kept for the next viewer is updated.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._flush_scheduled = False
+        start = time.perf_counter()
+        game = self.status() if self.status is not None else None
+        if not self._pending and game == self._game:
+            return
+        items = {name: self._encode(changes) for name, changes in self._pending.items()}
+        self._pending = {}
+        with self._lock:
+            self.seq += 1
+            for name, changes in items.items():
+                if name not in self._snapshot:
+                    self._snapshot[name] = {}
+                    self._order.append(name)
+                self._snapshot[name].update(changes)
+            frame = {"seq": self.seq, "items": items}
+            if game != self._game:
+                frame["game"] = self._game = game
+            if self._clients:
+                self._frames.append(self._line(frame))
+        if self._clients:
+            self._wake()
+        self.encode_time += time.perf_counter() - start
+
+    def keyframe(self) -> dict:
+        """
+        Return the frame of the whole scene.
+        :return: dict
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with self._lock:
+            return {"seq": self.seq, "key": True, "order": list(self._order),
+                    "items": {name: dict(options) for name, options in self._snapshot.items()}, "game": self._game}
+
+    def _encode(self, changes: dict) -> dict:
+        """
+        Return the options of an item as JSON values, the images by their path.
+        :param changes: dict
+        :return: dict
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        encoded = {}
+        for key, value in changes.items():
+            if key == "image":
+                value = self.image_path(value) if self.image_path is not None and value is not None else None
+            elif isinstance(value, tuple):
+                value = list(value)
+            elif not isinstance(value, (str, int, float, list, type(None))):
+                value = str(value)
+            encoded[key] = value
+        return encoded
+
+    @staticmethod
+    def _line(frame: dict) -> bytes:
+        """
+        Return the line of a frame.
+        :param frame: dict
+        :return: bytes
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return json.dumps(frame, separators=(",", ":")).encode("utf-8") + b"\n"
+
+    def _wake(self):
+        """
+        Wake the thread sending the frames.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        try:
+            os.write(self._wake_writer, b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    def _run(self):
+        """
+        Background loop: accept the viewers, then send them the whole scene and the frames.
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        while not self._stop_event.is_set():
+            sockets = [self._listener, self._wake_reader] + list(self._clients)
+            waiting = [connection for connection, client in self._clients.items() if client.pending]
+            readable, writable, _ = select.select(sockets, waiting, [], 1)
+            cpu_start = time.thread_time()
+            if self._wake_reader in readable:
+                os.read(self._wake_reader, 4096)
+            if self._listener in readable:
+                try:
+                    connection, _ = self._listener.accept()
+                    connection.setblocking(False)
+                    with self._lock:
+                        self._clients[connection] = MirrorConnection(connection)
+                except BlockingIOError:
+                    pass
+            # The viewers send nothing, a readable viewer left
+            for connection in readable:
+                if connection in self._clients:
+                    try:
+                        if not connection.recv(4096):
+                            self._drop(connection)
+                    except OSError:
+                        self._drop(connection)
+            with self._lock:
+                frames = b"".join(self._frames)
+                self._frames = []
+            key = None
+            if any(client.needs_key for client in self._clients.values()):
+                key = self._line(self.keyframe())
+            for connection, client in list(self._clients.items()):
+                if client.needs_key:
+                    # The frames kept are already in the whole scene
+                    client.pending += key
+                    client.needs_key = False
+                    self.keyframes += 1
+                elif frames:
+                    client.pending += frames
+                    if len(client.pending) > self.max_buffer:
+                        # Only whole frames are dropped, the end of a line partly sent is kept
+                        if client.line_start:
+                            client.pending = b""
+                        else:
+                            client.pending = client.pending[:client.pending.index(b"\n") + 1]
+                        client.needs_key = True
+                        self.resyncs += 1
+                        continue
+                if client.pending:
+                    try:
+                        sent = connection.send(client.pending)
+                        if sent:
+                            client.line_start = client.pending[sent - 1:sent] == b"\n"
+                        client.pending = client.pending[sent:]
+                        self.bytes_sent += sent
+                    except BlockingIOError:
+                        pass
+                    except OSError:
+                        self._drop(connection)
+            if any(client.needs_key for client in self._clients.values()):
+                self._wake()
+            self.send_cpu += time.thread_time() - cpu_start
+
+    def _drop(self, connection: socket.socket):
+        """
+        Forget a viewer that left.
+        :param connection: socket
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with self._lock:
+            self._clients.pop(connection, None)
+        connection.close()
+
+
+class MirrorViewer(tk.Tk):
+    def __init__(self, path: str, scale: float):
+        """
+        Window of the game master showing the mirror of the window, smaller by scale.
+        The texts and rectangles are drawn, the images are shown by their file name.
+        :param path: string, path of the socket of the mirror
+        :param scale: float
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        super().__init__()
+        self.title("ENIGM-ESC mirror")
+        self.path = path
+        self.scale = scale
+        self.canvas = tk.Canvas(self, width=int(screen_size[0] * scale), height=int(screen_size[1] * scale),
+                                background="black", highlightthickness=0)
+        self.canvas.pack()
+        self.status_label = tk.Label(self, anchor="w", font=(None, 14))
+        self.status_label.pack(fill="x")
+        self.model = {}
+        # Canvas item and kind by name of the item of the scene
+        self.items = {}
+        self.kinds = {}
+        self._socket = None
+        self._buffer = b""
+        self.connect()
+
+    def connect(self):
+        """
+        Connect to the mirror, again every second until it answers.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._socket.connect(self.path)
+        except OSError:
+            self._socket.close()
+            self._socket = None
+            self.status_label.configure(text="Waiting for the window (%s)" % self.path)
+            self.after(1000, self.connect)
+            return
+        self._buffer = b""
+        self.tk.createfilehandler(self._socket, tk.READABLE, self._readable)
+
+    def _readable(self, connection, mask: int):
+        """
+        Read the frames received and draw them.
+        A damaged line leaves the model behind, the viewer connects again to get the whole scene.
+        :param connection: socket
+        :param mask: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        data = self._socket.recv(65536)
+        if not data:
+            self.tk.deletefilehandler(self._socket)
+            self._socket.close()
+            self.connect()
+            return
+        *lines, self._buffer = (self._buffer + data).split(b"\n")
+        for line in lines:
+            try:
+                frame = json.loads(line.decode("utf-8"))
+            except ValueError:
+                print("Damaged frame from the window, connecting again")
+                self.tk.deletefilehandler(self._socket)
+                self._socket.close()
+                self.connect()
+                return
+            if frame.get("key"):
+                self.canvas.delete("all")
+                self.items.clear()
+                self.kinds.clear()
+            if apply_frame(self.model, frame):
+                for name in self.model["order"]:
+                    if name in frame["items"]:
+                        self.draw(name, frame["items"][name])
+        game = self.model.get("game") or {}
+        self.status_label.configure(text="  ".join("%s: %s" % (key, value) for key, value in game.items()))
+
+    def draw(self, name: str, changes: dict):
+        """
+        Create or change the canvas item of an item of the scene.
+        :param name: string
+        :param changes: dict
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        options = {}
+        for key, value in changes.items():
+            if key == "font" and value:
+                value = (value[0], max(1, int(value[1] * self.scale)))
+            elif key == "image":
+                key, value = "text", "[%s]" % os.path.basename(value) if value else ""
+            elif key == "width":
+                value = value * self.scale
+            options[key] = value
+        coords = options.pop("coords", None)
+        if coords is not None:
+            coords = [coordinate * self.scale for coordinate in coords]
+        options.pop("kind", None)
+        if name not in self.items:
+            self.kinds[name] = self.model["items"][name].get("kind", "text")
+            if self.kinds[name] == "image":
+                options.setdefault("fill", "gray")
+            create = self.canvas.create_rectangle if self.kinds[name] == "rectangle" else self.canvas.create_text
+            self.items[name] = create(*coords, **options)
+            return
+        if options:
+            self.canvas.itemconfigure(self.items[name], **options)
+        if coords is not None:
+            self.canvas.coords(self.items[name], *coords)
+
+
+class NullCanvas:
+    def __init__(self):
+        """
+        Canvas drawing nothing, for the benchmark of the mirror without window.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.count = 0
+
+    def create_text(self, *coords, **options):
+        self.count += 1
+        return self.count
+
+    create_rectangle = create_image = create_text
+
+    def itemconfigure(self, item, **options):
+        pass
+
+    def coords(self, item, *coords):
+        pass
+
+
+def benchmark(viewer_counts: list, frames: int, interval: float) -> list:
+    """
+    Play the changes of a game on a scene like the one of the window, mirrored to each number of viewers,
+    and measure the encoding in the window, the sending and the bytes received by each viewer.
+    :param viewer_counts: list of ints
+    :param frames: int, frames for each number of viewers
+    :param interval: float, seconds between two frames
+    :return: list of dicts
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    results = []
+    folder = tempfile.mkdtemp()
+    try:
+        for count in viewer_counts:
+            scene = Scene(NullCanvas())
+            for name in ("picture", "message", "hint", "clock", "header_text", "scan_result"):
+                scene.add(name, "text", (960, 540), fill="orange", font=(None, 70))
+            for name in ("header", "footer", "separator"):
+                scene.add(name, "rectangle", (0, 0, 1920, 100), fill="#56b04c")
+            for i in range(5):
+                scene.add("task_%d" % i, "text", (192 * (2 * i + 1), 980), fill="black", font=(None, 30))
+            game = {"state": "selection", "view": "selection", "completed": [False] * 5}
+            mirror = SceneMirror(scene, os.path.join(folder, "mirror.sock"), lambda: dict(game))
+            mirror.open()
+            viewers = []
+            for _ in range(count):
+                viewer = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                viewer.connect(mirror.path)
+                viewers.append(viewer)
+            received = {viewer: [0, b"", {}] for viewer in viewers}
+            stop = threading.Event()
+
+            # The viewers read their frames in one thread, until they all have the last one
+            def read_viewers():
+                while not stop.is_set() or any(state[2].get("seq") != mirror.seq for state in received.values()):
+                    readable, _, _ = select.select(viewers, [], [], 0.1)
+                    for viewer in readable:
+                        state = received[viewer]
+                        data = viewer.recv(65536)
+                        state[0] += len(data)
+                        *lines, state[1] = (state[1] + data).split(b"\n")
+                        for line in lines:
+                            apply_frame(state[2], json.loads(line.decode("utf-8")))
+
+            reader = threading.Thread(target=read_viewers, name="MirrorViewers", daemon=True)
+            reader.start()
+            while mirror.viewers() < count or mirror.keyframes < count:
+                time.sleep(0.01)
+            key_bytes = mirror.bytes_sent
+            encode_start, send_start = mirror.encode_time, mirror.send_cpu
+            for frame in range(frames):
+                # The clock every second, a view or a task from time to time
+                scene.configure("clock", text="%02d:%02d" % divmod(3600 - frame, 60))
+                if frame % 10 == 0:
+                    scene.show(["message", "header", "header_text"] if frame % 20 else ["scan_result", "footer"])
+                    scene.configure("message", text="Scanning Badge... %d" % frame)
+                if frame % 50 == 25:
+                    game["completed"] = [i <= frame // 50 for i in range(5)]
+                    scene.configure("task_%d" % (frame // 50 % 5), text="Task done")
+                mirror.flush()
+                time.sleep(interval)
+            stop.set()
+            reader.join(10)
+            mirror.close()
+            for viewer in viewers:
+                viewer.close()
+            results.append({
+                "viewers": count,
+                "frames": frames,
+                "encode us per frame": (mirror.encode_time - encode_start) / frames * 1e6,
+                "send us per viewer per frame": (mirror.send_cpu - send_start) / frames / count * 1e6,
+                "bytes per viewer per frame": (mirror.bytes_sent - key_bytes) / frames / count,
+                "in sync": all(state[2].get("items") == mirror.keyframe()["items"] for state in received.values()),
+                "resyncs": mirror.resyncs,
+            })
+    finally:
+        shutil.rmtree(folder)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mirror of the window for the game master")
+    parser.add_argument("--socket", default=mirror_socket, help="socket of the mirror")
+    parser.add_argument("--scale", type=float, default=0.5, help="size of the viewer, relative to the screen")
+    parser.add_argument("--benchmark", type=int, nargs="+", metavar="VIEWERS",
+                        help="measure the cost of the frames for these numbers of viewers instead")
+    parser.add_argument("--frames", type=int, default=200, help="frames played by the benchmark")
+    arguments = parser.parse_args()
+
+    if arguments.benchmark:
+        print("%8s %14s %18s %16s %8s" % ("viewers", "encode us", "send us/viewer", "bytes/viewer", "in sync"))
+        for result in benchmark(arguments.benchmark, arguments.frames, 0.002):
+            print("%8d %14.1f %18.1f %16.1f %8s" % (result["viewers"], result["encode us per frame"],
+                                                    result["send us per viewer per frame"],
+                                                    result["bytes per viewer per frame"], result["in sync"]))
+    else:
+        MirrorViewer(arguments.socket, arguments.scale).mainloop()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 25, 2022
+# Last Modified: April 4, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Puzzle of the escape game, described in puzzle.json:
+#   states       phases of the game, the window has a view for each of them
+#   initial      state at the start of the game
+#   lost         state reached when the game clock or the chances run out (optional)
+#   transitions  {"from": state, "to": state, "sensor": sensor name} taken when the sensor is activated
+#                {"from": state, "to": state, "tasks": "all"} taken once every task is completed
+#   tasks        {"name": string, "uid": UID of the card, "after": names of the tasks to complete before}
+#   messages     text displayed for each scan result, {name} is replaced by the name of the task
+#   hints        {"name": string, "state": state, "after": seconds in the state, "text": string, "image": file name
+#                of Assets/} given to the players stuck in a state, a state can have hints of several tiers (optional)
+
+import collections
+import copy
+import json
+
+# Task of the puzzle, uid is the packed UID of its card (see pack_uid)
+Task = collections.namedtuple("Task", ["name", "uid", "after"])
+# Result of a scan: "completed", "already completed", "wrong order" or "wrong card",
+# task is None for a wrong card
+ScanResult = collections.namedtuple("ScanResult", ["outcome", "task", "message"])
+# Hint given delay seconds after the state is entered, image is None for a text hint (see hints.py)
+Hint = collections.namedtuple("Hint", ["name", "state", "delay", "text", "image"])
+
+
+def pack_uid(uid: list) -> bytes:
+    """
+    Pack the bytes of a card UID, used as key of the UID index.
+    The length of the UID is kept: UIDs differing only by leading zero bytes are different cards.
+    :param uid: list of integers between 0 and 255
+    :return: bytes
+    :author: AUGUSTIN NOGUE
+    :version: 1.1
+    """
+    assert all(type(byte) == int and 0 <= byte <= 255 for byte in uid), "UID should be a list of bytes"
+    return bytes(uid)
+
+
+class Puzzle:
+    def __init__(self, definition: dict):
+        """
+        State machine of the game built from its definition (see the top of the file).
+        The progress is kept up to date at each change, so every check is done in constant time.
+        :param definition: dict
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        assert type(definition) == dict, "Definition should be a dictionary"
+
+        self.states = list(definition["states"])
+        self.initial = definition["initial"]
+        self.messages = dict(definition["messages"])
+        self.lost = definition.get("lost")
+        if self.initial not in self.states:
+            raise ValueError("Unknown initial state %s" % self.initial)
+        if self.lost is not None and self.lost not in self.states:
+            raise ValueError("Unknown lost state %s" % self.lost)
+
+        # Transitions by (state, sensor) and the state reached once every task is completed, by state
+        self.sensor_transitions = {}
+        self.tasks_transitions = {}
+        for transition in definition["transitions"]:
+            if transition["from"] not in self.states or transition["to"] not in self.states:
+                raise ValueError("Unknown state in transition %s" % transition)
+            if "sensor" in transition:
+                self.sensor_transitions[(transition["from"], transition["sensor"])] = transition["to"]
+            else:
+                self.tasks_transitions[transition["from"]] = transition["to"]
+
+        # Tasks in order and index of the tasks by packed UID
+        self.tasks = []
+        self.uid_index = {}
+        names = {}
+        for task in definition["tasks"]:
+            uid = pack_uid(task["uid"])
+            if uid in self.uid_index:
+                raise ValueError("Card of task %s is already used by another task" % task["name"])
+            names[task["name"]] = len(self.tasks)
+            self.uid_index[uid] = len(self.tasks)
+            self.tasks.append(Task(task["name"], uid, list(task.get("after", []))))
+
+        # Tasks waiting for each task, to update the number of missing tasks when it is completed
+        self.dependents = [[] for _ in self.tasks]
+        for i, task in enumerate(self.tasks):
+            for name in task.after:
+                if name not in names:
+                    raise ValueError("Task %s comes after an unknown task %s" % (task.name, name))
+                self.dependents[names[name]].append(i)
+
+        # Hints of each state, from the first to the last tier
+        self.hints = {}
+        for hint in definition.get("hints", []):
+            if hint["state"] not in self.states:
+                raise ValueError("Hint %s is given in an unknown state %s" % (hint["name"], hint["state"]))
+            if "text" not in hint and "image" not in hint:
+                raise ValueError("Hint %s has no text and no image" % hint["name"])
+            self.hints.setdefault(hint["state"], []).append(
+                Hint(hint["name"], hint["state"], hint["after"], hint.get("text"), hint.get("image")))
+        for hints in self.hints.values():
+            hints.sort(key=lambda hint: hint.delay)
+
+        self.reset()
+
+    def reset(self):
+        """
+        Start a new game.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.state = self.initial
+        self.completed = [False] * len(self.tasks)
+        self.completed_count = 0
+        # Number of tasks to complete before each task
+        self.missing = [len(task.after) for task in self.tasks]
+
+    def new_game(self):
+        """
+        Return a puzzle with its own progress, sharing the definition (states, transitions, tasks
+        and UID index) with this one. Used to run many games of the same puzzle with little memory.
+        :return: Puzzle
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        game = copy.copy(self)
+        game.reset()
+        return game
+
+    def handle_sensor(self, sensor: str) -> bool:
+        """
+        Take the transition of the current state triggered by the sensor, if any.
+        Return True if the state changed.
+        :param sensor: string
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(sensor) == str, "Sensor should be a string"
+
+        target = self.sensor_transitions.get((self.state, sensor))
+        if target is None:
+            return False
+        self.state = target
+        return True
+
+    def pending_sensors(self) -> list:
+        """
+        Return the sensors still needed from the current state, in the order of their transitions.
+        A resumed game does not wait again for the sensors it already passed.
+        :return: list of strings
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        sensors = []
+        state = self.state
+        visited = {state}
+        while True:
+            transitions = [(sensor, target) for (origin, sensor), target in self.sensor_transitions.items()
+                           if origin == state]
+            if not transitions or transitions[0][1] in visited:
+                return sensors
+            sensor, state = transitions[0]
+            sensors.append(sensor)
+            visited.add(state)
+
+    def scan(self, uid: list) -> ScanResult:
+        """
+        Complete the task of the scanned card if the tasks before it are completed.
+        :param uid: list of integers
+        :return: ScanResult
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        i = self.uid_index.get(pack_uid(uid))
+        if i is None:
+            return ScanResult("wrong card", None, self.messages["wrong card"])
+        task = self.tasks[i]
+        if self.completed[i]:
+            outcome = "already completed"
+        elif self.missing[i]:
+            outcome = "wrong order"
+        else:
+            outcome = "completed"
+            self._complete(i)
+            if self.is_solved() and self.state in self.tasks_transitions:
+                self.state = self.tasks_transitions[self.state]
+        return ScanResult(outcome, task, self.messages[outcome].format(name=task.name))
+
+    def restore(self, state: str, completed: list):
+        """
+        Resume a game in the state given, with the tasks given by name completed (see journal.py).
+        :param state: string
+        :param completed: list of strings
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if state not in self.states:
+            raise ValueError("Unknown state %s" % state)
+        names = {task.name: i for i, task in enumerate(self.tasks)}
+        self.reset()
+        for name in completed:
+            if name not in names:
+                raise ValueError("Unknown task %s" % name)
+            if not self.completed[names[name]]:
+                self._complete(names[name])
+        self.state = state
+
+    def _complete(self, i: int):
+        """
+        Mark the task number i completed and update the tasks waiting for it.
+        :param i: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.completed[i] = True
+        self.completed_count += 1
+        for dependent in self.dependents[i]:
+            self.missing[dependent] -= 1
+
+    def lose(self) -> bool:
+        """
+        Go to the lost state, unless the game is solved or there is no lost state.
+        Return True if the state changed.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self.lost is None or self.state == self.lost or self.is_solved():
+            return False
+        self.state = self.lost
+        return True
+
+    def is_solved(self) -> bool:
+        """
+        Return True once every task is completed.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self.completed_count == len(self.tasks)
+
+
+def load_puzzle(path: str) -> Puzzle:
+    """
+    Load the puzzle described in a JSON file.
+    :param path: string
+    :return: Puzzle
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    assert type(path) == str, "Path should be a string"
+
+    with open(path, encoding="utf8") as file:
+        return Puzzle(json.load(file))
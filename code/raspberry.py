@@ -10,40 +10,171 @@
 
 import os
 import time
-import serial  # Module for communication between the arduino and the Raspberry Pi
+import threading
+import collections
+import base64
+import binascii
+import shlex
+import subprocess
 from pirc522 import RFID  # Module for RFID
 from configuration import *
+from serial_link import SerialLink
+from telemetry import timed
+from session_record import recorded
 
+# Serial link with the arduino, started on first use by get_serial_link.
+# Its thread owns the port, the functions below queue their commands and get futures.
+serial_link = None
+# Lock making sure the serial link is started only once
+serial_link_lock = threading.Lock()
 
+# RFID reader, see get_rfid_reader
+rfid_reader = None
+# Receiver of the frames pushed by the arduino, None while the push mode is off
+push_receiver = None
+# Name of the sensors as identified in the push frames
+push_sensor_ids = {"F": "fsr", "L": "load cell"}
+# Decoded push frame. Kind is "E" (event) or "H" (heartbeat), sensor and state are None for heartbeats.
+PushFrame = collections.namedtuple("PushFrame", ["kind", "sensor", "state", "timestamp", "sequence"])
+# Status of every sensor at once. States and readings are dicts by sensor name, readings is empty
+# unless they were asked. Timestamp is the millis() of the arduino (None in push mode),
+# read_time the monotonic time of the reading, to know how old the snapshot is.
+SensorSnapshot = collections.namedtuple("SensorSnapshot", ["states", "readings", "timestamp", "read_time"])
+# Batch of raw samples sent in stream mode, data are the samples packed as sent by the arduino.
+# Timestamp is the millis() of the last sample.
+SampleFrame = collections.namedtuple("SampleFrame", ["sensor", "sequence", "timestamp", "data"])
+# Bytes of a sample of each sensor in the batch frames, see arduino.ino
+SAMPLE_WIDTHS = {"fsr": 2, "load cell": 3}
+# Processing of the raw samples (signal_processing.py), None while the stream mode is off
+sample_stream = None
+# Last snapshot read, see get_sensor_snapshot
+sensor_snapshot = None
+# Lock making sure a single request is made when several threads need a new snapshot
+sensor_snapshot_lock = threading.Lock()
+
+
+def get_serial_link() -> SerialLink:
+    """
+    Return the serial link with the arduino, started on first use:
+    the port is opened and the arduino waited for in the background (see serial_link.py).
+    :return: SerialLink
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    global serial_link
+
+    with serial_link_lock:
+        if serial_link is None:
+            serial_link = SerialLink(serial_port, serial_baudrate, arduino_ready_timeout, arduino_ping_interval,
+                                     serial_queue_size, serial_reconnect_min, serial_reconnect_max,
+                                     handle_pushed_line, forget_sensor_snapshot)
+            serial_link.start()
+    return serial_link
+
+
+def wait_arduino_connected(timeout: float) -> bool:
+    """
+    Wait until the serial link is connected to the arduino. Return False after timeout seconds.
+    :param timeout: float
+    :return: bool
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    return get_serial_link().wait_connected(timeout)
+
+
+def forget_sensor_snapshot(*_):
+    """
+    Drop the last snapshot of the sensors, the arduino was set up or reset.
+    In stream mode the activations found in the samples are forgotten too.
+    Also called back by the serial link, the arguments are ignored.
+    :author: AUGUSTIN NOGUE
+    :version: 1.1
+    """
+    global sensor_snapshot
+
+    sensor_snapshot = None
+    stream = sample_stream
+    if stream is not None:
+        stream.reset()
+
+
+@recorded
 def setup_arduino():
     """
     Function asking the arduino to reset the FSR pressed and load cell pressed data.
-    Activate the solenoide
+    Activate the solenoide.
+    The setup is sent again if the arduino is reset.
+    :return: Future, see serial_link.py
     :author: AUGUSTIN NOGUE
-    :version: 1.0
+    :version: 1.3
     """
-    ser.write(b"setup\n")
+    forget_sensor_snapshot()
+    future = get_serial_link().send(b"setup\n", serial_command_timeout, state="setup")
+    future.add_done_callback(forget_sensor_snapshot)
+    return future
 
 
+@recorded
 def cleanup_arduino():
     """
     Function asking the arduino to reset the FSR pressed and load cell pressed data.
     Deactivate the solenoide.
-    Close the serial communication
+    Close the serial communication once the commands are sent.
     :author: AUGUSTIN NOGUE
-    :version: 1.0
+    :version: 1.4
     """
-    ser.write(b"cleanup\n")
-    ser.close()
+    global serial_link, push_receiver, sample_stream
+
+    if push_receiver is not None:
+        push_receiver.stop()
+        push_receiver = None
+    if sample_stream is not None:
+        sample_stream.close()
+        sample_stream = None
+    link = get_serial_link()
+    link.send(b"cleanup\n", serial_command_timeout, state="setup")
+    link.close()
+    with serial_link_lock:
+        serial_link = None
+    forget_sensor_snapshot()
 
 
+@recorded
 def deactivate_solenoide():
     """
     Function asking the arduino to deactivate the solenoide.
+    :return: Future, see serial_link.py
+    :author: AUGUSTIN NOGUE
+    :version: 1.2
+    """
+    return get_serial_link().send(b"deactivate solenoide\n", serial_command_timeout, state="solenoide")
+
+
+@recorded
+def activate_solenoide():
+    """
+    Function asking the arduino to lock the desk again, the sensors keep their state.
+    :return: Future, see serial_link.py
+    :author: AUGUSTIN NOGUE
+    :version: 1.1
+    """
+    return get_serial_link().send(b"activate solenoide\n", serial_command_timeout, state="solenoide")
+
+
+def report_command_failure(future, action: str):
+    """
+    Print a message if a command sent to the arduino fails, without waiting for it.
+    :param future: Future returned by the command
+    :param action: string, what the command does
     :author: AUGUSTIN NOGUE
     :version: 1.0
     """
-    ser.write(b"deactivate solenoide\n")
+    def report(done):
+        if done.exception() is not None:
+            print("%s not confirmed by the arduino: %s" % (action, done.exception()))
+
+    future.add_done_callback(report)
 
 
 def get_files_in_directory(path: str, file_type: str) -> list:
@@ -69,33 +200,438 @@ def get_files_in_directory(path: str, file_type: str) -> list:
     return files_list
 
 
+@timed
 def get_arduino_sensor_status(sensor: str) -> bool:
     """
     Get arduino sensor status. Pass the sensor name as an argument.
     It can be a fsr or load cell.
     If the sensor was activated the function returns True.
     Else it will return False.
-    There is a function corresponding to the other side
-    of the communication in the arduino file.
+    The status comes from the snapshot of every sensor, see get_sensor_snapshot:
+    asking for both sensors within sensor_snapshot_ttl costs a single request.
     :param sensor: string
     :return: bool
     :author: AUGUSTIN NOGUE
-    :version: 1.0
+    :version: 1.3
     """
     assert type(sensor) == str, "Sensor should be a string"
     assert (sensor == "fsr" or sensor == "load cell"), "Sensor should be FSR or Load cell"
 
+    return get_sensor_snapshot().states[sensor]
+
+
+def get_sensor_snapshot(raw: bool = False, max_age: float = None) -> SensorSnapshot:
+    """
+    Return the status of every sensor, with their readings if raw is True.
+    The last snapshot is reused if it is younger than max_age seconds, otherwise the arduino is asked
+    for all of them with a single "status all" request. In push mode the states are already known
+    and no request is made, the readings are then empty.
+    In stream mode the states are the activations found in the raw samples, and the readings
+    their filtered values in units (see signal_processing.py).
+    Raise TimeoutError or ConnectionError if the arduino does not answer, see serial_link.py.
+    :param raw: bool
+    :param max_age: float or None, seconds, sensor_snapshot_ttl if None
+    :return: SensorSnapshot
+    :author: AUGUSTIN NOGUE
+    :version: 1.2
+    """
+    global sensor_snapshot
+
+    assert type(raw) == bool, "Raw should be a boolean"
+
+    if max_age is None:
+        max_age = sensor_snapshot_ttl
+
+    stream = sample_stream
+    if stream is not None:
+        return SensorSnapshot(stream.states(), dict(stream.readings), None, time.monotonic())
+
+    # In push mode the status is already known, no need to ask the arduino
+    receiver = push_receiver
+    if receiver is not None and receiver.is_running():
+        return SensorSnapshot(dict(receiver.state), {}, None, time.monotonic())
+
+    with sensor_snapshot_lock:
+        # The snapshot may have been read by another thread while this one was waiting
+        snapshot = sensor_snapshot
+        if snapshot is not None and time.monotonic() - snapshot.read_time < max_age \
+                and (snapshot.readings or not raw):
+            return snapshot
+
+        link = get_serial_link()
+        snapshot = decode_status_frame(link.request(b"status all raw\n" if raw else b"status all\n",
+                                                    serial_command_timeout))
+        # Firmware without the status frame, ask the sensors one by one
+        if snapshot is None:
+            snapshot = SensorSnapshot({sensor: request_sensor_status(link, sensor)
+                                       for sensor in push_sensor_ids.values()}, {}, None, time.monotonic())
+        sensor_snapshot = snapshot
+    return snapshot
+
+
+def request_sensor_status(link: SerialLink, sensor: str) -> bool:
+    """
+    Ask the arduino the status of one sensor.
+    :param link: SerialLink
+    :param sensor: string
+    :return: bool
+    :author: AUGUSTIN NOGUE
+    :version: 1.1
+    """
     # Encode sensor name as bytes
     sensor_name_as_byte = sensor.encode("utf-8")
-    # Request the FSR status
-    ser.write((b"status update %s\n" % sensor_name_as_byte))
-    # Read answer and decodes it
-    input_str = ser.readline().decode("utf-8").strip()
-    # If the FSR was pressed
-    if input_str == ("%s activated: true" % sensor):
+    # Request the sensor status, the answer says if the sensor was activated
+    input_str = link.request(b"status update %s\n" % sensor_name_as_byte, serial_command_timeout)
+    return input_str == ("%s activated: true" % sensor)
+
+
+def frame_payload(line: str):
+    """
+    Return the payload of a frame sent by the arduino, or None if the line is not a valid frame.
+    A frame looks like #<payload>*<checksum> where the checksum is the XOR
+    of the payload characters in hexadecimal. See arduino.ino for the payloads.
+    :param line: string
+    :return: string or None
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    assert type(line) == str, "Line should be a string"
+
+    line = line.strip()
+    if not line.startswith("#") or "*" not in line:
+        return None
+    payload, _, checksum = line[1:].rpartition("*")
+    # Check the integrity of the frame
+    computed = 0
+    for char in payload:
+        computed ^= ord(char)
+    try:
+        if int(checksum, 16) != computed:
+            return None
+    except ValueError:
+        return None
+    return payload
+
+
+def decode_push_frame(line: str):
+    """
+    Decode a frame pushed by the arduino.
+    Return a PushFrame or None if the line is not a valid frame.
+    :param line: string
+    :return: PushFrame or None
+    :author: AUGUSTIN NOGUE
+    :version: 1.1
+    """
+    payload = frame_payload(line)
+    if payload is None:
+        return None
+
+    fields = payload.split(",")
+    try:
+        # Event frame: E,<sensor id>,<state>,<millis>,<sequence number>
+        if fields[0] == "E" and len(fields) == 5 and fields[1] in push_sensor_ids:
+            return PushFrame("E", push_sensor_ids[fields[1]], fields[2] == "1", int(fields[3]), int(fields[4]))
+        # Heartbeat frame: H,<millis>,<sequence number>
+        if fields[0] == "H" and len(fields) == 3:
+            return PushFrame("H", None, None, int(fields[1]), int(fields[2]))
+    except ValueError:
+        return None
+    return None
+
+
+def decode_sample_frame(line: str):
+    """
+    Decode a batch frame of the stream mode: R,<sensor id>,<batch number>,<millis>,<samples in base64>
+    Return a SampleFrame or None if the line is not a valid batch frame. The checksum misses some damages
+    (two identical characters lost), the samples must fill the data exactly.
+    :param line: string
+    :return: SampleFrame or None
+    :author: AUGUSTIN NOGUE
+    :version: 1.1
+    """
+    payload = frame_payload(line)
+    if payload is None:
+        return None
+
+    fields = payload.split(",")
+    if fields[0] != "R" or len(fields) != 5 or fields[1] not in push_sensor_ids:
+        return None
+    try:
+        data = base64.b64decode(fields[4], validate=True)
+        sensor = push_sensor_ids[fields[1]]
+        if len(data) % SAMPLE_WIDTHS[sensor] != 0:
+            return None
+        return SampleFrame(push_sensor_ids[fields[1]], int(fields[2]), int(fields[3]), data)
+    except (ValueError, binascii.Error):
+        return None
+
+
+def decode_status_frame(line: str):
+    """
+    Decode the reply to "status all": S,<millis>,F<state>,L<state>[,f<fsr reading>,l<load cell grams>]
+    Uppercase letters are the states and lowercase letters the readings of the sensors of push_sensor_ids,
+    unknown sensors are ignored. Return a SensorSnapshot or None if the line is not a valid status frame.
+    :param line: string
+    :return: SensorSnapshot or None
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    payload = frame_payload(line)
+    if payload is None:
+        return None
+
+    fields = payload.split(",")
+    if fields[0] != "S" or len(fields) < 2:
+        return None
+    states = {}
+    readings = {}
+    try:
+        timestamp = int(fields[1])
+        for field in fields[2:]:
+            sensor = push_sensor_ids.get(field[:1].upper())
+            if sensor is None:
+                continue
+            if field[0].isupper():
+                states[sensor] = field[1:] == "1"
+            else:
+                readings[sensor] = int(field[1:])
+    except (ValueError, IndexError):
+        return None
+    # Every known sensor must have its state
+    if len(states) != len(push_sensor_ids):
+        return None
+    return SensorSnapshot(states, readings, timestamp, time.monotonic())
+
+
+def handle_pushed_line(line: str) -> bool:
+    """
+    Hand a line read by the serial link to the push receiver, if the push mode is on,
+    or to the processing of the samples, if the stream mode is on.
+    Return True if the line is a pushed frame, so it is not taken for the reply to a request.
+    A damaged batch frame is dropped and counted.
+    Called from the thread of the serial link.
+    :param line: string
+    :return: bool
+    :author: AUGUSTIN NOGUE
+    :version: 1.2
+    """
+    if line.startswith("#R,"):
+        frame = decode_sample_frame(line)
+        stream = sample_stream
+        if stream is None:
+            return True
+        if frame is None:
+            stream.dropped_frames += 1
+        else:
+            stream.record(line)
+            stream.handle_frame(frame)
         return True
+    frame = decode_push_frame(line)
+    if frame is None:
+        return False
+    receiver = push_receiver
+    if receiver is not None and receiver.is_running():
+        receiver.handle_frame(frame)
+    return True
+
+
+class PushReceiver:
+    def __init__(self, callback=None):
+        """
+        Snapshot of the sensors state kept from the frames pushed by the arduino.
+        The serial link hands the frames to it (see handle_pushed_line).
+        The callback, if given, is called from the thread of the serial link with the
+        sensor name and its new state each time a sensor changes.
+        :param callback: function or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        # Current state of the sensors
+        self.state = {"fsr": False, "load cell": False}
+        # Time (time.monotonic) of the last valid frame
+        self.last_frame_time = None
+        # Sequence number of the last valid frame
+        self.last_sequence = None
+        # Number of frames lost according to the sequence numbers
+        self.lost_frames = 0
+        # Set each time a sensor changes
+        self.changed = threading.Event()
+        self.callback = callback
+        self._running = threading.Event()
+
+    def start(self):
+        """
+        Start keeping the snapshot.
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        self._running.set()
+
+    def stop(self):
+        """
+        Stop keeping the snapshot, the next frames are ignored.
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        self._running.clear()
+
+    def is_running(self) -> bool:
+        """
+        Return True while the snapshot is kept up to date.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        return self._running.is_set()
+
+    def link_alive(self) -> bool:
+        """
+        Return True if a frame was received less than push_heartbeat_timeout seconds ago.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self.last_frame_time is not None and \
+            time.monotonic() - self.last_frame_time < push_heartbeat_timeout
+
+    def handle_line(self, line: str):
+        """
+        Update the snapshot with a line received from the arduino.
+        Lines which are not valid frames are ignored.
+        :param line: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        frame = decode_push_frame(line)
+        if frame is not None:
+            self.handle_frame(frame)
+
+    def handle_frame(self, frame: PushFrame):
+        """
+        Update the snapshot with a decoded frame.
+        :param frame: PushFrame
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.last_frame_time = time.monotonic()
+        # Count the frames lost in between
+        if self.last_sequence is not None and frame.sequence > self.last_sequence + 1:
+            self.lost_frames += frame.sequence - self.last_sequence - 1
+        self.last_sequence = frame.sequence
+
+        if frame.kind == "E" and self.state[frame.sensor] != frame.state:
+            self.state[frame.sensor] = frame.state
+            self.changed.set()
+            if self.callback is not None:
+                self.callback(frame.sensor, frame.state)
+
+
+def enable_push_mode(callback=None):
+    """
+    Ask the arduino to push the sensor changes and start keeping their snapshot.
+    Once enabled get_arduino_sensor_status reads the snapshot without any serial communication.
+    The push mode is asked again if the arduino is reset.
+    :param callback: function or None, see PushReceiver
+    :return: Future or None if the push mode is already on
+    :author: AUGUSTIN NOGUE
+    :version: 1.1
+    """
+    global push_receiver
+
+    if push_receiver is not None and push_receiver.is_running():
+        return None
+    link = get_serial_link()
+    push_receiver = PushReceiver(callback)
+    push_receiver.start()
+    # The arduino sends heartbeats, a silent link is considered lost and opened again
+    link.idle_timeout = push_heartbeat_timeout
+    return link.send(b"push mode on\n", serial_command_timeout, state="push mode")
+
+
+def disable_push_mode():
+    """
+    Ask the arduino to stop pushing the sensor changes and go back to status requests.
+    :return: Future of the acknowledgement, or None if the push mode is off
+    :author: AUGUSTIN NOGUE
+    :version: 1.2
+    """
+    global push_receiver
+
+    if push_receiver is None:
+        return None
+    push_receiver.stop()
+    push_receiver = None
+    link = get_serial_link()
+    # The batches of the stream mode keep the link busy
+    link.idle_timeout = None if sample_stream is None else push_heartbeat_timeout
+    # A reset arduino is not in push mode, nothing to send again
+    link.forget_state("push mode")
+    return link.send(b"push mode off\n", serial_command_timeout, reply=True)
+
+
+def enable_sensor_stream():
+    """
+    Ask the arduino to send the raw samples of the sensors, processed with the filters of configuration.py.
+    Once enabled the sensor states come from the processing of the samples, see get_sensor_snapshot.
+    The stream mode is asked again if the arduino is reset. NumPy is needed.
+    :return: Future or None if the stream mode is already on
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    global sample_stream
+
+    # NumPy is only needed in stream mode
+    from signal_processing import SampleStream, default_filters
+
+    if sample_stream is not None:
+        return None
+    sample_stream = SampleStream(default_filters(), sensor_stream_record_file)
+    link = get_serial_link()
+    # A batch is sent every fraction of a second, a silent link is considered lost and opened again
+    link.idle_timeout = push_heartbeat_timeout
+    return link.send(b"stream on\n", serial_command_timeout, state="stream")
+
+
+def disable_sensor_stream():
+    """
+    Ask the arduino to stop sending the raw samples, the states come from the arduino again.
+    :return: Future of the acknowledgement, or None if the stream mode is off
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    global sample_stream
+
+    if sample_stream is None:
+        return None
+    sample_stream.close()
+    sample_stream = None
+    link = get_serial_link()
+    if push_receiver is None:
+        link.idle_timeout = None
+    link.forget_state("stream")
+    return link.send(b"stream off\n", serial_command_timeout, reply=True)
+
+
+def wait_for_sensor_change(timeout: float) -> bool:
+    """
+    In push or stream mode, wait until a sensor changes or the timeout expires.
+    Return False at once if both modes are off.
+    :param timeout: float, seconds
+    :return: bool, True if the push or stream mode is on
+    :author: AUGUSTIN NOGUE
+    :version: 1.1
+    """
+    stream = sample_stream
+    receiver = push_receiver
+    if stream is not None:
+        changed = stream.changed
+    elif receiver is not None and receiver.is_running():
+        changed = receiver.changed
     else:
         return False
+    if changed.wait(timeout):
+        changed.clear()
+    return True
 
 
 def read_txt(text_file_path: str) -> str:
@@ -116,40 +652,112 @@ def read_txt(text_file_path: str) -> str:
     return text
 
 
+def run_command(command: str, timeout: float) -> bool:
+    """
+    Run a shell command such as the mount command without going through a shell.
+    Return True if the command succeeded before the timeout.
+    :param command: string
+    :param timeout: float, seconds
+    :return: bool
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    assert type(command) == str, "Command should be a string"
+
+    try:
+        result = subprocess.run(shlex.split(command), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                timeout=timeout)
+    except (subprocess.TimeoutExpired, OSError):
+        return False
+    return result.returncode == 0
+
+
+@timed
 def text_from_floppy(floppy_text_path: str) -> str:
     """
     Mount the floppy drive.
     Call the read_txt function to read text from floppy disk.
     Return the text inside the file in the floppy disk.
     Unmount the floppy drive
+    See floppy.py to read the floppy disk without blocking.
     :param floppy_text_path: string
     :return: text: string
     :author: AUGUSTIN NOGUE
-    :version: 1.0
+    :version: 1.2
     """
     assert type(floppy_text_path) == str, "Floppy_Path should be a string"
 
     try:
         # Try to mount the floppy drive
-        os.system(mount_command)
+        run_command(mount_command, floppy_command_timeout)
         # Call the read_text function to path of the floppy disk
         text = read_txt(floppy_text_path)
-        time.sleep(1)
-        # Unmount the floppy drive
-        os.system(unmount_command)
     # Catch os errors
     except OSError:
         text = "An error occurred"
-    # Cautionary unmounting
-    os.system("sudo umount -t msdos /dev/sda")
+    # Unmount the floppy drive
+    run_command(unmount_command, floppy_command_timeout)
 
     return text
 
 
+def get_rfid_reader() -> RFID:
+    """
+    Return the RFID reader. It is created on first use and kept until cleanup_rfid,
+    so the SPI and GPIO setup is not done again for every scan.
+    :return: RFID
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    global rfid_reader
+
+    if rfid_reader is None:
+        rfid_reader = RFID()
+    return rfid_reader
+
+
+def cleanup_rfid():
+    """
+    Release the GPIO and SPI used by the RFID reader.
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    global rfid_reader
+
+    if rfid_reader is not None:
+        rfid_reader.cleanup()
+        rfid_reader = None
+
+
+@timed
+def read_rfid_uid(rdr: RFID, requested: bool = False) -> list:
+    """
+    Read the UID of the card in front of the reader, once a tag was detected.
+    With requested, the card already answered a request: a second request would put it back to idle
+    and it would not answer the anticollision (ISO 14443-3).
+    Return the 5 bytes of the UID or an empty list in case of error.
+    :param rdr: RFID
+    :param requested: bool
+    :return: scan: list of integers
+    :author: AUGUSTIN NOGUE
+    :version: 1.2
+    """
+    scan = []
+    if not requested:
+        (error, data) = rdr.request()
+    (error, uid) = rdr.anticoll()
+    if not error:
+        scan = list(uid[:5])
+        rdr.util().deauth()
+    return scan
+
+
+@timed
 def rfid_scan() -> list:
     """
     Scan RFID cards or badges.
     Return the scanned UID
+    Blocks until a card is in front of the reader, see rfid_service.py to scan without blocking.
 
     Based on the code of Ondryaso : https://github.com/ondryaso
     from the pi-rc522 module
@@ -157,20 +765,8 @@ def rfid_scan() -> list:
 
     :return: scan: list of integers
     :author: AUGUSTIN NOGUE
-    :version: 1.0
+    :version: 1.2
     """
-    rdr = RFID()
-    util = rdr.util()
-    scan = []
+    rdr = get_rfid_reader()
     rdr.wait_for_tag()
-    (error, data) = rdr.request()
-    (error, uid) = rdr.anticoll()
-    if not error:
-        i = 0
-        while i < 5:
-            scan.append(uid[i])
-            i += 1
-        util.deauth()
-
-    rdr.cleanup()
-    return scan
+    return read_rfid_uid(rdr)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: April 7, 2022
+# Last Modified: April 7, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Benchmark of the polling of several RFID readers (rfid_readers.py) on fake readers (simulator package):
+# cards are put on random readers at random times, the time until each card is reported is compared
+# with the bound given by the manager, for each number of readers. Each exchange with a fake reader
+# takes --exchange-time seconds, like the SPI transfers and the timeout of an RC522 without card.
+#     python3 rfid_benchmark.py --readers 1 2 4 8 --cards 50
+
+import argparse
+import json
+import random
+import time
+from simulator import Simulator, rfid
+from telemetry import percentile
+
+# Longest time a card can stay unreported before the benchmark fails (seconds)
+CARD_TIMEOUT = 5
+
+
+def run_readers(sim: Simulator, readers: int, cards: int, round_time: float, seed: int) -> dict:
+    """
+    Put the cards one after the other on random readers, each after a random delay within a round,
+    and measure the time until the manager reports it from the right reader.
+    :param sim: Simulator
+    :param readers: int, number of readers
+    :param cards: int, number of cards put on the readers
+    :param round_time: float, seconds
+    :param seed: int, seed of the random generator
+    :return: dict
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    # Imported once the RFID module is simulated
+    from rfid_readers import RfidReaderManager
+
+    generator = random.Random(seed)
+    names = ["reader %d" % device for device in range(readers)]
+    manager = RfidReaderManager({name: {"device": device} for device, name in enumerate(names)}, round_time, 0)
+    latencies = []
+    manager.start()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        for card in range(cards):
+            # Any phase of the round
+            time.sleep(generator.uniform(0, round_time))
+            device = generator.randrange(readers)
+            uid = [card & 0xFF, 0x10, 0x20, 0x30, card & 0xFF ^ 0x30]
+            sim.present_card(uid, device)
+            result = manager.results.get(timeout=CARD_TIMEOUT)
+            if (result.reader, result.uid) != (names[device], uid):
+                raise ValueError("Card %s of %s reported by %s as %s" % (uid, names[device], result.reader,
+                                                                         result.uid))
+            latencies.append(result.read_time - rfid.field(device).presented)
+            sim.remove_card(device)
+    finally:
+        manager.stop()
+    wall_time = time.perf_counter() - wall_start
+    return {
+        "readers": readers,
+        "cards": cards,
+        "rounds": manager.rounds,
+        "longest round": manager.longest_round,
+        "bound": manager.latency_bound(),
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        # CPU time of the whole process, the fake readers included
+        "cpu share": (time.process_time() - cpu_start) / wall_time,
+    }
+
+
+def run_benchmark(reader_counts: list, cards: int, round_time: float, exchange_time: float) -> list:
+    """
+    Measure the detection of the cards for each number of readers.
+    :param reader_counts: list of ints
+    :param cards: int
+    :param round_time: float, seconds
+    :param exchange_time: float, seconds of one exchange with a fake reader
+    :return: list of dicts
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    sim = Simulator()
+    sim.install()
+    rfid.exchange_time = exchange_time
+    try:
+        return [run_readers(sim, readers, cards, round_time, readers) for readers in reader_counts]
+    finally:
+        sim.stop()
+
+
+def print_report(results: list):
+    """
+    Print the results of the benchmark as a table, times in milliseconds.
+    :param results: list of dicts
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    print("%7s %7s %9s %9s %9s %9s %9s %6s" % ("readers", "rounds", "round ms", "bound ms", "p50 ms", "p99 ms",
+                                              "max ms", "CPU %"))
+    for result in results:
+        print("%7d %7d %9.1f %9.1f %9.1f %9.1f %9.1f %6.1f" % (
+            result["readers"], result["rounds"], result["longest round"] * 1000, result["bound"] * 1000,
+            result["p50"] * 1000, result["p99"] * 1000, result["max"] * 1000, result["cpu share"] * 100))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the polling of several RFID readers")
+    parser.add_argument("--readers", type=int, nargs="+", default=[1, 2, 4, 8], help="numbers of readers")
+    parser.add_argument("--cards", type=int, default=50, help="cards put on the readers for each number")
+    parser.add_argument("--round-time", type=float, default=0.05, help="seconds of one round of polls")
+    parser.add_argument("--exchange-time", type=float, default=0.001,
+                        help="seconds of one exchange with a fake reader")
+    parser.add_argument("--json", help="also write the results in this file")
+    arguments = parser.parse_args()
+
+    benchmark_results = run_benchmark(arguments.readers, arguments.cards, arguments.round_time,
+                                      arguments.exchange_time)
+    print_report(benchmark_results)
+    if arguments.json:
+        with open(arguments.json, "w") as results_file:
+            json.dump(benchmark_results, results_file, indent=2)
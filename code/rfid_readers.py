@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: April 7, 2022
+# Last Modified: April 7, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Several RC522 readers on one Raspberry Pi, one per badge station (rfid_readers in configuration.py).
+# The readers share the SPI bus, so a single thread polls them in turn: each round asks every reader
+# once for a card, then waits for the end of the round (rfid_round_time). A card is read at the next
+# poll of its reader, so it is seen within one round period plus the longest round, whatever the number
+# of cards on the other readers. Each card seen is reported with the name of its reader.
+# The readers in use are tried from the installation:
+#     python3 rfid_readers.py
+# The scheduling is measured on fake readers by rfid_benchmark.py.
+
+import collections
+import queue
+import threading
+import time
+from raspberry import *
+from configuration import *
+
+# Card read by a reader: name of the reader, UID (5 integers), time.monotonic of the read
+ReaderScan = collections.namedtuple("ReaderScan", ["reader", "uid", "read_time"])
+
+
+def open_rfid_reader(options: dict) -> RFID:
+    """
+    Return a new RFID reader set up with the options of pirc522.RFID (device, pin_ce, pin_irq, ...).
+    The readers are polled, their IRQ line is not used: without pin_irq in the options none is set up,
+    pirc522 would watch its default GPIO for every reader and the second one could not be opened.
+    :param options: dict
+    :return: RFID
+    :author: AUGUSTIN NOGUE
+    :version: 1.1
+    """
+    return RFID(**dict({"pin_irq": None}, **options))
+
+
+class RfidReaderManager:
+    def __init__(self, readers: dict, round_time: float, debounce_time: float, open_reader=open_rfid_reader):
+        """
+        Poll several RFID readers from a background thread, see the top of the file.
+        Every card read is put in the results queue as a ReaderScan.
+        A card read again by the same reader less than debounce_time seconds after its last read is ignored,
+        so a card left on a reader is reported once. The other readers do not share the debounce.
+        :param readers: dict, options of pirc522.RFID by name of the reader
+        :param round_time: float, seconds of one round of polls
+        :param debounce_time: float, seconds
+        :param open_reader: function returning the reader for its options
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        assert all(isinstance(options, dict) for options in readers.values()), "Reader options should be dicts"
+        assert type(round_time) == float or type(round_time) == int, "Round time should be a number"
+        assert type(debounce_time) == float or type(debounce_time) == int, "Debounce time should be a number"
+        irq_pins = [options["pin_irq"] for options in readers.values() if options.get("pin_irq") is not None]
+        assert len(irq_pins) == len(set(irq_pins)), "Readers should not share an IRQ pin"
+
+        self.readers = dict(readers)
+        self.round_time = round_time
+        self.debounce_time = debounce_time
+        self.open_reader = open_reader
+        # Cards read, waiting to be handled
+        self.results = queue.Queue()
+        # Cards reported by each reader
+        self.reads = {name: 0 for name in self.readers}
+        # Rounds of polls done, duration of the longest one and longest time between the start of two rounds
+        # (seconds), the waits of the thread can last a bit longer than asked
+        self.rounds = 0
+        self.longest_round = 0.0
+        self.longest_period = 0.0
+        # Last UID reported by each reader and the last time it was read
+        self._last_uids = {}
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="RfidReaders", daemon=True)
+
+    def start(self):
+        """
+        Start polling the readers.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop polling and release the readers.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join(self.round_time + 1)
+
+    def get_result(self):
+        """
+        Return the next card read (ReaderScan) or None if there is none.
+        :return: ReaderScan or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        try:
+            return self.results.get_nowait()
+        except queue.Empty:
+            return None
+
+    def latency_bound(self) -> float:
+        """
+        Return the longest time in seconds a card could wait before being read, with the rounds measured so far.
+        A card put on a reader just after its poll is read during the next round, which starts one round period
+        later (the round time, or the longest round if the polls take longer) and lasts at most the longest round.
+        :return: float
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return max(self.round_time, self.longest_round, self.longest_period) + self.longest_round
+
+    def poll(self, name: str, reader: RFID):
+        """
+        Ask a reader for a card and report the card read, if any.
+        The UID is only read once a card answered the request: an empty reader costs one exchange,
+        a card two (the request and the anticollision).
+        :param name: string, name of the reader
+        :param reader: RFID
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        (error, _) = reader.request()
+        if error:
+            return
+        scan = read_rfid_uid(reader, requested=True)
+        if not scan:
+            return
+        read_time = time.monotonic()
+        last_uid, last_time = self._last_uids.get(name, (None, 0))
+        self._last_uids[name] = (scan, read_time)
+        # The card stays on the reader
+        if scan == last_uid and read_time - last_time < self.debounce_time:
+            return
+        self.reads[name] += 1
+        self.results.put(ReaderScan(name, scan, read_time))
+
+    def _run(self):
+        """
+        Background loop: poll every reader, then wait for the next round.
+        A round taking longer than the round time is followed at once by the next one.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        readers = {name: self.open_reader(options) for name, options in self.readers.items()}
+        next_round = time.monotonic()
+        start = None
+        try:
+            while not self._stop_event.is_set():
+                if start is not None:
+                    self.longest_period = max(self.longest_period, time.monotonic() - start)
+                start = time.monotonic()
+                for name, reader in readers.items():
+                    self.poll(name, reader)
+                end = time.monotonic()
+                self.rounds += 1
+                self.longest_round = max(self.longest_round, end - start)
+                next_round = max(next_round + self.round_time, end)
+                self._stop_event.wait(next_round - end)
+        finally:
+            for reader in readers.values():
+                reader.cleanup()
+
+
+if __name__ == "__main__":
+    manager = RfidReaderManager(rfid_readers, rfid_round_time, rfid_debounce_time)
+    manager.start()
+    print("Polling %s, put a card on a reader (Ctrl+C to stop)" % ", ".join(rfid_readers))
+    try:
+        while True:
+            try:
+                result = manager.results.get(timeout=1)
+            except queue.Empty:
+                continue
+            print("%s: %s" % (result.reader, result.uid))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.stop()
+        print("%d rounds, longest %.1f ms, a card is seen within %.1f ms" %
+              (manager.rounds, manager.longest_round * 1000, manager.latency_bound() * 1000))
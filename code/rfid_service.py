@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 15, 2022
+# Last Modified: March 15, 2022
+#
+# Developed and tested using Python 3.7.3
+
+import collections
+import queue
+import threading
+import time
+from raspberry import *
+from configuration import *
+
+
+class RfidService:
+    def __init__(self, debounce_time: float, get_reader=get_rfid_reader):
+        """
+        Scan RFID cards from a background thread owning one reader for the whole program.
+        A scan is asked with start_scan, the scanned UID is then put in the results queue
+        with the time it was read (time.monotonic).
+        A card read again less than debounce_time seconds after the last read is ignored,
+        so a card left on the reader is not scanned twice.
+        :param debounce_time: float, seconds
+        :param get_reader: function returning the pirc522 RFID reader
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(debounce_time) == float or type(debounce_time) == int, "Debounce time should be a number"
+
+        self.debounce_time = debounce_time
+        self.get_reader = get_reader
+        self.reader = None
+        # Scanned UIDs waiting to be handled by the window
+        self.results = queue.Queue()
+        # Time between the read of a card and the display of its result (seconds), last 100 scans
+        self.latencies = collections.deque(maxlen=100)
+        self._last_uid = None
+        self._last_uid_time = 0
+        self._scan_requested = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="RfidService", daemon=True)
+
+    def start_scan(self):
+        """
+        Ask for the next card to be scanned. The background thread is started on the first call.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._scan_requested.set()
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def cancel_scan(self):
+        """
+        Cancel the scan in progress, for instance when the player goes back to the selection screen.
+        A result already in the queue is dropped.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._scan_requested.clear()
+        self._wake_reader()
+        while not self.results.empty():
+            try:
+                self.results.get_nowait()
+            except queue.Empty:
+                break
+
+    def stop(self):
+        """
+        Stop the background thread and release the reader.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._stop_event.set()
+        self._scan_requested.set()
+        self._wake_reader()
+        if self._thread.is_alive():
+            self._thread.join(1)
+
+    def is_scanning(self) -> bool:
+        """
+        Return True while a scan is asked and no card was read yet.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self._scan_requested.is_set()
+
+    def get_result(self):
+        """
+        Return the next scan result (UID, time of the read) or None if no card was read yet.
+        Must be called from the thread of the window.
+        :return: tuple or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        try:
+            return self.results.get_nowait()
+        except queue.Empty:
+            return None
+
+    def record_feedback(self, read_time: float):
+        """
+        Record the time between the read of a card and the display of its result.
+        :param read_time: float, time.monotonic of the read
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.latencies.append(time.monotonic() - read_time)
+
+    def _wake_reader(self):
+        """
+        Make the reader leave wait_for_tag: pirc522 waits on the IRQ event of the reader.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self.reader is not None:
+            self.reader.irq.set()
+
+    def _run(self):
+        """
+        Background loop: wait for a scan request, then for a card, then read its UID.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.reader = self.get_reader()
+        while not self._stop_event.is_set():
+            self._scan_requested.wait()
+            if self._stop_event.is_set():
+                break
+            self.reader.wait_for_tag()
+            # The scan was cancelled while waiting
+            if not self._scan_requested.is_set() or self._stop_event.is_set():
+                continue
+            scan = read_rfid_uid(self.reader)
+            read_time = time.monotonic()
+            # Ignore the card read just before
+            if scan and scan == self._last_uid and read_time - self._last_uid_time < self.debounce_time:
+                self._last_uid_time = read_time
+                # Do not read the card again at once
+                self._stop_event.wait(0.1)
+                continue
+            if scan:
+                self._last_uid = scan
+                self._last_uid_time = read_time
+            self._scan_requested.clear()
+            self.results.put((scan, read_time))
+        cleanup_rfid()
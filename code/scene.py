@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 18, 2022
+# Last Modified: March 18, 2022
+#
+# Developed and tested using Python 3.7.3
+
+import tkinter as tk
+
+
+class Scene:
+    def __init__(self, canvas: tk.Canvas):
+        """
+        Items of the canvas created once and then updated.
+        Each item has a name (also used as canvas tag). A view shows the items it needs
+        and changes their text or image, instead of deleting and creating every item.
+        Only the options which really change are sent to the canvas.
+        :param canvas: Canvas
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.canvas = canvas
+        # Canvas item id by name
+        self.items = {}
+        # Last options given to each item, and its kind
+        self.options = {}
+        self.kinds = {}
+        # Names of the visible items
+        self.visible = set()
+        # Items shown by every view, see pin
+        self.pinned = set()
+        # Number of items created and of item updates sent to the canvas
+        self.created = 0
+        self.configured = 0
+        # Functions told of every change of an item, see watch
+        self.watchers = []
+
+    def watch(self, watcher):
+        """
+        Tell the function of every change of an item, with the name of the item and the options changed
+        ("state" for its visibility, "coords" for its position). An item created is given with its kind,
+        its coordinates and its options.
+        :param watcher: function(name, changes)
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.watchers.append(watcher)
+
+    def _changed(self, name: str, changes: dict):
+        """
+        Tell the watchers of a change.
+        :param name: string
+        :param changes: dict
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        for watcher in self.watchers:
+            watcher(name, changes)
+
+    def add(self, name: str, kind: str, coords: tuple, **options):
+        """
+        Create a hidden item. The items are drawn in their creation order.
+        :param name: string
+        :param kind: string, "text", "image" or "rectangle"
+        :param coords: tuple
+        :param options: options of the canvas item
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        assert type(name) == str, "Name should be a string"
+        assert name not in self.items, "Item %s already exists" % name
+        assert kind in ("text", "image", "rectangle"), "Kind should be text, image or rectangle"
+
+        create = getattr(self.canvas, "create_" + kind)
+        self.items[name] = create(*coords, state=tk.HIDDEN, tags=(name,), **options)
+        self.options[name] = dict(options)
+        self.options[name]["coords"] = tuple(coords)
+        self.kinds[name] = kind
+        self.created += 1
+        self._changed(name, dict(self.options[name], kind=kind, state=tk.HIDDEN))
+
+    def configure(self, name: str, **options):
+        """
+        Change options of an item. Nothing is sent to the canvas if the options are unchanged.
+        :param name: string
+        :param options: options of the canvas item
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        current = self.options[name]
+        changed = {}
+        for key, value in options.items():
+            # Images are compared by identity, PhotoImage objects are not comparable
+            if key not in current or current[key] is not value and current[key] != value:
+                changed[key] = value
+        if changed:
+            self.canvas.itemconfigure(self.items[name], **changed)
+            current.update(changed)
+            self.configured += 1
+            self._changed(name, changed)
+
+    def move(self, name: str, coords: tuple):
+        """
+        Move an item.
+        :param name: string
+        :param coords: tuple
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        if self.options[name].get("coords") != coords:
+            self.canvas.coords(self.items[name], *coords)
+            self.options[name]["coords"] = coords
+            self.configured += 1
+            self._changed(name, {"coords": coords})
+
+    def pin(self, name: str):
+        """
+        Keep an item visible whatever the view, until unpin.
+        :param name: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.pinned.add(name)
+        self.show(self.visible)
+
+    def unpin(self, name: str):
+        """
+        Let the views hide the item again, it is hidden at once.
+        :param name: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.pinned.discard(name)
+        self.show(self.visible - {name})
+
+    def show(self, names):
+        """
+        Show the items given and the pinned items, hide every other item.
+        :param names: iterable of strings
+        :author: AUGUSTIN NOGUE
+        :version: 1.2
+        """
+        names = set(names) | self.pinned
+        for name in self.visible - names:
+            self.canvas.itemconfigure(self.items[name], state=tk.HIDDEN)
+            self.configured += 1
+            self._changed(name, {"state": tk.HIDDEN})
+        for name in names - self.visible:
+            self.canvas.itemconfigure(self.items[name], state=tk.NORMAL)
+            self.configured += 1
+            self._changed(name, {"state": tk.NORMAL})
+        self.visible = names
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 14, 2022
+# Last Modified: March 24, 2022
+#
+# Developed and tested using Python 3.7.3
+
+import queue
+import threading
+import time
+from raspberry import *
+from configuration import *
+
+
+class SensorWatcher:
+    def __init__(self, sensors: list, poll_interval: float, prepare=None):
+        """
+        Watch the arduino sensors from a background thread.
+        The sensors are watched one after the other in the order of the list,
+        the next one is only requested once the previous one was activated.
+        (the arduino keeps the activation of a sensor until the next setup)
+        Each activation is put in a queue as an event (sensor name, time of detection).
+        :param sensors: list of strings
+        :param poll_interval: float, seconds between two status requests
+        :param prepare: function or None, called by the thread before watching (connection to the arduino)
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        assert all(isinstance(sensor, str) for sensor in sensors), "Sensor names should be strings"
+        assert type(poll_interval) == float or type(poll_interval) == int, "Poll interval should be a number"
+
+        self.sensors = list(sensors)
+        self.poll_interval = poll_interval
+        self.prepare = prepare
+        # Events waiting to be handled by the window
+        self.events = queue.Queue()
+        # Time between the detection of an activation and its handling, by sensor (seconds)
+        self.latencies = {}
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="SensorWatcher", daemon=True)
+
+    def start(self):
+        """
+        Start the background thread.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread. Events already in the queue are kept.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._stop_event.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(self.poll_interval + 1)
+
+    def _run(self):
+        """
+        Background loop: request the status of the watched sensor, then sleep.
+        The thread ends once every sensor was activated.
+        :author: AUGUSTIN NOGUE
+        :version: 1.2
+        """
+        # The window is already displayed while the arduino gets ready
+        if self.prepare is not None:
+            self.prepare()
+        pending = list(self.sensors)
+        while pending and not self._stop_event.is_set():
+            try:
+                activated = get_arduino_sensor_status(pending[0])
+            except (TimeoutError, ConnectionError):
+                # The serial link is connected again in the background, ask again later
+                activated = False
+            if activated:
+                self.events.put((pending.pop(0), time.monotonic()))
+                # The next sensor may already be activated, check it at once
+                continue
+            # In push mode wake up as soon as the arduino reports a change,
+            # else sleep instead of spinning so the CPU is free while nothing happens
+            if not wait_for_sensor_change(self.poll_interval):
+                self._stop_event.wait(self.poll_interval)
+
+    def dispatch(self, callback):
+        """
+        Call the callback for each event waiting in the queue.
+        Must be called from the thread of the window (for instance with after()).
+        :param callback: function taking the sensor name as parameter
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        while True:
+            try:
+                sensor, detected_at = self.events.get_nowait()
+            except queue.Empty:
+                return
+            self.latencies[sensor] = time.monotonic() - detected_at
+            callback(sensor)
+
+    def is_running(self) -> bool:
+        """
+        Return True while the background thread still watches a sensor.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self._thread.is_alive()
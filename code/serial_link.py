@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: April 3, 2022
+# Last Modified: April 3, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Serial link with the arduino, owned by a background thread. The commands are queued and sent
+# one after the other without waiting for the replies, each caller gets a Future:
+#   result None           command without reply, once written
+#   result the reply      command with a reply, once the reply is read
+#   TimeoutError          not sent or not answered before its deadline
+#   ConnectionError       link lost before the reply, queue full or link closed
+# The arduino answers the requests in order, a line which is neither a pushed frame nor the "ready"
+# banner is the reply to the oldest request waiting for one. A request not answered in time fails alone,
+# its reply is skipped if it comes late; the link is only opened again once several requests in a row
+# got no line at all (or on a silence of the heartbeats), since it resets the arduino.
+# When the port breaks (USB adapter reset, cable pulled) it is opened again, waiting longer after each
+# failure. The arduino is reset by then, the last command of each state (setup, solenoid, push mode)
+# is sent again once it is ready.
+
+import atexit
+import collections
+import concurrent.futures
+import os
+import select
+import threading
+import time
+import serial
+
+# Command waiting to be sent. Reply is True if the arduino answers it with a line.
+Command = collections.namedtuple("Command", ["data", "reply", "deadline", "future"])
+
+
+def wait_for_ready(port, timeout: float, ping_interval: float) -> bool:
+    """
+    Wait for the "ready" line the arduino sends at the end of its setup().
+    Opening the port resets the arduino, but not always (no DTR line, port already open),
+    so "ping" is sent regularly and the arduino answers it with "ready" as well.
+    Return False if the arduino did not answer before the timeout.
+    :param port: serial.Serial
+    :param timeout: float, seconds
+    :param ping_interval: float, seconds between two pings
+    :return: bool
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    deadline = time.monotonic() + timeout
+    read_timeout = port.timeout
+    port.timeout = ping_interval
+    try:
+        while time.monotonic() < deadline:
+            line = port.readline().decode("utf-8", errors="replace").strip()
+            if line == "ready":
+                return True
+            # Nothing received, the arduino may have been running for a while already
+            if not line:
+                port.write(b"ping\n")
+        return False
+    finally:
+        port.timeout = read_timeout
+
+
+class SerialLink:
+    def __init__(self, port_name: str, baudrate: int, ready_timeout: float, ping_interval: float,
+                 queue_size: int, reconnect_min: float, reconnect_max: float, on_line=None, on_connect=None,
+                 late_reply_time: float = 1.0, max_unanswered: int = 3):
+        """
+        Serial link with the arduino supervised by a background thread, see start.
+        :param port_name: string, /dev/ttyUSB0 for instance
+        :param baudrate: int
+        :param ready_timeout: float, seconds to wait for the ready banner once the port is opened
+        :param ping_interval: float, seconds between two pings while waiting for the banner
+        :param queue_size: int, commands waiting to be sent, the next ones fail at once
+        :param reconnect_min: float, seconds before opening the port again after the first failure
+        :param reconnect_max: float, longest time between two tries
+        :param on_line: function(line) returning True if it handled the line (pushed frame), or None
+        :param on_connect: function called once the arduino is ready and the states are sent again, or None
+        :param late_reply_time: float, seconds after its deadline during which the reply of a request is skipped
+        :param max_unanswered: int, requests in a row answered by no line at all before the link is opened again
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        assert type(port_name) == str, "Port name should be a string"
+        assert type(queue_size) == int and queue_size > 0, "Queue size should be a positive integer"
+
+        self.port_name = port_name
+        self.baudrate = baudrate
+        self.ready_timeout = ready_timeout
+        self.ping_interval = ping_interval
+        self.queue_size = queue_size
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.on_line = on_line
+        self.on_connect = on_connect
+        self.late_reply_time = late_reply_time
+        self.max_unanswered = max_unanswered
+        # Time in seconds without any line before the link is considered down, None to never check it.
+        # Only set while the arduino sends heartbeats (push mode).
+        self.idle_timeout = None
+        # Last command of each state, sent again after a reconnection, in the order the states appeared
+        self.states = collections.OrderedDict()
+        # Number of connections and of lost links
+        self.connections = 0
+        self.disconnections = 0
+
+        self._commands = collections.deque()
+        self._replies = collections.deque()
+        # Commands of a state given while the states were not sent yet, they are sent with the states
+        self._state_commands = {}
+        self._states_sent = False
+        # Time until which the reply of each request not answered in time is expected, and requests in a row
+        # not answered while no line was read
+        self._late_replies = collections.deque()
+        self._unanswered = 0
+        self._lock = threading.Lock()
+        self._connected = threading.Event()
+        self._stop_event = threading.Event()
+        # Written to wake the thread up when a command is queued
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_write, False)
+        self._thread = threading.Thread(target=self._run, name="SerialLink", daemon=True)
+        self._closed = False
+        self._ready_ignored_until = 0
+
+    def start(self):
+        """
+        Start the background thread opening the port. The queued commands are sent once the port is ready.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._thread.start()
+        # The desk must be unlocked even if the program leaves through exit()
+        atexit.register(self.close)
+
+    def send(self, data: bytes, timeout: float, reply: bool = False, state: str = None):
+        """
+        Queue a command, the caller is never blocked.
+        With a state name the command is remembered and sent again after a reconnection,
+        the next command of the same state replaces it. Until the arduino is connected, it is only sent
+        with the states, not twice.
+        :param data: bytes, the command with its newline
+        :param timeout: float, seconds for the command to be sent and answered
+        :param reply: bool, True if the arduino answers the command
+        :param state: string or None
+        :return: concurrent.futures.Future
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        assert type(data) == bytes, "Command should be bytes"
+
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._closed:
+                future.set_exception(ConnectionError("Serial link closed"))
+                return future
+            if state is not None:
+                self.states[state] = data
+            if state is not None and not reply and not self._states_sent:
+                replaced = self._state_commands.pop(state, None)
+                # The command replacing it is the one sent
+                if replaced is not None and replaced.future.set_running_or_notify_cancel():
+                    replaced.future.set_result(None)
+                self._state_commands[state] = Command(data, reply, time.monotonic() + timeout, future)
+                return future
+            if len(self._commands) >= self.queue_size:
+                future.set_exception(ConnectionError("Serial queue full"))
+                return future
+            self._commands.append(Command(data, reply, time.monotonic() + timeout, future))
+            self._wake()
+        return future
+
+    def forget_state(self, state: str):
+        """
+        Stop sending a state again after a reconnection, a reset arduino is already in the state wanted.
+        :param state: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        with self._lock:
+            self.states.pop(state, None)
+            command = self._state_commands.pop(state, None)
+        if command is not None and command.future.set_running_or_notify_cancel():
+            command.future.set_result(None)
+
+    def request(self, data: bytes, timeout: float) -> str:
+        """
+        Send a command and wait for its reply, for the callers outside of the window.
+        Raise TimeoutError or ConnectionError, see the top of this file.
+        :param data: bytes
+        :param timeout: float
+        :return: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self.send(data, timeout, True).result()
+
+    def is_connected(self) -> bool:
+        """
+        Return True while the port is open and the arduino ready.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self._connected.is_set()
+
+    def wait_connected(self, timeout: float) -> bool:
+        """
+        Wait until the arduino is ready. Return False if it is not before the timeout.
+        :param timeout: float, seconds
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self._connected.wait(timeout)
+
+    def close(self, timeout: float = 1):
+        """
+        Send the commands still queued, then stop the thread and close the port.
+        The commands not sent within the timeout fail. Only the first call does something.
+        :param timeout: float, seconds
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._stop_event.set()
+            self._wake()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._fail_commands(ConnectionError("Serial link closed"))
+        atexit.unregister(self.close)
+        # The pipe is left open if the thread is still blocked on the port
+        if not self._thread.is_alive():
+            os.close(self._wake_read)
+            os.close(self._wake_write)
+
+    def _wake(self):
+        """
+        Wake the background thread up. The pipe being full means it will wake up anyway.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        try:
+            os.write(self._wake_write, b"\0")
+        except BlockingIOError:
+            pass
+
+    def _run(self):
+        """
+        Background loop: open the port, serve the commands until the link breaks, and start again.
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        delay = self.reconnect_min
+        while not self._stop_event.is_set():
+            port = self._open()
+            if port is None:
+                # Wait before the next try, the commands reaching their deadline fail meanwhile
+                self._wait(delay)
+                delay = min(delay * 2, self.reconnect_max)
+                continue
+            delay = self.reconnect_min
+            try:
+                self._serve(port)
+            except (serial.SerialException, OSError) as error:
+                print("Serial link with the arduino lost: %s" % error)
+            finally:
+                with self._lock:
+                    self._states_sent = False
+                self._connected.clear()
+                port.close()
+                self._fail_replies(ConnectionError("Serial link lost"))
+            if not self._stop_event.is_set():
+                self.disconnections += 1
+
+    def _open(self):
+        """
+        Open the port and wait for the arduino. Return the port, None if it cannot be opened.
+        :return: serial.Serial or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        try:
+            port = serial.Serial(self.port_name, self.baudrate, timeout=self.ping_interval)
+        except (serial.SerialException, OSError) as error:
+            if self.connections == self.disconnections:
+                print("Serial port %s not opened: %s" % (self.port_name, error))
+            return None
+        try:
+            if not wait_for_ready(port, self.ready_timeout, self.ping_interval):
+                print("No ready banner from the arduino on %s, going on anyway" % self.port_name)
+        except (serial.SerialException, OSError) as error:
+            print("Serial port %s not ready: %s" % (self.port_name, error))
+            port.close()
+            return None
+        return port
+
+    def _wait(self, delay: float):
+        """
+        Wait for delay seconds or until the link is closed, failing the commands reaching their deadline.
+        :param delay: float, seconds
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        end = time.monotonic() + delay
+        poller = select.poll()
+        poller.register(self._wake_read, select.POLLIN)
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            self._expire(now)
+            if now >= end:
+                return
+            if poller.poll(self._next_timeout(now, end) * 1000):
+                os.read(self._wake_read, 1024)
+
+    def _serve(self, port: serial.Serial):
+        """
+        Send the states again, then send the queued commands and dispatch the lines read until the link breaks.
+        The port is read and written through its file descriptor, waiting on it with poll.
+        :param port: serial.Serial
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        descriptor = port.fileno()
+        poller = select.poll()
+        poller.register(descriptor, select.POLLIN)
+        poller.register(self._wake_read, select.POLLIN)
+        self._late_replies.clear()
+        self._unanswered = 0
+        self._send_states(descriptor)
+        self.connections += 1
+        self._connected.set()
+        last_line = time.monotonic()
+        # Late answers to the pings of wait_for_ready are not resets of the arduino
+        self._ready_ignored_until = last_line + 2 * self.ping_interval
+        buffer = b""
+        while True:
+            self._write_commands(descriptor)
+            now = time.monotonic()
+            if self._stop_event.is_set():
+                return
+            # The oldest request was not answered in time, its reply may still come
+            while self._replies and self._replies[0].deadline <= now:
+                self._replies.popleft().future.set_exception(TimeoutError("No reply from the arduino"))
+                self._late_replies.append(now + self.late_reply_time)
+                self._unanswered += 1
+                # Nothing read for several requests, the arduino does not listen anymore
+                if self._unanswered >= self.max_unanswered:
+                    raise OSError("%d requests not answered" % self._unanswered)
+            end = now + 0.5
+            if self.idle_timeout is not None:
+                if now - last_line > self.idle_timeout:
+                    raise OSError("nothing received for %s seconds" % self.idle_timeout)
+                end = min(end, last_line + self.idle_timeout + 0.01)
+
+            for file_descriptor, events in poller.poll(self._next_timeout(now, end) * 1000):
+                if file_descriptor == self._wake_read:
+                    os.read(self._wake_read, 1024)
+                    continue
+                try:
+                    data = os.read(descriptor, 4096)
+                except BlockingIOError:
+                    continue
+                if not data:
+                    raise OSError("end of the serial port")
+                buffer += data
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    last_line = time.monotonic()
+                    self._unanswered = 0
+                    self._dispatch(line.decode("utf-8", errors="replace").strip(), descriptor)
+
+    def _dispatch(self, line: str, descriptor: int):
+        """
+        Hand a line read to the pushed frames, to the oldest request waiting for a reply, or drop it.
+        An unexpected ready banner means the arduino was reset: its states are sent again.
+        A line the pushed frames handler fails on is dropped, the link goes on.
+        The late reply of a request which failed is skipped.
+        :param line: string
+        :param descriptor: int, file descriptor of the port
+        :author: AUGUSTIN NOGUE
+        :version: 1.2
+        """
+        if not line:
+            return
+        if line == "ready":
+            if time.monotonic() < self._ready_ignored_until:
+                return
+            self._fail_replies(ConnectionError("Arduino reset"))
+            self._late_replies.clear()
+            self._send_states(descriptor)
+            return
+        if self.on_line is not None:
+            try:
+                if self.on_line(line):
+                    return
+            except Exception as error:
+                print("Line from the arduino dropped: %s (%r)" % (error, line))
+                return
+        now = time.monotonic()
+        while self._late_replies and self._late_replies[0] <= now:
+            self._late_replies.popleft()
+        if self._late_replies:
+            self._late_replies.popleft()
+            return
+        if self._replies:
+            self._replies.popleft().future.set_result(line)
+
+    def _send_states(self, descriptor: int):
+        """
+        Send the last command of each state, and tell the program the arduino is ready.
+        The commands of a state given meanwhile are done once their state is sent.
+        :param descriptor: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        with self._lock:
+            commands = list(self.states.values())
+            waiting = list(self._state_commands.values())
+            self._state_commands.clear()
+            self._states_sent = True
+        for data in commands:
+            self._write(descriptor, data)
+        for command in waiting:
+            if command.future.set_running_or_notify_cancel():
+                command.future.set_result(None)
+        if self.on_connect is not None:
+            self.on_connect()
+
+    def _write_commands(self, descriptor: int):
+        """
+        Write every queued command, without waiting for the replies.
+        :param descriptor: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        while True:
+            with self._lock:
+                if not self._commands:
+                    return
+                command = self._commands.popleft()
+            # Cancelled by the caller
+            if not command.future.set_running_or_notify_cancel():
+                continue
+            if command.deadline <= time.monotonic():
+                command.future.set_exception(TimeoutError("Command not sent in time"))
+                continue
+            if command.reply:
+                self._replies.append(command)
+            try:
+                self._write(descriptor, command.data)
+            except OSError as error:
+                if not command.reply:
+                    command.future.set_exception(ConnectionError(str(error)))
+                raise
+            if not command.reply:
+                command.future.set_result(None)
+
+    def _write(self, descriptor: int, data: bytes):
+        """
+        Write the whole data, waiting while the output buffer of the port is full.
+        :param descriptor: int
+        :param data: bytes
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        while data:
+            try:
+                data = data[os.write(descriptor, data):]
+            except BlockingIOError:
+                poller = select.poll()
+                poller.register(descriptor, select.POLLOUT)
+                if not poller.poll(self.ping_interval * 1000):
+                    raise OSError("serial port not writable")
+
+    def _next_timeout(self, now: float, end: float) -> float:
+        """
+        Return the time in seconds until end or the nearest deadline of a command, whichever comes first.
+        :param now: float
+        :param end: float
+        :return: float
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with self._lock:
+            deadlines = [command.deadline for command in self._commands]
+        if self._replies:
+            deadlines.append(self._replies[0].deadline)
+        return max(0.0, min([end] + deadlines) - now)
+
+    def _expire(self, now: float):
+        """
+        Fail the queued commands whose deadline passed. The commands of a state are still sent with the states.
+        :param now: float
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        with self._lock:
+            expired = [command for command in self._commands if command.deadline <= now]
+            for command in expired:
+                self._commands.remove(command)
+            for state, command in list(self._state_commands.items()):
+                if command.deadline <= now:
+                    expired.append(self._state_commands.pop(state))
+        for command in expired:
+            if command.future.set_running_or_notify_cancel():
+                command.future.set_exception(TimeoutError("Arduino not connected"))
+
+    def _fail_replies(self, error: Exception):
+        """
+        Fail the requests waiting for a reply.
+        :param error: Exception
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        while self._replies:
+            self._replies.popleft().future.set_exception(error)
+
+    def _fail_commands(self, error: Exception):
+        """
+        Fail the commands still queued.
+        :param error: Exception
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        with self._lock:
+            commands = list(self._commands) + list(self._state_commands.values())
+            self._commands.clear()
+            self._state_commands.clear()
+        for command in commands:
+            if command.future.set_running_or_notify_cancel():
+                command.future.set_exception(error)
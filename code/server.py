@@ -0,0 +1,628 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 28, 2022
+# Last Modified: March 28, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Control server running the games of several desks from one host, without window.
+# Each desk (rooms.json) has its own arduino, RFID reader and game state, everything runs
+# in one asyncio loop. A local HTTP API gives the status of the desks and controls them:
+#     GET  /sessions                  status of every desk
+#     GET  /sessions/<name>           status of one desk
+#     POST /sessions/<name>/reset     new game, the arduino is set up again
+#     POST /sessions/<name>/hint      {"text": "..."} hint sent to the clients of the desk
+#     POST /sessions/<name>/unlock    open the desk at once
+#     GET  /events                    WebSocket sending each change of the desks as a JSON message
+# Use:
+#     python3 server.py --rooms rooms.json
+
+import argparse
+import asyncio
+import collections
+import http
+import json
+import os
+import serial
+import signal
+import time
+import urllib.parse
+from raspberry import *
+from configuration import *
+from puzzle import load_puzzle
+from rfid_readers import open_rfid_reader
+from websocket import accept_key, encode_frame, read_frame, OPCODE_CLOSE, OPCODE_PING, OPCODE_PONG
+
+# Largest request body accepted by the API (bytes)
+MAX_BODY_SIZE = 16 * 1024
+# Time in seconds to receive the headers of a request
+REQUEST_TIMEOUT = 10
+# Number of hints kept for each desk
+MAX_HINTS = 10
+
+
+class ArduinoLink:
+    def __init__(self, port_name: str, on_frame):
+        """
+        Serial communication with the arduino of one desk, read by the asyncio loop
+        (no thread): the port is non-blocking and read when the loop sees data on it.
+        pyserial only opens and configures the port, its read and write use select(),
+        which fails once the server has more than 1024 files open.
+        :param port_name: string
+        :param on_frame: function called with each PushFrame received
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.port_name = port_name
+        self.on_frame = on_frame
+        self.port = None
+        self.last_frame_time = None
+        self._buffer = b""
+        self._ready = None
+        # Done once the port is closed
+        self.closed = None
+
+    async def open(self, timeout: float, ping_interval: float) -> bool:
+        """
+        Open the port and wait for the "ready" line of the arduino, pinging it like get_serial does.
+        Return False if the port can not be opened or the arduino does not answer.
+        :param timeout: float, seconds
+        :param ping_interval: float, seconds
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        loop = asyncio.get_running_loop()
+        self._ready = loop.create_future()
+        self.closed = loop.create_future()
+        try:
+            # A timeout of 0 makes the reads non-blocking
+            self.port = serial.Serial(self.port_name, serial_baudrate, timeout=0)
+        except (serial.SerialException, OSError):
+            self.close()
+            return False
+        loop.add_reader(self.port.fileno(), self._read)
+
+        deadline = loop.time() + timeout
+        while not self._ready.done() and loop.time() < deadline:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._ready), ping_interval)
+            except asyncio.TimeoutError:
+                self.write(b"ping\n")
+        if not self._ready.done():
+            self.close()
+        return self.port is not None
+
+    def write(self, data: bytes):
+        """
+        Send a request to the arduino. The requests are a few bytes, they fit in the buffer of the port.
+        :param data: bytes
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self.port is None:
+            return
+        try:
+            os.write(self.port.fileno(), data)
+        except OSError:
+            self.close()
+
+    def link_alive(self) -> bool:
+        """
+        Return True if a frame was received in the last push_heartbeat_timeout seconds.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self.last_frame_time is not None and time.monotonic() - self.last_frame_time < push_heartbeat_timeout
+
+    def close(self):
+        """
+        Close the port, the closed future is then done.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self.port is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(self.port.fileno())
+            except (RuntimeError, ValueError, OSError):
+                # No loop running anymore or the port is already closed
+                pass
+            self.port.close()
+            self.port = None
+        self._buffer = b""
+        if self.closed is not None and not self.closed.done():
+            self.closed.set_result(True)
+
+    def _read(self):
+        """
+        Read what the arduino sent and handle the complete lines.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        try:
+            data = os.read(self.port.fileno(), 4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.close()
+            return
+        if not data:
+            # End of file, the device is gone
+            self.close()
+            return
+        self._buffer += data
+        while b"\n" in self._buffer:
+            line, self._buffer = self._buffer.split(b"\n", 1)
+            self._handle_line(line.decode("utf-8", errors="replace").strip())
+
+    def _handle_line(self, line: str):
+        """
+        Handle one line: the ready banner or a push frame, anything else is ignored.
+        :param line: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if line == "ready":
+            if not self._ready.done():
+                self._ready.set_result(True)
+            return
+        frame = decode_push_frame(line)
+        if frame is not None:
+            self.last_frame_time = time.monotonic()
+            self.on_frame(frame)
+
+
+class DeskSession:
+    def __init__(self, name: str, serial_port: str, rfid_device: int, puzzle, notify):
+        """
+        Game of one desk: its arduino in push mode, its RFID reader and its own progress in the puzzle.
+        :param name: string
+        :param serial_port: string
+        :param rfid_device: int, chip select of the RFID reader
+        :param puzzle: Puzzle, shared definition of the game (see Puzzle.new_game)
+        :param notify: function(session, event dict) called on each change
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(name) == str, "Name should be a string"
+        assert type(rfid_device) == int, "RFID device should be an integer"
+
+        self.name = name
+        self.link = ArduinoLink(serial_port, self.handle_frame)
+        self.rfid_device = rfid_device
+        self.puzzle = puzzle.new_game()
+        self.notify = notify
+        # "connecting", "ready" or "offline"
+        self.link_status = "connecting"
+        # "waiting" until the reader is opened, then "ready" or "offline"
+        self.rfid_status = "waiting"
+        self.sensors = {"fsr": False, "load cell": False}
+        self.hints = collections.deque(maxlen=MAX_HINTS)
+        self.unlocked = False
+        self._last_uid = None
+        self._last_uid_time = 0
+        self._tasks = []
+
+    def start(self):
+        """
+        Start connecting the arduino and reading the cards.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._tasks = [asyncio.ensure_future(self._connect()), asyncio.ensure_future(self._scan_cards())]
+
+    async def stop(self):
+        """
+        Stop the session and close the serial port.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.link.write(b"push mode off\n")
+        self.link.close()
+
+    def status(self) -> dict:
+        """
+        Return the status of the desk.
+        :return: dict
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        return {"name": self.name, "link": self.link_status, "link alive": self.link.link_alive(),
+                "rfid": self.rfid_status, "state": self.puzzle.state, "sensors": dict(self.sensors),
+                "completed tasks": self.puzzle.completed_count, "tasks": len(self.puzzle.tasks),
+                "hints": list(self.hints), "unlocked": self.unlocked}
+
+    def handle_frame(self, frame: PushFrame):
+        """
+        Update the sensors with a frame of the arduino and move the game forward.
+        :param frame: PushFrame
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if frame.kind != "E" or self.sensors[frame.sensor] == frame.state:
+            return
+        self.sensors[frame.sensor] = frame.state
+        # The arduino keeps an activation until the next setup, only activations move the game
+        if frame.state and self.puzzle.handle_sensor(frame.sensor):
+            self.notify(self, {"event": "state", "state": self.puzzle.state})
+
+    def reset(self):
+        """
+        Start a new game: the arduino resets its sensors and locks the desk.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.link.write(b"setup\n")
+        self.puzzle.reset()
+        self.hints.clear()
+        self.unlocked = False
+        self._last_uid = None
+        self.notify(self, {"event": "reset"})
+
+    def unlock(self):
+        """
+        Open the desk at once.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.link.write(b"deactivate solenoide\n")
+        self.unlocked = True
+        self.notify(self, {"event": "unlock"})
+
+    def push_hint(self, text: str):
+        """
+        Send a hint to the clients of the desk.
+        :param text: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(text) == str, "Hint should be a string"
+        self.hints.append(text)
+        self.notify(self, {"event": "hint", "text": text})
+
+    async def _connect(self):
+        """
+        Keep the arduino connected: set it up in push mode once ready, connect it again if the link breaks.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        while True:
+            if await self.link.open(arduino_ready_timeout, arduino_ping_interval):
+                # Opening the port reset the arduino, start from a known state
+                self.sensors = {"fsr": False, "load cell": False}
+                self.link.write(b"setup\n")
+                self.link.write(b"push mode on\n")
+                self.link_status = "ready"
+                self.notify(self, {"event": "link"})
+                await self.link.closed
+            self.link_status = "offline"
+            self.notify(self, {"event": "link"})
+            await asyncio.sleep(server_reconnect_interval)
+
+    async def _scan_cards(self):
+        """
+        Read the RFID reader regularly while the game waits for cards.
+        The reader is used from the threads of the loop executor, pirc522 blocks during a read.
+        Its IRQ line is not used, the readers of the other desks could not be opened (see open_rfid_reader).
+        A reader failing to open or to read is released and opened again after the reconnect interval.
+        :author: AUGUSTIN NOGUE
+        :version: 1.2
+        """
+        loop = asyncio.get_running_loop()
+        reader = None
+        try:
+            while True:
+                await asyncio.sleep(server_rfid_poll_interval)
+                # Cards only count in the states waiting for the tasks
+                if self.puzzle.state not in self.puzzle.tasks_transitions:
+                    continue
+                try:
+                    if reader is None:
+                        reader = await loop.run_in_executor(None, open_rfid_reader, {"device": self.rfid_device})
+                        self.rfid_status = "ready"
+                        self.notify(self, {"event": "rfid"})
+                    uid = await loop.run_in_executor(None, read_rfid_uid, reader)
+                except (OSError, RuntimeError) as error:
+                    print("RFID reader of %s not read: %s" % (self.name, error))
+                    if reader is not None:
+                        release_rfid_reader(reader)
+                        reader = None
+                    self.rfid_status = "offline"
+                    self.notify(self, {"event": "rfid", "error": str(error)})
+                    await asyncio.sleep(server_reconnect_interval)
+                    continue
+                if not uid:
+                    continue
+                # The card stays on the reader, it is only counted again after the debounce time
+                if uid == self._last_uid and time.monotonic() - self._last_uid_time < rfid_debounce_time:
+                    self._last_uid_time = time.monotonic()
+                    continue
+                self._last_uid = uid
+                self._last_uid_time = time.monotonic()
+                result = self.puzzle.scan(uid)
+                self.notify(self, {"event": "scan", "outcome": result.outcome, "message": result.message,
+                                   "state": self.puzzle.state})
+        finally:
+            if reader is not None:
+                release_rfid_reader(reader)
+
+
+def release_rfid_reader(reader: RFID):
+    """
+    Release a reader, a reader which failed may fail again while it is released.
+    :param reader: RFID
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    try:
+        reader.cleanup()
+    except (OSError, RuntimeError) as error:
+        print("RFID reader not released: %s" % error)
+
+
+class ControlServer:
+    def __init__(self, rooms: list, puzzle):
+        """
+        Server of the desks listed in rooms, each one being {"name", "serial_port", "rfid_device"}.
+        The readers of the desks share the SPI bus, each one needs its own chip select.
+        :param rooms: list of dicts
+        :param puzzle: Puzzle played on every desk
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        self.sessions = collections.OrderedDict()
+        for room in rooms:
+            if room["name"] in self.sessions:
+                raise ValueError("Desk %s is listed twice" % room["name"])
+            for session in self.sessions.values():
+                if session.rfid_device == room.get("rfid_device", 0):
+                    raise ValueError("Desks %s and %s share the RFID chip select %d"
+                                     % (session.name, room["name"], session.rfid_device))
+            self.sessions[room["name"]] = DeskSession(room["name"], room["serial_port"], room.get("rfid_device", 0),
+                                                      puzzle, self.notify)
+        # Writers of the WebSocket clients
+        self.clients = set()
+        self.server = None
+        self.port = None
+        # Messages sent to the WebSocket clients
+        self.events_sent = 0
+
+    async def start(self, host: str, port: int):
+        """
+        Start the sessions and listen to the API. A port of 0 takes any free port, see the port attribute.
+        :param host: string
+        :param port: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        for session in self.sessions.values():
+            session.start()
+
+    async def stop(self):
+        """
+        Stop listening, disconnect the clients and stop the sessions.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.server.close()
+        await self.server.wait_closed()
+        for writer in list(self.clients):
+            writer.close()
+        self.clients.clear()
+        await asyncio.gather(*(session.stop() for session in self.sessions.values()))
+
+    def notify(self, session: DeskSession, event: dict):
+        """
+        Send a change of a desk to every WebSocket client, with the new status of the desk.
+        The message is encoded once for all the clients, the clients too slow to read are disconnected.
+        :param session: DeskSession
+        :param event: dict
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if not self.clients:
+            return
+        message = dict(event, session=session.name, status=session.status())
+        frame = encode_frame(json.dumps(message).encode("utf-8"))
+        for writer in list(self.clients):
+            if writer.transport.get_write_buffer_size() > server_client_buffer:
+                self.clients.discard(writer)
+                writer.close()
+                continue
+            writer.write(frame)
+        self.events_sent += 1
+
+    def route(self, method: str, path: list, body: bytes) -> tuple:
+        """
+        Handle an API request, return (HTTP status code, JSON content).
+        :param method: string
+        :param path: list of strings, the parts of the path
+        :param body: bytes
+        :return: tuple
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if not path or path[0] != "sessions" or len(path) > 3:
+            return 404, {"error": "not found"}
+        if len(path) == 1:
+            if method != "GET":
+                return 405, {"error": "method not allowed"}
+            return 200, [session.status() for session in self.sessions.values()]
+
+        session = self.sessions.get(path[1])
+        if session is None:
+            return 404, {"error": "unknown desk %s" % path[1]}
+        if len(path) == 2:
+            if method != "GET":
+                return 405, {"error": "method not allowed"}
+            return 200, session.status()
+
+        if method != "POST":
+            return 405, {"error": "method not allowed"}
+        if path[2] == "reset":
+            session.reset()
+        elif path[2] == "unlock":
+            session.unlock()
+        elif path[2] == "hint":
+            try:
+                text = json.loads(body.decode("utf-8"))["text"]
+            except (ValueError, KeyError, TypeError):
+                return 400, {"error": "the body should be {\"text\": \"...\"}"}
+            if type(text) != str:
+                return 400, {"error": "the hint should be a string"}
+            session.push_hint(text)
+        else:
+            return 404, {"error": "unknown action %s" % path[2]}
+        return 200, session.status()
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Read one HTTP request and answer it, or keep the connection as a WebSocket for /events.
+        :param reader: StreamReader
+        :param writer: StreamWriter
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        try:
+            method, target, headers = await asyncio.wait_for(read_request_head(reader), REQUEST_TIMEOUT)
+            length = int(headers.get("content-length", "0"))
+            if not 0 <= length <= MAX_BODY_SIZE:
+                raise ValueError("Body of %d bytes" % length)
+            body = await asyncio.wait_for(reader.readexactly(length), REQUEST_TIMEOUT)
+        except (ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+
+        path = [urllib.parse.unquote(part) for part in urllib.parse.urlsplit(target).path.split("/") if part]
+        if path == ["events"] and headers.get("upgrade", "").lower() == "websocket":
+            await self.handle_websocket(reader, writer, headers)
+            return
+        status, content = self.route(method, path, body)
+        send_response(writer, status, content)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def handle_websocket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, headers: dict):
+        """
+        Accept a WebSocket client: it first gets the status of every desk, then every change.
+        Messages sent by the client are ignored, except the control frames.
+        :param reader: StreamReader
+        :param writer: StreamWriter
+        :param headers: dict, headers of the request with lowercase names
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if "sec-websocket-key" not in headers:
+            send_response(writer, 400, {"error": "missing Sec-WebSocket-Key"})
+            writer.close()
+            return
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Accept: %s\r\n\r\n" % accept_key(headers["sec-websocket-key"]).encode("ascii"))
+        snapshot = {"event": "snapshot", "sessions": [session.status() for session in self.sessions.values()]}
+        writer.write(encode_frame(json.dumps(snapshot).encode("utf-8")))
+        self.clients.add(writer)
+        try:
+            while True:
+                opcode, payload = await read_frame(reader)
+                if opcode == OPCODE_CLOSE:
+                    writer.write(encode_frame(payload[:2], OPCODE_CLOSE))
+                    break
+                if opcode == OPCODE_PING:
+                    writer.write(encode_frame(payload, OPCODE_PONG))
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+
+async def read_request_head(reader: asyncio.StreamReader) -> tuple:
+    """
+    Read the request line and the headers of an HTTP request.
+    Return (method, target, headers) with the header names in lowercase.
+    :param reader: StreamReader
+    :return: tuple
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return method, target, headers
+        if len(headers) >= 100:
+            raise ValueError("Too many headers")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+
+def send_response(writer: asyncio.StreamWriter, status: int, content):
+    """
+    Write an HTTP response with a JSON content.
+    :param writer: StreamWriter
+    :param status: int
+    :param content: object serializable in JSON
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    body = json.dumps(content).encode("utf-8")
+    writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n"
+                 b"Connection: close\r\n\r\n" % (status, http.HTTPStatus(status).phrase.encode("ascii"), len(body)))
+    writer.write(body)
+
+
+def load_rooms(path: str) -> list:
+    """
+    Load the list of desks of a rooms file (see rooms.json).
+    :param path: string
+    :return: list of dicts
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    assert type(path) == str, "Path should be a string"
+
+    with open(path, encoding="utf8") as file:
+        return json.load(file)
+
+
+async def serve(rooms: list, host: str, port: int):
+    """
+    Run the control server until SIGINT or SIGTERM.
+    :param rooms: list of dicts
+    :param host: string
+    :param port: int
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    control_server = ControlServer(rooms, load_puzzle(puzzle_file))
+    await control_server.start(host, port)
+    print("Control server of %d desks on http://%s:%d" % (len(rooms), host, control_server.port))
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop_event.set)
+    await stop_event.wait()
+    await control_server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Control server of the ENIGM-ESC desks")
+    parser.add_argument("--rooms", default=rooms_file, help="file listing the desks")
+    parser.add_argument("--host", default=server_host, help="address of the API")
+    parser.add_argument("--port", type=int, default=server_port, help="port of the API")
+    arguments = parser.parse_args()
+
+    asyncio.run(serve(load_rooms(arguments.rooms), arguments.host, arguments.port))
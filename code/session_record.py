@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: April 6, 2022
+# Last Modified: April 6, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Recording of a hardware session: what the hardware gave to the window (sensor activations,
+# RFID scans, floppy disk texts), what the players and the operator did (clicks, hints) and the
+# commands sent to the hardware (setup, solenoid, cleanup), with their time, so a session can be
+# replayed on another machine (session_replay.py). One file per start of the program, binary:
+#   magic "ENIGMREC" | version (2 bytes) | wall clock time of the start (8 bytes)
+#   records: time in milliseconds since the start (4 bytes) | kind (1 byte) | size (4 bytes) | value
+#   index: time (4 bytes) | offset (8 bytes) of the first record of every INDEX_INTERVAL milliseconds
+#   footer: offset of the index (8 bytes) | records (4 bytes) | duration in milliseconds (4 bytes)
+#           | magic "ENIGMIDX"
+# Each record is written at once, the index and the footer once the session is closed:
+# a session stopped by a crash has none and is read record by record up to its last complete record.
+
+import atexit
+import functools
+import json
+import os
+import struct
+import threading
+import time
+
+RECORD_MAGIC = b"ENIGMREC"
+RECORD_VERSION = 1
+HEADER = struct.Struct("<8sHd")
+RECORD = struct.Struct("<IBI")
+INDEX_ENTRY = struct.Struct("<IQ")
+INDEX_MAGIC = b"ENIGMIDX"
+FOOTER = struct.Struct("<QII8s")
+# Milliseconds of session between two entries of the index
+INDEX_INTERVAL = 10000
+CLICK = struct.Struct("<hh")
+
+# Kind of the records and their number in the file
+KINDS = {"sensor": 1, "scan": 2, "floppy": 3, "click": 4, "hint": 5, "command": 6, "end": 7}
+KIND_NAMES = {number: kind for kind, number in KINDS.items()}
+
+
+def encode_value(kind: str, value) -> bytes:
+    """
+    Return the bytes of the value of a record:
+        sensor, hint, command   name or text (string)
+        scan                    UID (list of integers, empty if the scan failed)
+        floppy                  (status, text or None) of the floppy reader
+        click                   (x, y)
+        end                     dict, state of the game at the end
+    :param kind: string
+    :param value: value of the record
+    :return: bytes
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    if kind == "scan":
+        return bytes(value)
+    if kind == "floppy":
+        status, text = value
+        return status.encode("utf-8") + (b"" if text is None else b"\0" + text.encode("utf-8"))
+    if kind == "click":
+        return CLICK.pack(*value)
+    if kind == "end":
+        return json.dumps(value).encode("utf-8")
+    return value.encode("utf-8")
+
+
+def decode_value(kind: str, data: bytes):
+    """
+    Return the value of a record, see encode_value.
+    :param kind: string
+    :param data: bytes
+    :return: value of the record
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    if kind == "scan":
+        return list(data)
+    if kind == "floppy":
+        status, separator, text = data.partition(b"\0")
+        return status.decode("utf-8"), text.decode("utf-8") if separator else None
+    if kind == "click":
+        return CLICK.unpack(data)
+    if kind == "end":
+        return json.loads(data.decode("utf-8"))
+    return data.decode("utf-8")
+
+
+class SessionRecorder:
+    def __init__(self):
+        """
+        Recorder of the session, records can be added from any thread.
+        Nothing is recorded until open is called.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.path = None
+        self.records = 0
+        self._file = None
+        self._start = None
+        self._index = []
+        self._lock = threading.Lock()
+
+    def open(self, folder: str):
+        """
+        Start recording in a new file of the folder.
+        :param folder: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(folder) == str, "Folder should be a string"
+
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, "%s-%d.rec" % (time.strftime("%Y%m%d-%H%M%S"), os.getpid()))
+        self._file = open(self.path, "wb")
+        self._start = time.monotonic()
+        self._file.write(HEADER.pack(RECORD_MAGIC, RECORD_VERSION, time.time()))
+        self._file.flush()
+        # The program can also leave through exit(), from a callback of the window
+        atexit.register(self.close)
+
+    def is_open(self) -> bool:
+        """
+        Return True while the session is recorded.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self._file is not None
+
+    def record(self, kind: str, value):
+        """
+        Record a value, see encode_value for the kinds. Nothing is done if no session is open.
+        :param kind: string
+        :param value: value of the record
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self._file is None:
+            return
+        data = encode_value(kind, value)
+        with self._lock:
+            if self._file is None:
+                return
+            milliseconds = int((time.monotonic() - self._start) * 1000)
+            if not self._index or milliseconds // INDEX_INTERVAL > self._index[-1][0] // INDEX_INTERVAL:
+                self._index.append((milliseconds, self._file.tell()))
+            self._file.write(RECORD.pack(milliseconds, KINDS[kind], len(data)) + data)
+            # Kept on the disk even if the program crashes
+            self._file.flush()
+            self.records += 1
+
+    def close(self):
+        """
+        Write the index and the footer and close the file. Only the first call does something.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            duration = int((time.monotonic() - self._start) * 1000)
+            index_offset = self._file.tell()
+            self._file.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in self._index))
+            self._file.write(FOOTER.pack(index_offset, self.records, duration, INDEX_MAGIC))
+            self._file.close()
+            self._file = None
+
+
+class SessionRecording:
+    def __init__(self, path: str):
+        """
+        Recorded session, read from its file. Raise ValueError if the file is not a recording.
+        :param path: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(path) == str, "Path should be a string"
+
+        self.path = path
+        with open(path, "rb") as file:
+            self.data = file.read()
+        if len(self.data) < HEADER.size or HEADER.unpack_from(self.data)[:2] != (RECORD_MAGIC, RECORD_VERSION):
+            raise ValueError("%s is not a session recording of version %d" % (path, RECORD_VERSION))
+        self.started = HEADER.unpack_from(self.data)[2]
+        # Index of the records (time, offset), None if the session was not closed
+        self.index = None
+        self.end = len(self.data)
+        self.duration = None
+        self.count = None
+        if len(self.data) >= HEADER.size + FOOTER.size:
+            index_offset, count, duration, magic = FOOTER.unpack_from(self.data, len(self.data) - FOOTER.size)
+            if magic == INDEX_MAGIC and HEADER.size <= index_offset <= len(self.data) - FOOTER.size:
+                self.end = index_offset
+                self.duration = duration / 1000
+                self.count = count
+                self.index = [INDEX_ENTRY.unpack_from(self.data, offset)
+                              for offset in range(index_offset, len(self.data) - FOOTER.size, INDEX_ENTRY.size)]
+
+    def records(self, since: float = 0):
+        """
+        Iterate over the records (time in seconds, kind, value) from the given time of the session.
+        The index is used to start close to that time. A last record cut by a crash is ignored.
+        :param since: float, seconds
+        :return: iterator of tuples
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        offset = HEADER.size
+        for milliseconds, entry_offset in self.index or []:
+            if milliseconds > since * 1000:
+                break
+            offset = entry_offset
+        while offset + RECORD.size <= self.end:
+            milliseconds, kind, size = RECORD.unpack_from(self.data, offset)
+            offset += RECORD.size
+            if offset + size > self.end or kind not in KIND_NAMES:
+                return
+            if milliseconds >= since * 1000:
+                yield milliseconds / 1000, KIND_NAMES[kind], decode_value(KIND_NAMES[kind],
+                                                                          self.data[offset:offset + size])
+            offset += size
+
+    def last_time(self) -> float:
+        """
+        Return the duration of the session, the time of the last record if it was not closed.
+        :return: float, seconds
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self.duration is not None:
+            return self.duration
+        last = 0
+        for when, _, _ in self.records():
+            last = when
+        return last
+
+
+# Recording of the session, written once open is called (see main.py)
+session = SessionRecorder()
+
+
+def recorded(function):
+    """
+    Decorator recording each call of a hardware command, under its name.
+    :param function: function
+    :return: function
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    name = function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        session.record("command", name)
+        return function(*args, **kwargs)
+
+    return wrapper
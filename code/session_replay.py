@@ -0,0 +1,728 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: April 6, 2022
+# Last Modified: April 6, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Replay of the sessions recorded by session_record.py, without the hardware. The window is run on a
+# virtual clock: its after() timers, the game clock and the hints follow the time of the recording.
+# The sensor activations, RFID scans and floppy disk texts are given to the window when it asks for
+# them, the clicks and the hints of the operator are done at their recorded time. The commands sent to
+# the hardware and the end of the game are then compared with the recording, the program exits with
+# status 1 if a session diverged.
+# Speed 0 jumps from one event to the next, as fast as possible; speed 1 is real time.
+# Tk needs a display, on a machine without screen use a virtual one:
+#     xvfb-run python3 session_replay.py Logs/sessions/ --speed 0
+
+import argparse
+import collections
+import concurrent.futures
+import heapq
+import importlib.util
+import itertools
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import time
+import types
+from session_record import SessionRecording
+
+# The hardware is not used by a replay, the RFID module is only needed for the imports
+if importlib.util.find_spec("pirc522") is None:
+    from simulator import rfid
+    sys.modules["pirc522"] = rfid
+import main
+import game_clock
+import hints
+
+# Seconds of replay after the last record, so the window handles what it was given last
+REPLAY_MARGIN = 1.0
+
+# Result of the replay of a session
+ReplayResult = collections.namedtuple("ReplayResult", ["path", "ok", "commands", "expected_commands", "ends",
+                                                       "expected_ends", "duration", "elapsed"])
+
+
+class VirtualClock:
+    def __init__(self, speed: float = 0.0, started: float = None):
+        """
+        Clock of a replay, its time only moves forward when advance is called.
+        It replaces the time module in the modules given to install: time() and monotonic()
+        give the virtual time, the other functions are those of the time module.
+        :param speed: float, 0 for as fast as possible, else times the real time
+        :param started: float or None, wall clock time of the start of the recording
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(speed) == float or type(speed) == int, "Speed should be a number"
+
+        self.speed = speed
+        self.started = time.time() if started is None else started
+        # Seconds since the start of the replay
+        self.elapsed = 0.0
+        self._origin = time.monotonic()
+        self._real_start = None
+        # Timers (due time, number, function, arguments), the cancelled ones are dropped once at the top
+        self._timers = []
+        self._pending = set()
+        self._numbers = itertools.count()
+        self._patched = []
+
+    def __getattr__(self, name: str):
+        """
+        Return the other functions of the time module.
+        :param name: string
+        :return: attribute of the time module
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return getattr(time, name)
+
+    def time(self) -> float:
+        """
+        Return the wall clock time of the replay.
+        :return: float
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self.started + self.elapsed
+
+    def monotonic(self) -> float:
+        """
+        Return the monotonic time of the replay.
+        :return: float
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self._origin + self.elapsed
+
+    def call_later(self, delay: int, function, *args) -> str:
+        """
+        Call the function in delay milliseconds of the replay, like after() of Tk.
+        Return the name of the timer, used to cancel it.
+        :param delay: int, milliseconds
+        :param function: function
+        :param args: arguments of the function
+        :return: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        number = next(self._numbers)
+        heapq.heappush(self._timers, (self.elapsed + max(0, delay) / 1000, number, function, args))
+        self._pending.add(number)
+        return "replay#%d" % number
+
+    def cancel(self, name: str):
+        """
+        Cancel a timer, nothing happens if it already ran.
+        :param name: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if isinstance(name, str) and name.startswith("replay#"):
+            self._pending.discard(int(name[7:]))
+
+    def next_due(self):
+        """
+        Return the time of the next timer, None if there is none.
+        :return: float or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        while self._timers and self._timers[0][1] not in self._pending:
+            heapq.heappop(self._timers)
+        return self._timers[0][0] if self._timers else None
+
+    def pop_due(self):
+        """
+        Return the next timer that is due (function, arguments), None if there is none.
+        :return: tuple or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        due = self.next_due()
+        if due is None or due > self.elapsed:
+            return None
+        _, number, function, args = heapq.heappop(self._timers)
+        self._pending.discard(number)
+        return function, args
+
+    def advance(self, when: float):
+        """
+        Move the time forward to the given time of the replay. With a speed the real time is waited for.
+        :param when: float, seconds since the start of the replay
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if when <= self.elapsed:
+            return
+        if self.speed > 0:
+            if self._real_start is None:
+                self._real_start = time.monotonic() - self.elapsed / self.speed
+            delay = self._real_start + when / self.speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self.elapsed = when
+
+    def install(self, *modules):
+        """
+        Replace the time module of the modules by the clock.
+        :param modules: modules
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        for module in modules:
+            self._patched.append((module, module.time))
+            module.time = self
+
+    def uninstall(self):
+        """
+        Give the modules their time module back.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        while self._patched:
+            module, previous = self._patched.pop()
+            module.time = previous
+
+
+def done_future(result=None) -> concurrent.futures.Future:
+    """
+    Return a future that is already done.
+    :param result: result of the future
+    :return: Future
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    future = concurrent.futures.Future()
+    future.set_result(result)
+    return future
+
+
+class ReplayHardware:
+    def __init__(self):
+        """
+        Hardware of a replay, same functions as raspberry.py. Each command is kept and done at once.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.commands = []
+
+    def wait_arduino_connected(self, timeout: float) -> bool:
+        """
+        The arduino of a replay is always connected.
+        :param timeout: float, seconds
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return True
+
+    def setup_arduino(self) -> concurrent.futures.Future:
+        """
+        Keep the setup command.
+        :return: Future
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.commands.append("setup_arduino")
+        return done_future()
+
+    def enable_push_mode(self):
+        """
+        The activations come from the recording, there is no mode to start.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return None
+
+    def enable_sensor_stream(self):
+        """
+        The activations come from the recording, there is no mode to start.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return None
+
+    def activate_solenoide(self) -> concurrent.futures.Future:
+        """
+        Keep the lock command.
+        :return: Future
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.commands.append("activate_solenoide")
+        return done_future()
+
+    def deactivate_solenoide(self) -> concurrent.futures.Future:
+        """
+        Keep the unlock command.
+        :return: Future
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.commands.append("deactivate_solenoide")
+        return done_future()
+
+    def cleanup_arduino(self):
+        """
+        Keep the cleanup command.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.commands.append("cleanup_arduino")
+
+
+class ReplaySensorWatcher:
+    def __init__(self, clock: VirtualClock, activations: list, prepare=None):
+        """
+        Sensor watcher of a replay, same functions as sensors.SensorWatcher.
+        Each recorded activation is given to the window once its time is reached.
+        :param clock: VirtualClock
+        :param activations: list of (time, sensor)
+        :param prepare: function or None, called by start (connection to the arduino)
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.clock = clock
+        self.activations = collections.deque(activations)
+        self.prepare = prepare
+        # Always empty, the activations are given by dispatch
+        self.events = queue.Queue()
+        self.latencies = {}
+
+    def start(self):
+        """
+        Connect to the arduino at once, the replay has no thread.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self.prepare is not None:
+            self.prepare()
+
+    def stop(self):
+        """
+        Drop the activations not given yet.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.activations.clear()
+
+    def dispatch(self, callback):
+        """
+        Call the callback for each activation whose time is reached.
+        :param callback: function taking the sensor name as parameter
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        while self.activations and self.activations[0][0] <= self.clock.elapsed:
+            callback(self.activations.popleft()[1])
+
+    def is_running(self) -> bool:
+        """
+        Return True while activations are still to be given.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return bool(self.activations)
+
+
+class ReplayRfidService:
+    def __init__(self, clock: VirtualClock, scans: list):
+        """
+        RFID service of a replay, same functions as rfid_service.RfidService.
+        A recorded scan is given once its time is reached, if a scan is asked.
+        The scans reached while no scan is asked are dropped and counted.
+        :param clock: VirtualClock
+        :param scans: list of (time, UID)
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.clock = clock
+        self.scans = collections.deque(scans)
+        self.dropped = 0
+        self.latencies = collections.deque(maxlen=100)
+        self._scanning = False
+
+    def start_scan(self):
+        """
+        Ask for the next card to be scanned.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._drop_due()
+        self._scanning = True
+
+    def cancel_scan(self):
+        """
+        Cancel the scan in progress.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._scanning = False
+        self._drop_due()
+
+    def stop(self):
+        """
+        Stop scanning.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._scanning = False
+
+    def is_scanning(self) -> bool:
+        """
+        Return True while a scan is asked and no card was given yet.
+        :return: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self._scanning
+
+    def get_result(self):
+        """
+        Return the scan result (UID, time of the read) or None if no recorded scan is reached yet.
+        :return: tuple or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if not self._scanning or not self.scans or self.scans[0][0] > self.clock.elapsed:
+            return None
+        self._scanning = False
+        return self.scans.popleft()[1], self.clock.monotonic()
+
+    def record_feedback(self, read_time: float):
+        """
+        Record the time between the read of a card and the display of its result.
+        :param read_time: float, monotonic time of the clock of the replay
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.latencies.append(self.clock.monotonic() - read_time)
+
+    def _drop_due(self):
+        """
+        Drop the scans whose time is reached, they were not asked for.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        while self.scans and self.scans[0][0] <= self.clock.elapsed:
+            self.scans.popleft()
+            self.dropped += 1
+
+
+class ReplayFloppyReader:
+    def __init__(self, clock: VirtualClock, reads: list):
+        """
+        Floppy reader of a replay, same functions as floppy.FloppyReader.
+        Its status and text are the last ones recorded before the time of the replay.
+        :param clock: VirtualClock
+        :param reads: list of (time, (status, text or None))
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.clock = clock
+        self.reads = list(reads)
+
+    def _current(self) -> tuple:
+        """
+        Return the index and the (status, text) of the last read reached, (-1, ("no disk", None)) if none.
+        :return: tuple
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        current = (-1, ("no disk", None))
+        for index, (when, read) in enumerate(self.reads):
+            if when > self.clock.elapsed:
+                break
+            current = (index, read)
+        return current
+
+    @property
+    def status(self) -> str:
+        """
+        Status of the drive: "no disk", "reading", "ready" or "error".
+        :return: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self._current()[1][0]
+
+    def get_text(self):
+        """
+        Return the text of the disk, None if there is none.
+        :return: string or None
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self._current()[1][1]
+
+    def start(self):
+        """
+        Nothing to watch, the reads come from the recording.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+
+    def stop(self):
+        """
+        Nothing to stop.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+
+    def refresh(self):
+        """
+        Nothing to read again, the reads come from the recording.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+
+
+class SessionReplay:
+    def __init__(self, recording: SessionRecording, speed: float = 0.0):
+        """
+        Replay of a recorded session, the window is given the hardware, the sensor watcher,
+        the RFID service and the floppy reader of the replay (see MainWindow).
+        :param recording: SessionRecording
+        :param speed: float, 0 for as fast as possible, else times the real time
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.recording = recording
+        self.clock = VirtualClock(speed, recording.started)
+        records = list(recording.records())
+        self.hardware = ReplayHardware()
+        self.rfid_service = ReplayRfidService(self.clock, [(when, value) for when, kind, value in records
+                                                           if kind == "scan"])
+        self.floppy_reader = ReplayFloppyReader(self.clock, [(when, value) for when, kind, value in records
+                                                             if kind == "floppy"])
+        self.activations = [(when, value) for when, kind, value in records if kind == "sensor"]
+        # What the window was given, in the order of the recording
+        self.inputs = [(when, kind, value) for when, kind, value in records
+                       if kind in ("sensor", "scan", "floppy", "click", "hint")]
+        self.expected_commands = [value for _, kind, value in records if kind == "command"]
+        self.expected_ends = [value for _, kind, value in records if kind == "end"]
+        self.duration = recording.last_time()
+        # Ends of the game during the replay, see ReplayWindow.game_over
+        self.ends = []
+
+    def sensor_watcher(self, sensors: list, prepare=None) -> ReplaySensorWatcher:
+        """
+        Return the sensor watcher of the replay, same parameters as SensorWatcher without the poll interval.
+        :param sensors: list of strings
+        :param prepare: function or None
+        :return: ReplaySensorWatcher
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return ReplaySensorWatcher(self.clock, [activation for activation in self.activations
+                                                if activation[1] in sensors], prepare)
+
+    def run_until(self, window, when: float):
+        """
+        Run the timers of the window up to the given time of the replay.
+        An error in a timer is reported like Tk does and the replay goes on.
+        :param window: ReplayWindow
+        :param when: float, seconds since the start of the replay
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        while True:
+            due = self.clock.next_due()
+            if due is None or due > when:
+                break
+            self.clock.advance(due)
+            timer = self.clock.pop_due()
+            while timer is not None:
+                function, args = timer
+                try:
+                    function(*args)
+                except SystemExit:
+                    raise
+                except Exception:
+                    window.report_callback_exception(*sys.exc_info())
+                timer = self.clock.pop_due()
+            # Idle tasks and drawing of the window
+            window.update()
+        self.clock.advance(when)
+
+    def give(self, window, kind: str, value):
+        """
+        Give a record to the window at its time. The sensor activations, scans and floppy disk texts
+        are handled at once, like they were during the session, not at the next check of the window
+        which could come after the next click.
+        :param window: ReplayWindow
+        :param kind: string
+        :param value: value of the record
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if kind == "click":
+            window.mouse_left_click(types.SimpleNamespace(x=value[0], y=value[1]))
+        elif kind == "hint":
+            window.show_operator_hint(value)
+        elif kind == "sensor":
+            window.sensor_watcher.dispatch(window.sensor_activated)
+        elif kind == "scan" and window.rfid_scan_job is not None:
+            window.after_cancel(window.rfid_scan_job)
+            window.check_rfid_scan()
+        elif kind == "floppy" and window.floppy_job is not None:
+            window.after_cancel(window.floppy_job)
+            window.check_floppy()
+
+    def run(self, window_class=None) -> ReplayResult:
+        """
+        Replay the session in a new window and compare it with the recording.
+        The program left by the exit of the top right corner ends the replay, like it ended the session.
+        The window is closed at the end if it was closed at the end of the session (last command cleanup).
+        :param window_class: class of the window, ReplayWindow by default
+        :return: ReplayResult
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        window_class = window_class or ReplayWindow
+        start = time.perf_counter()
+        self.clock.install(main, game_clock, hints)
+        window = window_class(self)
+        closed = False
+        try:
+            for when, kind, value in self.inputs:
+                self.run_until(window, when)
+                self.give(window, kind, value)
+            self.run_until(window, self.duration + REPLAY_MARGIN)
+            closed = self.expected_commands[-1:] == ["cleanup_arduino"]
+        except SystemExit:
+            pass
+        finally:
+            window.stop_services()
+            window.journal.close()
+            window.destroy()
+            self.clock.uninstall()
+        if closed:
+            window.hardware.cleanup_arduino()
+
+        return ReplayResult(self.recording.path, self.hardware.commands == self.expected_commands
+                            and self.ends == self.expected_ends, self.hardware.commands, self.expected_commands,
+                            self.ends, self.expected_ends, self.clock.elapsed, time.perf_counter() - start)
+
+
+class ReplayWindow(main.MainWindow):
+    def __init__(self, replay: SessionReplay):
+        """
+        Main window of a replay: its timers run on the virtual clock of the replay.
+        :param replay: SessionReplay
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.session_replay = replay
+        super().__init__(replay=replay)
+
+    def after(self, ms, func=None, *args):
+        """
+        Call the function after ms milliseconds of the replay.
+        :param ms: int
+        :param func: function
+        :param args: arguments of the function
+        :return: string, name of the timer
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return self.session_replay.clock.call_later(int(ms), func, *args)
+
+    def after_cancel(self, id):
+        """
+        Cancel a timer of the replay.
+        :param id: string, name of the timer
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.session_replay.clock.cancel(id)
+
+    def game_over(self):
+        """
+        Keep the end of the game, to compare it with the recording.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.session_replay.ends.append({"state": self.puzzle.state, "completed": list(self.puzzle.completed)})
+        super().game_over()
+
+
+def recording_files(paths: list) -> list:
+    """
+    Return the recordings given, the folders are replaced by the recordings they hold.
+    :param paths: list of strings
+    :return: list of strings
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".rec")))
+        else:
+            files.append(path)
+    return files
+
+
+def replay_sessions(paths: list, speed: float) -> list:
+    """
+    Replay the recordings one after the other, with their own journal and hint pipe.
+    Return the ReplayResult of each one, a file that is not a recording is reported and skipped.
+    :param paths: list of strings
+    :param speed: float
+    :return: list of ReplayResult
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    folder = tempfile.mkdtemp()
+    main.journal_file = os.path.join(folder, "journal.jsonl")
+    main.hint_pipe_file = os.path.join(folder, "hints.fifo")
+    # The mirror of the window on the desk is left alone
+    main.mirror_socket = None
+    results = []
+    try:
+        for path in recording_files(paths):
+            try:
+                recording = SessionRecording(path)
+            except (OSError, ValueError) as error:
+                print("Not replayed: %s" % error)
+                continue
+            # Each replay is a new game
+            if os.path.exists(main.journal_file):
+                os.remove(main.journal_file)
+            results.append(SessionReplay(recording, speed).run())
+    finally:
+        shutil.rmtree(folder)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay of recorded hardware sessions")
+    parser.add_argument("paths", nargs="+", help="recordings, or folders of recordings")
+    parser.add_argument("--speed", type=float, default=0.0, help="times the real time, 0 for as fast as possible")
+    arguments = parser.parse_args()
+
+    replay_start = time.perf_counter()
+    replay_results = replay_sessions(arguments.paths, arguments.speed)
+    for result in replay_results:
+        print("%s %s: %.1f s of session in %.2f s" % ("ok" if result.ok else "diverged", result.path,
+                                                      result.duration, result.elapsed))
+        if result.commands != result.expected_commands:
+            print("    commands %s, recorded %s" % (result.commands, result.expected_commands))
+        if result.ends != result.expected_ends:
+            print("    end %s, recorded %s" % (result.ends, result.expected_ends))
+    total = time.perf_counter() - replay_start
+    print("%d sessions replayed in %.2f s, %.1f sessions per second" % (len(replay_results), total,
+                                                                       len(replay_results) / max(total, 1e-9)))
+    # A session replayed differently fails the run, the recordings can be used as regression tests
+    if not all(result.ok for result in replay_results):
+        sys.exit(1)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: April 5, 2022
+# Last Modified: April 5, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# State of the hardware published by the hardware daemon (hardware_daemon.py) in a file of shared memory,
+# mapped by the daemon and by the window:
+#   magic "ENIGMHWS" | format version (4 bytes) | size of the text area (4 bytes)
+#   | sequence (4 bytes) | state (STATE) | text of the floppy disk
+# Only the daemon writes. The sequence is odd while it writes, a reader copies the state and reads the
+# sequence again: if it was odd or changed the copy may be torn and is made again (seqlock).
+# Reading is a copy from the mapping, no system call is made.
+# The file is created once and never replaced, it outlives the daemon and the window so either
+# of them can restart and find the state where the other left it.
+
+import collections
+import mmap
+import os
+import struct
+
+# Start of the file and version of its format
+STATE_MAGIC = b"ENIGMHWS"
+STATE_VERSION = 1
+# Header: magic, format version and size of the text area
+HEADER = struct.Struct("<8sII")
+SEQUENCE = struct.Struct("<I")
+SEQUENCE_OFFSET = HEADER.size
+# heartbeat, pid, starts, solenoide, connected, fsr, load cell, scans, scan requested, UID length, UID,
+# scan time, texts, floppy status, text length
+STATE = struct.Struct("<dIIb?ddI?B10sdI16sI")
+STATE_OFFSET = SEQUENCE_OFFSET + SEQUENCE.size
+TEXT_OFFSET = STATE_OFFSET + STATE.size
+# Copies of the state tried before giving up on a writer stopped in the middle of a write
+READ_TRIES = 1000
+
+# State of the hardware, the times are time.monotonic of the daemon (the same clock in every process):
+#   heartbeat       time of the last publish, the daemon is gone if it gets old
+#   pid, starts     process of the daemon and number of times a daemon started with this file
+#   solenoide       1 desk locked, 0 desk unlocked, -1 never set
+#   connected       True while the arduino is connected
+#   fsr, load_cell  time the sensor was activated, 0 until then (reset by the setup)
+#   scans           number of the last scan result, uid is empty if the scan failed
+#   scan_requested  True while a card is expected, the scan is started again by a restarted daemon
+#   texts           number of the last text read from a floppy disk, see SharedState.read_text
+#   floppy_status   status of the drive, see floppy.py
+HardwareState = collections.namedtuple("HardwareState", [
+    "heartbeat", "pid", "starts", "solenoide", "connected", "fsr", "load_cell", "scans", "scan_requested",
+    "uid", "scan_time", "texts", "floppy_status", "text_length"])
+# State of a new file
+EMPTY_STATE = HardwareState(0.0, 0, 0, -1, False, 0.0, 0.0, 0, False, [], 0.0, 0, "no disk", 0)
+# Field of the state of each sensor
+SENSOR_FIELDS = {"fsr": "fsr", "load cell": "load_cell"}
+
+
+def pack_state(state: HardwareState) -> tuple:
+    """
+    Return the values of a state as packed by STATE.
+    :param state: HardwareState
+    :return: tuple
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    return tuple(state[:9]) + (len(state.uid), bytes(state.uid), state.scan_time, state.texts,
+                               state.floppy_status.encode("utf-8"), state.text_length)
+
+
+def unpack_state(values: tuple) -> HardwareState:
+    """
+    Return the state packed by STATE.
+    :param values: tuple
+    :return: HardwareState
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    uid_length, uid = values[9], values[10]
+    return HardwareState(*values[:9], list(uid[:uid_length]), values[11], values[12],
+                         values[13].rstrip(b"\0").decode("utf-8"), values[14])
+
+
+def create_state_file(path: str, text_size: int):
+    """
+    Create the file of the state if it does not exist yet. The file is written aside and then linked
+    to its path, so the daemon and the window may both create it: the first one wins, nothing is replaced.
+    :param path: string
+    :param text_size: int, bytes kept for the text of the floppy disk
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    if os.path.exists(path):
+        return
+    temporary_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(temporary_path, "wb") as file:
+        file.write(HEADER.pack(STATE_MAGIC, STATE_VERSION, text_size))
+        file.write(SEQUENCE.pack(0))
+        file.write(STATE.pack(*pack_state(EMPTY_STATE)))
+        file.write(bytes(text_size))
+    try:
+        os.link(temporary_path, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(temporary_path)
+
+
+class SharedState:
+    def __init__(self, path: str, text_size: int, writable: bool = False):
+        """
+        State of the hardware in a file of shared memory, see the top of the file.
+        The file is created if needed. Raise ValueError if the file is not a state of this version,
+        the daemon (writable) replaces it then.
+        :param path: string
+        :param text_size: int, bytes kept for the text of the floppy disk
+        :param writable: bool, True for the daemon
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(path) == str, "Path should be a string"
+        assert type(text_size) == int, "Text size should be an integer"
+
+        self.path = path
+        self.text_size = text_size
+        self.writable = writable
+        create_state_file(path, text_size)
+        try:
+            self._map = self._open()
+        except ValueError:
+            if not writable:
+                raise
+            # Left by another version, the windows still mapping it see a file of another version too
+            os.remove(path)
+            create_state_file(path, text_size)
+            self._map = self._open()
+        # Last state read and its sequence, returned again while the sequence does not change
+        self._last = EMPTY_STATE
+        self._last_sequence = None
+        if writable:
+            sequence = SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0]
+            if sequence & 1:
+                # The previous daemon stopped while writing, the state is complete again once republished
+                SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, (sequence + 1) & 0xFFFFFFFF)
+            self._last = unpack_state(STATE.unpack_from(self._map, STATE_OFFSET))
+
+    def _open(self) -> mmap.mmap:
+        """
+        Map the file and check its header.
+        :return: mmap
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with open(self.path, "r+b" if self.writable else "rb") as file:
+            if os.fstat(file.fileno()).st_size != TEXT_OFFSET + self.text_size:
+                raise ValueError("%s is not a hardware state of %d bytes of text" % (self.path, self.text_size))
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_WRITE if self.writable else mmap.ACCESS_READ)
+        if HEADER.unpack_from(mapping) != (STATE_MAGIC, STATE_VERSION, self.text_size):
+            mapping.close()
+            raise ValueError("%s is not a hardware state of version %d" % (self.path, STATE_VERSION))
+        return mapping
+
+    def read(self) -> HardwareState:
+        """
+        Return the state. If the writer stopped in the middle of a write the last state read is returned.
+        :return: HardwareState
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        for _ in range(READ_TRIES):
+            sequence = SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0]
+            if sequence & 1:
+                continue
+            if sequence == self._last_sequence:
+                return self._last
+            values = STATE.unpack_from(self._map, STATE_OFFSET)
+            if SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0] == sequence:
+                self._last = unpack_state(values)
+                self._last_sequence = sequence
+                return self._last
+        return self._last
+
+    def read_text(self) -> tuple:
+        """
+        Return the state and the text of the floppy disk, read together.
+        Return None instead of the text if the writer stopped in the middle of a write.
+        :return: (HardwareState, string or None)
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        for _ in range(READ_TRIES):
+            sequence = SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0]
+            if sequence & 1:
+                continue
+            values = STATE.unpack_from(self._map, STATE_OFFSET)
+            state = unpack_state(values)
+            text = self._map[TEXT_OFFSET:TEXT_OFFSET + min(state.text_length, self.text_size)]
+            if SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0] == sequence:
+                # A text cut at the size of the area may end in the middle of a character
+                return state, text.decode("utf-8", "ignore")
+        return self._last, None
+
+    def publish(self, text: str = None, **changes) -> HardwareState:
+        """
+        Change fields of the state, and the text of the floppy disk if given. Only the daemon publishes,
+        from one thread at a time. Return the new state.
+        :param text: string or None
+        :param changes: fields of HardwareState
+        :return: HardwareState
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert self.writable, "Only the hardware daemon publishes the state"
+
+        data = None
+        if text is not None:
+            data = text.encode("utf-8")[:self.text_size]
+            changes["text_length"] = len(data)
+        state = self._last._replace(**changes)
+        sequence = SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0]
+        SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, (sequence + 1) & 0xFFFFFFFF)
+        STATE.pack_into(self._map, STATE_OFFSET, *pack_state(state))
+        if data is not None:
+            self._map[TEXT_OFFSET:TEXT_OFFSET + len(data)] = data
+        SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, (sequence + 2) & 0xFFFFFFFF)
+        self._last = state
+        return state
+
+    def close(self):
+        """
+        Unmap the file, the file itself is kept.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._map.close()
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: April 6, 2022
+# Last Modified: April 6, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Processing of the raw samples sent by the arduino in stream mode (see arduino.ino), with NumPy:
+#   moving median -> exponential moving average -> tare and scale -> hysteresis thresholds
+# Each batch frame is processed at once with array operations, no Python loop runs per sample.
+# The thresholds and filters are set in configuration.py, no need to flash the arduino to tune them.
+# Benchmark on recorded batch frames (sensor_stream_record_file) or on a synthetic recording:
+#     python3 signal_processing.py Logs/samples.log
+#     python3 signal_processing.py --synthetic 3600
+
+import argparse
+import math
+import os
+import tempfile
+import threading
+import time
+import numpy
+from numpy.lib.stride_tricks import as_strided
+from configuration import *
+from raspberry import SAMPLE_WIDTHS
+
+# Milliseconds between two samples of each sensor, see arduino.ino
+SAMPLE_INTERVALS = {"fsr": 10, "load cell": 100}
+
+
+def unpack_samples(data: bytes, width: int) -> numpy.ndarray:
+    """
+    Return the samples packed in little endian two's complement on width bytes (2 or 3).
+    :param data: bytes
+    :param width: int
+    :return: numpy array of int32
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    if width == 2:
+        return numpy.frombuffer(data, dtype="<i2").astype(numpy.int32)
+    raw = numpy.frombuffer(data, dtype=numpy.uint8).reshape(-1, 3).astype(numpy.int32)
+    samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+    # Sign of the 24 bits
+    samples[samples >= 1 << 23] -= 1 << 24
+    return samples
+
+
+def moving_median(samples: numpy.ndarray, history: numpy.ndarray, window: int) -> numpy.ndarray:
+    """
+    Return the median of each sample with the window - 1 samples before it,
+    the first ones taken from the history (the end of the previous batch).
+    :param samples: numpy array
+    :param history: numpy array of window - 1 samples
+    :param window: int
+    :return: numpy array of float
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    values = numpy.concatenate((history, samples)).astype(numpy.float64)
+    # Every window is a view of the same memory, nothing is copied
+    windows = as_strided(values, shape=(len(samples), window), strides=(values.strides[0], values.strides[0]))
+    return numpy.median(windows, axis=1)
+
+
+def exponential_average(samples: numpy.ndarray, alpha: float, initial: float) -> numpy.ndarray:
+    """
+    Return the exponential moving average y[n] = alpha * x[n] + (1 - alpha) * y[n - 1], with y[-1] = initial.
+    Computed by blocks in closed form: y[n] = d^n * (d * y[-1] + alpha * sum(x[k] / d^k)) with d = 1 - alpha,
+    the blocks are short enough for d^-n to stay in the range of floats.
+    :param samples: numpy array
+    :param alpha: float, between 0 excluded and 1
+    :param initial: float
+    :return: numpy array of float
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    decay = 1.0 - alpha
+    if decay <= 0:
+        return samples.astype(numpy.float64)
+    block = max(1, int(200 / -math.log10(decay)))
+    averages = numpy.empty(len(samples))
+    previous = initial
+    for start in range(0, len(samples), block):
+        values = samples[start:start + block]
+        weights = decay ** numpy.arange(len(values))
+        averages[start:start + len(values)] = weights * (decay * previous + alpha * numpy.cumsum(values / weights))
+        previous = averages[start + len(values) - 1]
+    return averages
+
+
+def hysteresis(values: numpy.ndarray, on_threshold: float, off_threshold: float, state: bool) -> numpy.ndarray:
+    """
+    Return the state after each value: on above on_threshold, off below off_threshold, unchanged in between.
+    :param values: numpy array
+    :param on_threshold: float
+    :param off_threshold: float
+    :param state: bool, state before the first value
+    :return: numpy array of bool
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    changes = numpy.full(len(values), -1, dtype=numpy.int8)
+    changes[values < off_threshold] = 0
+    changes[values > on_threshold] = 1
+    # Position of the last change at or before each value
+    positions = numpy.where(changes >= 0, numpy.arange(len(values)), -1)
+    numpy.maximum.accumulate(positions, out=positions)
+    return numpy.where(positions >= 0, changes[positions] == 1, state)
+
+
+class SensorFilter:
+    def __init__(self, scale: float, median_window: int, ema_alpha: float, on_threshold: float,
+                 off_threshold: float, tare_rate: float = None, tare_band: float = 0.0):
+        """
+        Filter of the raw samples of one sensor, keeping its state between two batches.
+        The samples go through a moving median (outliers), an exponential moving average (noise),
+        then are converted to units with the tare and the scale: (sample - tare) / scale.
+        The sensor is on once the magnitude gets above on_threshold and off once below off_threshold.
+        With a tare rate the tare is the first filtered value, then it follows the slow drift of the
+        sensor: it moves by tare_rate of the gap for each sample within tare_band units while the sensor is off.
+        :param scale: float, raw counts per unit
+        :param median_window: int, odd number of samples
+        :param ema_alpha: float, weight of a new sample in the average, 1 for no average
+        :param on_threshold: float, units
+        :param off_threshold: float, units, below on_threshold
+        :param tare_rate: float or None, None keeps the zero of the sensor
+        :param tare_band: float, units
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if median_window < 1 or median_window % 2 == 0:
+            raise ValueError("The median window should be an odd number of samples")
+        if not 0 < ema_alpha <= 1:
+            raise ValueError("The weight of the average should be in ]0, 1]")
+        if off_threshold > on_threshold:
+            raise ValueError("The off threshold should be below the on threshold")
+
+        self.scale = scale
+        self.median_window = median_window
+        self.ema_alpha = ema_alpha
+        self.on_threshold = on_threshold
+        self.off_threshold = off_threshold
+        self.tare_rate = tare_rate
+        self.tare_band = tare_band
+        # Raw counts of the zero, None until the first batch if the tare is followed
+        self.tare = None if tare_rate is not None else 0.0
+        self.state = False
+        # Last filtered value in units
+        self.value = 0.0
+        self._history = None
+        self._average = None
+
+    def process(self, samples: numpy.ndarray) -> tuple:
+        """
+        Filter a batch of raw samples. Return the filtered values in units and the state after each sample.
+        :param samples: numpy array of raw samples
+        :return: (numpy array of float, numpy array of bool)
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if len(samples) == 0:
+            return numpy.empty(0), numpy.empty(0, dtype=bool)
+        if self._history is None:
+            # The first sample stands for the ones before the stream started
+            self._history = numpy.full(self.median_window - 1, samples[0], dtype=numpy.float64)
+        medians = moving_median(samples, self._history, self.median_window)
+        self._history = numpy.concatenate((self._history, samples))[len(samples):].astype(numpy.float64)
+        if self._average is None:
+            self._average = medians[0]
+        averages = exponential_average(medians, self.ema_alpha, self._average)
+        self._average = averages[-1]
+        if self.tare is None:
+            self.tare = averages[0]
+
+        values = (averages - self.tare) / self.scale
+        states = hysteresis(numpy.abs(values), self.on_threshold, self.off_threshold, self.state)
+        self.state = bool(states[-1])
+        self.value = float(values[-1])
+
+        if self.tare_rate is not None:
+            # Samples of the empty sensor, the tare of the batch is taken from their average
+            resting = averages[~states & (numpy.abs(values) < self.tare_band)]
+            if len(resting):
+                self.tare = exponential_average(resting, self.tare_rate, self.tare)[-1]
+        return values, states
+
+
+class SampleStream:
+    def __init__(self, filters: dict, record_path: str = None):
+        """
+        Sensors state kept from the batch frames sent in stream mode, like PushReceiver for the push frames.
+        A sensor is activated once its filter turns on, the activation is kept until reset (setup of the game).
+        :param filters: dict of SensorFilter by sensor name
+        :param record_path: string or None, file in which the frames received are appended
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        self.filters = filters
+        # millis() of the arduino at the activation of each sensor, None until activated
+        self.activations = {sensor: None for sensor in filters}
+        # Last filtered value of each sensor, in units
+        self.readings = {}
+        # Batch number of the last frame, and batches lost according to them
+        self.last_sequence = None
+        self.lost_frames = 0
+        # Batch frames dropped because damaged
+        self.dropped_frames = 0
+        # Samples processed
+        self.samples = 0
+        # Set each time a sensor is activated
+        self.changed = threading.Event()
+        self._lock = threading.Lock()
+        self._record = None
+        if record_path is not None:
+            os.makedirs(os.path.dirname(record_path), exist_ok=True)
+            self._record = open(record_path, "a", encoding="ascii")
+
+    def record(self, line: str):
+        """
+        Append a frame line to the recording, if any. Called from the thread of the serial link.
+        Each line is flushed, the last frames before a crash are the ones the recording is kept for.
+        :param line: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        with self._lock:
+            if self._record is not None:
+                self._record.write(line.strip() + "\n")
+                self._record.flush()
+
+    def handle_frame(self, frame):
+        """
+        Process the samples of a batch frame (SampleFrame of raspberry.py).
+        Called from the thread of the serial link.
+        :param frame: SampleFrame
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        samples = unpack_samples(frame.data, SAMPLE_WIDTHS[frame.sensor])
+        with self._lock:
+            if self.last_sequence is not None and frame.sequence > self.last_sequence + 1:
+                self.lost_frames += frame.sequence - self.last_sequence - 1
+            self.last_sequence = frame.sequence
+            self.samples += len(samples)
+            sensor_filter = self.filters[frame.sensor]
+            values, states = sensor_filter.process(samples)
+            self.readings[frame.sensor] = sensor_filter.value
+            if self.activations[frame.sensor] is None and states.any():
+                # Time of the first sample on, the last sample of the batch is at the time of the frame
+                first = int(numpy.argmax(states))
+                self.activations[frame.sensor] = frame.timestamp - (len(samples) - 1 - first) * \
+                    SAMPLE_INTERVALS[frame.sensor]
+                self.changed.set()
+
+    def states(self) -> dict:
+        """
+        Return whether each sensor was activated since the last reset.
+        :return: dict of bool by sensor name
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with self._lock:
+            return {sensor: activation is not None for sensor, activation in self.activations.items()}
+
+    def reset(self):
+        """
+        Forget the activations, as the setup does on the arduino. A sensor still on is activated again
+        at its next batch. The filters and the tare are kept.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with self._lock:
+            for sensor, sensor_filter in self.filters.items():
+                self.activations[sensor] = None
+                sensor_filter.state = False
+
+    def close(self):
+        """
+        Close the recording, the frames still received by the thread of the serial link are not recorded.
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        with self._lock:
+            if self._record is not None:
+                self._record.close()
+                self._record = None
+
+
+def default_filters() -> dict:
+    """
+    Return the filters of the sensors set in configuration.py.
+    :return: dict of SensorFilter by sensor name
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    return {"fsr": SensorFilter(1.0, fsr_median_window, fsr_ema_alpha, fsr_on_threshold, fsr_off_threshold),
+            "load cell": SensorFilter(load_cell_scale, load_cell_median_window, load_cell_ema_alpha,
+                                      load_cell_on_threshold, load_cell_off_threshold, load_cell_tare_rate,
+                                      load_cell_tare_band)}
+
+
+def write_synthetic_recording(path: str, seconds: int):
+    """
+    Write the frames of a synthetic session (simulator package): the FSR is pressed at a third
+    of the session and the weight put at two thirds, the load cell has outliers and drifts.
+    :param path: string
+    :param seconds: int
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    from simulator.arduino import SampleSource
+
+    source = SampleSource(seed=1, spike_rate=0.002)
+    source.start(0)
+    with open(path, "wb") as file:
+        for millis in range(0, seconds * 1000, 100):
+            fsr_reading = 900 if millis >= seconds * 1000 // 3 else 0
+            kilograms = 4.0 if millis >= seconds * 2000 // 3 else 0.0
+            file.write(b"".join(source.frames(millis, fsr_reading, kilograms)))
+
+
+def benchmark(path: str) -> dict:
+    """
+    Process the frames of a recording as fast as possible.
+    Return the samples, the seconds of signal, the processing time and the activations found.
+    :param path: string
+    :return: dict
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    from raspberry import decode_sample_frame
+
+    with open(path, encoding="ascii", errors="replace") as file:
+        lines = file.readlines()
+    stream = SampleStream(default_filters())
+    first = last = None
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    for line in lines:
+        frame = decode_sample_frame(line)
+        if frame is None:
+            continue
+        first = frame.timestamp if first is None else first
+        last = frame.timestamp
+        stream.handle_frame(frame)
+    elapsed = time.perf_counter() - start
+    return {"frames": len(lines), "samples": stream.samples, "lost frames": stream.lost_frames,
+            "signal seconds": (last - first) / 1000 if first is not None else 0.0,
+            "seconds": elapsed, "cpu seconds": time.process_time() - start_cpu,
+            "activations": stream.activations}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the processing of the raw samples")
+    parser.add_argument("recordings", nargs="*", help="files of batch frames (sensor_stream_record_file)")
+    parser.add_argument("--synthetic", type=int, metavar="SECONDS",
+                        help="also benchmark a synthetic recording of this length")
+    arguments = parser.parse_args()
+
+    recordings = list(arguments.recordings)
+    folder = None
+    if arguments.synthetic:
+        folder = tempfile.mkdtemp()
+        recordings.append(os.path.join(folder, "synthetic.log"))
+        write_synthetic_recording(recordings[-1], arguments.synthetic)
+    for recording in recordings:
+        result = benchmark(recording)
+        print("%s: %d frames, %d samples (%d lost frames), %.0f s of signal" %
+              (recording, result["frames"], result["samples"], result["lost frames"], result["signal seconds"]))
+        print("  processed in %.3f s (%.3f s CPU), %.0f samples per second, %.3f%% of one core at the sample rate" %
+              (result["seconds"], result["cpu seconds"], result["samples"] / max(result["seconds"], 1e-9),
+               100 * result["cpu seconds"] / max(result["signal seconds"], 1e-9)))
+        for sensor, activation in result["activations"].items():
+            print("  %s: %s" % (sensor, "not activated" if activation is None else "activated at %.2f s" %
+                                (activation / 1000)))
+    if folder is not None:
+        os.remove(recordings[-1])
+        os.rmdir(folder)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 21, 2022
+# Last Modified: March 21, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Simulated hardware of the desk: the arduino on a pseudo terminal, fake RFID readers
+# and a fake floppy drive. Use:
+#     sim = Simulator()
+#     sim.install()      # before importing raspberry, configuration or main
+#     import main
+#     sim.configure(main)
+
+import os
+import sys
+from simulator import rfid
+from simulator.arduino import ArduinoEmulator
+from simulator.floppy import FakeFloppy
+
+
+class Simulator:
+    def __init__(self, heartbeat_interval: float = 1.0):
+        """
+        Simulated hardware of one desk.
+        :param heartbeat_interval: float, seconds between two heartbeats of the arduino in push mode
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.arduino = ArduinoEmulator(heartbeat_interval)
+        self.floppy = FakeFloppy()
+        self.rfid = rfid
+
+    def install(self):
+        """
+        Start the arduino emulation and replace the hardware modules.
+        Must be called before raspberry.py and configuration.py are imported.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.arduino.start()
+        os.environ["ENIGM_ESC_SERIAL_PORT"] = self.arduino.port
+        sys.modules["pirc522"] = rfid
+
+    def configure(self, module):
+        """
+        Point the floppy settings of a module (main, configuration) to the fake floppy drive.
+        The modules import the settings with "from configuration import *", so each module
+        using them has its own copy.
+        :param module: module
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        module.floppy_device = self.floppy.device
+        module.floppy_path = self.floppy.mount_path
+        module.mount_command = self.floppy.mount_command
+        module.unmount_command = self.floppy.unmount_command
+        # The disk image of the fake drive is read directly
+        module.identity_command = None
+
+    def present_card(self, uid: list, reader: int = 0):
+        """
+        Put a card in front of a reader.
+        :param uid: list of integers
+        :param reader: int, chip select of the reader
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        rfid.field(reader).present(uid)
+
+    def remove_card(self, reader: int = 0):
+        """
+        Take the card away from a reader.
+        :param reader: int, chip select of the reader
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        rfid.field(reader).remove()
+
+    def stop(self):
+        """
+        Stop the arduino emulation and remove the fake floppy drive.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.arduino.stop()
+        self.floppy.remove()
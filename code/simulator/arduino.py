@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 21, 2022
+# Last Modified: March 21, 2022
+#
+# Developed and tested using Python 3.7.3
+
+import base64
+import collections
+import os
+import random
+import select
+import threading
+import time
+import tty
+
+
+def frame(payload: str) -> bytes:
+    """
+    Build a push frame as sent by arduino.ino: #<payload>*<checksum>
+    :param payload: string
+    :return: bytes
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    checksum = 0
+    for char in payload:
+        checksum ^= ord(char)
+    return ("#%s*%02X\r\n" % (payload, checksum)).encode("ascii")
+
+
+class SampleSource:
+    # Time in milliseconds between two samples and samples of a batch, see arduino.ino
+    FSR_INTERVAL = 10
+    FSR_BATCH_SIZE = 24
+    LOAD_CELL_INTERVAL = 100
+    LOAD_CELL_BATCH_SIZE = 8
+    # HX711 counts of the empty load cell and per kilogram (calibration_factor of arduino.ino)
+    LOAD_CELL_OFFSET = 84000
+    LOAD_CELL_SCALE = -7050.0
+
+    def __init__(self, seed: int = 0, spike_rate: float = 0.0, drift: float = 0.5):
+        """
+        Raw samples of the stream mode of arduino.ino: noisy FSR readings and HX711 counts
+        whose zero drifts slowly, in batch frames. The time is given by the caller,
+        the emulator gives its millis() and the signal benchmark a virtual time.
+        :param seed: int, seed of the noise
+        :param spike_rate: float, share of the load cell samples replaced by an outlier
+        :param drift: float, HX711 counts the zero moves by at each sample
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.random = random.Random(seed)
+        self.spike_rate = spike_rate
+        self.drift = drift
+        self.sequence = 0
+        self._zero = self.LOAD_CELL_OFFSET
+        self._fsr_samples = []
+        self._load_cell_samples = []
+        self._next_fsr = None
+        self._next_load_cell = None
+
+    def start(self, millis: int):
+        """
+        Start sampling at the given time with empty batches, as the "stream on" request does.
+        :param millis: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._fsr_samples = []
+        self._load_cell_samples = []
+        self._next_fsr = millis
+        self._next_load_cell = millis
+
+    def frames(self, millis: int, fsr_reading: int, kilograms: float) -> list:
+        """
+        Take the samples due until the given time and return the frames of the batches filled.
+        :param millis: int
+        :param fsr_reading: int, FSR reading without noise
+        :param kilograms: float, weight on the load cell
+        :return: list of bytes
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        frames = []
+        while self._next_fsr <= millis:
+            reading = fsr_reading + self.random.gauss(0, 8)
+            self._fsr_samples.append(min(1023, max(0, int(reading))))
+            if len(self._fsr_samples) == self.FSR_BATCH_SIZE:
+                frames.append(self._batch_frame("F", self._fsr_samples, 2, self._next_fsr))
+            self._next_fsr += self.FSR_INTERVAL
+        while self._next_load_cell <= millis:
+            self._zero += self.drift
+            count = self._zero + kilograms * self.LOAD_CELL_SCALE + self.random.gauss(0, 200)
+            if self.random.random() < self.spike_rate:
+                count += self.random.choice((-1, 1)) * 10 * abs(self.LOAD_CELL_SCALE)
+            self._load_cell_samples.append(int(count))
+            if len(self._load_cell_samples) == self.LOAD_CELL_BATCH_SIZE:
+                frames.append(self._batch_frame("L", self._load_cell_samples, 3, self._next_load_cell))
+            self._next_load_cell += self.LOAD_CELL_INTERVAL
+        return frames
+
+    def _batch_frame(self, sensor_id: str, samples: list, width: int, millis: int) -> bytes:
+        """
+        Return the frame of a full batch and empty it.
+        :param sensor_id: string, F or L
+        :param samples: list of int
+        :param width: int, bytes of a sample
+        :param millis: int, time of the last sample
+        :return: bytes
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        data = b"".join(sample.to_bytes(width, "little", signed=True) for sample in samples)
+        samples.clear()
+        self.sequence += 1
+        return frame("R,%s,%d,%d,%s" % (sensor_id, self.sequence, millis, base64.b64encode(data).decode("ascii")))
+
+
+class ArduinoEmulator:
+    def __init__(self, heartbeat_interval: float = 1.0):
+        """
+        Emulation of arduino.ino on a pseudo terminal.
+        The program opens the port given by the port attribute as it would open /dev/ttyUSB0.
+        The sensors are activated with press_fsr and put_weight.
+        :param heartbeat_interval: float, seconds between two heartbeat frames in push mode
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.master, self.slave = os.openpty()
+        # No echo and no line translation, like a real serial port
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.heartbeat_interval = heartbeat_interval
+
+        self.fsr_pressed = False
+        self.enough_weight = False
+        # True while the solenoid keeps the desk closed
+        self.solenoid_on = False
+        self.push_mode = False
+        self.sequence = 0
+        self.last_heartbeat = 0
+        # Raw samples sent in stream mode
+        self.stream_mode = False
+        self.samples = SampleSource()
+        # Bytes exchanged and commands received
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.commands = collections.Counter()
+
+        self._start_time = time.monotonic()
+        self._input = b""
+        # poll rather than select, select fails once the process has more than 1024 files open
+        self._poll = select.poll()
+        self._poll.register(self.master, select.POLLIN)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ArduinoEmulator", daemon=True)
+
+    def start(self):
+        """
+        Start answering on the pseudo terminal.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the emulation and close the pseudo terminal.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join(1)
+        os.close(self.master)
+        os.close(self.slave)
+
+    def press_fsr(self):
+        """
+        Press the FSR hard enough.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with self._lock:
+            self._set_sensor("F", True)
+
+    def put_weight(self):
+        """
+        Put enough weight on the load cell.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        with self._lock:
+            self._set_sensor("L", True)
+
+    def reboot(self):
+        """
+        Restart the arduino, as a reset of the USB adapter does: the sensors, the solenoid
+        and the push and stream modes are back to their state at power on, then the ready banner is sent.
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        with self._lock:
+            self.fsr_pressed = False
+            self.enough_weight = False
+            self.solenoid_on = False
+            self.push_mode = False
+            self.stream_mode = False
+            self.send(b"ready\r\n")
+
+    def fsr_reading(self) -> int:
+        """
+        Analog reading of the FSR, above the threshold of arduino.ino once pressed.
+        :return: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return 900 if self.fsr_pressed else 0
+
+    def load_cell_grams(self) -> int:
+        """
+        Average weight on the load cell in grams, above the threshold of arduino.ino once the weight is put.
+        :return: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return 4000 if self.enough_weight else 0
+
+    def millis(self) -> int:
+        """
+        Milliseconds since the start of the emulation, like millis() on the arduino.
+        :return: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return int((time.monotonic() - self._start_time) * 1000)
+
+    def send(self, data: bytes):
+        """
+        Send bytes to the program.
+        :param data: bytes
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.bytes_sent += len(data)
+        os.write(self.master, data)
+
+    def handle_command(self, command: str):
+        """
+        Handle one request of the program, as loop() does in arduino.ino.
+        :param command: string, without the newline
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        self.commands[command] += 1
+        if command.startswith("status all"):
+            payload = "S,%d,F%d,L%d" % (self.millis(), self.fsr_pressed, self.enough_weight)
+            if command.startswith("status all raw"):
+                payload += ",f%d,l%d" % (self.fsr_reading(), self.load_cell_grams())
+            self.send(frame(payload))
+        elif command.startswith("status update"):
+            if "fsr" in command:
+                self.send(b"fsr activated: %s\r\n" % (b"true" if self.fsr_pressed else b"false"))
+            elif "load cell" in command:
+                self.send(b"load cell activated: %s\r\n" % (b"true" if self.enough_weight else b"false"))
+            else:
+                self.send(b"invalid set Command\r\n")
+        elif command.startswith("setup"):
+            self._set_sensor("F", False)
+            self._set_sensor("L", False)
+            self.solenoid_on = True
+        elif command.startswith("cleanup"):
+            self._set_sensor("F", False)
+            self._set_sensor("L", False)
+            self.solenoid_on = False
+        elif command.startswith("push mode on"):
+            self.push_mode = True
+            self._send_event("F", self.fsr_pressed)
+            self._send_event("L", self.enough_weight)
+            self._send_heartbeat()
+        elif command.startswith("push mode off"):
+            self.push_mode = False
+            self.send(b"push mode off\r\n")
+        elif command.startswith("stream on"):
+            self.stream_mode = True
+            self.samples.start(self.millis())
+        elif command.startswith("stream off"):
+            self.stream_mode = False
+            self.send(b"stream off\r\n")
+        elif command.startswith("ping"):
+            self.send(b"ready\r\n")
+        elif command.startswith("deactivate solenoide"):
+            self.solenoid_on = False
+        elif command.startswith("activate solenoide"):
+            self.solenoid_on = True
+        else:
+            self.send(b"invalid Command\r\n")
+
+    def _set_sensor(self, sensor_id: str, state: bool):
+        """
+        Change the state of a sensor (F or L), sending an event frame in push mode.
+        :param sensor_id: string
+        :param state: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if sensor_id == "F":
+            changed = self.fsr_pressed != state
+            self.fsr_pressed = state
+        else:
+            changed = self.enough_weight != state
+            self.enough_weight = state
+        if changed and self.push_mode:
+            self._send_event(sensor_id, state)
+
+    def _send_event(self, sensor_id: str, state: bool):
+        """
+        Send the event frame of a sensor.
+        :param sensor_id: string
+        :param state: bool
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.sequence += 1
+        self.send(frame("E,%s,%d,%d,%d" % (sensor_id, 1 if state else 0, self.millis(), self.sequence)))
+
+    def _send_heartbeat(self):
+        """
+        Send a heartbeat frame.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.sequence += 1
+        self.last_heartbeat = time.monotonic()
+        self.send(frame("H,%d,%d" % (self.millis(), self.sequence)))
+
+    def _run(self):
+        """
+        Background loop reading the requests and sending the heartbeats and the batches of samples.
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        while not self._stop_event.is_set():
+            readable = self._poll.poll(50)
+            with self._lock:
+                if readable:
+                    try:
+                        data = os.read(self.master, 1024)
+                    except OSError:
+                        # The program closed the port, wait for it to open it again
+                        data = b""
+                        self._stop_event.wait(0.05)
+                    self.bytes_received += len(data)
+                    self._input += data
+                    while b"\n" in self._input:
+                        line, self._input = self._input.split(b"\n", 1)
+                        self.handle_command(line.decode("utf-8", errors="replace").strip())
+                if self.push_mode and time.monotonic() - self.last_heartbeat >= self.heartbeat_interval:
+                    self._send_heartbeat()
+                if self.stream_mode:
+                    for batch in self.samples.frames(self.millis(), self.fsr_reading(),
+                                                     self.load_cell_grams() / 1000):
+                        self.send(batch)
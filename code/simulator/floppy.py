@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 21, 2022
+# Last Modified: March 21, 2022
+#
+# Developed and tested using Python 3.7.3
+
+import os
+import shutil
+import tempfile
+
+
+class FakeFloppy:
+    def __init__(self):
+        """
+        Floppy drive made of files in a temporary folder:
+        the device is a disk image file (empty without disk) and the mount
+        and unmount commands copy and remove the clue file of the inserted disk.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.folder = tempfile.mkdtemp(prefix="enigm-esc-floppy-")
+        self.device = os.path.join(self.folder, "floppy.img")
+        self.disk_folder = os.path.join(self.folder, "disk")
+        self.mount_path = os.path.join(self.folder, "mount")
+        os.mkdir(self.disk_folder)
+        os.mkdir(self.mount_path)
+        self.mount_command = "cp %s %s" % (os.path.join(self.disk_folder, "clue.txt"), self.mount_path)
+        self.unmount_command = "rm -f %s" % os.path.join(self.mount_path, "clue.txt")
+        # Number of disks inserted, part of the disk content so every disk is a new one
+        self.inserted = 0
+        self.eject()
+
+    def insert(self, text: str):
+        """
+        Insert a disk holding the given clue.
+        :param text: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.inserted += 1
+        with open(os.path.join(self.disk_folder, "clue.txt"), "w", encoding="utf8") as file:
+            file.write(text)
+        with open(self.device, "wb") as file:
+            file.write(("disk %d\n%s" % (self.inserted, text)).encode("utf8").ljust(512, b"\0"))
+
+    def eject(self):
+        """
+        Take the disk out of the drive.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        open(self.device, "wb").close()
+
+    def remove(self):
+        """
+        Delete the temporary folder.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        shutil.rmtree(self.folder, ignore_errors=True)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 21, 2022
+# Last Modified: March 21, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Fake pirc522 module: simulator.install() registers it as pirc522 so that
+# "from pirc522 import RFID" gives the FakeRFID class below.
+
+import threading
+import time
+
+# Time in seconds of one exchange with a reader on the SPI bus (request or anticollision), 0 for none
+exchange_time = 0.0
+
+
+class CardField:
+    def __init__(self):
+        """
+        Radio field of one reader: the card in front of it, if any.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.uid = None
+        self.card_present = threading.Event()
+        # The card answered a request and waits for the anticollision (READY state of ISO 14443-3)
+        self.ready = False
+        # time.monotonic of the last card put in the field
+        self.presented = None
+        # Number of UIDs read by the reader
+        self.reads = 0
+
+    def present(self, uid: list):
+        """
+        Put a card in front of the reader.
+        :param uid: list of 5 integers
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.uid = list(uid)
+        self.ready = False
+        self.presented = time.monotonic()
+        self.card_present.set()
+
+    def remove(self):
+        """
+        Take the card away from the reader.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.card_present.clear()
+        self.uid = None
+        self.ready = False
+
+
+# Field of each reader, by chip select (device parameter of RFID)
+fields = {}
+
+
+def field(device: int = 0) -> CardField:
+    """
+    Return the field of the reader on the given chip select.
+    :param device: int
+    :return: CardField
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    if device not in fields:
+        fields[device] = CardField()
+    return fields[device]
+
+
+class FakeUtil:
+    def deauth(self):
+        """
+        Nothing to do, no authentication is emulated.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+
+
+class FakeRFID:
+    def __init__(self, bus: int = 0, device: int = 0, **options):
+        """
+        Stand-in for pirc522.RFID, reading the cards put in its field.
+        :param bus: int
+        :param device: int, chip select of the reader
+        :param options: other options of pirc522.RFID, ignored
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.device = device
+        self.field = field(device)
+        self.options = options
+        # Same IRQ event as pirc522, setting it ends wait_for_tag
+        self.irq = threading.Event()
+        self.closed = False
+
+    def wait_for_tag(self, timeout: float = 0):
+        """
+        Wait for a card in the field or for the IRQ event.
+        :param timeout: float, seconds, 0 to wait without limit
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        waited = 0
+        while not self.field.card_present.wait(0.01):
+            if self.irq.is_set():
+                break
+            waited += 0.01
+            if timeout and waited >= timeout:
+                break
+        self.irq.clear()
+
+    def request(self):
+        """
+        Return (error, tag type) as pirc522 does.
+        A card answering a request gets ready for the anticollision, a ready card goes back to idle
+        without answering, as a real card does.
+        :return: tuple
+        :author: AUGUSTIN NOGUE
+        :version: 1.2
+        """
+        if exchange_time:
+            time.sleep(exchange_time)
+        if not self.field.card_present.is_set():
+            return (True, 0)
+        if self.field.ready:
+            self.field.ready = False
+            return (True, 0)
+        self.field.ready = True
+        return (False, 0x10)
+
+    def anticoll(self):
+        """
+        Return (error, UID) as pirc522 does, the UID having a fifth checksum byte.
+        Only a card ready after a request answers, the exchange with the card ends with its UID.
+        :return: tuple
+        :author: AUGUSTIN NOGUE
+        :version: 1.2
+        """
+        if exchange_time:
+            time.sleep(exchange_time)
+        uid = self.field.uid
+        if uid is None or not self.field.ready:
+            return (True, [])
+        self.field.ready = False
+        self.field.reads += 1
+        return (False, list(uid))
+
+    def util(self) -> FakeUtil:
+        """
+        Return the utility object of the reader.
+        :return: FakeUtil
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return FakeUtil()
+
+    def cleanup(self):
+        """
+        Release the reader.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.closed = True
+
+
+# Name used by pirc522
+RFID = FakeRFID
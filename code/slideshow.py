@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 26, 2022
+# Last Modified: March 26, 2022
+#
+# Developed and tested using Python 3.7.3
+
+import threading
+import tkinter as tk
+from images import asset_read_ahead, image_source
+
+# Stipple patterns of the cover used for the fade, from the lightest to a full cover ("" is solid)
+FADE_STIPPLES = ["gray12", "gray25", "gray50", "gray75", ""]
+# Time in milliseconds between two checks of the file read in the background
+PREFETCH_CHECK_INTERVAL = 50
+
+
+def read_ahead(image_path: str) -> int:
+    """
+    Read the file an image will be decoded from, so the decoding does not wait for the SD card.
+    Return the number of bytes read.
+    :param image_path: string
+    :return: int
+    :author: AUGUSTIN NOGUE
+    :version: 1.1
+    """
+    size = asset_read_ahead(image_path)
+    if size is not None:
+        return size
+    size = 0
+    with open(image_source(image_path), "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            size += len(block)
+    return size
+
+
+class Slideshow:
+    def __init__(self, widget: tk.Misc, scene, pictures: list, interval: int, display, images,
+                 fade_item: str = None, fade_time: int = 0):
+        """
+        Pictures displayed one after the other with after() timers, the window is never blocked.
+        While a picture is displayed the next one is read in a background thread and then
+        decoded in the image cache, so it is ready when its time comes.
+        Only the pictures shown and the next one are decoded, the cache drops the old ones.
+        :param widget: Tk widget used to schedule the pictures
+        :param scene: Scene holding the fade item
+        :param pictures: list of strings
+        :param interval: int, milliseconds between two pictures
+        :param display: function displaying the picture of the path given
+        :param images: ImageCache used by the display function
+        :param fade_item: string or None, name of a rectangle of the scene covering the picture
+        :param fade_time: int, milliseconds of the fade between two pictures, 0 for none
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert all(isinstance(picture, str) for picture in pictures), "Picture names should be strings"
+        assert type(interval) == int, "Interval should be an integer"
+
+        self.widget = widget
+        self.scene = scene
+        self.pictures = list(pictures)
+        self.interval = interval
+        self.display = display
+        self.images = images
+        self.fade_item = fade_item
+        self.fade_step = fade_time // (2 * len(FADE_STIPPLES)) if fade_item is not None else 0
+        # Index of the picture displayed
+        self.index = 0
+        # Pictures ready in the cache before their time
+        self.prefetched = 0
+        self._job = None
+        self._prefetch_job = None
+        self._reader = None
+
+    def start(self, index: int = 0):
+        """
+        Display the picture number index and start the slideshow.
+        :param index: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._display(index)
+        self._schedule_next()
+
+    def stop(self):
+        """
+        Stop the slideshow, the picture displayed stays on screen.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        for job in (self._job, self._prefetch_job):
+            if job is not None:
+                self.widget.after_cancel(job)
+        self._job = None
+        self._prefetch_job = None
+        if self.fade_item is not None and self.fade_item in self.scene.visible:
+            self.scene.show(self.scene.visible - {self.fade_item})
+
+    def _schedule_next(self):
+        """
+        Schedule the change to the next picture, if there is more than one.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if len(self.pictures) > 1:
+            self._job = self.widget.after(self.interval, self._advance)
+
+    def _display(self, index: int):
+        """
+        Display the picture number index and read the next one in the background.
+        :param index: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.index = index % len(self.pictures)
+        self.display(self.pictures[self.index])
+        if self._prefetch_job is not None:
+            self.widget.after_cancel(self._prefetch_job)
+            self._prefetch_job = None
+        if len(self.pictures) > 1:
+            next_picture = self.pictures[(self.index + 1) % len(self.pictures)]
+            self._reader = threading.Thread(target=read_ahead, args=(next_picture,), name="Slideshow", daemon=True)
+            self._reader.start()
+            self._prefetch_job = self.widget.after(PREFETCH_CHECK_INTERVAL, self._check_prefetch, next_picture)
+
+    def _check_prefetch(self, picture: str):
+        """
+        Decode the next picture once its file was read, else check again later.
+        Tk images can only be created by the thread of the window.
+        :param picture: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self._reader.is_alive():
+            self._prefetch_job = self.widget.after(PREFETCH_CHECK_INTERVAL, self._check_prefetch, picture)
+            return
+        self._prefetch_job = None
+        self.images.get(picture)
+        self.prefetched += 1
+
+    def _advance(self):
+        """
+        Change to the next picture, through a fade if there is one.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self._job = None
+        if self.fade_step:
+            self._fade(0)
+        else:
+            self._display(self.index + 1)
+            self._schedule_next()
+
+    def _fade(self, step: int):
+        """
+        One step of the fade: the picture is covered more and more, replaced under the full cover,
+        and then uncovered. Canvas images have no transparency, the cover is a black stippled rectangle.
+        :param step: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        levels = len(FADE_STIPPLES)
+        if step == 2 * levels - 1:
+            # Uncovered, wait for the next picture
+            self.scene.show(self.scene.visible - {self.fade_item})
+            self._job = None
+            self._schedule_next()
+            return
+        if step == levels - 1:
+            # Fully covered, change the picture underneath
+            self._display(self.index + 1)
+        self.scene.configure(self.fade_item, stipple=FADE_STIPPLES[min(step, 2 * levels - 2 - step)])
+        self.scene.show(self.scene.visible | {self.fade_item})
+        self._job = self.widget.after(self.fade_step, self._fade, step + 1)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 24, 2022
+# Last Modified: March 24, 2022
+#
+# Developed and tested using Python 3.7.3
+
+import collections
+import json
+import os
+import threading
+import time
+
+
+def process_start_time() -> float:
+    """
+    Return the time at which the process started, on the time.monotonic() clock.
+    Read from /proc so the time spent importing the modules is counted,
+    the time of the first call is returned if it is not available.
+    :return: float
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    try:
+        with open("/proc/self/stat") as stat:
+            # The fields following the name of the program, the 22nd field is the start time in clock ticks
+            fields = stat.read().rsplit(")", 1)[1].split()
+        started_after_boot = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return time.monotonic() - (time.clock_gettime(time.CLOCK_BOOTTIME) - started_after_boot)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.monotonic()
+
+
+def time_since_boot():
+    """
+    Return the time in seconds since the machine booted, None if it is not available.
+    :return: float or None
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    try:
+        return time.clock_gettime(time.CLOCK_BOOTTIME)
+    except (OSError, AttributeError):
+        return None
+
+
+class StartupTimer:
+    def __init__(self, start: float = None):
+        """
+        Measure the duration of the startup phases.
+        Each call to mark ends a phase, its duration is the time since the previous mark.
+        :param start: float, time.monotonic() time of the start, the start of the process by default
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        self.start = process_start_time() if start is None else start
+        # Duration of each phase in seconds, in order
+        self.phases = collections.OrderedDict()
+        # Time since boot at which the first frame was displayed
+        self.first_frame_since_boot = None
+        self._last_mark = self.start
+        # Phases are marked by the window and by the thread connecting the arduino
+        self._lock = threading.Lock()
+
+    def mark(self, phase: str) -> float:
+        """
+        End a phase, print and return its duration in seconds.
+        :param phase: string
+        :return: float
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(phase) == str, "Phase should be a string"
+
+        with self._lock:
+            now = time.monotonic()
+            duration = now - self._last_mark
+            self._last_mark = now
+            self.phases[phase] = duration
+            if phase == "first frame":
+                self.first_frame_since_boot = time_since_boot()
+        print("Startup: %-16s %7.1f ms (%.1f ms since start)" % (phase, duration * 1000, (now - self.start) * 1000))
+        return duration
+
+    def elapsed(self) -> float:
+        """
+        Return the time in seconds since the start.
+        :return: float
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return time.monotonic() - self.start
+
+    def save(self, path: str):
+        """
+        Append the measured phases to a file, one JSON line per start.
+        :param path: string
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(path) == str, "Path should be a string"
+
+        with self._lock:
+            record = {"date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                      "first frame since boot": self.first_frame_since_boot,
+                      "total": self._last_mark - self.start,
+                      "phases": dict(self.phases)}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="utf8") as file:
+            file.write(json.dumps(record) + "\n")
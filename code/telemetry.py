@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 30, 2022
+# Last Modified: March 30, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Telemetry of a game session: duration of the calls on the hot paths, game events and counters.
+# Recording only appends a tuple to a ring buffer, a background thread writes the records
+# to the session log by batches. One session log per start of the program, JSON lines:
+#   {"session": id, "started": wall clock time}     first line
+#   [t, "span", name, seconds]                      duration of a call
+#   [t, "event", name, value]                       game event (fsr, load cell, task, end screen...)
+#   [t, "counter", name, total]                     value of a counter, written when it changed
+# t is the time in seconds since the start of the session, on a monotonic clock.
+# See telemetry_report.py to aggregate the session logs. Standard library only, like the report.
+
+import atexit
+import collections
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+
+class Telemetry:
+    def __init__(self, capacity: int = 8192):
+        """
+        Ring buffer of the records of a session. When the buffer is full the oldest records
+        are overwritten, the number of records lost is written at the end of the log.
+        Records can be added from any thread.
+        :param capacity: int, number of records kept before they are written
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        assert type(capacity) == int and capacity > 0, "Capacity should be a positive integer"
+
+        self.records = collections.deque(maxlen=capacity)
+        self.counters = collections.Counter()
+        self.start = time.perf_counter()
+        self.session = time.strftime("%Y%m%d-%H%M%S")
+        self.path = None
+        # Records added, written to the log, and the counters as last written
+        self.recorded = 0
+        self.written = 0
+        self._written_counters = {}
+        # Held while a record is added and counted, the threads recording at once would lose counts
+        self._buffer_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def span(self, name: str, duration: float):
+        """
+        Record the duration of a call.
+        :param name: string
+        :param duration: float, seconds
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        with self._buffer_lock:
+            self.records.append((time.perf_counter() - self.start, "span", name, duration))
+            self.recorded += 1
+
+    def event(self, name: str, value=None):
+        """
+        Record a game event.
+        :param name: string
+        :param value: object serializable in JSON
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        with self._buffer_lock:
+            self.records.append((time.perf_counter() - self.start, "event", name, value))
+            self.recorded += 1
+
+    def count(self, name: str, amount: int = 1):
+        """
+        Increase a counter.
+        :param name: string
+        :param amount: int
+        :author: AUGUSTIN NOGUE
+        :version: 1.1
+        """
+        with self._buffer_lock:
+            self.counters[name] += amount
+
+    def open(self, folder: str, flush_interval: float):
+        """
+        Start writing the records to a new session log in the folder, every flush_interval seconds.
+        :param folder: string
+        :param flush_interval: float, seconds
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        assert type(folder) == str, "Folder should be a string"
+
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, "%s-%d.jsonl" % (self.session, os.getpid()))
+        with open(self.path, "a") as file:
+            file.write(json.dumps({"session": self.session, "started": time.time() - self.elapsed()}) + "\n")
+        self._thread = threading.Thread(target=self._run, args=(flush_interval,), name="Telemetry", daemon=True)
+        self._thread.start()
+        # The program can also leave through exit(), from a callback of the window
+        atexit.register(self.close)
+
+    def close(self):
+        """
+        Stop the background thread and write the last records. Only the first call does something.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        lost = self.recorded - self.written - len(self.records)
+        if lost > 0:
+            self.count("telemetry records lost", lost)
+        self.flush()
+
+    def elapsed(self) -> float:
+        """
+        Return the time in seconds since the start of the session.
+        :return: float
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        return time.perf_counter() - self.start
+
+    def flush(self):
+        """
+        Write the records waiting in the buffer and the counters that changed, in one write.
+        Nothing is written if no log is open.
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        if self.path is None:
+            return
+        with self._write_lock:
+            records = []
+            # popleft and append can be used by two threads at once, the buffer is never copied
+            while True:
+                try:
+                    records.append(self.records.popleft())
+                except IndexError:
+                    break
+            now = self.elapsed()
+            for name, total in list(self.counters.items()):
+                if self._written_counters.get(name) != total:
+                    self._written_counters[name] = total
+                    records.append((now, "counter", name, total))
+            if not records:
+                return
+            with open(self.path, "a") as file:
+                file.write("".join(json.dumps(record) + "\n" for record in records))
+            self.written += sum(1 for record in records if record[1] != "counter")
+
+    def _run(self, flush_interval: float):
+        """
+        Background loop writing the records.
+        :param flush_interval: float
+        :author: AUGUSTIN NOGUE
+        :version: 1.0
+        """
+        while not self._stop_event.wait(flush_interval):
+            try:
+                self.flush()
+            except OSError as error:
+                print("Telemetry not written: %s" % error)
+
+
+# Telemetry of the program, written once open is called (see main.py)
+recorder = Telemetry()
+
+
+def percentile(values: list, rank: float) -> float:
+    """
+    Return the value at the given percentile (nearest rank: the smallest value with at least rank percent
+    of the values lower or equal).
+    :param values: list of floats
+    :param rank: float, between 0 and 100
+    :return: float
+    :author: AUGUSTIN NOGUE
+    :version: 1.1
+    """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(rank * len(ordered) / 100) - 1))
+    return ordered[index]
+
+
+def timed(function):
+    """
+    Decorator recording the duration of each call of the function, under its name.
+    :param function: function
+    :return: function
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    name = function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            recorder.span(name, time.perf_counter() - start)
+
+    return wrapper
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 30, 2022
+# Last Modified: March 30, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# Report of the session logs written by telemetry.py: histogram of the duration of each
+# instrumented call, time taken by the players for each step of the puzzle, and counters.
+# Use (files or folders of session logs):
+#     python3 telemetry_report.py Logs/telemetry/
+#     python3 telemetry_report.py --json report.json Logs/telemetry/*.jsonl
+
+import argparse
+import collections
+import json
+import os
+from telemetry import percentile
+
+# Folder of the session logs, telemetry_folder of configuration.py. Not imported from it,
+# the report is made on any computer, without the modules of the hardware.
+default_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), 'Logs/telemetry/'))
+
+# Upper bounds of the histogram buckets (milliseconds), the last bucket has no bound
+HISTOGRAM_BOUNDS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+# Width of the longest bar of a histogram (characters)
+BAR_WIDTH = 40
+
+
+def read_session(path: str) -> dict:
+    """
+    Read a session log. Return its spans by name, its milestones (time, step) in order and its counters.
+    A line cut by a crash at the end of the log is ignored.
+    :param path: string
+    :return: dict
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    assert type(path) == str, "Path should be a string"
+
+    session = {"path": path, "spans": collections.defaultdict(list), "milestones": [], "counters": {}}
+    with open(path, encoding="utf8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                session.update(record)
+                continue
+            t, kind, name, value = record
+            if kind == "span":
+                session["spans"][name].append(value)
+            elif kind == "counter":
+                session["counters"][name] = value
+            elif kind == "event":
+                # Tasks are told apart by their name
+                session["milestones"].append((t, name if name != "task" else "task %s" % value))
+    return session
+
+
+def session_paths(paths: list) -> list:
+    """
+    Return the session logs given, the folders are replaced by the logs they hold.
+    :param paths: list of strings
+    :return: list of strings
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(".jsonl"))
+        else:
+            files.append(path)
+    return files
+
+
+def histogram(values: list) -> list:
+    """
+    Count the durations (seconds) in each bucket of HISTOGRAM_BOUNDS.
+    :param values: list of floats
+    :return: list of integers, one more than the bounds
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    counts = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+    for value in values:
+        milliseconds = value * 1000
+        bucket = 0
+        while bucket < len(HISTOGRAM_BOUNDS) and milliseconds > HISTOGRAM_BOUNDS[bucket]:
+            bucket += 1
+        counts[bucket] += 1
+    return counts
+
+
+def step_durations(milestones: list) -> dict:
+    """
+    Return the time taken for each step of a game: from the previous milestone to this one,
+    the game starting when the fsr is pressed. The total is the time from the fsr to the end screen.
+    :param milestones: list of (time, step)
+    :return: dict
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    durations = collections.OrderedDict()
+    start = previous = None
+    for t, step in milestones:
+        if step == "fsr":
+            start = previous = t
+            durations.clear()
+            continue
+        if previous is None or step in durations:
+            continue
+        durations[step] = t - previous
+        previous = t
+        if step == "end screen":
+            durations["total"] = t - start
+    return durations
+
+
+def build_report(paths: list) -> dict:
+    """
+    Aggregate the session logs.
+    :param paths: list of strings
+    :return: dict
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    spans = collections.defaultdict(list)
+    steps = collections.OrderedDict()
+    counters = collections.Counter()
+    sessions = [read_session(path) for path in session_paths(paths)]
+    for session in sessions:
+        for name, values in session["spans"].items():
+            spans[name].extend(values)
+        for step, duration in step_durations(session["milestones"]).items():
+            steps.setdefault(step, []).append(duration)
+        counters.update(session["counters"])
+    return {
+        "sessions": len(sessions),
+        "games finished": len(steps.get("total", [])),
+        "spans": {name: {"calls": len(values), "p50": percentile(values, 50), "p90": percentile(values, 90),
+                         "p99": percentile(values, 99), "max": max(values), "histogram": histogram(values)}
+                  for name, values in sorted(spans.items())},
+        "steps": {step: {"games": len(values), "p50": percentile(values, 50), "p90": percentile(values, 90),
+                         "max": max(values)}
+                  for step, values in steps.items()},
+        "counters": dict(counters),
+    }
+
+
+def print_report(report: dict):
+    """
+    Print the report: histograms in milliseconds, steps in minutes and seconds.
+    :param report: dict
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    print("%d sessions, %d games finished" % (report["sessions"], report["games finished"]))
+    for name, span in report["spans"].items():
+        print("\n%s: %d calls, p50 %.2f ms, p90 %.2f ms, p99 %.2f ms, max %.2f ms"
+              % (name, span["calls"], span["p50"] * 1000, span["p90"] * 1000, span["p99"] * 1000, span["max"] * 1000))
+        largest = max(span["histogram"])
+        for i, count in enumerate(span["histogram"]):
+            if not count:
+                continue
+            bound = "<= %g ms" % HISTOGRAM_BOUNDS[i] if i < len(HISTOGRAM_BOUNDS) else "> %g ms" % HISTOGRAM_BOUNDS[-1]
+            print("  %12s %7d %s" % (bound, count, "#" * max(1, count * BAR_WIDTH // largest)))
+
+    if report["steps"]:
+        print("\n%-16s %6s %8s %8s %8s" % ("step", "games", "p50", "p90", "max"))
+        for step, values in report["steps"].items():
+            print("%-16s %6d %8s %8s %8s" % (step, values["games"], minutes(values["p50"]), minutes(values["p90"]),
+                                             minutes(values["max"])))
+    if report["counters"]:
+        print()
+        for name, total in sorted(report["counters"].items()):
+            print("%s: %d" % (name, total))
+
+
+def minutes(seconds: float) -> str:
+    """
+    Format a duration as minutes:seconds.
+    :param seconds: float
+    :return: string
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    return "%d:%04.1f" % divmod(seconds, 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report of the telemetry of the game sessions")
+    parser.add_argument("paths", nargs="*", default=[default_folder], help="session logs or folders of logs")
+    parser.add_argument("--json", help="also write the report in this file")
+    arguments = parser.parse_args()
+
+    telemetry_report = build_report(arguments.paths)
+    print_report(telemetry_report)
+    if arguments.json:
+        with open(arguments.json, "w") as report_file:
+            json.dump(telemetry_report, report_file, indent=2)
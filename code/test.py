@@ -1,6 +1,51 @@
 import unittest
+import unittest.mock
 from raspberry import *
 from configuration import *
+from sensors import SensorWatcher
+import images
+from images import ImageCache, fit_factor, is_opaque, open_asset_bundle
+from bundle import AssetBundle, build_bundle
+from rfid_service import RfidService
+from rfid_readers import RfidReaderManager, open_rfid_reader
+from floppy import FloppyReader
+from scene import Scene
+from startup import StartupTimer
+from puzzle import Puzzle, load_puzzle, pack_uid
+from slideshow import Slideshow
+from server import ControlServer, DeskSession
+from websocket import accept_key, encode_frame, read_frame
+from telemetry import Telemetry, percentile, recorder, timed
+from telemetry_report import build_report, step_durations
+from journal import Journal, compact_game, game_records, replay
+from game_clock import GameClock
+from hints import HintScheduler, OperatorHints, send_hint
+from shared_state import STATE_OFFSET, SEQUENCE, SEQUENCE_OFFSET, SharedState
+from hardware_daemon import HardwareDaemon
+from hardware_client import DaemonSensorWatcher, HardwareClient
+from simulator.arduino import ArduinoEmulator, SampleSource, frame
+from serial_link import SerialLink, wait_for_ready
+from simulator.floppy import FakeFloppy
+from simulator import rfid as fake_rfid
+from session_record import SessionRecorder, SessionRecording
+from session_replay import ReplayFloppyReader, ReplayRfidService, VirtualClock
+from mirror import SceneMirror, apply_frame
+import asyncio
+import base64
+import json
+import serial
+import shutil
+import socket
+import struct
+import subprocess
+import tempfile
+import zlib
+# NumPy is only needed by the stream mode
+try:
+    import numpy
+    import signal_processing
+except ImportError:
+    numpy = None
 
 
 # Testing of the arduino serial communication with the pi
@@ -15,6 +60,315 @@ class TestArduinoFunctions(unittest.TestCase):
         setup_arduino()
         self.assertEqual(get_arduino_sensor_status("load cell"), False)
 
+    # Both sensors read within the time to live of the snapshot cost one request
+    def test_sensor_snapshot(self):
+        setup_arduino()
+        snapshot = get_sensor_snapshot(max_age=60)
+        self.assertEqual(snapshot.states, {"fsr": False, "load cell": False})
+        self.assertIs(get_sensor_snapshot(max_age=60), snapshot)
+        self.assertIsNot(get_sensor_snapshot(max_age=0), snapshot)
+        # The readings were not part of the cached snapshot
+        self.assertEqual(set(get_sensor_snapshot(raw=True, max_age=60).readings), {"fsr", "load cell"})
+
+    # Testing of the reply to "status all raw" of the emulated arduino
+    def test_status_frame(self):
+        arduino = ArduinoEmulator()
+        arduino.start()
+        port = serial.Serial(arduino.port, 9600, timeout=1)
+        try:
+            arduino.press_fsr()
+            port.write(b"status all raw\n")
+            snapshot = decode_status_frame(port.readline().decode("utf-8"))
+        finally:
+            port.close()
+            arduino.stop()
+        self.assertEqual(snapshot.states, {"fsr": True, "load cell": False})
+        self.assertEqual(snapshot.readings, {"fsr": 900, "load cell": 0})
+
+
+# Testing of the serial link with an emulated arduino
+class TestSerialLink(unittest.TestCase):
+    def setUp(self):
+        self.arduino = ArduinoEmulator()
+        self.arduino.start()
+        self.link = SerialLink(self.arduino.port, 9600, 2, 0.1, 8, 0.05, 0.2)
+        self.link.start()
+        self.assertTrue(self.link.wait_connected(5))
+
+    def tearDown(self):
+        self.link.close()
+        self.arduino.stop()
+
+    # The requests are all sent before the first reply, each gets its own reply
+    def test_pipelined_requests(self):
+        self.arduino.press_fsr()
+        futures = [self.link.send(request, 2, True) for request in
+                   (b"status update fsr\n", b"status all\n", b"status update load cell\n", b"foo\n")]
+        replies = [future.result() for future in futures]
+        self.assertEqual(replies[0], "fsr activated: true")
+        self.assertEqual(decode_status_frame(replies[1]).states, {"fsr": True, "load cell": False})
+        self.assertEqual(replies[2:], ["load cell activated: false", "invalid Command"])
+
+    # The states are sent again when the arduino restarts
+    def test_states_after_reset(self):
+        self.link.send(b"setup\n", 2, state="setup").result()
+        self.link.send(b"deactivate solenoide\n", 2, state="solenoide").result()
+        time.sleep(0.3)
+        self.arduino.reboot()
+        time.sleep(0.2)
+        self.assertEqual(self.link.request(b"status update fsr\n", 2), "fsr activated: false")
+        self.assertEqual(self.arduino.commands["setup"], 2)
+        self.assertFalse(self.arduino.solenoid_on)
+
+    # A pushed line the handler fails on is dropped, the link is kept
+    def test_failing_pushed_line(self):
+        def on_line(line):
+            if line.startswith("#"):
+                raise ValueError("damaged frame")
+            return False
+        self.link.on_line = on_line
+        self.link.send(b"push mode on\n", 2).result()
+        self.assertEqual(self.link.request(b"push mode off\n", 2), "push mode off")
+        self.assertEqual(self.link.request(b"status update fsr\n", 2), "fsr activated: false")
+        self.assertEqual(self.link.connections, 1)
+
+    # A request not answered fails alone, its late reply is skipped; requests answered by nothing reconnect
+    def test_unanswered_request(self):
+        self.link.send(b"setup\n", 2, state="setup").result()
+        self.assertRaises(TimeoutError, self.link.send(b"setup\n", 0.2, True).result)
+        time.sleep(self.link.late_reply_time)
+        self.assertEqual(self.link.request(b"status update fsr\n", 2), "fsr activated: false")
+        self.assertEqual((self.link.connections, self.arduino.commands["setup"]), (1, 2))
+        futures = [self.link.send(b"setup\n", 0.2, True) for _ in range(self.link.max_unanswered)]
+        for future in futures:
+            self.assertRaises(TimeoutError, future.result)
+        self.assertEqual(self.link.request(b"status update fsr\n", 2), "fsr activated: false")
+        self.assertEqual(self.link.connections, 2)
+
+    # A silent link is closed and opened again, the states are sent again
+    def test_reconnect(self):
+        self.link.send(b"setup\n", 2, state="setup").result()
+        self.link.idle_timeout = 0.2
+        time.sleep(1)
+        self.link.idle_timeout = None
+        self.assertEqual(self.link.request(b"status update fsr\n", 2), "fsr activated: false")
+        self.assertGreaterEqual(self.link.connections, 2)
+        self.assertGreaterEqual(self.arduino.commands["setup"], 2)
+
+    # A state given before the connection is sent once, with the states
+    def test_state_before_connection(self):
+        arduino = ArduinoEmulator()
+        arduino.start()
+        link = SerialLink(arduino.port, 9600, 2, 0.1, 8, 0.05, 0.2)
+        try:
+            future = link.send(b"setup\n", 2, state="setup")
+            link.start()
+            self.assertIsNone(future.result())
+            self.assertEqual(link.request(b"status update fsr\n", 2), "fsr activated: false")
+            self.assertEqual(arduino.commands["setup"], 1)
+        finally:
+            link.close()
+            arduino.stop()
+
+    def test_deadline_without_arduino(self):
+        link = SerialLink("/dev/enigm-esc-missing", 9600, 0.1, 0.05, 1, 0.05, 0.1)
+        link.start()
+        try:
+            first = link.send(b"setup\n", 0.2)
+            self.assertRaises(ConnectionError, link.send(b"setup\n", 0.2).result)
+            self.assertRaises(TimeoutError, first.result)
+        finally:
+            link.close()
+
+
+# Testing of the hardware daemon and of the state it shares with the window
+class TestHardwareDaemon(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.state_path = os.path.join(self.folder, "state")
+        self.socket_path = os.path.join(self.folder, "socket")
+
+    def start_daemon(self):
+        daemon = HardwareDaemon(self.state_path, self.socket_path, 1024, 0.05)
+        thread = threading.Thread(target=daemon.run)
+        thread.start()
+        while not os.path.exists(self.socket_path):
+            time.sleep(0.01)
+        return daemon, thread
+
+    def test_seqlock(self):
+        writer = SharedState(self.state_path, 1024, writable=True)
+        reader = SharedState(self.state_path, 1024)
+        writer.publish("clue of the disk", uid=[1, 2, 3, 4, 5], scans=1, floppy_status="ready")
+        self.assertEqual((reader.read().uid, reader.read().floppy_status), ([1, 2, 3, 4, 5], "ready"))
+        self.assertEqual(reader.read_text()[1], "clue of the disk")
+        # A writer stopped in the middle of a write: the reader keeps the last complete state
+        sequence = SEQUENCE.unpack_from(writer._map, SEQUENCE_OFFSET)[0]
+        SEQUENCE.pack_into(writer._map, SEQUENCE_OFFSET, sequence + 1)
+        writer._map[STATE_OFFSET:STATE_OFFSET + 8] = bytes(8)
+        self.assertEqual(reader.read().scans, 1)
+        self.assertIsNone(reader.read_text()[1])
+        # The next writer finds the state where the previous one left it
+        writer.close()
+        writer = SharedState(self.state_path, 1024, writable=True)
+        writer.publish(starts=2)
+        self.assertEqual((reader.read().scans, reader.read().starts), (1, 2))
+        writer.close()
+        reader.close()
+
+    def test_sensors_in_order(self):
+        writer = SharedState(self.state_path, 1024, writable=True)
+        client = HardwareClient(self.state_path, self.socket_path, 1024, 1, 1)
+        watcher = DaemonSensorWatcher(client, ["fsr", "load cell"])
+        watcher.start()
+        watcher._prepared.wait(1)
+        events = []
+        writer.publish(load_cell=time.monotonic())
+        watcher.dispatch(events.append)
+        self.assertEqual(events, [])
+        writer.publish(fsr=time.monotonic())
+        watcher.dispatch(events.append)
+        self.assertEqual(events, ["fsr", "load cell"])
+        self.assertFalse(watcher.is_running())
+        # No daemon to answer
+        self.assertRaises(ConnectionError, client.setup_arduino().result)
+        client.close()
+        writer.close()
+
+    # The daemon answers the commands, a new daemon keeps the state of the previous one
+    def test_commands_and_restart(self):
+        daemon, thread = self.start_daemon()
+        client = HardwareClient(self.state_path, self.socket_path, 1024, 5, 1)
+        try:
+            client.setup_arduino().result()
+            client.deactivate_solenoide().result()
+            self.assertRaises(ValueError, client.send("foo").result)
+            self.assertTrue(client.wait_arduino_connected(5))
+            daemon.stop()
+            thread.join()
+            self.assertEqual(client.read_state().solenoide, 0)
+            daemon, thread = self.start_daemon()
+            time.sleep(0.2)
+            self.assertEqual((client.read_state().starts, client.read_state().solenoide), (2, 0))
+            self.assertTrue(client.is_alive())
+        finally:
+            daemon.stop()
+            thread.join()
+            client.close()
+        # The link of the tests is shared with the daemon
+        disable_push_mode()
+        report_command_failure(activate_solenoide(), "Desk lock")
+
+
+# Testing of the background sensor watcher
+class TestSensorWatcher(unittest.TestCase):
+    # No activation should be reported after setup
+    def test_no_event_after_setup(self):
+        setup_arduino()
+        watcher = SensorWatcher(["fsr", "load cell"], sensor_poll_interval)
+        watcher.start()
+        time.sleep(0.5)
+        watcher.stop()
+        self.assertTrue(watcher.events.empty())
+        self.assertFalse(watcher.is_running())
+
+
+# Testing of the request parser of the arduino, compiled for the host (arduino/host/parser_test.cpp)
+@unittest.skipUnless(shutil.which("g++"), "g++ is needed to compile the parser")
+class TestFirmwareParser(unittest.TestCase):
+    # Requests sent by raspberry.py
+    requests = b"setup\ncleanup\ndeactivate solenoide\nstatus update fsr\nstatus update load cell\n" \
+               b"push mode on\npush mode off\nping\nactivate solenoide\nstatus all\nstatus all raw\n" \
+               b"stream on\nstream off\n"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.program = os.path.join(cls.folder, "parser_test")
+        arduino_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "arduino")
+        # Memory errors stop the program when the sanitizers are available
+        command = ["g++", "-I" + arduino_folder, os.path.join(arduino_folder, "host", "parser_test.cpp"),
+                   os.path.join(arduino_folder, "command_parser.cpp"), os.path.join(arduino_folder, "sample_batch.cpp"),
+                   "-o", cls.program]
+        if subprocess.run(command[:1] + ["-fsanitize=address,undefined"] + command[1:]).returncode != 0:
+            subprocess.run(command, check=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def run_parser(self, arguments, data):
+        return subprocess.run([self.program] + arguments, input=data, stdout=subprocess.PIPE, timeout=60)
+
+    def test_requests(self):
+        result = self.run_parser(["parse"], self.requests + b"status update foo\r\nfoo\n" + b"a" * 100 + b"\n")
+        self.assertEqual(result.stdout.decode().splitlines(),
+                         ["setup", "cleanup", "deactivate solenoide", "status fsr", "status load cell",
+                          "push mode on", "push mode off", "ping", "activate solenoide", "status all",
+                          "status all raw", "stream on", "stream off", "status invalid", "invalid", "invalid"])
+
+    def test_fuzz(self):
+        result = self.run_parser(["fuzz", "20000", "1"], self.requests)
+        self.assertEqual(result.returncode, 0)
+
+    # The batches of the firmware are read back by the Raspberry Pi
+    def test_sample_batch(self):
+        samples = [0, 1, -1, 8388607, -8388608, 300, -7050, 84000, 12]
+        result = self.run_parser(["batch", "3", "4"], "\n".join(map(str, samples)).encode())
+        batches = [base64.b64decode(line) for line in result.stdout.decode().splitlines()]
+        self.assertEqual(batches, [b"".join(sample.to_bytes(3, "little", signed=True) for sample in samples[i:i + 4])
+                                   for i in (0, 4)])
+
+
+# Testing of the frames pushed by the arduino
+class TestPushProtocol(unittest.TestCase):
+    def test_decode_event_frame(self):
+        self.assertEqual(decode_push_frame("#E,F,1,1200,7*06\r\n"), PushFrame("E", "fsr", True, 1200, 7))
+
+    def test_decode_heartbeat_frame(self):
+        self.assertEqual(decode_push_frame("#H,5000,12*4E"), PushFrame("H", None, None, 5000, 12))
+
+    def test_decode_invalid_frames(self):
+        self.assertIsNone(decode_push_frame("#E,F,1,1200,7*00"))
+        self.assertIsNone(decode_push_frame("fsr activated: true"))
+        self.assertIsNone(decode_push_frame("#E,X,1,1200,7*18"))
+
+    def test_decode_sample_frame(self):
+        line = frame("R,L,3,800,%s" % base64.b64encode(b"\x01\x02\x03\xff\xff\xff").decode()).decode()
+        self.assertEqual(decode_sample_frame(line), SampleFrame("load cell", 3, 800, b"\x01\x02\x03\xff\xff\xff"))
+        self.assertIsNone(decode_sample_frame(frame("R,L,3,800,AQID!").decode()))
+        self.assertIsNone(decode_sample_frame(frame("R,X,3,800,AQID").decode()))
+        # 3 bytes are not a whole number of FSR samples
+        self.assertIsNone(decode_sample_frame(frame("R,F,5,1000,AQID").decode()))
+        self.assertIsNone(decode_sample_frame("#E,F,1,1200,7*06"))
+
+    def test_decode_status_frame(self):
+        snapshot = decode_status_frame("#S,1500,F1,L0,f912,l-20*6F")
+        self.assertEqual((snapshot.states, snapshot.readings, snapshot.timestamp),
+                         ({"fsr": True, "load cell": False}, {"fsr": 912, "load cell": -20}, 1500))
+        # Checksum, missing sensor and reply of an older firmware
+        self.assertIsNone(decode_status_frame("#S,1500,F1,L0*00"))
+        self.assertIsNone(decode_status_frame("#S,1500,F1*20"))
+        self.assertIsNone(decode_status_frame("invalid Command"))
+
+    def test_snapshot_update(self):
+        receiver = PushReceiver()
+        receiver.handle_line("#E,L,1,300,1*3A")
+        receiver.handle_line("#H,1000,4*7D")
+        self.assertEqual(receiver.state, {"fsr": False, "load cell": True})
+        self.assertEqual(receiver.lost_frames, 2)
+        self.assertTrue(receiver.link_alive())
+
+    # Testing of the push mode against the arduino
+    def test_push_mode_status(self):
+        setup_arduino()
+        enable_push_mode()
+        time.sleep(0.5)
+        self.assertEqual(get_arduino_sensor_status("fsr"), False)
+        self.assertEqual(get_arduino_sensor_status("load cell"), False)
+        disable_push_mode()
+
 
 # Testing of the function interacting with the files
 class TestFileFunctions(unittest.TestCase):
@@ -31,11 +385,1145 @@ class TestFileFunctions(unittest.TestCase):
         self.assertEqual(read_txt(os.path.join(os.path.dirname(__file__), 'testing/test1.txt')), 'foobar')
 
 
+# Image standing for a decoded PhotoImage in the image cache tests
+class FakeImage:
+    def __init__(self, width, height):
+        self.size = (width, height)
+
+    def width(self):
+        return self.size[0]
+
+    def height(self):
+        return self.size[1]
+
+
+# Testing of the decoded image cache
+class TestImageCache(unittest.TestCase):
+    def setUp(self):
+        self.loaded = []
+        self.png = os.path.join(os.path.dirname(__file__), 'testing/test2.png')
+        self.txt = os.path.join(os.path.dirname(__file__), 'testing/test1.txt')
+
+    def loader(self, path, size):
+        self.loaded.append(path)
+        return FakeImage(10, 10)
+
+    def test_image_decoded_once(self):
+        cache = ImageCache(1000, self.loader)
+        self.assertIs(cache.get(self.png), cache.get(self.png))
+        self.assertEqual(len(self.loaded), 1)
+        self.assertEqual(cache.hits, 1)
+
+    def test_memory_capped(self):
+        # Each fake image takes 400 bytes
+        cache = ImageCache(500, self.loader)
+        cache.get(self.png)
+        cache.get(self.txt)
+        self.assertEqual(cache.used_bytes, 400)
+        cache.get(self.png)
+        self.assertEqual(len(self.loaded), 3)
+
+    def test_fit_factor(self):
+        self.assertEqual(fit_factor(1920, 1080, (1920, 1080)), 1)
+        self.assertEqual(fit_factor(4000, 3000, (1920, 1080)), 3)
+
+    def test_opaque_pictures(self):
+        self.assertTrue(is_opaque(os.path.join(picture_frame_folder, 'pic_1.png')))
+        self.assertFalse(is_opaque(os.path.join(assets_folder, 'back_button.png')))
+
+    # Only a tRNS chunk before the image data counts, not the same bytes inside the data
+    def test_opaque_chunks(self):
+        def chunk(kind, data):
+            return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        header = b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+        paths = [os.path.join(folder, name) for name in ("data.png", "trns.png")]
+        with open(paths[0], "wb") as file:
+            file.write(header + chunk(b"IDAT", b"tRNS") + chunk(b"IEND", b""))
+        with open(paths[1], "wb") as file:
+            file.write(header + chunk(b"tRNS", b"\0\0\0\0\0\0") + chunk(b"IDAT", b"") + chunk(b"IEND", b""))
+        self.assertTrue(is_opaque(paths[0]))
+        self.assertFalse(is_opaque(paths[1]))
+
+
+# Testing of the bundle of the assets
+class TestAssetBundle(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.assets = os.path.join(self.folder, "Assets")
+        os.makedirs(self.assets)
+        self.png = os.path.join(self.assets, "test2.png")
+        shutil.copy(os.path.join(os.path.dirname(__file__), 'testing/test2.png'), self.png)
+        self.txt = os.path.join(self.assets, "clue.txt")
+        with open(self.txt, "w", encoding="utf8") as file:
+            file.write("Look under the desk")
+        self.path = os.path.join(self.folder, "assets.bundle")
+        build_bundle(self.path, [(self.png, self.png), (self.txt, self.txt)])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_read_assets(self):
+        bundle = AssetBundle(self.path)
+        with open(self.png, "rb") as file:
+            self.assertEqual(bundle.data(self.png), file.read())
+        self.assertEqual(bundle.text(self.txt), "Look under the desk")
+        self.assertEqual(bundle.files(self.assets, ".png"), [self.png])
+        self.assertEqual(bundle.verify(), [])
+        bundle.close()
+
+    # A damaged asset is found when it is first used and left to its loose file
+    def test_damaged_asset(self):
+        self.damage_last_asset()
+        bundle = AssetBundle(self.path, True)
+        self.assertTrue(bundle.contains(self.png))
+        # Only the asset used is checked
+        self.assertEqual(bundle.checked, {"Assets/test2.png"})
+        self.assertFalse(bundle.contains(self.txt))
+        self.assertEqual(bundle.verify(), ["Assets/clue.txt"])
+        bundle.close()
+
+    def damage_last_asset(self):
+        with open(self.path, "r+b") as file:
+            file.seek(-1, os.SEEK_END)
+            last_byte = file.read(1)[0]
+            file.seek(-1, os.SEEK_END)
+            file.write(bytes([last_byte ^ 0xFF]))
+
+    # Every asset is checked when the bundle is opened, before the game starts
+    def test_damaged_asset_found_at_startup(self):
+        self.damage_last_asset()
+        self.addCleanup(setattr, images, "asset_bundle", None)
+        bundle = open_asset_bundle(self.path, True)
+        self.addCleanup(bundle.close)
+        self.assertEqual(bundle.checked, {"Assets/clue.txt", "Assets/test2.png"})
+        self.assertEqual(bundle.damaged, {"Assets/clue.txt"})
+        self.assertFalse(bundle.contains(self.txt))
+
+    # Only the bundle was copied to the desk: a damaged asset cannot be read from its loose file
+    def test_damaged_asset_without_loose_file(self):
+        self.damage_last_asset()
+        os.remove(self.txt)
+        self.assertRaises(FileNotFoundError, open_asset_bundle, self.path, True)
+        self.assertIsNone(images.asset_bundle)
+
+    def test_outdated_asset(self):
+        os.utime(self.txt, ns=(0, 0))
+        bundle = AssetBundle(self.path)
+        self.assertEqual(bundle.remove_outdated(), ["Assets/clue.txt"])
+        bundle.close()
+
+    def test_not_a_bundle(self):
+        self.assertRaises(ValueError, AssetBundle, self.txt)
+
+
 # Testing of the RFID
 class TestRFIDFunctions(unittest.TestCase):
     def test_rfid(self):
         self.assertEqual(rfid_scan(), [25, 201, 83, 179, 48])
 
 
+# Reader standing for pirc522.RFID, a card is in front of it as long as uid is not None
+class FakeReader:
+    def __init__(self):
+        self.irq = threading.Event()
+        self.uid = None
+
+    def wait_for_tag(self):
+        while self.uid is None and not self.irq.wait(0.01):
+            pass
+        self.irq.clear()
+
+    def request(self):
+        return (self.uid is None, None)
+
+    def anticoll(self):
+        return (self.uid is None, self.uid)
+
+    def util(self):
+        return self
+
+    def deauth(self):
+        pass
+
+
+# Testing of the background RFID scan
+class TestRfidService(unittest.TestCase):
+    def setUp(self):
+        self.reader = FakeReader()
+        self.service = RfidService(1, lambda: self.reader)
+
+    def tearDown(self):
+        self.service.stop()
+
+    def wait_result(self):
+        for _ in range(100):
+            result = self.service.get_result()
+            if result is not None:
+                return result
+            time.sleep(0.01)
+        return None
+
+    def test_scan(self):
+        self.service.start_scan()
+        self.reader.uid = [25, 201, 83, 179, 48, 0]
+        self.assertEqual(self.wait_result()[0], [25, 201, 83, 179, 48])
+        self.assertFalse(self.service.is_scanning())
+
+    def test_same_card_debounced(self):
+        self.reader.uid = [25, 201, 83, 179, 48]
+        self.service.start_scan()
+        self.assertIsNotNone(self.wait_result())
+        self.service.start_scan()
+        self.assertIsNone(self.wait_result())
+
+    def test_cancel_scan(self):
+        self.service.start_scan()
+        time.sleep(0.05)
+        self.service.cancel_scan()
+        self.reader.uid = [25, 201, 83, 179, 48]
+        self.assertIsNone(self.wait_result())
+
+
+# Testing of the polling of several readers, on the fake readers of the simulator
+class TestRfidReaders(unittest.TestCase):
+    def setUp(self):
+        self.manager = RfidReaderManager({"drawer 1": {"device": 5}, "drawer 2": {"device": 6}}, 0.02, 1,
+                                         lambda options: fake_rfid.FakeRFID(**options))
+        self.manager.start()
+
+    def tearDown(self):
+        self.manager.stop()
+        for device in (5, 6):
+            fake_rfid.field(device).remove()
+
+    def test_reader_reported(self):
+        fake_rfid.field(6).present([25, 201, 83, 179, 48])
+        result = self.manager.results.get(timeout=1)
+        self.assertEqual((result.reader, result.uid), ("drawer 2", [25, 201, 83, 179, 48]))
+        # The round of the read is measured once it ends
+        self.manager.stop()
+        self.assertLessEqual(result.read_time - fake_rfid.field(6).presented, self.manager.latency_bound())
+
+    # A card left on a reader is reported once, the same card on another reader is reported
+    def test_card_left_debounced(self):
+        fake_rfid.field(5).present([25, 201, 83, 179, 48])
+        self.assertEqual(self.manager.results.get(timeout=1).reader, "drawer 1")
+        time.sleep(0.1)
+        self.assertIsNone(self.manager.get_result())
+        fake_rfid.field(5).remove()
+        fake_rfid.field(6).present([25, 201, 83, 179, 48])
+        self.assertEqual(self.manager.results.get(timeout=1).reader, "drawer 2")
+        self.assertEqual(self.manager.reads, {"drawer 1": 1, "drawer 2": 1})
+
+    # A card answering the request of the poll is not asked again before its UID is read
+    def test_card_requested_once(self):
+        reader = fake_rfid.FakeRFID(device=7)
+        self.addCleanup(fake_rfid.field(7).remove)
+        fake_rfid.field(7).present([25, 201, 83, 179, 48])
+        self.assertEqual(reader.request()[0], False)
+        # A second request puts the card back to idle, it does not answer the anticollision
+        self.assertEqual(reader.request()[0], True)
+        self.assertEqual(read_rfid_uid(reader, requested=True), [])
+        self.manager.poll("drawer 1", reader)
+        self.assertEqual(self.manager.get_result().uid, [25, 201, 83, 179, 48])
+
+    # The readers are opened without an IRQ pin, two readers cannot share one
+    def test_irq_pin(self):
+        with unittest.mock.patch("rfid_readers.RFID") as rfid:
+            open_rfid_reader({"device": 1})
+            open_rfid_reader({"device": 1, "pin_irq": 22})
+        self.assertEqual(rfid.call_args_list, [unittest.mock.call(device=1, pin_irq=None),
+                                               unittest.mock.call(device=1, pin_irq=22)])
+        with self.assertRaises(AssertionError):
+            RfidReaderManager({"a": {"device": 0, "pin_irq": 22}, "b": {"device": 1, "pin_irq": 22}}, 0.02, 1)
+
+
+# Testing of the floppy reader against a disk image file
+class TestFloppyReader(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.image = os.path.join(self.folder, "floppy.img")
+        self.mount_point = os.path.join(self.folder, "mount")
+        os.mkdir(self.mount_point)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write_image(self, content: bytes):
+        with open(self.image, "wb") as file:
+            file.write(content)
+
+    def test_disk_read_once(self):
+        # The "mount" only checks the commands are run, the text is already in the mount point
+        with open(os.path.join(self.mount_point, "clue.txt"), "w") as file:
+            file.write("foobar")
+        reader = FloppyReader(self.image, "true", "true", os.path.join(self.mount_point, "clue.txt"), 1, 5)
+        reader.check_drive()
+        self.assertIsNone(reader.get_text())
+        self.assertEqual(reader.status, "no disk")
+        self.write_image(b"disk one" * 100)
+        reader.check_drive()
+        self.assertEqual(reader.get_text(), "foobar")
+        reader.check_drive(True)
+        self.assertEqual(reader.reads, 1)
+        # Another disk
+        self.write_image(b"disk two" * 100)
+        reader.check_drive()
+        self.assertEqual(reader.reads, 2)
+
+    # The text left in the mount point is not the one of the disk
+    def test_failed_mount(self):
+        with open(os.path.join(self.mount_point, "clue.txt"), "w") as file:
+            file.write("stale")
+        self.write_image(b"disk one" * 100)
+        reader = FloppyReader(self.image, "false", "true", os.path.join(self.mount_point, "clue.txt"), 1, 5)
+        reader.check_drive()
+        self.assertEqual(reader.status, "error")
+        self.assertIsNone(reader.get_text())
+
+    # The disk is identified through a command, like sudo dd on the block device
+    def test_identity_command(self):
+        with open(os.path.join(self.mount_point, "clue.txt"), "w") as file:
+            file.write("foobar")
+        self.write_image(b"disk one" * 100)
+        text_path = os.path.join(self.mount_point, "clue.txt")
+        reader = FloppyReader(self.image, "true", "true", text_path, 1, 5, "cat %s" % self.image)
+        reader.check_drive()
+        self.assertEqual(reader.get_text(), "foobar")
+        # Not allowed to read the disk
+        reader = FloppyReader(self.image, "true", "true", text_path, 1, 5, "false")
+        reader.check_drive()
+        self.assertEqual(reader.status, "error")
+
+    # Mount a real FAT disk image through a loop device
+    @unittest.skipUnless(shutil.which("mkfs.msdos") and shutil.which("mcopy") and os.geteuid() == 0,
+                         "Needs root, mkfs.msdos and mtools")
+    def test_loopback_image(self):
+        run_command("mkfs.msdos -C %s 1440" % self.image, 10)
+        clue = os.path.join(self.folder, "clue.txt")
+        with open(clue, "w") as file:
+            file.write("foobar")
+        run_command("mcopy -i %s %s ::clue.txt" % (self.image, clue), 10)
+        reader = FloppyReader(self.image, "mount -o loop -t msdos %s %s" % (self.image, self.mount_point),
+                              "umount %s" % self.mount_point, os.path.join(self.mount_point, "clue.txt"), 1, 10)
+        reader.check_drive()
+        self.assertEqual(reader.get_text(), "foobar")
+
+
+# Canvas recording the calls made by the scene
+class FakeCanvas:
+    def __init__(self):
+        self.calls = []
+
+    def create_text(self, *coords, **options):
+        self.calls.append(("create", coords, options))
+        return len(self.calls)
+
+    create_rectangle = create_text
+
+    def itemconfigure(self, item, **options):
+        self.calls.append(("configure", item, options))
+
+    def coords(self, item, *coords):
+        self.calls.append(("coords", item, coords))
+
+
+# Testing of the retained canvas items
+class TestScene(unittest.TestCase):
+    def setUp(self):
+        self.canvas = FakeCanvas()
+        self.scene = Scene(self.canvas)
+        self.scene.add("title", "text", (10, 10), text="foo")
+        self.scene.add("message", "text", (20, 20), text="bar")
+
+    def test_unchanged_options_not_sent(self):
+        self.scene.configure("title", text="foo")
+        self.assertEqual(self.scene.configured, 0)
+        self.scene.configure("title", text="foobar")
+        self.assertEqual(self.canvas.calls[-1], ("configure", 1, {"text": "foobar"}))
+        self.scene.move("message", (20, 20))
+        self.assertEqual(self.scene.configured, 1)
+
+    def test_show_only_changes_visibility(self):
+        self.scene.show(["title"])
+        self.scene.show(["title", "message"])
+        self.assertEqual(self.scene.configured, 2)
+        self.scene.show(["message"])
+        self.assertEqual(self.canvas.calls[-1], ("configure", 1, {"state": "hidden"}))
+        self.assertEqual(self.scene.created, 2)
+
+    def test_pinned_item_kept_by_views(self):
+        self.scene.pin("title")
+        self.scene.show(["message"])
+        self.assertEqual(self.scene.visible, {"title", "message"})
+        self.scene.unpin("title")
+        self.assertEqual(self.scene.visible, {"message"})
+
+
+# Widget running the jobs scheduled with after() on demand
+class FakeWidget:
+    def __init__(self):
+        self.jobs = {}
+        self.last_job = 0
+
+    def after(self, delay, function, *args):
+        self.last_job += 1
+        self.jobs[self.last_job] = (function, args)
+        return self.last_job
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def run_jobs(self):
+        jobs, self.jobs = self.jobs, {}
+        for function, args in jobs.values():
+            function(*args)
+
+
+class FakeEventLoop:
+    def __init__(self):
+        self.handlers = {}
+
+    def createfilehandler(self, file_descriptor, mask, handler):
+        self.handlers[file_descriptor] = handler
+
+    def deletefilehandler(self, file_descriptor):
+        self.handlers.pop(file_descriptor, None)
+
+    def run_handlers(self):
+        for file_descriptor, handler in list(self.handlers.items()):
+            handler(file_descriptor, 0)
+
+
+# Testing of the picture frame slideshow
+class TestSlideshow(unittest.TestCase):
+    def setUp(self):
+        self.widget = FakeWidget()
+        self.scene = Scene(FakeCanvas())
+        self.scene.add("picture", "text", (0, 0))
+        self.scene.add("fade", "rectangle", (0, 0, 10, 10))
+        self.images = ImageCache(10 ** 6, lambda path, size: FakeImage(10, 10))
+        self.pictures = sorted(get_files_in_directory(picture_frame_folder, ".png"))[:2]
+        self.displayed = []
+
+    def display(self, picture):
+        self.images.get(picture)
+        self.displayed.append(picture)
+        self.scene.show(["picture"])
+
+    def test_next_picture_prefetched(self):
+        slideshow = Slideshow(self.widget, self.scene, self.pictures, 1000, self.display, self.images)
+        slideshow.start()
+        slideshow._reader.join()
+        self.widget.run_jobs()
+        self.assertEqual(self.displayed, self.pictures)
+        self.assertEqual(slideshow.prefetched, 1)
+        self.assertEqual(self.images.hits, 1)
+
+    def test_picture_changed_under_full_cover(self):
+        slideshow = Slideshow(self.widget, self.scene, self.pictures, 1000, self.display, self.images, "fade", 100)
+        slideshow.start()
+        while len(self.displayed) < 2:
+            self.widget.run_jobs()
+        self.assertEqual(self.scene.options["fade"]["stipple"], "")
+        self.assertIn("fade", self.scene.visible)
+        while "fade" in self.scene.visible:
+            self.widget.run_jobs()
+        slideshow.stop()
+        self.assertEqual(self.widget.jobs, {})
+
+
+# Testing of the simulated hardware
+class TestSimulator(unittest.TestCase):
+    def setUp(self):
+        self.arduino = ArduinoEmulator()
+        self.arduino.start()
+        self.port = serial.Serial(self.arduino.port, 9600, timeout=1)
+
+    def tearDown(self):
+        self.port.close()
+        self.arduino.stop()
+
+    def test_status_replies(self):
+        self.port.write(b"status update fsr\n")
+        self.assertEqual(self.port.readline(), b"fsr activated: false\r\n")
+        self.arduino.press_fsr()
+        self.port.write(b"status update fsr\n")
+        self.assertEqual(self.port.readline(), b"fsr activated: true\r\n")
+
+    def test_push_frames(self):
+        self.port.write(b"push mode on\n")
+        frames = [decode_push_frame(self.port.readline().decode()) for _ in range(3)]
+        self.assertEqual([frame.kind for frame in frames], ["E", "E", "H"])
+        self.arduino.put_weight()
+        frame = decode_push_frame(self.port.readline().decode())
+        self.assertEqual((frame.sensor, frame.state, frame.sequence), ("load cell", True, 4))
+
+    def test_stream_frames(self):
+        self.port.write(b"stream on\n")
+        batches = {}
+        while len(batches) < 2:
+            sample_frame = decode_sample_frame(self.port.readline().decode())
+            batches[sample_frame.sensor] = sample_frame
+        self.assertEqual((len(batches["fsr"].data), len(batches["load cell"].data)), (48, 24))
+        self.port.write(b"stream off\n")
+        while self.port.readline().startswith(b"#R,"):
+            pass
+        self.assertFalse(self.arduino.stream_mode)
+
+    # The emulator is not reset by the opening of the port, it answers the ping
+    def test_ready_after_ping(self):
+        self.assertTrue(wait_for_ready(self.port, 2, 0.1))
+        self.assertEqual(self.port.timeout, 1)
+        self.assertEqual(self.arduino.commands["ping"], 1)
+
+    def test_fake_rfid(self):
+        reader = fake_rfid.RFID(device=1)
+        fake_rfid.field(1).present([1, 2, 3, 4, 5])
+        reader.wait_for_tag()
+        self.assertEqual(read_rfid_uid(reader), [1, 2, 3, 4, 5])
+        fake_rfid.field(1).remove()
+        self.assertEqual(read_rfid_uid(reader), [])
+
+    def test_fake_floppy(self):
+        floppy = FakeFloppy()
+        reader = FloppyReader(floppy.device, floppy.mount_command, floppy.unmount_command,
+                              os.path.join(floppy.mount_path, "clue.txt"), 1, 5)
+        floppy.insert("foobar")
+        reader.check_drive()
+        self.assertEqual(reader.get_text(), "foobar")
+        floppy.eject()
+        reader.check_drive()
+        self.assertIsNone(reader.get_text())
+        floppy.remove()
+
+
+# Testing of the processing of the raw samples of the stream mode
+@unittest.skipUnless(numpy is not None, "NumPy is needed to process the samples")
+class TestSignalProcessing(unittest.TestCase):
+    def test_unpack_samples(self):
+        data = b"".join(sample.to_bytes(3, "little", signed=True) for sample in (5, -5, -8388608))
+        self.assertEqual(signal_processing.unpack_samples(data, 3).tolist(), [5, -5, -8388608])
+        self.assertEqual(signal_processing.unpack_samples(b"\x10\x00\xff\xff", 2).tolist(), [16, -1])
+
+    def test_exponential_average(self):
+        samples = numpy.random.default_rng(1).normal(size=1000)
+        expected = []
+        average = 2.0
+        for sample in samples:
+            average = 0.9 * sample + 0.1 * average
+            expected.append(average)
+        numpy.testing.assert_allclose(signal_processing.exponential_average(samples, 0.9, 2.0), expected)
+
+    # An outlier does not press the FSR, the state only changes past the thresholds
+    def test_outlier_and_hysteresis(self):
+        fsr = signal_processing.SensorFilter(1.0, 5, 1.0, 800, 700)
+        _, states = fsr.process(numpy.array([0, 0, 1000, 0, 0, 0]))
+        self.assertFalse(states.any())
+        _, states = fsr.process(numpy.array([900] * 4 + [750] * 4 + [600] * 4))
+        self.assertEqual(states.tolist(), [False, False, True, True] + [True] * 4 + [True, True, False, False])
+
+    # The tare follows a drift larger than the threshold, the weight is still found
+    def test_tare_follows_drift(self):
+        load_cell = signal_processing.SensorFilter(-7050.0, 5, 0.3, 3.0, 2.0, 0.01, 0.5)
+        raw = 84000 + 5 * numpy.arange(8000)
+        for batch in numpy.split(raw, 1000):
+            load_cell.process(batch)
+        self.assertFalse(load_cell.state)
+        _, states = load_cell.process(raw[-1] + 4 * -7050 + numpy.zeros(16))
+        self.assertTrue(states[-1])
+        self.assertAlmostEqual(load_cell.value, 4, delta=0.2)
+
+    def test_stream_activation(self):
+        stream = signal_processing.SampleStream(signal_processing.default_filters())
+        source = SampleSource(spike_rate=0.01)
+        source.start(0)
+        for millis in range(0, 20000, 100):
+            for line in source.frames(millis, 900 if millis >= 5000 else 0, 4.0 if millis >= 10000 else 0.0):
+                stream.handle_frame(decode_sample_frame(line.decode()))
+        self.assertAlmostEqual(stream.activations["fsr"], 5000, delta=50)
+        self.assertAlmostEqual(stream.activations["load cell"], 10000, delta=800)
+        self.assertEqual(stream.lost_frames, 0)
+        stream.reset()
+        self.assertEqual(stream.states(), {"fsr": False, "load cell": False})
+
+    # The frames are on the disk without closing the recording, a frame after the close is not recorded
+    def test_stream_recording(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        path = os.path.join(folder, "stream.txt")
+        stream = signal_processing.SampleStream(signal_processing.default_filters(), path)
+        stream.record("B0 1 2 3 AAAA\n")
+        with open(path) as file:
+            self.assertEqual(file.read(), "B0 1 2 3 AAAA\n")
+        stream.close()
+        stream.record("B0 1 2 4 AAAA\n")
+        with open(path) as file:
+            self.assertEqual(file.read(), "B0 1 2 3 AAAA\n")
+
+
+# Testing of the puzzle engine
+class TestPuzzle(unittest.TestCase):
+    def setUp(self):
+        self.puzzle = load_puzzle(puzzle_file)
+        self.uids = [list(task.uid) for task in self.puzzle.tasks]
+
+    def test_sensor_transitions(self):
+        self.assertFalse(self.puzzle.handle_sensor("load cell"))
+        self.assertTrue(self.puzzle.handle_sensor("fsr"))
+        self.assertTrue(self.puzzle.handle_sensor("load cell"))
+        self.assertEqual(self.puzzle.state, "selection")
+
+    def test_pending_sensors(self):
+        self.assertEqual(self.puzzle.pending_sensors(), ["fsr", "load cell"])
+        self.puzzle.restore("desk error", [])
+        self.assertEqual(self.puzzle.pending_sensors(), ["load cell"])
+        self.puzzle.restore("selection", [])
+        self.assertEqual(self.puzzle.pending_sensors(), [])
+
+    def test_scan_outcomes(self):
+        self.assertEqual(self.puzzle.scan([1, 2, 3, 4, 5]).outcome, "wrong card")
+        self.assertEqual(self.puzzle.scan(self.uids[1]).outcome, "wrong order")
+        result = self.puzzle.scan(self.uids[0])
+        self.assertEqual((result.outcome, result.message), ("completed", "Task 1 has been completed"))
+        self.assertEqual(self.puzzle.scan(self.uids[0]).outcome, "already completed")
+        self.assertEqual(self.puzzle.completed_count, 1)
+
+    def test_solved(self):
+        self.puzzle.handle_sensor("fsr")
+        self.puzzle.handle_sensor("load cell")
+        for uid in self.uids:
+            self.puzzle.scan(uid)
+        self.assertTrue(self.puzzle.is_solved())
+        self.assertEqual(self.puzzle.state, "solved")
+
+    def test_duplicate_card(self):
+        definition = {"states": ["start"], "initial": "start", "transitions": [], "messages": {},
+                      "tasks": [{"name": "a", "uid": [1, 2, 3, 4, 5]}, {"name": "b", "uid": [1, 2, 3, 4, 5]}]}
+        self.assertRaises(ValueError, Puzzle, definition)
+
+    def test_packed_uid(self):
+        self.assertEqual(pack_uid([1, 0, 0, 0, 2]), b"\x01\x00\x00\x00\x02")
+        self.assertNotEqual(pack_uid([0, 1, 2, 3, 4]), pack_uid([1, 2, 3, 4]))
+        self.assertEqual(self.puzzle.scan([0] + self.uids[0][1:]).outcome, "wrong card")
+        self.assertEqual(self.puzzle.scan(self.uids[0][1:]).outcome, "wrong card")
+
+    def test_lose(self):
+        self.puzzle.handle_sensor("fsr")
+        self.assertTrue(self.puzzle.lose())
+        self.assertEqual(self.puzzle.state, "lost")
+        self.assertFalse(self.puzzle.handle_sensor("load cell"))
+        self.assertFalse(self.puzzle.lose())
+
+    def test_new_game_shares_definition(self):
+        self.puzzle.handle_sensor("fsr")
+        game = self.puzzle.new_game()
+        game.scan(self.uids[0])
+        self.assertEqual(game.state, "picture frame")
+        self.assertEqual(self.puzzle.completed_count, 0)
+        self.assertIs(game.uid_index, self.puzzle.uid_index)
+
+    def test_hints_by_state(self):
+        delays = [hint.delay for hint in self.puzzle.hints["desk error"]]
+        self.assertEqual(delays, sorted(delays))
+        self.assertEqual(self.puzzle.hints["desk error"][0].image, "clean_desk_clue.png")
+        definition = {"states": ["start"], "initial": "start", "transitions": [], "messages": {}, "tasks": [],
+                      "hints": [{"name": "a", "state": "end", "after": 1, "text": "a"}]}
+        self.assertRaises(ValueError, Puzzle, definition)
+
+
+# Testing of the hint timers and of the hints written by the operator
+class TestHints(unittest.TestCase):
+    def setUp(self):
+        self.widget = FakeWidget()
+        self.shown = []
+        self.scheduler = HintScheduler(self.widget, self.shown.append)
+
+    def test_due_hints_in_order(self):
+        self.scheduler.schedule("second", 0.06)
+        self.scheduler.schedule("first", 0.02)
+        cancelled = self.scheduler.schedule("cancelled", 0.04)
+        self.scheduler.cancel(cancelled)
+        # Only the earliest timer is scheduled
+        self.assertEqual(len(self.widget.jobs), 1)
+        time.sleep(0.1)
+        self.widget.run_jobs()
+        self.assertEqual(self.shown, ["first", "second"])
+        self.assertEqual((self.scheduler.pending(), len(self.widget.jobs)), (0, 0))
+
+    def test_hint_not_due(self):
+        self.scheduler.schedule("later", 10)
+        self.widget.run_jobs()
+        self.assertEqual(self.shown, [])
+        self.assertEqual(len(self.widget.jobs), 1)
+        self.scheduler.cancel_all()
+        self.assertEqual(len(self.widget.jobs), 0)
+
+    def test_operator_pipe(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        self.widget.tk = FakeEventLoop()
+        operator_hints = OperatorHints(self.widget, os.path.join(folder, "hints.fifo"), self.shown.append)
+        operator_hints.open()
+        send_hint(operator_hints.path, "Look under\nthe keyboard")
+        send_hint(operator_hints.path, "Again")
+        self.widget.tk.run_handlers()
+        self.assertEqual(self.shown, ["Look under the keyboard", "Again"])
+        operator_hints.close()
+        self.assertRaises(OSError, send_hint, operator_hints.path, "Nobody reads")
+
+
+# Testing of the WebSocket frames of the control server
+class TestWebSocket(unittest.TestCase):
+    def test_accept_key(self):
+        # Example of RFC 6455
+        self.assertEqual(accept_key("dGhlIHNhbXBsZSBub25jZQ=="), "s3pPLMBiTxaQ9kYGzzhZRbK+xOo=")
+
+    def test_masked_frame(self):
+        async def read(data):
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            return await read_frame(reader)
+
+        payload = b"x" * 300
+        frame = encode_frame(payload, mask=b"\x01\x02\x03\x04")
+        self.assertNotIn(payload, frame)
+        self.assertEqual(asyncio.run(read(frame)), (1, payload))
+
+
+# Testing of the control server with an emulated desk
+class TestControlServer(unittest.TestCase):
+    def setUp(self):
+        self.arduino = ArduinoEmulator()
+        self.arduino.start()
+        self.rooms = [{"name": "room 1", "serial_port": self.arduino.port, "rfid_device": 7}]
+
+    def tearDown(self):
+        self.arduino.stop()
+
+    async def request(self, port: int, method: str, path: str, body: bytes = b""):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"%s %s HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n%s"
+                     % (method.encode(), path.encode(), len(body), body))
+        response = await reader.read()
+        writer.close()
+        head, _, content = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(content.decode())
+
+    async def play(self):
+        control_server = ControlServer(self.rooms, load_puzzle(puzzle_file))
+        await control_server.start("127.0.0.1", 0)
+        session = control_server.sessions["room 1"]
+        try:
+            while session.link_status != "ready":
+                await asyncio.sleep(0.01)
+            self.arduino.press_fsr()
+            while session.puzzle.state == "picture frame":
+                await asyncio.sleep(0.01)
+            results = [await self.request(control_server.port, "GET", "/sessions/room%201"),
+                       await self.request(control_server.port, "POST", "/sessions/room%201/hint",
+                                          b'{"text": "look under the desk"}'),
+                       await self.request(control_server.port, "POST", "/sessions/room%201/unlock"),
+                       await self.request(control_server.port, "POST", "/sessions/room%201/reset"),
+                       await self.request(control_server.port, "GET", "/sessions/room%202"),
+                       await self.request(control_server.port, "POST", "/sessions/room%201/hint", b"{}")]
+            # The requests reach the arduino before the port is closed
+            await asyncio.sleep(0.2)
+        finally:
+            await control_server.stop()
+        return results
+
+    def test_api(self):
+        status, hint, unlock, reset, unknown, bad_hint = asyncio.run(asyncio.wait_for(self.play(), 15))
+        self.assertEqual(status, (200, dict(status[1], state="desk error")))
+        self.assertEqual(status[1]["link"], "ready")
+        self.assertEqual(hint[1]["hints"], ["look under the desk"])
+        self.assertTrue(unlock[1]["unlocked"])
+        self.assertEqual((reset[1]["state"], reset[1]["hints"], reset[1]["unlocked"]), ("picture frame", [], False))
+        self.assertEqual((unknown[0], bad_hint[0]), (404, 400))
+        self.assertEqual(self.arduino.commands["deactivate solenoide"], 1)
+        self.assertEqual(self.arduino.commands["setup"], 2)
+
+    # A reader failing to open is tried again, the desk keeps taking cards
+    async def scan_after_failure(self):
+        events = []
+        session = DeskSession("room 1", self.arduino.port, 8, load_puzzle(puzzle_file),
+                              lambda session, event: events.append(dict(event, rfid=session.rfid_status)))
+        session.puzzle.restore("selection", [])
+        fake_rfid.field(8).present(list(session.puzzle.tasks[0].uid))
+        opened = [OSError("no /dev/spidev0.8"), fake_rfid.FakeRFID(device=8)]
+        with unittest.mock.patch("server.open_rfid_reader", side_effect=opened), \
+                unittest.mock.patch("server.server_reconnect_interval", 0.01), \
+                unittest.mock.patch("server.server_rfid_poll_interval", 0.01):
+            task = asyncio.ensure_future(session._scan_cards())
+            while not any(event["event"] == "scan" for event in events):
+                await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        return events
+
+    def test_rfid_reader_reopened(self):
+        self.addCleanup(fake_rfid.field(8).remove)
+        events = asyncio.run(asyncio.wait_for(self.scan_after_failure(), 5))
+        self.assertEqual([(event["event"], event["rfid"]) for event in events],
+                         [("rfid", "offline"), ("rfid", "ready"), ("scan", "ready")])
+        self.assertEqual(events[0]["error"], "no /dev/spidev0.8")
+
+    # The readers of two desks on the same chip select would answer together
+    def test_shared_rfid_device(self):
+        rooms = self.rooms + [{"name": "room 2", "serial_port": "/dev/ttyUSB1", "rfid_device": 7}]
+        self.assertRaises(ValueError, ControlServer, rooms, load_puzzle(puzzle_file))
+
+
+# Testing of the telemetry of the sessions
+class TestTelemetry(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_timed_call_recorded(self):
+        @timed
+        def decode():
+            time.sleep(0.01)
+
+        decode()
+        t, kind, name, duration = recorder.records[-1]
+        self.assertEqual((kind, name), ("span", "decode"))
+        self.assertGreaterEqual(duration, 0.01)
+
+    def test_full_buffer_counts_lost_records(self):
+        telemetry = Telemetry(10)
+        telemetry.open(self.folder, 60)
+        for i in range(25):
+            telemetry.span("display_image", i / 1000)
+        telemetry.close()
+        with open(telemetry.path) as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual(records[0]["session"], telemetry.session)
+        self.assertEqual([record[3] for record in records[1:11]], [i / 1000 for i in range(15, 25)])
+        self.assertEqual(records[-1][2:], ["telemetry records lost", 15])
+
+    def test_report_of_sessions(self):
+        for session in range(2):
+            telemetry = Telemetry()
+            telemetry.session += "-%d" % session
+            telemetry.open(self.folder, 60)
+            for event in [("fsr", "desk error"), ("load cell", "selection"), ("task", "1"), ("end screen", None)]:
+                telemetry.event(*event)
+            telemetry.span("informative_layout", 0.002)
+            telemetry.close()
+        report = build_report([self.folder])
+        self.assertEqual((report["sessions"], report["games finished"]), (2, 2))
+        self.assertEqual(list(report["steps"]), ["load cell", "task 1", "end screen", "total"])
+        self.assertEqual(report["spans"]["informative_layout"]["histogram"][4], 2)
+
+    def test_steps_start_at_fsr(self):
+        steps = step_durations([(1, "load cell"), (10, "fsr"), (40, "load cell"), (100, "task 2"), (130, "end screen")])
+        self.assertEqual(steps, {"load cell": 30, "task 2": 60, "end screen": 30, "total": 120})
+
+    # Ranks falling on an exact position take the value at that position
+    def test_percentile(self):
+        self.assertEqual(percentile(list(range(1, 11)), 50), 5)
+        self.assertEqual(percentile(list(range(1, 101)), 99), 99)
+        self.assertEqual(percentile(list(range(1, 9)), 50), 4)
+        self.assertEqual(percentile([3, 1, 2], 50), 2)
+        self.assertEqual(percentile([3, 1, 2], 100), 3)
+        self.assertEqual(percentile([3, 1, 2], 0), 1)
+
+
+# Testing of the countdown of the game
+class TestGameClock(unittest.TestCase):
+    def test_penalties(self):
+        clock = GameClock(600, 60, 3)
+        clock.start()
+        clock.penalize()
+        self.assertAlmostEqual(clock.remaining(), 540, delta=1)
+        self.assertEqual(clock.chances_left(), 2)
+        clock.penalize()
+        self.assertFalse(clock.is_lost())
+        clock.penalize()
+        self.assertTrue(clock.is_lost())
+
+    def test_time_up(self):
+        clock = GameClock(600, 60, 0)
+        self.assertFalse(clock.is_lost())
+        clock.start(elapsed=599.95)
+        self.assertIsNone(clock.chances_left())
+        self.assertEqual(clock.text(), "00:01")
+        self.assertLessEqual(clock.next_change(), 51)
+        time.sleep(0.06)
+        self.assertEqual(clock.text(), "00:00")
+        self.assertTrue(clock.is_lost())
+
+    def test_stopped_clock(self):
+        clock = GameClock(600, 60, 3)
+        clock.start(elapsed=30.5)
+        clock.stop()
+        self.assertFalse(clock.is_running())
+        self.assertEqual(clock.text(), "09:30")
+        self.assertAlmostEqual(clock.next_change(), 501, delta=2)
+
+
+# Testing of the journal of the game
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.journal = Journal(os.path.join(self.folder, "journal.jsonl"), 60, 100)
+        self.game = [{"event": "new game"}, {"event": "sensor", "sensor": "fsr", "state": "desk error"},
+                     {"event": "sensor", "sensor": "load cell", "state": "selection"},
+                     {"event": "task", "task": "1", "state": "selection"},
+                     {"event": "penalty", "outcome": "wrong card"}, {"event": "view", "view": "rfid"}]
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_records_written_by_batch(self):
+        for record in self.game:
+            self.journal.append(record)
+        self.journal.flush()
+        self.assertEqual(self.journal.syncs, 1)
+        self.assertEqual(self.journal.load(), self.game)
+
+    # A record cut by a crash is removed, the next records follow the last complete one
+    def test_torn_record_removed(self):
+        self.journal.compact(self.game[:2])
+        with open(self.journal.path, "a") as file:
+            file.write('{"event": "sens')
+        self.assertEqual(self.journal.load(), self.game[:2])
+        self.journal.append(self.game[2])
+        self.journal.flush()
+        self.assertEqual(self.journal.load(), self.game[:3])
+
+    def test_game_resumed(self):
+        progress = replay(game_records([{"event": "game over"}] + self.game))
+        self.assertEqual(progress, {"state": "selection", "completed": ["1"], "view": "rfid", "penalties": 1,
+                                    "clock started": None, "clock remaining": None})
+        puzzle = load_puzzle(puzzle_file)
+        puzzle.restore(progress["state"], progress["completed"])
+        self.assertEqual(puzzle.scan(list(puzzle.tasks[1].uid)).outcome, "completed")
+
+    # A solved game waiting for the end screen keeps the time it was solved in
+    def test_stopped_clock_resumed(self):
+        progress = replay(self.game + [{"event": "clock", "started": time.time() - 600},
+                                       {"event": "clock stop", "remaining": 1234.5}])
+        clock = GameClock(3600, 60, 3)
+        clock.start(max(0, time.time() - progress["clock started"]))
+        clock.stop(progress["clock remaining"])
+        self.assertEqual(clock.remaining(), 1234.5)
+        self.assertFalse(clock.is_running())
+
+    def test_finished_game_not_resumed(self):
+        self.assertEqual(game_records(self.game + [{"event": "game over"}]), [])
+
+    # The end of the game written while the journal is compacted is kept, the next start is a new game
+    def test_flush_during_compaction(self):
+        self.journal.compact(self.game)
+        loaded = threading.Event()
+        flushed = threading.Event()
+        load = self.journal.load
+
+        def slow_load():
+            records = load()
+            loaded.set()
+            # Without the write lock the flush would write its record now and the compaction would drop it
+            flushed.wait(0.5)
+            return records
+
+        with unittest.mock.patch.object(self.journal, "load", slow_load):
+            compaction = threading.Thread(target=self.journal.compact_game)
+            compaction.start()
+            loaded.wait(5)
+            self.journal.append({"event": "game over"})
+            self.journal.flush()
+            flushed.set()
+            compaction.join()
+        self.assertEqual(self.journal.load()[-1], {"event": "game over"})
+        self.assertEqual(game_records(self.journal.load()), [])
+        self.assertEqual(compact_game(self.game + [{"event": "game over"}]), [{"event": "new game"}])
+
+    def test_compaction_keeps_progress(self):
+        records = self.game + [{"event": "view", "view": "selection"}] * 300
+        self.journal.compact(compact_game(records))
+        compacted = self.journal.load()
+        self.assertEqual(len(compacted), 2)
+        self.assertEqual(replay(game_records(compacted)), dict(replay(records)))
+
+
+# Testing of the recording of the hardware sessions and of their replay
+class TestSessionRecord(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.recorder = SessionRecorder()
+        self.recorder.open(self.folder)
+        self.records = [("command", "setup_arduino"), ("sensor", "fsr"), ("click", (400, 500)),
+                        ("floppy", ("ready", "Session clue")), ("floppy", ("no disk", None)),
+                        ("scan", [25, 201, 83, 179, 48]), ("hint", "Look under"),
+                        ("end", {"state": "solved", "completed": [True] * 5})]
+
+    def tearDown(self):
+        self.recorder.close()
+        shutil.rmtree(self.folder)
+
+    def test_records_read_back(self):
+        for kind, value in self.records:
+            self.recorder.record(kind, value)
+        self.recorder.close()
+        recording = SessionRecording(self.recorder.path)
+        self.assertEqual([(kind, value) for _, kind, value in recording.records()], self.records)
+        self.assertEqual((recording.count, len(recording.index)), (len(self.records), 1))
+        self.assertEqual(list(recording.records(recording.last_time() + 1)), [])
+
+    # A session stopped by a crash has no index, it is read up to its last complete record
+    def test_crashed_session(self):
+        for kind, value in self.records[:3]:
+            self.recorder.record(kind, value)
+        size = os.path.getsize(self.recorder.path)
+        self.recorder._file.close()
+        self.recorder._file = None
+        with open(self.recorder.path, "r+b") as file:
+            file.truncate(size - 1)
+        recording = SessionRecording(self.recorder.path)
+        self.assertIsNone(recording.index)
+        self.assertEqual([(kind, value) for _, kind, value in recording.records()], self.records[:2])
+
+    def test_virtual_clock(self):
+        clock = VirtualClock()
+        called = []
+        clock.call_later(50, called.append, "second")
+        clock.call_later(20, called.append, "first")
+        clock.cancel(clock.call_later(30, called.append, "cancelled"))
+        while clock.next_due() is not None:
+            clock.advance(clock.next_due())
+            function, args = clock.pop_due()
+            function(*args)
+        self.assertEqual(called, ["first", "second"])
+        self.assertAlmostEqual(clock.monotonic() - clock._origin, 0.05)
+
+    # A scan is only given while a scan is asked, the floppy reader gives the last read reached
+    def test_replay_services(self):
+        clock = VirtualClock()
+        rfid_service = ReplayRfidService(clock, [(1.0, [1, 2, 3, 4, 5]), (2.0, [6, 7, 8, 9, 10])])
+        floppy_reader = ReplayFloppyReader(clock, [(1.5, ("ready", "Session clue"))])
+        rfid_service.start_scan()
+        self.assertIsNone(rfid_service.get_result())
+        clock.advance(1.0)
+        self.assertEqual(rfid_service.get_result()[0], [1, 2, 3, 4, 5])
+        self.assertEqual((floppy_reader.status, floppy_reader.get_text()), ("no disk", None))
+        clock.advance(2.0)
+        self.assertEqual((floppy_reader.status, floppy_reader.get_text()), ("ready", "Session clue"))
+        rfid_service.start_scan()
+        self.assertIsNone(rfid_service.get_result())
+        self.assertEqual(rfid_service.dropped, 1)
+
+
+# Testing of the mirror of the scene for the game master
+class TestMirror(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.scene = Scene(FakeCanvas())
+        self.scene.add("title", "text", (10, 10), text="foo")
+        self.scene.add("frame", "rectangle", (0, 0, 5, 5), fill="black")
+        self.scene.show(["title"])
+        self.mirror = None
+
+    def tearDown(self):
+        if self.mirror is not None:
+            self.mirror.close()
+        shutil.rmtree(self.folder)
+
+    def open_mirror(self, max_buffer=256 * 1024):
+        self.mirror = SceneMirror(self.scene, os.path.join(self.folder, "mirror.sock"), max_buffer=max_buffer)
+        self.mirror.open()
+        viewer = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        viewer.connect(self.mirror.path)
+        viewer.settimeout(2)
+        self.addCleanup(viewer.close)
+        return viewer.makefile("rb")
+
+    def wait_viewers(self, count):
+        deadline = time.monotonic() + 2
+        while self.mirror.viewers() != count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.mirror.viewers(), count)
+
+    def test_keyframe_then_changes(self):
+        lines = self.open_mirror()
+        model = {}
+        self.assertTrue(apply_frame(model, json.loads(lines.readline())))
+        self.assertEqual(model["items"]["title"], {"kind": "text", "coords": [10, 10], "text": "foo",
+                                                   "state": "normal"})
+        self.wait_viewers(1)
+        self.scene.configure("title", text="bar")
+        self.scene.move("frame", (1, 1, 6, 6))
+        self.mirror.flush()
+        frame = json.loads(lines.readline())
+        self.assertNotIn("key", frame)
+        self.assertEqual(frame["items"], {"title": {"text": "bar"}, "frame": {"coords": [1, 1, 6, 6]}})
+        self.assertTrue(apply_frame(model, frame))
+        self.assertEqual(model["items"], self.mirror.keyframe()["items"])
+
+    def test_slow_viewer_gets_keyframe(self):
+        lines = self.open_mirror(max_buffer=64)
+        self.assertTrue(json.loads(lines.readline())["key"])
+        self.wait_viewers(1)
+        self.scene.configure("title", text="x" * 100)
+        self.mirror.flush()
+        frame = json.loads(lines.readline())
+        self.assertTrue(frame["key"])
+        self.assertEqual(frame["items"]["title"]["text"], "x" * 100)
+        self.assertEqual(self.mirror.resyncs, 1)
+
+    # A viewer not reading gets whole lines only, then the whole scene
+    def test_slow_viewer_whole_lines(self):
+        lines = self.open_mirror(max_buffer=100000)
+        self.wait_viewers(1)
+        # Lines larger than the socket buffer are sent in several parts
+        for connection in list(self.mirror._clients):
+            connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        for i in range(100):
+            self.scene.configure("title", text=str(i) * 20000)
+            self.mirror.flush()
+            time.sleep(0.001)
+        self.assertGreater(self.mirror.resyncs, 0)
+        model = {}
+        while model.get("seq") != self.mirror.seq:
+            apply_frame(model, json.loads(lines.readline()))
+        self.assertEqual(model["items"], self.mirror.keyframe()["items"])
+
+    def test_frame_after_gap_ignored(self):
+        model = {}
+        apply_frame(model, {"seq": 1, "key": True, "order": ["title"], "items": {"title": {"text": "foo"}}})
+        self.assertFalse(apply_frame(model, {"seq": 3, "items": {"title": {"text": "bar"}}}))
+        self.assertEqual(model["items"]["title"]["text"], "foo")
+
+
+# Testing of the measure of the startup phases
+class TestStartupTimer(unittest.TestCase):
+    def test_phases_in_order(self):
+        timer = StartupTimer(time.monotonic())
+        timer.mark("window")
+        time.sleep(0.05)
+        timer.mark("first frame")
+        self.assertEqual(list(timer.phases), ["window", "first frame"])
+        self.assertGreaterEqual(timer.phases["first frame"], 0.05)
+
+    def test_save_appends_lines(self):
+        folder = tempfile.mkdtemp()
+        path = os.path.join(folder, "Logs", "startup.jsonl")
+        timer = StartupTimer(time.monotonic())
+        timer.mark("imports")
+        timer.save(path)
+        timer.save(path)
+        with open(path) as file:
+            records = [json.loads(line) for line in file]
+        shutil.rmtree(folder)
+        self.assertEqual(len(records), 2)
+        self.assertIn("imports", records[0]["phases"])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+# Author: AUGUSTIN NOGUE <augustin.nogue@student.unamur.be>
+# Repository: https://github.com/UNamurCSFaculty/2021_INFOB318_ENIGM-ESC
+#
+# Date Created: March 28, 2022
+# Last Modified: March 28, 2022
+#
+# Developed and tested using Python 3.7.3
+
+# The part of the WebSocket protocol (RFC 6455) used by the control server (server.py):
+# the opening handshake and the frames, without extensions nor fragmented messages.
+
+import asyncio
+import base64
+import hashlib
+import struct
+
+# Key appended to the key of the client in the opening handshake
+HANDSHAKE_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+# Frame types
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+# Largest frame accepted from a client (bytes)
+MAX_FRAME_SIZE = 64 * 1024
+
+
+def accept_key(key: str) -> str:
+    """
+    Return the Sec-WebSocket-Accept value answering the Sec-WebSocket-Key of a client.
+    :param key: string
+    :return: string
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    assert type(key) == str, "Key should be a string"
+    return base64.b64encode(hashlib.sha1((key + HANDSHAKE_GUID).encode("ascii")).digest()).decode("ascii")
+
+
+def encode_frame(payload: bytes, opcode: int = OPCODE_TEXT, mask: bytes = None) -> bytes:
+    """
+    Build a complete frame. The server sends unmasked frames, clients must mask theirs.
+    :param payload: bytes
+    :param opcode: int
+    :param mask: bytes or None, 4 bytes masking the payload
+    :return: bytes
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    assert type(payload) == bytes, "Payload should be bytes"
+
+    mask_bit = 0x80 if mask is not None else 0
+    length = len(payload)
+    if length < 126:
+        header = struct.pack(">BB", 0x80 | opcode, mask_bit | length)
+    elif length < 1 << 16:
+        header = struct.pack(">BBH", 0x80 | opcode, mask_bit | 126, length)
+    else:
+        header = struct.pack(">BBQ", 0x80 | opcode, mask_bit | 127, length)
+    if mask is None:
+        return header + payload
+    return header + mask + apply_mask(payload, mask)
+
+
+def apply_mask(payload: bytes, mask: bytes) -> bytes:
+    """
+    Mask or unmask a payload (XOR with the 4 bytes of the mask).
+    :param payload: bytes
+    :param mask: bytes
+    :return: bytes
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    # XOR of the whole payload at once, as integers
+    repeated = (mask * (len(payload) // 4 + 1))[:len(payload)]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(len(payload), "big")
+
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple:
+    """
+    Read one frame and return (opcode, payload), the payload unmasked.
+    Raise ValueError if the frame does not follow the protocol.
+    :param reader: StreamReader
+    :return: tuple
+    :author: AUGUSTIN NOGUE
+    :version: 1.0
+    """
+    first, second = await reader.readexactly(2)
+    if not first & 0x80:
+        raise ValueError("Fragmented messages are not supported")
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack(">H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", await reader.readexactly(8))[0]
+    if length > MAX_FRAME_SIZE:
+        raise ValueError("Frame of %d bytes is too large" % length)
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask is not None:
+        payload = apply_mask(payload, mask)
+    return opcode, payload